@@ -5,6 +5,7 @@ from models import Comment, Notification, SearchHistory, Download, WatchHistory,
 from vkr_downloader_service import OmadaVideoService
 from multi_stream_service import MultiStreamService
 from invidious_instances import invidious_manager
+from video_metadata import video_metadata_resolver
 from datetime import datetime, timedelta
 from sqlalchemy import desc, or_, func
 import logging
@@ -22,33 +23,7 @@ multi_stream_service = MultiStreamService()
 # コメント機能
 # =============================================================================
 
-@additional.route('/api/comments/<string:video_id>', methods=['GET'])
-def api_get_comments(video_id):
-    """動画のコメントを取得（ログイン不要）"""
-    try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
-        
-        comments = Comment.query.filter_by(video_id=video_id, is_deleted=False)\
-            .order_by(desc(Comment.created_at))\
-            .paginate(page=page, per_page=per_page, error_out=False)
-        
-        return jsonify({
-            'success': True,
-            'comments': [comment.to_dict() for comment in comments.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': comments.total,
-                'pages': comments.pages,
-                'has_next': comments.has_next,
-                'has_prev': comments.has_prev
-            }
-        })
-        
-    except Exception as e:
-        logging.error(f"コメント取得エラー: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+# 動画のコメント一覧（ローカルのコメントを含む）は routes.py の /api/comments/<video_id>（comment_service）で返す
 
 
 # =============================================================================
@@ -667,20 +642,23 @@ def api_get_vkr_stream(video_id):
                 'has_audio': True
             }
         
+        # 動画情報は統合リゾルバーで補完（Omadaの結果は取得済みとして渡し、再取得しない）
+        metadata = video_metadata_resolver.resolve(video_id, prefetched={'omada_api': result})
+        
         # 360p は combined_url（音声付き）、その他は video_url と audio_url を分離
         response = {
             'success': True,
-            'videoId': result.get('videoId'),
-            'title': result.get('title'),
-            'thumbnail': result.get('thumbnail'),
-            'description': result.get('description'),
-            'author': result.get('author'),
-            'authorId': result.get('authorId'),  # チャンネルID
+            'videoId': result.get('videoId') or video_id,
+            'title': metadata['title'],
+            'thumbnail': result.get('thumbnail') or metadata['videoThumbnails'][0]['url'],
+            'description': metadata['description'],
+            'author': metadata['author'],
+            'authorId': metadata['authorId'],  # チャンネルID
             'authorUrl': result.get('authorUrl'),  # チャンネルURL
-            'authorThumbnails': result.get('authorThumbnails', []),  # チャンネルアイコン
-            'viewCount': result.get('viewCount'),
-            'lengthSeconds': result.get('lengthSeconds'),
-            'publishedText': result.get('publishedText'),
+            'authorThumbnails': metadata['authorThumbnails'],  # チャンネルアイコン
+            'viewCount': metadata['viewCount'],
+            'lengthSeconds': metadata['lengthSeconds'],
+            'publishedText': metadata['publishedText'],
             'multi_quality': True,
             'quality_streams': available_qualities,
             'best_audio': result.get('best_audio'),
@@ -695,7 +673,7 @@ def api_get_vkr_stream(video_id):
         
         logging.info(f"✅ VKR API 多品質ストリーム取得成功: {video_id}")
         logging.info(f"   利用可能品質: {list(available_qualities.keys())}")
-        logging.info(f"   チャンネル: {result.get('author', 'Unknown')}")
+        logging.info(f"   チャンネル: {metadata['author']}")
         
         return jsonify(response)
         
@@ -753,57 +731,7 @@ def api_vkr_test():
 # Invidious コメント機能
 # =============================================================================
 
-@additional.route('/api/invidious-comments/<string:video_id>', methods=['GET'])
-def api_get_invidious_comments(video_id):
-    """Invidiousインスタンスから動画コメントを取得"""
-    try:
-        logging.info(f"🚀 Invidiousコメント取得開始: {video_id}")
-        
-        # Invidiousインスタンスマネージャーからコメントを取得
-        comments_data = invidious_manager.get_video_comments(video_id)
-        
-        if comments_data:
-            comments = comments_data.get('comments', [])
-            
-            # コメントデータを標準形式にフォーマット
-            formatted_comments = []
-            for comment in comments:
-                formatted_comment = {
-                    'author': comment.get('author', ''),
-                    'authorId': comment.get('authorId', ''),
-                    'authorThumbnails': comment.get('authorThumbnails', []),
-                    'content': comment.get('content', ''),
-                    'publishedText': comment.get('publishedText', ''),
-                    'likeCount': comment.get('likeCount', 0),
-                    'replies': comment.get('replies', {}).get('replyCount', 0),
-                    'isOwner': comment.get('authorIsChannelOwner', False),
-                    'isPinned': comment.get('isPinned', False)
-                }
-                formatted_comments.append(formatted_comment)
-            
-            logging.info(f"✅ Invidiousコメント取得成功: {video_id} - {len(formatted_comments)}件")
-            return jsonify({
-                'success': True,
-                'comments': formatted_comments,
-                'total': len(formatted_comments),
-                'continuation': comments_data.get('continuation'),
-                'source': 'invidious'
-            })
-        else:
-            logging.warning(f"Invidiousコメント取得失敗: {video_id}")
-            return jsonify({
-                'success': False,
-                'error': 'Invidiousからコメントを取得できませんでした',
-                'comments': []
-            }), 404
-            
-    except Exception as e:
-        logging.error(f"Invidiousコメント取得エラー: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'Invidiousコメント取得エラー: {str(e)}',
-            'comments': []
-        }), 500
+# 動画コメントは routes.py の /api/invidious-comments/<video_id>（comment_service、ページごとにキャッシュ）で返す
 
 @additional.route('/api/invidious-trending', methods=['GET'])
 def api_get_invidious_trending():
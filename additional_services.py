@@ -1,10 +1,10 @@
-import requests
 import logging
 from urllib.parse import quote
+from http_client import http_client
 
 class AdditionalStreamServices:
     def __init__(self):
-        self.timeout = 8  # 高速化のためタイムアウト短縮
+        self.timeout = http_client.timeout_for('additional')  # config.SERVICE_TIMEOUTS で設定
     
     def get_ytsr_stream(self, video_id):
         """YTSRサービスからストリームを取得"""
@@ -42,7 +42,7 @@ class AdditionalStreamServices:
             
             for url in urls_to_try:
                 try:
-                    response = requests.get(url, timeout=self.timeout)
+                    response = http_client.get(url, timeout=self.timeout)
                     if response.status_code == 200:
                         data = response.json()
                         return self._parse_ytsr_response(data, video_id)
@@ -68,7 +68,7 @@ class AdditionalStreamServices:
             
             for url in urls_to_try:
                 try:
-                    response = requests.get(url, timeout=self.timeout)
+                    response = http_client.get(url, timeout=self.timeout)
                     if response.status_code == 200:
                         data = response.json()
                         # データが辞書形式であることを確認
@@ -91,7 +91,7 @@ class AdditionalStreamServices:
         """高画質ストリーム取得（wakame API）"""
         try:
             url = f"https://watawatawata.glitch.me/api/{video_id}?token=wakameoishi"
-            response = requests.get(url, timeout=self.timeout)
+            response = http_client.get(url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -241,7 +241,7 @@ class AdditionalStreamServices:
                 "disableMetadata": True
             }
             
-            response = requests.post(url, json=payload, timeout=self.timeout)
+            response = http_client.post(url, json=payload, timeout=self.timeout)
             if response.status_code == 200:
                 data = response.json()
                 return self._parse_cobalt_response(data, video_id)
@@ -256,7 +256,7 @@ class AdditionalStreamServices:
         """🚀 Noembed API - 軽量高速取得"""
         try:
             url = f"https://noembed.com/embed?url=https://youtube.com/watch?v={video_id}"
-            response = requests.get(url, timeout=self.timeout)
+            response = http_client.get(url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -272,7 +272,7 @@ class AdditionalStreamServices:
         """🚀 LemnosLife API - YouTube互換高速API"""
         try:
             url = f"https://yt.lemnoslife.com/videos?part=snippet,contentDetails&id={video_id}"
-            response = requests.get(url, timeout=self.timeout)
+            response = http_client.get(url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -1,12 +1,14 @@
 import os
 import logging
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy.orm import DeclarativeBase
+from video_records import RECORD_TYPES
 
 # ログ設定
 logging.basicConfig(level=logging.DEBUG)
@@ -14,6 +16,15 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
+class RecordJSONProvider(DefaultJSONProvider):
+    """jsonify / tojson で Video などのレコードを従来の辞書形式に変換"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, RECORD_TYPES):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 # データベース設定
 db = SQLAlchemy(model_class=Base)
 migrate = Migrate()
@@ -21,6 +32,7 @@ login_manager = LoginManager()
 
 def create_app():
     app = Flask(__name__)
+    app.json = RecordJSONProvider(app)
     app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key-here")
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
@@ -0,0 +1,231 @@
+"""
+投稿者アイコン（チャンネルID → アイコンURL）のインデックス
+
+AuthorAvatarIndex は
+  - チャンネル情報を含む上流の応答（チャンネルヘッダー・検索結果のチャンネル・/watch の統合メタデータ）から
+    アイコンURLを記録（共有キャッシュに長いTTLで保存し、ワーカー・再起動をまたいで使う）
+  - 一覧の表示時はインデックスだけを引いて投稿者アイコンを付ける（リクエスト中に上流を呼ばない）
+  - インデックスにないチャンネルIDを集め、共有スレッドプール上でまとめて取得
+を行う。まとめての取得は Kahoot の channels API（YouTube Data API 互換、1回に最大50件）を使い、
+返らなかったIDはチャンネルヘッダーの取得（ChannelService）で補う。
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+from config import (AUTHOR_AVATAR_TTL, AUTHOR_AVATAR_MISSING_TTL, AUTHOR_AVATAR_BATCH_MAX,
+                    AUTHOR_AVATAR_PENDING_MAX, AUTHOR_AVATAR_FALLBACK_MAX)
+from cache_store import get_cache
+from upstream_executor import upstream_executor
+from http_client import http_client
+from video_records import DEFAULT_AUTHOR_THUMBNAIL
+
+KAHOOT_CHANNELS_API_URL = "https://apis.kahoot.it/media-api/youtube/channels"
+
+# 既定画像（実際のアイコンではないので記録しない）
+_PLACEHOLDER_MARKERS = ('default-user', 'default_user', 'AOPolaDefault', 'placeholder')
+
+
+def is_placeholder(url: Optional[str]) -> bool:
+    """アイコンURLが既定画像かどうか"""
+    return not url or url == DEFAULT_AUTHOR_THUMBNAIL or any(marker in url for marker in _PLACEHOLDER_MARKERS)
+
+
+def _largest_thumbnail(thumbnails) -> str:
+    # authorThumbnails 形式のリストから最大サイズのURL
+    if not isinstance(thumbnails, list):
+        return ''
+    sized = [thumb for thumb in thumbnails if isinstance(thumb, dict) and thumb.get('url')]
+    if not sized:
+        return ''
+    url = max(sized, key=lambda thumb: thumb.get('width', 0) * thumb.get('height', 0))['url']
+    return f"https:{url}" if url.startswith('//') else url
+
+
+def fetch_kahoot_channel_avatars(channel_ids: List[str]) -> Optional[Dict[str, str]]:
+    """Kahoot channels API を1回呼んで {チャンネルID: アイコンURL} を取得（失敗時None）"""
+    params = {'id': ','.join(channel_ids), 'part': 'snippet'}
+    response = http_client.get(KAHOOT_CHANNELS_API_URL, params=params, service='kahoot')
+    if response.status_code != 200:
+        logging.warning(f"Kahoot channels API エラー: {response.status_code}")
+        return None
+    avatars = {}
+    for item in response.json().get('items', []):
+        thumbnails = (item.get('snippet') or {}).get('thumbnails') or {}
+        for size in ('high', 'medium', 'default'):
+            if isinstance(thumbnails.get(size), dict) and thumbnails[size].get('url'):
+                avatars[item.get('id')] = thumbnails[size]['url']
+                break
+    return avatars
+
+
+def fetch_channel_header_avatar(channel_id: str) -> Optional[str]:
+    """チャンネルヘッダー（siawaseok → Invidious）からアイコンURLを取得（ヘッダーもキャッシュされる）"""
+    from channel_service import channel_service  # channel_service がこのモジュールを読み込むため遅延インポート
+    channel_info = channel_service.header(channel_id)
+    return channel_info.avatar if channel_info is not None else None
+
+
+class AuthorAvatarIndex:
+    """チャンネルIDごとの投稿者アイコンURL（スレッドセーフ）"""
+
+    def __init__(self, fetch_batch: Callable[[List[str]], Optional[Dict[str, str]]] = fetch_kahoot_channel_avatars,
+                 fetch_one: Optional[Callable[[str], Optional[str]]] = fetch_channel_header_avatar,
+                 executor=upstream_executor, ttl: float = AUTHOR_AVATAR_TTL,
+                 missing_ttl: float = AUTHOR_AVATAR_MISSING_TTL, max_batch: int = AUTHOR_AVATAR_BATCH_MAX,
+                 pending_max: int = AUTHOR_AVATAR_PENDING_MAX, fallback_max: int = AUTHOR_AVATAR_FALLBACK_MAX):
+        self.fetch_batch = fetch_batch
+        self.fetch_one = fetch_one
+        self.executor = executor
+        self.missing_ttl = missing_ttl  # アイコンを取得できなかったIDを再取得しない秒数
+        self.max_batch = max_batch  # 1回のまとめ取得で送るIDの上限
+        self.pending_max = pending_max  # 取得待ちのIDの上限（超えた分は次に要求されたときに追加）
+        self.fallback_max = fallback_max  # まとめ取得で返らなかったIDを個別に取得する上限（1回の取得ごと）
+        self._cache = get_cache('author_avatars', ttl=ttl, max_entries=50000, max_bytes=16 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._pending = {}  # 取得待ちのID（挿入順）
+        self._filling = False
+        self.recorded = 0
+        self.lookups = 0
+        self.hits = 0
+        self.applied = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.failed_batches = 0
+
+    # --- 記録 ---
+
+    def record(self, channel_id: str, url: Optional[str]) -> bool:
+        """アイコンURLを記録（既定画像・記録済みと同じURLは無視）"""
+        if not channel_id or is_placeholder(url):
+            return False
+        if self._cache.get(channel_id) == url:
+            return False
+        self._cache.set(channel_id, url)
+        self.recorded += 1
+        return True
+
+    def observe(self, records: Iterable) -> int:
+        """チャンネル情報を含むレコード（Channel・Video・authorThumbnails を持つ辞書）から記録（記録した件数を返す）"""
+        count = 0
+        for record in records or []:
+            if record is None or not hasattr(record, 'get'):
+                continue
+            url = (record.get('avatar') or record.get('authorThumbnail')
+                   or _largest_thumbnail(record.get('authorThumbnails')))
+            if self.record(record.get('authorId'), url):
+                count += 1
+        return count
+
+    # --- 参照 ---
+
+    def lookup(self, channel_ids: Iterable[str], fill: bool = True) -> Dict[str, str]:
+        """インデックスにあるアイコンURL {チャンネルID: URL}（通信なし、fill の場合はないIDを裏で取得）"""
+        avatars = {}
+        missing = []
+        for channel_id in dict.fromkeys(channel_ids):
+            if not channel_id:
+                continue
+            self.lookups += 1
+            url = self._cache.get(channel_id)
+            if url is None:
+                missing.append(channel_id)
+            elif url:
+                self.hits += 1
+                avatars[channel_id] = url
+        if fill and missing:
+            self.prefetch(missing)
+        return avatars
+
+    def apply(self, videos: List) -> List:
+        """投稿者アイコンがない動画にインデックスのアイコンを付けた一覧（キャッシュ上のレコードは書き換えない）"""
+        targets = [video.get('authorId') for video in videos if is_placeholder(video.get('authorThumbnail'))]
+        avatars = self.lookup(targets) if targets else {}
+        if not avatars:
+            return videos
+        result = []
+        for video in videos:
+            url = avatars.get(video.get('authorId'))
+            if url and is_placeholder(video.get('authorThumbnail')):
+                video = video.copy()
+                video['authorThumbnail'] = url
+                self.applied += 1
+            result.append(video)
+        return result
+
+    # --- 裏での取得 ---
+
+    def prefetch(self, channel_ids: Iterable[str]) -> int:
+        """インデックスにないIDを取得待ちに追加し、取得を開始する（追加したID数を返す）"""
+        added = 0
+        with self._lock:
+            for channel_id in channel_ids:
+                if len(self._pending) >= self.pending_max:
+                    break
+                if channel_id and channel_id not in self._pending and self._cache.get(channel_id) is None:
+                    self._pending[channel_id] = True
+                    added += 1
+            start = bool(self._pending) and not self._filling
+            if start:
+                self._filling = True
+        if start and self.executor.submit(self._fill) is None:
+            with self._lock:
+                self._filling = False  # プールが飽和している場合は次の要求時に開始
+        return added
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    batch = list(self._pending)[:self.max_batch]
+                if not batch:
+                    return
+                try:
+                    self._fill_batch(batch)
+                except Exception as e:
+                    self.failed_batches += 1
+                    logging.error(f"投稿者アイコン取得エラー: {e}")
+                finally:
+                    with self._lock:
+                        for channel_id in batch:
+                            self._pending.pop(channel_id, None)
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def _fill_batch(self, channel_ids: List[str]):
+        self.batches += 1
+        avatars = self.fetch_batch(channel_ids) if self.fetch_batch else None
+        if avatars is None:
+            self.failed_batches += 1
+            avatars = {}
+        for channel_id, url in avatars.items():
+            self.record(channel_id, url)
+        missing = [channel_id for channel_id in channel_ids if is_placeholder(avatars.get(channel_id))]
+        for index, channel_id in enumerate(missing):
+            url = None
+            if self.fetch_one and index < self.fallback_max:
+                self.fallbacks += 1
+                url = self.fetch_one(channel_id)
+            if not self.record(channel_id, url) and self._cache.get(channel_id) is None:
+                self._cache.set(channel_id, '', ttl=self.missing_ttl)  # 取得できなかったIDはしばらく再取得しない
+        logging.info(f"🧑‍🎨 投稿者アイコン取得: {len(channel_ids)} 件中 {len(channel_ids) - len(missing)} 件を一括取得"
+                     f"{f', 個別取得 {min(len(missing), self.fallback_max)} 件' if missing and self.fetch_one else ''}")
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "recorded": self.recorded,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0,
+            "applied": self.applied,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "fallbacks": self.fallbacks,
+            "failed_batches": self.failed_batches,
+            "cache": self._cache.stats()
+        }
+
+
+# グローバルインスタンス（チャンネルページ・検索・関連動画・/watch で共有）
+author_avatars = AuthorAvatarIndex()
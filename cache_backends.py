@@ -0,0 +1,250 @@
+"""
+ワーカー間で共有する第2層（L2）キャッシュのバックエンド
+
+gunicornの各ワーカーはプロセス内LRU（cache_store.TTLCache）を個別に持つため、
+同じ動画を各ワーカーが取得し直していた。L2バックエンドはノード内の全ワーカーで
+共有され、プロセス内LRUのミス時に参照される。値はJSONで保存し、
+有効期限（絶対時刻）もL1と同じ意味で保持する。
+
+  - SQLiteCacheBackend: ローカルのSQLiteファイル（既定、追加依存なし）
+  - RedisCacheBackend: Redis互換サーバー（redisパッケージがある場合のみ）
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+from config import CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_REDIS_URL, CACHE_KEY_PREFIX
+
+
+class SQLiteCacheBackend:
+    """SQLiteファイルを使用した共有キャッシュ（WALモードで複数プロセスから同時アクセス）"""
+
+    def __init__(self, path: str, purge_interval: float = 300.0):
+        self.path = path
+        self.purge_interval = purge_interval  # 期限切れ行の掃除間隔（秒）
+        self._local = threading.local()
+        self._last_purge = time.time()
+        self.stale_grace = 0.0  # stale-while-revalidate 用に期限切れ後も保持する秒数
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_tombstones (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                deleted_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_leases (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3の接続はスレッド間・fork後のプロセス間で共有できないためスレッド・PIDごとに保持
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def retain_stale(self, seconds: float):
+        """期限切れ後もseconds秒は行を残す（stale-while-revalidate用）"""
+        self.stale_grace = max(self.stale_grace, seconds)
+
+    def get(self, namespace: str, key: str, max_stale: float = 0) -> Optional[Tuple[str, float]]:
+        """(JSON文字列, 有効期限) を取得（期限切れからmax_stale秒を過ぎたもの・未登録はNone）"""
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time() - max_stale)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, namespace: str, key: str, payload: str, expires_at: float, max_stale: float = 0):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, payload, expires_at)
+        )
+        now = time.time()
+        if now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            deleted = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now - self.stale_grace,)).rowcount
+            conn.execute("DELETE FROM cache_tombstones WHERE expires_at <= ?", (now,))
+            if deleted:
+                logging.debug(f"共有キャッシュの期限切れエントリを削除: {deleted} 件")
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def mark_deleted(self, namespace: str, key: str, expires_at: float):
+        """削除記録を残す（他ワーカーのL1に残った同じキーの値を無効にするため、expires_at まで保持）"""
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache_tombstones (namespace, key, deleted_at, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, time.time(), expires_at)
+        )
+
+    def deleted_at(self, namespace: str, key: str) -> Optional[float]:
+        """最後に削除された時刻（記録がなければNone）"""
+        row = self._connection().execute(
+            "SELECT deleted_at FROM cache_tombstones WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def acquire_lease(self, namespace: str, key: str, ttl: float) -> Optional[str]:
+        """取得リースを獲得（single-flight用）。獲得できればオーナートークン、できなければNone"""
+        owner = _lease_owner()
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE cache_leases.expires_at <= ?",
+            (namespace, key, owner, now + ttl, now)
+        )
+        return owner if cursor.rowcount == 1 else None
+
+    def lease_held(self, namespace: str, key: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def release_lease(self, namespace: str, key: str, owner: str):
+        self._connection().execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?", (namespace, key, owner)
+        )
+
+    def describe(self) -> str:
+        return f"sqlite:{self.path}"
+
+
+class RedisCacheBackend:
+    """Redis互換サーバーを使用した共有キャッシュ（複数ノード間でも共有可能）"""
+
+    def __init__(self, url: str, prefix: str = CACHE_KEY_PREFIX):
+        import redis  # オプション依存
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client.ping()
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get(self, namespace: str, key: str, max_stale: float = 0) -> Optional[Tuple[str, float]]:
+        # 値は "有効期限|JSON" 形式（Redis側のTTLはstale猶予を含むため有効期限を別に保持）
+        raw = self.client.get(self._key(namespace, key))
+        if raw is None:
+            return None
+        expires_at, payload = raw.decode('utf-8').split('|', 1)
+        expires_at = float(expires_at)
+        if expires_at <= time.time() - max_stale:
+            return None
+        return payload, expires_at
+
+    def set(self, namespace: str, key: str, payload: str, expires_at: float, max_stale: float = 0):
+        ttl_ms = int((expires_at + max_stale - time.time()) * 1000)
+        if ttl_ms > 0:
+            self.client.set(self._key(namespace, key), f"{expires_at:.3f}|{payload}", px=ttl_ms)
+
+    def delete(self, namespace: str, key: str):
+        self.client.delete(self._key(namespace, key))
+
+    def clear(self, namespace: str):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:{namespace}:*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def mark_deleted(self, namespace: str, key: str, expires_at: float):
+        """削除記録を残す（他ワーカーのL1に残った同じキーの値を無効にするため、expires_at まで保持）"""
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            self.client.set(f"{self._key(namespace, key)}:deleted", f"{time.time():.3f}", px=ttl_ms)
+
+    def deleted_at(self, namespace: str, key: str) -> Optional[float]:
+        """最後に削除された時刻（記録がなければNone）"""
+        raw = self.client.get(f"{self._key(namespace, key)}:deleted")
+        return float(raw) if raw is not None else None
+
+    def acquire_lease(self, namespace: str, key: str, ttl: float) -> Optional[str]:
+        """取得リースを獲得（single-flight用）。獲得できればオーナートークン、できなければNone"""
+        owner = _lease_owner()
+        if self.client.set(f"{self._key(namespace, key)}:lease", owner, nx=True, px=int(ttl * 1000)):
+            return owner
+        return None
+
+    def lease_held(self, namespace: str, key: str) -> bool:
+        return bool(self.client.exists(f"{self._key(namespace, key)}:lease"))
+
+    def release_lease(self, namespace: str, key: str, owner: str):
+        lease_key = f"{self._key(namespace, key)}:lease"
+        current = self.client.get(lease_key)
+        if current is not None and current.decode('utf-8') == owner:
+            self.client.delete(lease_key)
+
+    def describe(self) -> str:
+        return f"redis:{self.url}"
+
+
+def _lease_owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex[:8]}"
+
+
+_backend = None
+_backend_initialized = False
+_backend_lock = threading.Lock()
+
+
+def get_shared_backend():
+    """設定に応じた共有バックエンドを取得（初回のみ生成、失敗時はL2なし）"""
+    global _backend, _backend_initialized
+    with _backend_lock:
+        if _backend_initialized:
+            return _backend
+        _backend_initialized = True
+        backend_name = CACHE_BACKEND.lower()
+        if backend_name == 'redis':
+            try:
+                _backend = RedisCacheBackend(CACHE_REDIS_URL)
+            except Exception as e:
+                logging.warning(f"Redisキャッシュに接続できないためSQLiteを使用します: {e}")
+                backend_name = 'sqlite'
+        if backend_name == 'sqlite':
+            try:
+                _backend = SQLiteCacheBackend(CACHE_SQLITE_PATH)
+            except Exception as e:
+                logging.warning(f"SQLite共有キャッシュを初期化できません（L2無効）: {e}")
+                _backend = None
+        if _backend:
+            logging.info(f"🗄️ 共有キャッシュ（L2）: {_backend.describe()}")
+        return _backend
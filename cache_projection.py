@@ -0,0 +1,80 @@
+"""
+上流APIレスポンスのキャッシュ前射影
+
+エンドポイントごとに「アプリが読む項目」のスキーマを定義し、キャッシュへ保存する前に
+それ以外の項目を取り除く。スキーマは {キー: None（値をそのまま保持） | 入れ子のスキーマ} の辞書で、
+入れ子のスキーマは辞書にも辞書のリストにも再帰的に適用される。
+スキーマに項目を追加しない限り、新しく参照する項目はキャッシュに残らない点に注意。
+"""
+from typing import Any, Dict, Optional
+
+_THUMBNAIL = {'quality': None, 'url': None, 'width': None, 'height': None}
+
+# formatStreams（音声付き）の要素
+FORMAT_STREAM = {
+    'url': None, 'itag': None, 'type': None, 'quality': None, 'qualityLabel': None, 'container': None,
+    'encoding': None, 'resolution': None, 'size': None, 'width': None, 'height': None, 'fps': None,
+}
+
+# adaptiveFormats（映像のみ・音声のみ）の要素。init / index / clen / lmt / colorInfo などは使わない
+ADAPTIVE_FORMAT = {
+    'url': None, 'itag': None, 'type': None, 'container': None, 'encoding': None, 'audioQuality': None,
+    'bitrate': None, 'qualityLabel': None, 'resolution': None, 'size': None, 'width': None, 'height': None,
+    'fps': None,
+}
+
+# /api/v1/videos/{id}（動画ページのメタデータ・ストリームURL）
+VIDEO = {
+    'type': None, 'videoId': None, 'title': None, 'description': None, 'videoThumbnails': _THUMBNAIL,
+    'published': None, 'publishedText': None, 'keywords': None, 'viewCount': None, 'likeCount': None,
+    'author': None, 'authorId': None, 'authorUrl': None, 'authorThumbnails': _THUMBNAIL, 'subCountText': None,
+    'lengthSeconds': None, 'genre': None, 'liveNow': None, 'hlsUrl': None, 'dashUrl': None,
+    'formatStreams': FORMAT_STREAM, 'adaptiveFormats': ADAPTIVE_FORMAT,
+}
+
+# 一覧（trending・search・チャンネル動画）の要素。search はチャンネルの項目も含む
+LIST_ITEM = {
+    'type': None, 'videoId': None, 'title': None, 'description': None, 'author': None, 'authorId': None,
+    'authorThumbnails': _THUMBNAIL, 'lengthSeconds': None, 'viewCount': None, 'published': None,
+    'publishedText': None, 'liveNow': None, 'subCount': None, 'videoCount': None, 'channelHandle': None,
+}
+
+# /api/v1/channels/{id}/videos（インスタンスにより配列または {'videos': [...], 'continuation': ...}）
+CHANNEL_VIDEOS = dict(LIST_ITEM, videos=LIST_ITEM, continuation=None)
+
+# /api/v1/comments/{id}
+COMMENTS = {
+    'commentCount': None, 'continuation': None,
+    'comments': {
+        'commentId': None, 'author': None, 'authorId': None, 'authorThumbnails': _THUMBNAIL, 'content': None,
+        'published': None, 'publishedText': None, 'likeCount': None, 'replies': {'replyCount': None, 'continuation': None},
+        'authorIsChannelOwner': None, 'isPinned': None,
+    },
+}
+
+
+def project(data: Any, schema: Optional[Dict]) -> Any:
+    """スキーマに含まれる項目だけを残したコピーを返す（schema が None の場合はそのまま）"""
+    if schema is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, schema) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], sub_schema) for key, sub_schema in schema.items() if key in data}
+
+
+def invidious_schema(endpoint: str) -> Optional[Dict]:
+    """Invidious API（yt.omada.cafe を含む）のエンドポイントに対応するスキーマ（対象外はNone）"""
+    path = endpoint.strip('/')
+    if path.startswith('api/v1/'):
+        path = path[len('api/v1/'):]
+    if path.startswith('videos/'):
+        return VIDEO
+    if path in ('search', 'trending'):
+        return LIST_ITEM
+    if path.startswith('channels/') and path.endswith('/videos'):
+        return CHANNEL_VIDEOS
+    if path.startswith('comments/'):
+        return COMMENTS
+    return None
@@ -0,0 +1,383 @@
+"""
+上限付きLRU + TTLキャッシュ
+
+TTLCacheはエントリ数・概算バイト数の上限を持ち、
+上限を超えると最も長く使われていないエントリから削除する。
+名前空間ごとにヒット・ミス・削除・バイト数を集計し、スレッドセーフに動作する。
+
+共有バックエンド（cache_backends.py）を指定すると、プロセス内LRUのミス時に
+ワーカー間で共有される第2層キャッシュを参照し、保存時は両方に書き込む。
+
+max_stale を指定した名前空間は stale-while-revalidate に対応し、期限切れ後も
+max_stale 秒までは古い値を即座に返しつつ、裏で再取得する（get_or_revalidate）。
+
+coherent を指定した名前空間（ストリームURLなど）は削除時に共有バックエンドへ削除記録を残し、
+プロセス内LRUのヒット時にそれより前に保存した値を捨てる（削除が他ワーカーにも即座に反映される）。
+"""
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from cache_backends import get_shared_backend
+from config import STREAM_URL_MAX_TTL
+from video_records import cache_encode, cache_decode
+
+
+def serialize(value: Any) -> Optional[str]:
+    """値をJSON文字列に変換（変換できない場合はNone）。Video などのレコードはコンパクトな配列形式で保存する"""
+    try:
+        return json.dumps(value, ensure_ascii=False, default=cache_encode)
+    except (TypeError, ValueError):
+        return None
+
+
+# stale-while-revalidate のバックグラウンド再取得用スレッドプール
+_revalidate_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='swr')
+
+
+class TTLCache:
+    """エントリ数・バイト数の上限とTTLを持つLRUキャッシュ"""
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int = 1000, max_bytes: Optional[int] = None,
+                 backend=None, max_stale: float = 0, coherent: bool = False):
+        self.namespace = namespace
+        self.backend = backend  # ワーカー間共有の第2層キャッシュ（Noneの場合はプロセス内のみ）
+        self.ttl = ttl  # 既定の有効期限（秒）
+        self.max_stale = max_stale  # 期限切れ後に古い値を返してよい上限（秒、0で無効）
+        self.coherent = coherent and backend is not None  # L1ヒット時に他ワーカーでの削除を確認するか
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, stored_at, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self.stale_hits = 0
+        self.revalidations = 0
+        self.projected_sets = 0
+        self.source_bytes = 0
+        self.bytes_saved = 0
+        self.invalidated_hits = 0
+        self._revalidating = set()
+        if backend is not None and max_stale and hasattr(backend, 'retain_stale'):
+            backend.retain_stale(max_stale)
+
+    def _remove(self, key):
+        _, _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _store(self, key, value, stored_at: float, expires_at: float, size: int):
+        # ロック取得済みの状態で呼び出すこと
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, stored_at, expires_at, size)
+        self._bytes += size
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes and self._bytes > self.max_bytes)):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _deleted_since(self, key, stored_at: float) -> bool:
+        # coherent の場合、L1の値を保存した後に（他ワーカーを含めて）削除されていればTrue
+        if not self.coherent:
+            return False
+        try:
+            deleted_at = self.backend.deleted_at(self.namespace, str(key))
+        except Exception as e:
+            self.shared_errors += 1
+            logging.debug(f"共有キャッシュ削除記録の読み込みエラー [{self.namespace}]: {e}")
+            return False
+        return deleted_at is not None and stored_at <= deleted_at
+
+    def _drop_if_deleted(self, key, entry) -> bool:
+        # 削除済みのL1エントリを捨てる（ロックの外で呼ぶこと）
+        if not self._deleted_since(key, entry[1]):
+            return False
+        with self._lock:
+            if self._data.get(key) is entry:
+                self._remove(key)
+            self.invalidated_hits += 1
+        return True
+
+    def get(self, key, default=None):
+        """有効期限内の値を取得（期限切れ・未登録の場合はdefault）
+
+        プロセス内にない場合は共有バックエンドを参照し、見つかればプロセス内にも
+        同じ有効期限で保存する。
+        """
+        fresh = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                now = time.time()
+                if now < entry[2]:
+                    fresh = entry
+                elif now >= entry[2] + self.max_stale:
+                    # stale-while-revalidate 用の猶予も過ぎたものだけ削除
+                    self._remove(key)
+                    self.expirations += 1
+        if fresh is not None and not self._drop_if_deleted(key, fresh):
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                self.hits += 1
+            return fresh[0]
+
+        read_at = time.time()  # L2の読み込み中に削除された場合に備え、読み込み前の時刻をL1の保存時刻にする
+        shared = self._get_shared(key)
+        with self._lock:
+            if shared is None or shared[1] <= time.time():
+                self.misses += 1
+                return default
+            value, expires_at, size = shared
+            self._store(key, value, read_at, expires_at, size)
+            self.shared_hits += 1
+            return value
+
+    def get_stale(self, key) -> Optional[Tuple[Any, bool]]:
+        """max_stale の猶予内なら期限切れの値も含めて (value, is_fresh) を取得"""
+        now = time.time()
+        local = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if now < entry[2] and not self.coherent:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[0], True
+                if now < entry[2] + self.max_stale:
+                    local = entry
+        if local is not None and self._drop_if_deleted(key, local):
+            local = None
+        if local is not None and now < local[2]:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                self.hits += 1
+            return local[0], True
+
+        # 他ワーカーが再取得済みの可能性があるため共有バックエンドも確認
+        shared = self._get_shared(key, stale=True)
+        with self._lock:
+            if shared is not None and (local is None or shared[1] > local[2]):
+                value, expires_at, size = shared
+                self._store(key, value, now, expires_at, size)
+                self.shared_hits += 1
+                return value, now < expires_at
+            if local is not None:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                return local[0], False
+            self.misses += 1
+            return None
+
+    def get_or_revalidate(self, key, loader: Callable):
+        """stale-while-revalidate で値を取得
+
+        有効期限内ならそのまま、期限切れでも max_stale 以内なら古い値を即座に返して
+        loader をバックグラウンドで実行する。値がない・古すぎる場合のみ loader を待つ。
+        loader は取得結果をこのキャッシュへ保存して返すこと。
+        """
+        found = self.get_stale(key)
+        if found is None:
+            return loader()
+        value, fresh = found
+        if not fresh:
+            self._revalidate(key, loader)
+        return value
+
+    def _revalidate(self, key, loader: Callable):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            self.revalidations += 1
+
+        def run():
+            try:
+                loader()
+            except Exception as e:
+                logging.warning(f"バックグラウンド再取得エラー [{self.namespace}] {key}: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        logging.debug(f"♻️ 期限切れキャッシュを返しつつ再取得 [{self.namespace}]: {key}")
+        _revalidate_executor.submit(run)
+
+    def load_shared(self, key):
+        """共有バックエンドのみを参照し、見つかればプロセス内にも保存して返す（統計は変えない）"""
+        read_at = time.time()
+        shared = self._get_shared(key)
+        if shared is None or shared[1] <= time.time():
+            return None
+        value, expires_at, size = shared
+        with self._lock:
+            self._store(key, value, read_at, expires_at, size)
+        return value
+
+    def _get_shared(self, key, stale: bool = False):
+        if self.backend is None:
+            return None
+        try:
+            found = self.backend.get(self.namespace, str(key), self.max_stale if stale else 0)
+            if found is None:
+                return None
+            payload, expires_at = found
+            size = len(payload.encode('utf-8')) if self.max_bytes else 0
+            return json.loads(payload, object_hook=cache_decode), expires_at, size
+        except Exception as e:
+            self.shared_errors += 1
+            logging.debug(f"共有キャッシュ読み込みエラー [{self.namespace}]: {e}")
+            return None
+
+    def peek(self, key) -> Optional[Tuple[Any, float]]:
+        """統計・LRU順を変えずに (value, stored_at) を取得（期限切れも含む）"""
+        with self._lock:
+            entry = self._data.get(key)
+            return (entry[0], entry[1]) if entry else None
+
+    def set(self, key, value, ttl: Optional[float] = None, source_bytes: Optional[int] = None):
+        """値を保存（ttl省略時は既定の有効期限、0以下なら保存しない）。共有バックエンドにも書き込む
+
+        source_bytes には射影（cache_projection）前の上流レスポンスのバイト数を渡す。
+        保存した値との差を名前空間ごとの bytes_saved として集計する。
+        """
+        if ttl is not None and ttl <= 0:
+            self.delete(key)
+            return
+        measure = self.max_bytes or source_bytes is not None
+        payload = serialize(value) if (measure or self.backend is not None) else None
+        size = 0
+        if measure:
+            size = len(payload.encode('utf-8')) if payload is not None else 1024
+        if source_bytes is not None:
+            with self._lock:
+                self.projected_sets += 1
+                self.source_bytes += source_bytes
+                self.bytes_saved += max(source_bytes - size, 0)
+        if self.max_bytes and size > self.max_bytes:
+            logging.debug(f"キャッシュ上限超過のため保存しません [{self.namespace}]: {size} bytes")
+            return
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, now, expires_at, size)
+
+        if self.backend is not None and payload is not None:
+            try:
+                self.backend.set(self.namespace, str(key), payload, expires_at, self.max_stale)
+            except Exception as e:
+                self.shared_errors += 1
+                logging.debug(f"共有キャッシュ書き込みエラー [{self.namespace}]: {e}")
+
+    def delete(self, key):
+        """エントリを削除（共有バックエンドからも削除、coherent の場合は他ワーカーのL1にも反映）"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+        if self.backend is not None:
+            try:
+                self.backend.delete(self.namespace, str(key))
+                if self.coherent:
+                    # 他ワーカーのL1に残りうる間（ストリームURLのTTL上限まで）削除記録を保持
+                    self.backend.mark_deleted(self.namespace, str(key),
+                                              time.time() + max(self.ttl, STREAM_URL_MAX_TTL) + self.max_stale)
+            except Exception as e:
+                logging.debug(f"共有キャッシュ削除エラー [{self.namespace}]: {e}")
+
+    def purge_expired(self) -> int:
+        """期限切れエントリをまとめて削除し、削除件数を返す"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if now >= entry[2] + self.max_stale]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def clear(self):
+        """全エントリを削除（共有バックエンドの同じ名前空間も削除）"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            try:
+                self.backend.clear(self.namespace)
+            except Exception as e:
+                logging.debug(f"共有キャッシュ削除エラー [{self.namespace}]: {e}")
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and time.time() < entry[2]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """名前空間の統計を取得"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.shared_hits + self.stale_hits) / lookups, 3) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared_backend": self.backend.describe() if self.backend is not None else None,
+                "shared_hits": self.shared_hits,
+                "shared_errors": self.shared_errors,
+                "max_stale": self.max_stale,
+                "stale_hits": self.stale_hits,
+                "coherent": self.coherent,
+                "invalidated_hits": self.invalidated_hits,
+                "revalidations": self.revalidations,
+                "projected_sets": self.projected_sets,
+                "source_bytes": self.source_bytes,
+                "bytes_saved": self.bytes_saved,
+                "saved_ratio": round(self.bytes_saved / self.source_bytes, 3) if self.source_bytes else 0
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str, ttl: float, max_entries: int = 1000, max_bytes: Optional[int] = None,
+              shared: bool = True, max_stale: float = 0, coherent: bool = False) -> TTLCache:
+    """名前空間のキャッシュを取得（同じ名前空間はプロセス内で共有）
+
+    shared=True の場合は設定された共有バックエンド（config.CACHE_BACKEND）を第2層に使う。
+    max_stale は stale-while-revalidate で期限切れの値を返してよい上限（秒）。
+    coherent=True の場合は delete() が他ワーカーのプロセス内LRUにも即座に反映される
+    （ヒットごとに共有バックエンドの削除記録を1回参照する）。
+    """
+    backend = get_shared_backend() if shared else None
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = TTLCache(namespace, ttl, max_entries=max_entries, max_bytes=max_bytes, backend=backend,
+                             max_stale=max_stale, coherent=coherent)
+            _caches[namespace] = cache
+        return cache
+
+
+def get_cache_stats() -> Dict[str, Dict]:
+    """全名前空間の統計を取得"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.stats() for cache in caches}
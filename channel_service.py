@@ -0,0 +1,208 @@
+"""
+チャンネルページの組み立て
+
+ChannelService は
+  - チャンネルのヘッダー（名前・アイコン・バナー・登録者数など）を長いTTLでキャッシュ
+  - 動画一覧をページ単位で (チャンネル, 並び順, ページ) ごとにキャッシュ
+  - ヘッダーと要求されたページを共有スレッドプールで同時に取得
+  - ページを返した後に次のページを裏で先読み
+を行う。siawaseok を優先し、取得できない場合は Invidious を使う。
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from config import CHANNEL_HEADER_TTL, CHANNEL_PAGE_TTL, CHANNEL_PAGE_SIZE, CHANNEL_DEADLINE
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from multi_stream_service import MultiStreamService
+from invidious_service import InvidiousService
+from video_records import Video, Channel, parse_count, parse_duration
+from author_avatars import author_avatars
+
+DEFAULT_CHANNEL_AVATAR = 'https://yt3.ggpht.com/a/default-user=s176-c-k-c0x00ffffff-no-rj'
+
+# 並び順（channel.html の選択肢）
+SORT_ORDERS = ('newest', 'oldest', 'popular')
+
+
+def channel_from_siawaseok(data: Dict, channel_id: str, channel_name: str = '') -> Channel:
+    """siawaseok /api/channel/{id} の結果からヘッダー（動画数はプレイリストの動画の合計）"""
+    video_count = sum(len(playlist['items']) for playlist in data.get('playlists', [])
+                      if isinstance(playlist, dict) and 'items' in playlist)
+    return Channel(
+        authorId=channel_id,
+        author=data.get('title', channel_name or f'チャンネル ({channel_id})'),
+        description=data.get('description', ''),
+        subCount=parse_count(data.get('subCount')),
+        totalViews=parse_count(data.get('totalViews')),
+        videoCount=video_count,
+        joined=data.get('joined', 0),
+        avatar=data.get('avatar', DEFAULT_CHANNEL_AVATAR),
+        banner=data.get('banner', '')
+    )
+
+
+def playlists_from_siawaseok(data: Dict, channel_id: str, channel_name: str = '') -> List[Dict]:
+    """siawaseok /api/channel/{id} のプレイリストごとの動画（投稿者はチャンネル自身）"""
+    author = data.get('title', channel_name)
+    playlists = []
+    for playlist in data.get('playlists', []):
+        if not isinstance(playlist, dict) or 'items' not in playlist:
+            continue
+        playlist_videos = []
+        seen_ids = set()
+        for video_data in playlist.get('items', []):
+            video_id = video_data.get('videoId') if isinstance(video_data, dict) else None
+            if not video_id or video_id in seen_ids:
+                continue
+            seen_ids.add(video_id)
+            playlist_videos.append(Video(
+                videoId=video_id,
+                title=video_data.get('title', f'Video {video_id}'),
+                author=author,
+                authorId=channel_id,
+                lengthSeconds=parse_duration(video_data.get('duration', '0:00')),
+                viewCount=parse_count(video_data.get('viewCount', '0')),
+                publishedText=video_data.get('published', '')
+            ))
+        # プレイリスト情報を保存（動画がある場合のみ）
+        if playlist_videos:
+            playlists.append({
+                'name': playlist.get('name', playlist.get('title', 'その他の動画')),
+                'videos': playlist_videos,
+                'video_count': len(playlist_videos)
+            })
+    return playlists
+
+
+def _sorted_videos(playlists: List[Dict], sort: str) -> List[Video]:
+    # 全プレイリストの動画を重複なしで1つの一覧にして並べ替え
+    unique = {}
+    for playlist in playlists:
+        for video in playlist['videos']:
+            unique.setdefault(video.videoId, video)
+    videos = list(unique.values())
+    if sort == 'oldest':
+        videos.reverse()
+    elif sort == 'popular':
+        videos.sort(key=lambda video: video.viewCount, reverse=True)
+    return videos
+
+
+class ChannelService:
+    """チャンネルのヘッダーと動画一覧のページを取得・キャッシュする（スレッドセーフ）"""
+
+    def __init__(self, multi_stream_service: MultiStreamService, invidious: InvidiousService, executor=upstream_executor,
+                 header_ttl: float = CHANNEL_HEADER_TTL, page_ttl: float = CHANNEL_PAGE_TTL,
+                 page_size: int = CHANNEL_PAGE_SIZE, deadline: float = CHANNEL_DEADLINE):
+        self.multi_stream_service = multi_stream_service
+        self.invidious = invidious
+        self.executor = executor
+        self.page_size = page_size  # 1ページの動画数
+        self.deadline = deadline  # ヘッダーと動画一覧を待つ上限（秒）
+        self._headers = get_cache('channel_headers', ttl=header_ttl, max_entries=5000, max_bytes=8 * 1024 * 1024)
+        self._pages = get_cache('channel_pages', ttl=page_ttl, max_entries=2000, max_bytes=32 * 1024 * 1024)
+        self.assembled = 0
+        self.prefetches = 0
+
+    # --- ヘッダー ---
+
+    def header(self, channel_id: str, channel_name: str = '') -> Optional[Channel]:
+        """チャンネルのヘッダー（長いTTLでキャッシュ、取得できない場合はNone）"""
+        cached = self._headers.get(channel_id)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"channel_header:{channel_id}", self._fetch_header, channel_id, channel_name,
+                                cache=self._headers, cache_key=channel_id)
+
+    def cached_header(self, channel_id: str) -> Optional[Channel]:
+        """キャッシュ済みのヘッダー（取得はしない）"""
+        return self._headers.get(channel_id)
+
+    def _fetch_header(self, channel_id: str, channel_name: str) -> Optional[Channel]:
+        data = self.multi_stream_service.get_channel_info(channel_id)
+        if isinstance(data, dict) and data:
+            header = channel_from_siawaseok(data, channel_id, channel_name)
+        else:
+            header = self.invidious.get_channel_info(channel_id)
+        if header is not None:
+            self._headers.set(channel_id, header)
+            author_avatars.record(channel_id, header.avatar)
+        return header
+
+    # --- 動画一覧 ---
+
+    def videos_page(self, channel_id: str, sort: str = 'newest', page: int = 1, channel_name: str = '') -> Dict:
+        """動画一覧の1ページ {'videos', 'playlists'（1ページ目のみ）, 'has_next', 'source'}"""
+        sort = sort if sort in SORT_ORDERS else 'newest'
+        cache_key = f"{channel_id}:{sort}:{page}"
+        cached = self._pages.get(cache_key)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"channel_page:{cache_key}", self._fetch_page, channel_id, sort, page, channel_name,
+                                cache_key, cache=self._pages, cache_key=cache_key)
+
+    def _fetch_page(self, channel_id: str, sort: str, page: int, channel_name: str, cache_key: str) -> Dict:
+        result = {'videos': [], 'playlists': [], 'has_next': False, 'source': None}
+        data = self.multi_stream_service.get_channel_info(channel_id)
+        if isinstance(data, dict) and data.get('playlists'):
+            # siawaseok は全動画を1回で返すので、並べ替えてからページに分ける
+            playlists = playlists_from_siawaseok(data, channel_id, channel_name)
+            videos = _sorted_videos(playlists, sort)
+            start = (page - 1) * self.page_size
+            result.update(videos=videos[start:start + self.page_size], has_next=len(videos) > start + self.page_size,
+                          playlists=playlists if page == 1 else [], source='siawaseok')
+        else:
+            videos = self.invidious.get_channel_videos(channel_id, page=page, sort=sort) or []
+            result.update(videos=videos, has_next=len(videos) >= self.page_size, source='invidious')
+        if result['videos'] or result['playlists']:
+            self._pages.set(cache_key, result)
+        return result
+
+    def prefetch_page(self, channel_id: str, sort: str, page: int, channel_name: str = '') -> bool:
+        """ページを裏で取得してキャッシュに入れる（キャッシュ済み・プール飽和時は何もしない）"""
+        if self._pages.get(f"{channel_id}:{sort}:{page}") is not None:
+            return False
+        if self.executor.submit(self.videos_page, channel_id, sort, page, channel_name) is None:
+            return False
+        self.prefetches += 1
+        return True
+
+    # --- ページの組み立て ---
+
+    def channel_page(self, channel_id: str, sort: str = 'newest', page: int = 1, channel_name: str = '') -> Dict[str, Any]:
+        """ヘッダーと動画一覧のページを同時に取得 {'channel_info', 'videos', 'playlists', 'has_next'}
+
+        ヘッダーがキャッシュ済みなら動画一覧だけを取得する。次のページは裏で先読みする。
+        """
+        start_time = time.time()
+        self.assembled += 1
+        header = self.cached_header(channel_id)
+        tasks = {'page': lambda: self.videos_page(channel_id, sort, page, channel_name)}
+        if header is None:
+            tasks['header'] = lambda: self.header(channel_id, channel_name)
+        results = self.executor.run_all(tasks, timeout=self.deadline, label=f"channel[{channel_id}]")
+        header = header or results.get('header')
+        page_data = results.get('page') or {'videos': [], 'playlists': [], 'has_next': False, 'source': None}
+        if page_data['has_next']:
+            self.prefetch_page(channel_id, sort, page + 1, channel_name)
+        logging.info(f"📺 チャンネルページ {channel_id} p{page} ({sort}): {time.time() - start_time:.2f}秒 "
+                     f"動画 {len(page_data['videos'])} 件 (取得元 {page_data['source']}, "
+                     f"ヘッダー{'キャッシュ' if 'header' not in tasks else '取得'})")
+        return {'channel_info': header, 'videos': page_data['videos'], 'playlists': page_data['playlists'],
+                'has_next': page_data['has_next']}
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "page_size": self.page_size,
+            "assembled": self.assembled,
+            "prefetches": self.prefetches,
+            "headers": self._headers.stats(),
+            "pages": self._pages.stats()
+        }
+
+
+# グローバルインスタンス（チャンネルページ・投稿者アイコンの補完で共有）
+channel_service = ChannelService(MultiStreamService(), InvidiousService())
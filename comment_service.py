@@ -0,0 +1,269 @@
+"""
+コメントの集約
+
+CommentService は
+  - 1ページ目は yt.omada.cafe と Invidious に同時に問い合わせ、先にコメントを返した方を使う
+  - (動画, 取得元, continuation) ごとのページを短いTTLでキャッシュ
+  - ページを返した後に次の continuation を裏で先読み
+  - 1ページ目の先頭にローカルDBの Comment（このサイトで投稿されたコメント）を加える
+を行い、カーソル（"取得元:continuation"）でページ送りする /api/comments から使う。
+continuation は取得元ごとのトークンなので、2ページ目以降は1ページ目と同じ取得元から取得する。
+"""
+import hashlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import COMMENTS_DEADLINE, COMMENTS_PAGE_TTL, COMMENTS_LOCAL_MAX
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from http_client import http_client
+from invidious_service import InvidiousService
+from author_avatars import author_avatars
+
+OMADA_COMMENTS_API_URL = "https://yt.omada.cafe/api/v1/comments/{video_id}"
+
+_EMPTY_PAGE = {'comments': [], 'continuation': None, 'commentCount': 0}
+
+
+def _fallback_comment_id(comment: Dict, source: str) -> str:
+    # commentId がない場合もプロセス・ワーカーをまたいで同じ値になるID（hash() は起動ごとに変わる）
+    key = f"{comment.get('authorId', '')}:{comment.get('published', '')}:{comment.get('content', '')}"
+    return f"{source}_{hashlib.md5(key.encode()).hexdigest()[:16]}"
+
+
+def _with_display_fields(comment: Dict) -> Dict:
+    # watch.html の表示（user / created_at / likes）でもそのまま使えるように
+    comment['user'] = {'username': comment['author'] or 'Unknown User', 'avatar_url': comment['authorThumbnail']}
+    comment['created_at'] = comment['publishedText']
+    comment['likes'] = comment['likeCount']
+    return comment
+
+
+def format_comment(comment: Dict, source: str) -> Dict:
+    """Invidious API形式（omada.cafe も同じ）のコメントを共通の形式に変換"""
+    thumbnails = comment.get('authorThumbnails') or []
+    replies = comment.get('replies', 0)
+    return _with_display_fields({
+        'id': comment.get('commentId') or comment.get('id') or _fallback_comment_id(comment, source),
+        'author': comment.get('author', ''),
+        'authorId': comment.get('authorId', ''),
+        'authorThumbnails': thumbnails,
+        'authorThumbnail': comment.get('authorThumbnail') or (thumbnails[0].get('url', '') if thumbnails else ''),
+        'content': comment.get('content') or comment.get('text', ''),
+        'published': comment.get('published', 0),
+        'publishedText': comment.get('publishedText', ''),
+        'likeCount': comment.get('likeCount', 0),
+        'replies': replies.get('replyCount', 0) if isinstance(replies, dict) else replies,
+        'isOwner': comment.get('isOwner', comment.get('authorIsChannelOwner', False)),
+        'isPinned': comment.get('isPinned', False),
+        'source': source
+    })
+
+
+def encode_cursor(source: str, continuation: Optional[str]) -> Optional[str]:
+    """次のページのカーソル（continuation がなければNone）"""
+    return f"{source}:{continuation}" if continuation else None
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], Optional[str]]:
+    """カーソルを (取得元, continuation) に分解（空・不正な場合は (None, None) で1ページ目）"""
+    source, _, continuation = (cursor or '').partition(':')
+    if not source or not continuation:
+        return None, None
+    return source, continuation
+
+
+class CommentService:
+    """複数の取得元のコメントを集約し、ページごとにキャッシュする（スレッドセーフ）"""
+
+    def __init__(self, executor=upstream_executor, deadline: float = COMMENTS_DEADLINE,
+                 page_ttl: float = COMMENTS_PAGE_TTL, local_max: int = COMMENTS_LOCAL_MAX):
+        self.executor = executor
+        self.deadline = deadline  # 1ページ目で取得元を待つ上限（秒）
+        self.local_max = local_max  # 1ページ目に加えるローカルのコメントの上限
+        self._sources = {}  # 取得元名 -> fn(video_id, continuation) -> {'comments', 'continuation', 'commentCount'}（失敗時None）
+        self._local = None  # fn(video_id, limit) -> 共通形式のコメントのリスト
+        self._pages = get_cache('comment_pages', ttl=page_ttl, max_entries=2000, max_bytes=32 * 1024 * 1024)
+        self.requests = 0
+        self.wins = {}
+        self.prefetches = 0
+        self.failures = 0
+
+    # --- 宣言 ---
+
+    def register_source(self, name: str, fetch: Callable[[str, Optional[str]], Optional[Dict]]):
+        """取得元を登録（登録順が1ページ目で全取得元が失敗した場合の既定の取得元）"""
+        self._sources[name] = fetch
+
+    def set_local(self, load: Callable[[str, int], List[Dict]]):
+        """ローカルのコメントの取得関数（fn(動画ID, 上限) -> 共通形式のコメントのリスト）を設定"""
+        self._local = load
+
+    # --- 取得元のページ ---
+
+    def source_page(self, source: str, video_id: str, continuation: Optional[str] = None) -> Optional[Dict]:
+        """取得元の1ページ（キャッシュ・同時リクエストの合流あり、失敗時None）"""
+        if source not in self._sources:
+            return None
+        cache_key = f"{video_id}:{source}:{continuation or ''}"
+        cached = self._pages.get(cache_key)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"comments:{cache_key}", self._fetch_page, source, video_id, continuation, cache_key,
+                                cache=self._pages, cache_key=cache_key)
+
+    def _fetch_page(self, source: str, video_id: str, continuation: Optional[str], cache_key: str) -> Optional[Dict]:
+        try:
+            page = self._sources[source](video_id, continuation)
+        except Exception as e:
+            logging.warning(f"コメント取得エラー {source} ({video_id}): {e}")
+            page = None
+        if page is None:
+            self.failures += 1
+            return None  # 失敗はキャッシュしない
+        self._pages.set(cache_key, page)
+        return page
+
+    def _race_first_page(self, video_id: str) -> Tuple[Optional[str], Dict]:
+        # キャッシュ済みの取得元があればそれを使い、なければ全取得元に同時に問い合わせて先にコメントを返した方を使う
+        for source in self._sources:
+            cached = self._pages.get(f"{video_id}:{source}:")
+            if cached and cached['comments']:
+                return source, cached
+        tasks = {source: (lambda source=source: self.source_page(source, video_id)) for source in self._sources}
+        fallback = None
+        for source, page in self.executor.iter_completed(tasks, timeout=self.deadline, label=f"comments[{video_id}]"):
+            if page and page['comments']:
+                return source, page
+            if page is not None and fallback is None:
+                fallback = (source, page)  # コメントが0件の動画（取得自体は成功）
+        return fallback or (None, _EMPTY_PAGE)
+
+    def prefetch(self, source: str, video_id: str, continuation: Optional[str]) -> bool:
+        """次のページを裏で取得してキャッシュに入れる（キャッシュ済み・プール飽和時は何もしない）"""
+        if not continuation or self._pages.get(f"{video_id}:{source}:{continuation}") is not None:
+            return False
+        if self.executor.submit(self.source_page, source, video_id, continuation) is None:
+            return False
+        self.prefetches += 1
+        return True
+
+    # --- ページ ---
+
+    def page(self, video_id: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """コメントの1ページ {'comments', 'commentCount', 'continuation'（次のカーソル）, 'source'}
+
+        cursor が空なら1ページ目（取得元を同時に問い合わせ、ローカルのコメントを先頭に追加）。
+        """
+        start_time = time.time()
+        self.requests += 1
+        source, continuation = decode_cursor(cursor)
+        if source is None:
+            source, page = self._race_first_page(video_id)
+            local = self._local_comments(video_id)
+            if source is not None:
+                self.wins[source] = self.wins.get(source, 0) + 1
+        else:
+            page = self.source_page(source, video_id, continuation) or _EMPTY_PAGE
+            local = []
+        if source is not None:
+            self.prefetch(source, video_id, page['continuation'])
+        comments = local + page['comments']
+        logging.info(f"💬 コメント {video_id} ({'1ページ目' if not cursor else '続き'}): {len(comments)} 件 "
+                     f"{time.time() - start_time:.2f}秒 (取得元 {source}, ローカル {len(local)} 件)")
+        return {
+            'comments': comments,
+            'commentCount': max(page['commentCount'] or 0, len(page['comments'])) + len(local),
+            'continuation': encode_cursor(source, page['continuation']) if source else None,
+            'source': source
+        }
+
+    def _local_comments(self, video_id: str) -> List[Dict]:
+        if self._local is None:
+            return []
+        try:
+            return self._local(video_id, self.local_max)
+        except Exception as e:
+            logging.warning(f"ローカルコメント取得エラー ({video_id}): {e}")
+            return []
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "sources": list(self._sources),
+            "requests": self.requests,
+            "wins": self.wins,
+            "prefetches": self.prefetches,
+            "failures": self.failures,
+            "pages": self._pages.stats()
+        }
+
+
+# --- 既定の取得元 ---
+
+def fetch_omada_comments(video_id: str, continuation: Optional[str] = None) -> Optional[Dict]:
+    """yt.omada.cafe（Invidious API互換）のコメント（失敗時None）"""
+    params = {'continuation': continuation} if continuation else None
+    response = http_client.get(OMADA_COMMENTS_API_URL.format(video_id=video_id), params=params, service='omada')
+    if response.status_code != 200:
+        logging.warning(f"omada APIコメント取得失敗: {response.status_code}")
+        return None
+    data = response.json()
+    if not isinstance(data, dict):
+        return None
+    raw_comments = [comment for comment in data.get('comments', []) if isinstance(comment, dict)]
+    author_avatars.observe(raw_comments)  # コメント投稿者のアイコンも記録
+    return {
+        'comments': [format_comment(comment, 'omada') for comment in raw_comments],
+        'continuation': data.get('continuation'),
+        'commentCount': data.get('commentCount', 0)
+    }
+
+
+def _build_default_service() -> CommentService:
+    invidious = InvidiousService()
+
+    def invidious_comments(video_id, continuation):
+        data = invidious.get_video_comments(video_id, continuation)
+        if not data or (not data['comments'] and not data.get('commentCount')):
+            return None  # get_video_comments は失敗時も空のページを返すので、失敗として扱う
+        return {
+            'comments': [format_comment(comment, 'invidious') for comment in data['comments']],
+            'continuation': data.get('continuation'),
+            'commentCount': data.get('commentCount', 0)
+        }
+
+    def local_comments(video_id, limit):
+        # このサイトで投稿されたコメント（新しい順）
+        from app import app
+        from models import Comment
+        with app.app_context():
+            rows = (Comment.query.filter_by(video_id=video_id, is_deleted=False)
+                    .order_by(Comment.created_at.desc()).limit(limit).all())
+            return [_with_display_fields({
+                'id': comment.id,
+                'author': comment.author.username,
+                'authorId': '',
+                'authorThumbnails': [{'url': comment.author.avatar_url}] if comment.author.avatar_url else [],
+                'authorThumbnail': comment.author.avatar_url or '',
+                'content': comment.content,
+                'published': int(comment.created_at.timestamp()),
+                'publishedText': comment.created_at.isoformat(),
+                'likeCount': comment.likes or 0,
+                'replies': 0,
+                'isOwner': False,
+                'isPinned': False,
+                'source': 'local'
+            }) for comment in rows]
+
+    service = CommentService()
+    # 登録順は従来の優先順（omada.cafe → Invidious）
+    service.register_source('omada', fetch_omada_comments)
+    service.register_source('invidious', invidious_comments)
+    service.set_local(local_comments)
+    return service
+
+
+# グローバルインスタンス（/api/comments・/api/priority-comments で使用）
+comment_service = _build_default_service()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Invidious インスタンスリスト（高速化のため厳選）
 INVIDIOUS_INSTANCES = [
@@ -23,3 +24,124 @@ YTDL_OPTIONS = {
     'extract_flat': False,
     'format': 'best[ext=mp4]/best',
 }
+
+# 上流HTTPクライアント設定（全サービス共有のコネクションプール / keep-alive）
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 64))  # 保持するホスト別プール数
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 16))  # ホストごとの最大コネクション数
+HTTP_RETRY_TOTAL = int(os.environ.get('HTTP_RETRY_TOTAL', 1))  # 接続エラー時の再試行回数（読み取りタイムアウトは再試行しない）
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.1))  # 再試行の待機係数（秒）
+HTTP_RETRY_STATUSES = [int(code) for code in os.environ.get('HTTP_RETRY_STATUSES', '').split(',') if code.strip()]  # 再試行するHTTPステータス（既定なし）
+
+# サービスごとのタイムアウト（秒）
+SERVICE_TIMEOUTS = {
+    'default': 10,
+    'invidious': REQUEST_TIMEOUT,
+    'invidious_manager': 5,
+    'multi_stream': 4,
+    'custom_api': 2,
+    'omada': 6,
+    'piped': 3,
+    'additional': 8,
+    'kahoot': 15,
+    'suggest': 3,  # キー入力ごとの予測変換（遅れて届いた候補は使われない）
+}
+
+# MultiStreamService のヘッジリクエスト設定（複数エンドポイントへの追加発射）
+HEDGE_DELAY = float(os.environ.get('HEDGE_DELAY', 0.4))  # 先行リクエストの応答待ち時間（超過で次のエンドポイントを追加発射）
+HEDGE_FANOUT = int(os.environ.get('HEDGE_FANOUT', 2))  # 同時に追加発射するエンドポイント数の上限
+REQUEST_BUDGET = float(os.environ.get('REQUEST_BUDGET', 6.0))  # _make_request 1回あたりのレイテンシ予算（秒）
+HEDGE_EXECUTOR_WORKERS = int(os.environ.get('HEDGE_EXECUTOR_WORKERS', 16))  # ヘッジリクエスト用スレッド数
+
+# 共有キャッシュ（L2）設定：gunicornの全ワーカーで共有する第2層キャッシュ
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')  # 'sqlite' / 'redis' / 'none'
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'upstream_cache.sqlite3'))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'upstream')
+
+# ストリームURL（googlevideo）のキャッシュ設定：署名済みURLの expire= から有効期限を決める
+STREAM_EXPIRY_MARGIN = int(os.environ.get('STREAM_EXPIRY_MARGIN', 600))  # 有効期限の何秒前にキャッシュを捨てるか
+STREAM_URL_DEFAULT_TTL = int(os.environ.get('STREAM_URL_DEFAULT_TTL', 300))  # expire= が読めないストリームURLのTTL
+STREAM_URL_MAX_TTL = int(os.environ.get('STREAM_URL_MAX_TTL', 6 * 3600))  # ストリームURLのTTL上限
+STREAM_URL_MIN_TTL = int(os.environ.get('STREAM_URL_MIN_TTL', 30))  # これ未満しか残っていなければキャッシュしない
+
+# Node.js常駐ワーカープール設定（turbo_video_service.js を worker モードで常駐させる）
+NODE_WORKER_SCRIPT = os.environ.get('NODE_WORKER_SCRIPT', 'turbo_video_service.js')
+NODE_WORKER_POOL_SIZE = int(os.environ.get('NODE_WORKER_POOL_SIZE', 2))  # 常駐させるNodeプロセス数
+NODE_WORKER_MAX_INFLIGHT = int(os.environ.get('NODE_WORKER_MAX_INFLIGHT', 16))  # 1プロセスあたりの同時処理数上限
+NODE_WORKER_HEALTH_INTERVAL = float(os.environ.get('NODE_WORKER_HEALTH_INTERVAL', 30))  # pingによる死活監視の間隔（秒）
+NODE_WORKER_RESTART_BACKOFF = float(os.environ.get('NODE_WORKER_RESTART_BACKOFF', 1.0))  # 起動失敗・起動直後の終了後に再起動を待つ初期秒数（失敗ごとに倍）
+NODE_WORKER_RESTART_BACKOFF_MAX = float(os.environ.get('NODE_WORKER_RESTART_BACKOFF_MAX', 60.0))  # 再起動待ちの上限（秒、これより長く動いたワーカーは正常扱い）
+
+# yt-dlp抽出プロセスプール設定（YoutubeDLを常駐プロセスで使い回す）
+YTDL_POOL_WORKERS = int(os.environ.get('YTDL_POOL_WORKERS', 2))  # 抽出ワーカープロセス数
+YTDL_POOL_MAX_QUEUE = int(os.environ.get('YTDL_POOL_MAX_QUEUE', 16))  # 実行中 + 待機中ジョブ数の上限
+YTDL_POOL_JOB_TIMEOUT = float(os.environ.get('YTDL_POOL_JOB_TIMEOUT', 45))  # 1ジョブのタイムアウト（秒）
+
+# 上流API並列呼び出し用の共有スレッドプール設定
+UPSTREAM_EXECUTOR_WORKERS = int(os.environ.get('UPSTREAM_EXECUTOR_WORKERS', 32))  # スレッド数
+UPSTREAM_EXECUTOR_MAX_QUEUE = int(os.environ.get('UPSTREAM_EXECUTOR_MAX_QUEUE', 64))  # 全スレッド使用中に待たせてよいタスク数
+WATCH_FANOUT_DEADLINE = float(os.environ.get('WATCH_FANOUT_DEADLINE', 3.0))  # /watch で上流APIの結果を待つ上限（秒）
+WATCH_PROGRESSIVE = os.environ.get('WATCH_PROGRESSIVE', '1') != '0'  # /watch を段階的表示（初期HTML + SSE）にする
+WATCH_STREAM_DEADLINE = float(os.environ.get('WATCH_STREAM_DEADLINE', 15.0))  # 段階的表示で上流APIの結果を送り続ける上限（秒）
+
+# 動画メタデータ統合リゾルバー設定
+VIDEO_METADATA_TIMEOUT = float(os.environ.get('VIDEO_METADATA_TIMEOUT', 3.0))  # 取得元・フォールバックを待つ上限（秒）
+VIDEO_METADATA_CACHE_TTL = int(os.environ.get('VIDEO_METADATA_CACHE_TTL', 600))  # 全取得元から統合したレコードのTTL
+VIDEO_METADATA_PARTIAL_TTL = int(os.environ.get('VIDEO_METADATA_PARTIAL_TTL', 30))  # 必須項目の確定で打ち切ったレコードのTTL
+
+# フェデレーション検索設定（/search・/api/search）
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', 5.0))  # 検索の取得元を待つ上限（秒）
+SEARCH_ENOUGH_RESULTS = int(os.environ.get('SEARCH_ENOUGH_RESULTS', 20))  # 重複を除いてこの件数が集まったら残りを待たない
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 300))  # 全取得元から統合した検索結果のTTL
+SEARCH_PARTIAL_TTL = int(os.environ.get('SEARCH_PARTIAL_TTL', 30))  # 件数到達・締め切りで打ち切った検索結果のTTL
+SEARCH_PREFETCH_ENABLED = os.environ.get('SEARCH_PREFETCH_ENABLED', '1') != '0'  # ページを返した後に次のページを先読みする
+SEARCH_PREFETCH_CONCURRENCY = int(os.environ.get('SEARCH_PREFETCH_CONCURRENCY', 2))  # 同時に実行する先読みの上限
+SEARCH_PREFETCH_PER_QUERY = int(os.environ.get('SEARCH_PREFETCH_PER_QUERY', 3))  # 1つのクエリで先読みするページ数の上限
+SEARCH_PREFETCH_MAX_PAGE = int(os.environ.get('SEARCH_PREFETCH_MAX_PAGE', 20))  # これより後のページは先読みしない
+
+# 検索予測変換（/suggest）設定
+SUGGEST_LIMIT = int(os.environ.get('SUGGEST_LIMIT', 10))  # 返す候補数（ローカルでこの件数が揃えば上流に問い合わせない）
+SUGGEST_UPSTREAM_MAX = int(os.environ.get('SUGGEST_UPSTREAM_MAX', 10))  # 上流が返す候補の最大数（未満なら長い接頭辞は絞り込みで答える）
+SUGGEST_CACHE_TTL = int(os.environ.get('SUGGEST_CACHE_TTL', 3600))  # 上流の予測変換のキャッシュTTL
+SUGGEST_INDEX_REFRESH = int(os.environ.get('SUGGEST_INDEX_REFRESH', 300))  # ローカルインデックスを作り直す間隔（秒）
+SUGGEST_INDEX_MAX_TERMS = int(os.environ.get('SUGGEST_INDEX_MAX_TERMS', 50000))  # ローカルインデックスの語数の上限
+
+# Kahoot 動画詳細APIのマイクロバッチ設定
+KAHOOT_BATCH_WINDOW = float(os.environ.get('KAHOOT_BATCH_WINDOW', 0.005))  # 同時の要求を集める時間窓（秒）
+KAHOOT_BATCH_MAX = int(os.environ.get('KAHOOT_BATCH_MAX', 50))  # 1回のAPI呼び出しで送る動画IDの上限
+KAHOOT_BATCH_TIMEOUT = float(os.environ.get('KAHOOT_BATCH_TIMEOUT', 16))  # 呼び出し元がバッチの結果を待つ上限（秒）
+KAHOOT_VIDEO_CACHE_TTL = int(os.environ.get('KAHOOT_VIDEO_CACHE_TTL', 600))  # 動画IDごとの詳細のキャッシュTTL
+KAHOOT_VIDEO_MISSING_TTL = int(os.environ.get('KAHOOT_VIDEO_MISSING_TTL', 60))  # APIが返さなかった動画IDを覚えておく秒数
+
+# 関連動画エンジン設定（/api/related-videos）
+RELATED_DEADLINE = float(os.environ.get('RELATED_DEADLINE', 4.0))  # 候補の生成元を待つ上限（秒）
+RELATED_LIMIT = int(os.environ.get('RELATED_LIMIT', 20))  # 返す関連動画の数
+RELATED_CACHE_TTL = int(os.environ.get('RELATED_CACHE_TTL', 1800))  # 全生成元から並べた関連動画のTTL
+RELATED_PARTIAL_TTL = int(os.environ.get('RELATED_PARTIAL_TTL', 60))  # 締め切りで一部の生成元を待たなかった場合のTTL
+
+# ショート動画フィード設定（/api/shorts-feed・/api/shorts-next・/api/shorts-prev）
+SHORTS_FEED_DEADLINE = float(os.environ.get('SHORTS_FEED_DEADLINE', 5.0))  # 1回の補充でクエリの結果を待つ上限（秒）
+SHORTS_FEED_TARGET = int(os.environ.get('SHORTS_FEED_TARGET', 80))  # 新しいフィードで裏の補充により揃える件数
+SHORTS_FEED_LOW_WATER = int(os.environ.get('SHORTS_FEED_LOW_WATER', 20))  # 返した位置から末尾までがこれ未満なら裏で補充
+SHORTS_FEED_BATCH_QUERIES = int(os.environ.get('SHORTS_FEED_BATCH_QUERIES', 6))  # 1回の補充で同時に実行するクエリ数
+SHORTS_FEED_INITIAL_QUERIES = int(os.environ.get('SHORTS_FEED_INITIAL_QUERIES', 12))  # 新しいフィードの作成時に同時に実行するクエリ数
+SHORTS_FEED_MAX_VIDEOS = int(os.environ.get('SHORTS_FEED_MAX_VIDEOS', 500))  # 1フィードに保持する件数（超えた分は先頭から捨てる）
+SHORTS_FEED_PROFILES = int(os.environ.get('SHORTS_FEED_PROFILES', 8))  # 保持する嗜好プロファイル数
+
+# チャンネルページ
+CHANNEL_HEADER_TTL = int(os.environ.get('CHANNEL_HEADER_TTL', 21600))  # チャンネルのヘッダー（名前・アイコン・バナー・登録者数）のTTL
+CHANNEL_PAGE_TTL = int(os.environ.get('CHANNEL_PAGE_TTL', 1800))  # 動画一覧のページ（並び順ごと）のTTL
+CHANNEL_PAGE_SIZE = int(os.environ.get('CHANNEL_PAGE_SIZE', 20))  # 1ページの動画数
+CHANNEL_DEADLINE = float(os.environ.get('CHANNEL_DEADLINE', 6.0))  # ヘッダーと動画一覧を待つ上限（秒）
+
+# 投稿者アイコンのインデックス
+AUTHOR_AVATAR_TTL = int(os.environ.get('AUTHOR_AVATAR_TTL', 2592000))  # チャンネルIDごとのアイコンURLのTTL（30日）
+AUTHOR_AVATAR_MISSING_TTL = int(os.environ.get('AUTHOR_AVATAR_MISSING_TTL', 3600))  # アイコンを取得できなかったIDを再取得しない秒数
+AUTHOR_AVATAR_BATCH_MAX = int(os.environ.get('AUTHOR_AVATAR_BATCH_MAX', 50))  # 1回のまとめ取得で送るIDの上限
+AUTHOR_AVATAR_PENDING_MAX = int(os.environ.get('AUTHOR_AVATAR_PENDING_MAX', 1000))  # 取得待ちのIDの上限
+AUTHOR_AVATAR_FALLBACK_MAX = int(os.environ.get('AUTHOR_AVATAR_FALLBACK_MAX', 5))  # まとめ取得で返らなかったIDを個別に取得する上限
+
+# コメント
+COMMENTS_DEADLINE = float(os.environ.get('COMMENTS_DEADLINE', 6.0))  # 1ページ目で取得元（omada.cafe・Invidious）を待つ上限（秒）
+COMMENTS_PAGE_TTL = int(os.environ.get('COMMENTS_PAGE_TTL', 120))  # (動画, 取得元, continuation) ごとのページのTTL
+COMMENTS_LOCAL_MAX = int(os.environ.get('COMMENTS_LOCAL_MAX', 50))  # 1ページ目に加えるローカルのコメントの上限
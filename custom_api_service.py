@@ -1,18 +1,21 @@
 import requests
 import logging
-import time
 import json
 import urllib.parse
 from typing import Dict, List, Optional, Union
+from http_client import http_client
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+from video_records import Video, StreamFormat, parse_count, parse_duration
 
 class CustomApiService:
     """siawaseok.duckdns.orgのAPIエンドポイントを使用した統合サービス"""
     
     def __init__(self):
         self.base_url = "https://siawaseok.duckdns.org"
-        self.timeout = 2  # 🚀 高速化: 5秒→2秒に短縮（検索速度向上）
-        self._cache = {}
-        self._cache_timeout = 600  # 🚀 高速化: キャッシュ時間を10分に延長
+        self.timeout = http_client.timeout_for('custom_api')  # config.SERVICE_TIMEOUTS で設定
+        self._cache = get_cache('custom_api', ttl=600, max_entries=500, max_bytes=32 * 1024 * 1024, coherent=True)  # 10分キャッシュ（上限付きLRU）
         
         # siawaseok APIエンドポイント
         self.search_endpoint = "/api/search"
@@ -23,27 +26,31 @@ class CustomApiService:
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """APIリクエストの実行"""
         cache_key = f"{endpoint}:{str(params) if params else ''}"
-        current_time = time.time()
         
         # キャッシュチェック
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            if current_time - timestamp < self._cache_timeout:
-                logging.info(f"キャッシュからデータ取得: {endpoint}")
-                return cached_data
+        cached_data = self._cache.get(cache_key)
+        if cached_data is not None:
+            logging.info(f"キャッシュからデータ取得: {endpoint}")
+            return cached_data
         
+        # 同じリクエストが実行中ならその結果を共有（single-flight）
+        return single_flight.do(f"custom_api:{cache_key}", self._fetch, endpoint, params, cache_key,
+                                cache=self._cache, cache_key=cache_key)
+    
+    def _fetch(self, endpoint: str, params: Optional[Dict], cache_key: str) -> Optional[Dict]:
+        """APIへの実際のリクエスト（キャッシュミス時）"""
         try:
             url = f"{self.base_url}{endpoint}"
             logging.info(f"APIリクエスト: {url}")
             
-            response = requests.get(url, params=params, timeout=self.timeout)
+            response = http_client.get(url, params=params, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
                 # データが辞書形式であることを確認
                 if isinstance(data, dict):
-                    # キャッシュに保存
-                    self._cache[cache_key] = (data, current_time)
+                    # キャッシュに保存（ストリームURLを含む場合は expire= から有効期限を決める）
+                    self._cache.set(cache_key, data, ttl=stream_cache_ttl(data, self._cache.ttl))
                     logging.info(f"✅ 成功: {url}")
                     return data
                 else:
@@ -66,6 +73,10 @@ class CustomApiService:
             logging.error(f"予期しないエラー: {e}")
             return None
     
+    def invalidate_stream_cache(self, video_id: str):
+        """動画のストリームURLキャッシュを破棄（プレーヤーで403等が発生した場合）"""
+        self._cache.delete(f"{self.stream_endpoint}/{video_id}/:")
+    
     def search_videos(self, query: str) -> Optional[Dict]:
         """動画検索API呼び出し"""
         if not query:
@@ -104,7 +115,7 @@ class CustomApiService:
             omada_url = f"https://yt.omada.cafe/api/v1/comments/{video_id}"
             logging.info(f"🎯 最優先: omada.cafe APIからコメント取得試行: {omada_url}")
             
-            response = requests.get(omada_url, timeout=self.timeout)
+            response = http_client.get(omada_url, timeout=self.timeout)
             if response.status_code == 200:
                 data = response.json()
                 if isinstance(data, dict) and data:
@@ -119,30 +130,15 @@ class CustomApiService:
         logging.warning(f"コメント取得失敗: omada.cafe APIが利用できません: {video_id}")
         return None
     
-    def format_search_results(self, search_data: Dict) -> List[Dict]:
+    def format_search_results(self, search_data: Dict) -> List[Video]:
         """検索結果を標準形式にフォーマット"""
         if not search_data:
             return []
         
-        formatted_results = []
-        
         # API応答の構造に応じて調整が必要
         videos = search_data.get('videos', search_data.get('items', []))
         
-        for video in videos:
-            formatted_video = {
-                'videoId': video.get('videoId', video.get('id')),
-                'title': video.get('title', ''),
-                'author': video.get('author', video.get('channel', {}).get('name', '')),
-                'publishedText': video.get('publishedText', video.get('published', '')),
-                'viewCount': video.get('viewCount', 0),
-                'lengthSeconds': video.get('lengthSeconds', video.get('duration', 0)),
-                'videoThumbnails': video.get('videoThumbnails', video.get('thumbnails', [])),
-                'description': video.get('description', video.get('descriptionSnippet', ''))
-            }
-            formatted_results.append(formatted_video)
-        
-        return formatted_results
+        return [video for video in map(Video.from_siawaseok, videos) if video is not None]
     
     def format_video_info(self, video_data: Dict, video_id: str = '') -> Optional[Dict]:
         """動画情報を標準形式にフォーマット（siawaseok API対応）"""
@@ -158,8 +154,8 @@ class CustomApiService:
         author = video_data.get('uploader', video_data.get('author', ''))
         authorId = video_data.get('uploader_id', video_data.get('authorId', ''))
         description = video_data.get('description', '')
-        viewCount = video_data.get('view_count', video_data.get('viewCount', 0))
-        duration = video_data.get('duration', video_data.get('lengthSeconds', 0))
+        viewCount = parse_count(video_data.get('view_count', video_data.get('viewCount', 0)))
+        duration = parse_duration(video_data.get('duration', video_data.get('lengthSeconds', 0)))
         uploadDate = video_data.get('upload_date', video_data.get('publishedText', ''))
         
         # サムネイルを適切にフォーマット
@@ -184,7 +180,7 @@ class CustomApiService:
             video_streams = video_data['videoStreams']
             if video_streams:
                 stream_url = video_streams[0].get('url', '')
-                format_streams = video_streams
+                format_streams = [fmt for fmt in map(StreamFormat.from_stream, video_streams) if fmt is not None]
         
         if 'audioStreams' in video_data:
             adaptive_formats = video_data['audioStreams']
@@ -0,0 +1,186 @@
+"""
+外部エンドポイント（APIミラー / Invidiousインスタンス）の健全性スコアリング
+
+固定時間のブラックリストの代わりに、エンドポイントごとに
+  - レイテンシのEWMA（指数移動平均）
+  - 成功率のEWMA
+  - 直近のエラー種別と連続失敗回数
+を記録し、呼び出しのたびに「速くて健全な順」に候補を並べ替える。
+連続失敗したエンドポイントは一定時間除外（open）し、クールダウン経過後は
+1本だけ試験リクエストを通して（half-open）、成功すれば即座に復帰させる。
+"""
+import logging
+import requests
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class EndpointHealthTracker:
+    """エンドポイントごとの健全性スコアを管理するクラス（スレッドセーフ）"""
+
+    def __init__(self, alpha: float = 0.3, failure_threshold: int = 2,
+                 base_cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 probe_interval: float = 10.0, default_latency: float = 1.5):
+        self.alpha = alpha  # EWMAの平滑化係数（大きいほど直近の結果を重視）
+        self.failure_threshold = failure_threshold  # この回数連続で失敗したら除外
+        self.base_cooldown = base_cooldown  # 除外時間の初期値（秒）
+        self.max_cooldown = max_cooldown  # 除外時間の上限（連続失敗ごとに倍増）
+        self.probe_interval = probe_interval  # half-open時の試験リクエスト間隔（秒）
+        self.default_latency = default_latency  # 計測実績のないエンドポイントの仮レイテンシ（秒）
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(endpoint: str) -> str:
+        # 末尾スラッシュの有無で別エンドポイント扱いにならないよう正規化
+        return endpoint.rstrip('/')
+
+    def _get(self, endpoint: str) -> Dict:
+        key = self._key(endpoint)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = {
+                'latency': None,
+                'success_rate': 1.0,
+                'successes': 0,
+                'failures': 0,
+                'consecutive_failures': 0,
+                'last_error': None,
+                'last_failure': None,
+                'last_success': None,
+                'open_until': 0.0,
+                'last_probe': 0.0,
+            }
+            self._stats[key] = stats
+        return stats
+
+    def _state(self, stats: Dict, now: float) -> str:
+        if stats['consecutive_failures'] < self.failure_threshold:
+            return 'healthy'
+        if now < stats['open_until']:
+            return 'open'
+        return 'half-open'
+
+    def _score(self, stats: Dict) -> float:
+        # 期待レイテンシ = EWMAレイテンシ / 成功率（失敗しがちなミラーほど遅く見積もる）
+        latency = stats['latency'] if stats['latency'] is not None else self.default_latency
+        return latency / max(stats['success_rate'], 0.05)
+
+    def record_success(self, endpoint: str, latency: float):
+        """成功したリクエストを記録"""
+        with self._lock:
+            stats = self._get(endpoint)
+            if stats['latency'] is None:
+                stats['latency'] = latency
+            else:
+                stats['latency'] = self.alpha * latency + (1 - self.alpha) * stats['latency']
+            stats['success_rate'] = self.alpha + (1 - self.alpha) * stats['success_rate']
+            stats['successes'] += 1
+            if stats['consecutive_failures'] >= self.failure_threshold:
+                logging.info(f"✅ エンドポイント復帰: {self._key(endpoint)}")
+            stats['consecutive_failures'] = 0
+            stats['open_until'] = 0.0
+            stats['last_success'] = time.time()
+
+    def record_failure(self, endpoint: str, error_class: str, latency: Optional[float] = None):
+        """失敗したリクエストを記録（error_classは 'timeout' / 'http_503' などの分類名）"""
+        with self._lock:
+            stats = self._get(endpoint)
+            if latency is not None:
+                # タイムアウト等も遅さとしてレイテンシに反映
+                if stats['latency'] is None:
+                    stats['latency'] = latency
+                else:
+                    stats['latency'] = self.alpha * latency + (1 - self.alpha) * stats['latency']
+            stats['success_rate'] = (1 - self.alpha) * stats['success_rate']
+            stats['failures'] += 1
+            stats['consecutive_failures'] += 1
+            stats['last_error'] = error_class
+            stats['last_failure'] = time.time()
+            overflow = stats['consecutive_failures'] - self.failure_threshold
+            if overflow >= 0:
+                cooldown = min(self.base_cooldown * (2 ** overflow), self.max_cooldown)
+                stats['open_until'] = time.monotonic() + cooldown
+                logging.debug(f"エンドポイント除外 {cooldown:.0f}秒 ({error_class}): {self._key(endpoint)}")
+
+    def rank(self, endpoints: List[str], claim_probes: bool = True) -> List[str]:
+        """候補を健全性スコア順に並べ替える
+
+        健全なエンドポイントは期待レイテンシの昇順（同点は元の優先順位順）。
+        クールダウンが明けたエンドポイントは試験リクエスト用に2番目へ差し込み、
+        全候補が除外中の場合は復帰が近い順にそのまま返す。
+        claim_probes=False の場合は試験枠を消費しない（状態表示用）。
+        """
+        now = time.monotonic()
+        healthy, probes, opened = [], [], []
+        with self._lock:
+            for index, endpoint in enumerate(endpoints):
+                stats = self._get(endpoint)
+                state = self._state(stats, now)
+                if state == 'healthy':
+                    healthy.append((self._score(stats), index, endpoint))
+                elif state == 'half-open' and now - stats['last_probe'] >= self.probe_interval:
+                    if claim_probes:
+                        stats['last_probe'] = now
+                    probes.append(endpoint)
+                else:
+                    opened.append((stats['open_until'], index, endpoint))
+
+        ranked = [endpoint for _, _, endpoint in sorted(healthy)]
+        if probes:
+            ranked[1:1] = probes
+        if not ranked:
+            ranked = [endpoint for _, _, endpoint in sorted(opened)]
+        return ranked
+
+    def get_status(self, endpoints: List[str]) -> Dict[str, Dict]:
+        """エンドポイントごとの状態・スコアを取得"""
+        now = time.monotonic()
+        current_time = time.time()
+        status = {}
+        with self._lock:
+            for endpoint in endpoints:
+                stats = self._get(endpoint)
+                state = self._state(stats, now)
+                last_failure = stats['last_failure']
+                status[endpoint] = {
+                    "status": {'healthy': 'active', 'open': 'failed', 'half-open': 'probing'}[state],
+                    "score": round(self._score(stats), 3),
+                    "latency_ewma": round(stats['latency'], 3) if stats['latency'] is not None else None,
+                    "success_rate": round(stats['success_rate'], 3),
+                    "successes": stats['successes'],
+                    "failures": stats['failures'],
+                    "consecutive_failures": stats['consecutive_failures'],
+                    "last_error": stats['last_error'],
+                    "last_failure": last_failure,
+                    "time_since_failure": current_time - last_failure if last_failure else 0,
+                    "retry_in": round(max(stats['open_until'] - now, 0), 1) if state == 'open' else 0
+                }
+        return status
+
+    def reset(self, endpoints: Optional[List[str]] = None):
+        """記録をリセット（endpoints省略時は全件）"""
+        with self._lock:
+            if endpoints is None:
+                self._stats.clear()
+            else:
+                for endpoint in endpoints:
+                    self._stats.pop(self._key(endpoint), None)
+
+
+def classify_error(error: Exception) -> str:
+    """例外をエラー種別名に分類"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.SSLError):
+        return 'ssl'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    if isinstance(error, ValueError):
+        return 'invalid_json'
+    return type(error).__name__
+
+
+# グローバルインスタンス（MultiStreamService / InvidiousService / InvidiousInstanceManager で共有）
+endpoint_health = EndpointHealthTracker()
@@ -0,0 +1,323 @@
+"""
+フェデレーション検索エンジン
+
+FederatedSearch は
+  - 取得元（取得関数 + 正規化関数 + 重み）を宣言的に登録
+  - 取得元を共有スレッドプールで同時に実行し、1つの締め切りの中で待つ
+  - 動画IDで重複を除いて統合し、取得元ごとの重みと順位からスコアを付けて並べ替え
+  - 十分な件数が集まった時点で残りを待たずに返す（残りは各サービスのキャッシュに入る）
+  - 統合結果を (クエリ, ページ) ごとにキャッシュ
+  - ページを返した後に次のページを裏で先読み（同時実行数・クエリごとの回数に上限あり）
+する。/search と /api/search で共有する。
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from config import (SEARCH_DEADLINE, SEARCH_ENOUGH_RESULTS, SEARCH_CACHE_TTL, SEARCH_PARTIAL_TTL,
+                    SEARCH_PREFETCH_ENABLED, SEARCH_PREFETCH_CONCURRENCY, SEARCH_PREFETCH_PER_QUERY,
+                    SEARCH_PREFETCH_MAX_PAGE)
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from custom_api_service import CustomApiService
+from multi_stream_service import MultiStreamService
+from invidious_service import InvidiousService
+from video_records import Video
+from author_avatars import author_avatars
+
+# 順位によるスコアの減衰（重み / (RANK_OFFSET + 順位)、複数の取得元に現れる動画ほど上位になる）
+RANK_OFFSET = 10
+
+# 代表レコードで空の場合に他の取得元から補完する項目
+_FILL_FIELDS = ('title', 'author', 'authorId', 'lengthSeconds', 'viewCount', 'publishedText', 'published',
+                'description', 'thumbnail')
+
+# 取得元が返す「値なし」を表す仮の値
+_PLACEHOLDER_VALUES = ('Unknown', 'N/A', 'タイトル未取得')
+
+
+def _is_empty(value) -> bool:
+    return not value or (isinstance(value, str) and value in _PLACEHOLDER_VALUES)
+
+
+class FederatedSearch:
+    """複数の取得元に同時に問い合わせて検索結果を統合する（スレッドセーフ）"""
+
+    def __init__(self, executor=upstream_executor, deadline: float = SEARCH_DEADLINE,
+                 enough_results: int = SEARCH_ENOUGH_RESULTS, cache_ttl: float = SEARCH_CACHE_TTL,
+                 partial_ttl: float = SEARCH_PARTIAL_TTL, prefetch_enabled: bool = SEARCH_PREFETCH_ENABLED,
+                 prefetch_concurrency: int = SEARCH_PREFETCH_CONCURRENCY,
+                 prefetch_per_query: int = SEARCH_PREFETCH_PER_QUERY, prefetch_max_page: int = SEARCH_PREFETCH_MAX_PAGE):
+        self.executor = executor
+        self.deadline = deadline  # 取得元を待つ上限（秒）
+        self.enough_results = enough_results  # 重複を除いてこの件数が集まったら残りを待たない
+        self.cache_ttl = cache_ttl  # 全取得元の結果から統合した場合のTTL
+        self.partial_ttl = partial_ttl  # 件数到達・締め切りで打ち切った場合のTTL
+        self._sources = {}  # 取得元名 -> {'fetch': fn(query, page), 'normalize': fn(data), 'weight', 'paged'}
+        self._cache = get_cache('federated_search', ttl=cache_ttl, max_entries=500, max_bytes=16 * 1024 * 1024)
+        self.prefetch_enabled = prefetch_enabled
+        self.prefetch_concurrency = prefetch_concurrency  # 同時に実行する先読みの上限
+        self.prefetch_per_query = prefetch_per_query  # 1つのクエリで先読みするページ数の上限（キャッシュTTLの間）
+        self.prefetch_max_page = prefetch_max_page  # これより後のページは先読みしない
+        self._prefetch_counts = get_cache('search_prefetch_counts', ttl=cache_ttl, max_entries=2000, shared=False)
+        # 利用済みの先読み結果（最初の利用だけを先読みのヒットとして数える、ワーカー間で共有）
+        self._prefetch_used = get_cache('search_prefetch_used', ttl=cache_ttl, max_entries=2000)
+        self._prefetching = set()  # 先読み中の (クエリ, ページ)
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.early_returns = 0
+        self.prefetches = 0
+        self.prefetch_skipped = 0
+        self.prefetch_hits = 0
+
+    # --- 宣言 ---
+
+    def register_source(self, name: str, fetch: Callable[[str, int], Any],
+                        normalize: Callable[[Any], Dict[str, List]], weight: float = 1.0, paged: bool = True):
+        """取得元を登録
+
+        normalize は取得結果を {'videos': [Video, ...], 'channels': [...]} に変換する。
+        paged=False の取得元（ページ指定のないAPI）は1ページ目だけで使う。
+        """
+        self._sources[name] = {'fetch': fetch, 'normalize': normalize, 'weight': weight, 'paged': paged}
+
+    @property
+    def source_names(self) -> List[str]:
+        return list(self._sources)
+
+    # --- 取得 ---
+
+    def source_tasks(self, query: str, page: int) -> Dict[str, Callable[[], Any]]:
+        """取得元ごとのタスク {取得元名: 引数なし関数} を作成"""
+        return {name: (lambda fetch=source['fetch']: fetch(query, page))
+                for name, source in self._sources.items() if source['paged'] or page == 1}
+
+    def normalize(self, name: str, data: Any) -> Dict[str, List]:
+        """取得元の結果を {'videos': [...], 'channels': [...]} に変換（失敗した場合は空）"""
+        source = self._sources.get(name)
+        if source is None or not data:
+            return {'videos': [], 'channels': []}
+        try:
+            normalized = source['normalize'](data) or {}
+        except Exception as e:
+            logging.warning(f"検索結果正規化エラー {name}: {e}")
+            normalized = {}
+        videos = [video for video in normalized.get('videos') or [] if video is not None and video.get('videoId')]
+        return {'videos': videos, 'channels': list(normalized.get('channels') or [])}
+
+    def fetch(self, query: str, page: int, timeout: Optional[float] = None,
+              stop_early: bool = True) -> Dict[str, Dict[str, List]]:
+        """全取得元を同時に実行し、締め切りまでに完了した取得元の正規化済み結果を返す
+
+        stop_early=True の場合は重複を除いた動画が enough_results 件に達した時点で残りを待たずに返す。
+        """
+        tasks = self.source_tasks(query, page)
+        label = f"search[{query}:{page}]"
+        results = {}
+        video_ids = set()
+        for name, data in self.executor.iter_completed(tasks, timeout=self.deadline if timeout is None else timeout,
+                                                       label=label):
+            results[name] = self.normalize(name, data)
+            video_ids.update(video.videoId for video in results[name]['videos'])
+            if stop_early and len(video_ids) >= self.enough_results:
+                pending = [name for name in tasks if name not in results]
+                if pending:
+                    self.early_returns += 1
+                    logging.info(f"⚡ {label} {len(video_ids)}件に到達、残りを待たずに返します: {', '.join(pending)}")
+                break
+        return results
+
+    # --- 統合 ---
+
+    def merge(self, results: Dict[str, Dict[str, List]]) -> Dict[str, List]:
+        """取得元の結果を動画IDで統合し、スコア順に並べる（通信なし）"""
+        entries = {}  # videoId -> {'score': float, 'records': [(重み, Video)], 'sources': {取得元名}}
+        channels = []
+        channel_ids = set()
+        # 登録順に走査（同点の場合は先に登録した取得元の順位が残る）
+        for name, source in self._sources.items():
+            if name not in results:
+                continue
+            weight = source['weight']
+            for rank, video in enumerate(results[name]['videos']):
+                entry = entries.setdefault(video.videoId, {'score': 0.0, 'records': [], 'sources': set()})
+                if name in entry['sources']:
+                    continue  # 同じ取得元内の重複は最上位だけ数える
+                entry['sources'].add(name)
+                entry['score'] += weight / (RANK_OFFSET + rank)
+                entry['records'].append((weight, video))
+            for channel in results[name]['channels']:
+                channel_id = channel.get('authorId')
+                if channel_id and channel_id not in channel_ids:
+                    channel_ids.add(channel_id)
+                    channels.append(channel)
+        ranked = sorted(entries.values(), key=lambda entry: -entry['score'])
+        return {'videos': [self._combine(entry['records']) for entry in ranked], 'channels': channels}
+
+    @staticmethod
+    def _combine(records: List) -> Video:
+        # 重みが最大の取得元のレコードを代表にし、空の項目だけ他の取得元から補完する
+        records = sorted(records, key=lambda record: -record[0])
+        video = records[0][1]
+        copied = False
+        for field in _FILL_FIELDS:
+            if not _is_empty(video.get(field)):
+                continue
+            for _, other in records[1:]:
+                value = other.get(field)
+                if not _is_empty(value):
+                    if not copied:
+                        video = video.copy()  # キャッシュ上のレコードは書き換えない
+                        copied = True
+                    video[field] = value
+                    break
+        return video
+
+    def search(self, query: str, page: int = 1, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """統合検索結果 {'videos', 'channels', 'sources', 'complete'} を取得
+
+        （キャッシュ・同時リクエストの合流・件数到達での早期終了あり）
+        sources は結果を返した取得元ごとの件数、complete は全取得元の結果から統合したかどうか。
+        """
+        cache_key = f"{page}:{query}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            if cached.get('prefetched'):
+                self._count_prefetch_hit(cache_key)
+            return cached
+        return single_flight.do(f"federated_search:{cache_key}", self._search, query, page, timeout, cache_key,
+                                cache=self._cache, cache_key=cache_key)
+
+    def _count_prefetch_hit(self, cache_key: str):
+        # 同じ先読み結果の2回目以降の利用（他の利用者・再読み込み）は数えない
+        with self._lock:
+            if self._prefetch_used.get(cache_key) is not None:
+                return
+            self._prefetch_used.set(cache_key, True)
+            self.prefetch_hits += 1
+
+    def _search(self, query: str, page: int, timeout: Optional[float], cache_key: str,
+                prefetch: bool = False) -> Dict[str, Any]:
+        start_time = time.time()
+        self.searches += 1
+        # 先読みは利用者を待たせないので、完全な結果（長いTTL）になるよう全取得元を待つ
+        results = self.fetch(query, page, timeout=timeout, stop_early=not prefetch)
+        merged = self.merge(results)
+        complete = all(name in results for name in self.source_tasks(query, page))
+        merged['sources'] = {name: len(result['videos']) for name, result in results.items()}
+        merged['complete'] = complete
+        merged['prefetched'] = prefetch
+        author_avatars.observe(merged['channels'])  # 検索結果のチャンネルのアイコンを記録
+        if merged['videos'] or merged['channels']:
+            if prefetch:
+                self._prefetch_used.delete(cache_key)  # 新しい先読み結果の最初の利用を数えられるように
+            self._cache.set(cache_key, merged, ttl=self.cache_ttl if complete else self.partial_ttl)
+        logging.info(f"{'📥 先読み' if prefetch else '🔎 統合検索'} '{query}' p{page}: {time.time() - start_time:.2f}秒 "
+                     f"動画 {len(merged['videos'])} 件, チャンネル {len(merged['channels'])} 件 "
+                     f"(取得元 {merged['sources']}, {'完全' if complete else '打ち切り'})")
+        return merged
+
+    # --- 先読み ---
+
+    def prefetch(self, query: str, page: int) -> bool:
+        """次のページを裏で取得してキャッシュに入れる（投入した場合True）
+
+        同じページの先読み中・同時実行数やクエリごとの回数の上限・プールの飽和時は何もしない。
+        """
+        if not self.prefetch_enabled or not query or page > self.prefetch_max_page:
+            return False
+        cache_key = f"{page}:{query}"
+        with self._lock:
+            count = self._prefetch_counts.get(query) or 0
+            if (cache_key in self._prefetching or len(self._prefetching) >= self.prefetch_concurrency
+                    or count >= self.prefetch_per_query):
+                self.prefetch_skipped += 1
+                return False
+            self._prefetching.add(cache_key)
+        future = self.executor.submit(self._prefetch, query, page, cache_key)
+        with self._lock:
+            if future is None:
+                self._prefetching.discard(cache_key)
+                self.prefetch_skipped += 1
+                return False
+            self._prefetch_counts.set(query, count + 1)
+            self.prefetches += 1
+        return True
+
+    def _prefetch(self, query: str, page: int, cache_key: str):
+        try:
+            if self._cache.get(cache_key) is not None:
+                return  # キャッシュ済み
+            single_flight.do(f"federated_search:{cache_key}", self._search, query, page, None, cache_key, True,
+                             cache=self._cache, cache_key=cache_key)
+        except Exception as e:
+            logging.warning(f"検索の先読みエラー '{query}' p{page}: {e}")
+        finally:
+            with self._lock:
+                self._prefetching.discard(cache_key)
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "sources": {name: {'weight': source['weight'], 'paged': source['paged']}
+                        for name, source in self._sources.items()},
+            "deadline": self.deadline,
+            "enough_results": self.enough_results,
+            "searches": self.searches,
+            "early_returns": self.early_returns,
+            "prefetch": {
+                "enabled": self.prefetch_enabled,
+                "concurrency": self.prefetch_concurrency,
+                "per_query": self.prefetch_per_query,
+                "in_flight": len(self._prefetching),
+                "started": self.prefetches,
+                "skipped": self.prefetch_skipped,
+                "hits": self.prefetch_hits
+            },
+            "cache": self._cache.stats()
+        }
+
+
+# --- 既定の取得元 ---
+
+def _normalize_siawaseok(data) -> Dict[str, List]:
+    videos_list = data.get('results', []) if isinstance(data, dict) else data
+    if not isinstance(videos_list, list):
+        return {}
+    return {'videos': [Video.from_siawaseok(item, default_author='Unknown')
+                       for item in videos_list if isinstance(item, dict)]}
+
+
+def _normalize_invidious(data) -> Dict[str, List]:
+    if isinstance(data, dict):
+        return {'videos': [Video.from_invidious(item) for item in data.get('videos', [])],
+                'channels': data.get('channels', [])}
+    return {'videos': [Video.from_invidious(item) for item in data if isinstance(item, dict)]}
+
+
+def _build_default_search() -> FederatedSearch:
+    custom_api_service = CustomApiService()
+    multi_stream_service = MultiStreamService()
+    invidious = InvidiousService()
+
+    engine = FederatedSearch()
+    # 重みは従来の優先順（Kahoot → CustomApi → Invidious → siawaseok）
+    engine.register_source(
+        'kahoot',
+        lambda query, page: multi_stream_service.search_videos_with_kahoot(
+            query, max_results=50 if page == 1 else 30, page=page),  # 1ページ目は多め
+        lambda data: {'videos': data},
+        weight=1.0)
+    engine.register_source(
+        'custom_api',
+        lambda query, page: custom_api_service.search_videos(query),
+        lambda data: {'videos': custom_api_service.format_search_results(data)},
+        weight=0.8, paged=False)
+    engine.register_source('invidious', invidious.search_all, _normalize_invidious, weight=0.7)
+    engine.register_source('siawaseok', multi_stream_service.search_videos, _normalize_siawaseok, weight=0.5)
+    return engine
+
+
+# グローバルインスタンス（/search・/api/search で共有）
+federated_search = _build_default_search()
@@ -0,0 +1,64 @@
+"""
+上流APIへの共有HTTPクライアント
+
+全サービスで1つの requests.Session を共有し、ホストごとのコネクションプールと
+keep-alive を再利用することで、同じホストへのTCP/TLSハンドシェイクを毎回行わない。
+プールサイズ・再試行ポリシー・サービスごとのタイムアウトは config.py で設定する。
+"""
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_RETRY_TOTAL,
+                    HTTP_RETRY_BACKOFF, HTTP_RETRY_STATUSES, SERVICE_TIMEOUTS)
+
+
+class UpstreamHttpClient:
+    """コネクションプール付きの共有HTTPクライアント（スレッド間で共有可能）"""
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 retry_total: int = HTTP_RETRY_TOTAL, retry_backoff: float = HTTP_RETRY_BACKOFF,
+                 retry_statuses=None, timeouts=None):
+        self.timeouts = dict(SERVICE_TIMEOUTS if timeouts is None else timeouts)
+        retry_statuses = HTTP_RETRY_STATUSES if retry_statuses is None else retry_statuses
+
+        # 接続確立の失敗のみ再試行（読み取りタイムアウトの再試行はレイテンシを倍増させるため行わない）
+        retry = Retry(
+            total=retry_total,
+            connect=retry_total,
+            read=0,
+            status=retry_total if retry_statuses else 0,
+            backoff_factor=retry_backoff,
+            status_forcelist=retry_statuses,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        logging.info(f"🌐 共有HTTPクライアント初期化: プール{pool_connections}ホスト × {pool_maxsize}接続, 再試行{retry_total}回")
+
+    def timeout_for(self, service: str = None) -> float:
+        """サービスごとのタイムアウトを取得"""
+        return self.timeouts.get(service, self.timeouts.get('default', 10))
+
+    def request(self, method: str, url: str, service: str = None, **kwargs) -> requests.Response:
+        """共有セッションでリクエスト（timeout未指定時はサービスの既定値を使用）"""
+        kwargs.setdefault('timeout', self.timeout_for(service))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, service: str = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, service=service, **kwargs)
+
+    def post(self, url: str, service: str = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, service=service, **kwargs)
+
+    def head(self, url: str, service: str = None, **kwargs) -> requests.Response:
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, service=service, **kwargs)
+
+
+# グローバルインスタンス（全サービス・routes.py で共有）
+http_client = UpstreamHttpClient()
@@ -1,10 +1,11 @@
 """
 Invidiousインスタンスリストの管理とフォールバック機能
 """
-import random
 import logging
-import requests
+import time
 from typing import List, Optional, Dict
+from endpoint_health import endpoint_health, classify_error
+from http_client import http_client
 
 class InvidiousInstanceManager:
     """複数のInvidiousインスタンスを管理するクラス"""
@@ -94,104 +95,98 @@ class InvidiousInstanceManager:
             "https://invidious.weblibre.org",
             "https://watch.thekitty.zone"
         ]
-        self.timeout = 5
-        self.failed_instances = set()  # 失敗したインスタンスを追跡
+        self.timeout = http_client.timeout_for('invidious_manager')  # config.SERVICE_TIMEOUTS で設定
+        self.health = endpoint_health  # インスタンス健全性スコア（他サービスと共有）
         
     def get_working_instance(self) -> Optional[str]:
-        """動作中のインスタンスを取得"""
-        # 失敗していないインスタンスから選択
-        available_instances = [inst for inst in self.instances if inst not in self.failed_instances]
-        
-        if not available_instances:
-            # 全て失敗した場合は失敗リストをリセット
-            self.failed_instances.clear()
-            available_instances = self.instances.copy()
-        
-        # ランダムに選択（負荷分散）
-        return random.choice(available_instances)
+        """動作中のインスタンスを取得（健全性スコアが最も高いもの）"""
+        ranked = self.get_ranked_instances(1)
+        return ranked[0] if ranked else None
+    
+    def get_ranked_instances(self, limit: int = 3) -> List[str]:
+        """健全性スコア順のインスタンス候補を取得（除外中のものは含まれない）"""
+        return self.health.rank(self.instances)[:limit]
         
-    def mark_failed(self, instance_url: str):
+    def mark_failed(self, instance_url: str, error_class: str = 'unknown', latency: Optional[float] = None):
         """失敗したインスタンスをマーク"""
-        self.failed_instances.add(instance_url)
-        logging.warning(f"Invidiousインスタンス失敗マーク: {instance_url}")
+        self.health.record_failure(instance_url, error_class, latency)
+        logging.warning(f"Invidiousインスタンス失敗マーク: {instance_url} ({error_class})")
+    
+    def get_endpoint_status(self) -> Dict[str, Dict]:
+        """各インスタンスの健全性スコアを取得"""
+        return self.health.get_status(self.instances)
         
     def get_video_data(self, video_id: str) -> Optional[Dict]:
         """複数のインスタンスから動画データを取得（フォールバック付き）"""
-        for attempt in range(3):  # 最大3回試行
-            instance = self.get_working_instance()
-            if not instance:
-                break
-                
+        for attempt, instance in enumerate(self.get_ranked_instances(3)):  # 最大3回試行
+            started = time.monotonic()
             try:
                 url = f"{instance}/api/v1/videos/{video_id}"
                 logging.info(f"Invidiousリクエスト試行 {attempt + 1}: {url}")
                 
-                response = requests.get(url, timeout=self.timeout)
+                response = http_client.get(url, timeout=self.timeout)
                 if response.status_code == 200:
                     data = response.json()
+                    self.health.record_success(instance, time.monotonic() - started)
                     logging.info(f"✅ Invidious成功: {instance}")
                     return data
                 else:
                     logging.warning(f"Invidious HTTPエラー {response.status_code}: {instance}")
-                    self.mark_failed(instance)
+                    self.mark_failed(instance, f"http_{response.status_code}", time.monotonic() - started)
                     
             except Exception as e:
                 logging.warning(f"Invidiousエラー {instance}: {e}")
-                self.mark_failed(instance)
+                self.mark_failed(instance, classify_error(e), time.monotonic() - started)
                 
         logging.error("全てのInvidiousインスタンスが失敗しました")
         return None
         
     def get_video_comments(self, video_id: str) -> Optional[Dict]:
         """複数のインスタンスから動画コメントを取得"""
-        for attempt in range(3):
-            instance = self.get_working_instance()
-            if not instance:
-                break
-                
+        for attempt, instance in enumerate(self.get_ranked_instances(3)):
+            started = time.monotonic()
             try:
                 url = f"{instance}/api/v1/comments/{video_id}"
                 logging.info(f"Invidiousコメントリクエスト試行 {attempt + 1}: {url}")
                 
-                response = requests.get(url, timeout=self.timeout)
+                response = http_client.get(url, timeout=self.timeout)
                 if response.status_code == 200:
                     data = response.json()
+                    self.health.record_success(instance, time.monotonic() - started)
                     logging.info(f"✅ Invidiousコメント成功: {instance}")
                     return data
                 else:
                     logging.warning(f"Invidiousコメント HTTPエラー {response.status_code}: {instance}")
-                    self.mark_failed(instance)
+                    self.mark_failed(instance, f"http_{response.status_code}", time.monotonic() - started)
                     
             except Exception as e:
                 logging.warning(f"Invidiousコメントエラー {instance}: {e}")
-                self.mark_failed(instance)
+                self.mark_failed(instance, classify_error(e), time.monotonic() - started)
                 
         logging.error("全てのInvidiousインスタンスでコメント取得が失敗しました")
         return None
         
     def get_trending_videos(self) -> Optional[List[Dict]]:
         """トレンド動画を取得"""
-        for attempt in range(3):
-            instance = self.get_working_instance()
-            if not instance:
-                break
-                
+        for attempt, instance in enumerate(self.get_ranked_instances(3)):
+            started = time.monotonic()
             try:
                 url = f"{instance}/api/v1/trending"
                 logging.info(f"Invidiousトレンドリクエスト試行 {attempt + 1}: {url}")
                 
-                response = requests.get(url, timeout=self.timeout)
+                response = http_client.get(url, timeout=self.timeout)
                 if response.status_code == 200:
                     data = response.json()
+                    self.health.record_success(instance, time.monotonic() - started)
                     logging.info(f"✅ Invidiousトレンド成功: {instance} - {len(data)} 件")
                     return data
                 else:
                     logging.warning(f"Invidiousトレンド HTTPエラー {response.status_code}: {instance}")
-                    self.mark_failed(instance)
+                    self.mark_failed(instance, f"http_{response.status_code}", time.monotonic() - started)
                     
             except Exception as e:
                 logging.warning(f"Invidiousトレンドエラー {instance}: {e}")
-                self.mark_failed(instance)
+                self.mark_failed(instance, classify_error(e), time.monotonic() - started)
                 
         logging.error("全てのInvidiousインスタンスでトレンド取得が失敗しました")
         return None
@@ -2,71 +2,92 @@ import requests
 import logging
 import time
 from functools import lru_cache
-from config import INVIDIOUS_INSTANCES, REQUEST_TIMEOUT
+from config import INVIDIOUS_INSTANCES
 import random
+from endpoint_health import endpoint_health, classify_error
+from http_client import http_client
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+from video_records import Video, Channel
+from cache_projection import project, invidious_schema
 
 class InvidiousService:
     def __init__(self):
         self.instances = INVIDIOUS_INSTANCES.copy()
         # 優先インスタンスを使用するため、シャッフルしない
-        self._cache = {}
-        self._cache_timeout = 300  # 5分間キャッシュ
-        self._failed_instances = {}  # 失敗したインスタンスを一時的に記録
-        self._failure_timeout = 60  # 1分間は失敗したインスタンスを避ける（高速化）
+        self._cache = get_cache('invidious', ttl=300, max_entries=500, max_bytes=64 * 1024 * 1024,
+                                max_stale=1800, coherent=True)  # 5分間キャッシュ（上限付きLRU、SWR対象は30分まで古い値を返す）
+        self.health = endpoint_health  # インスタンス健全性スコア（他サービスと共有）
+        self.timeout = http_client.timeout_for('invidious')  # config.SERVICE_TIMEOUTS で設定
     
-    def _make_request(self, endpoint, params=None, max_instances=5):
-        """複数のインスタンスでリクエストを試行（キャッシュ付き、高速化のため制限付き）"""
+    def _make_request(self, endpoint, params=None, max_instances=5, stale_ok=False):
+        """複数のインスタンスでリクエストを試行（キャッシュ付き、高速化のため制限付き）
+
+        stale_ok=True の場合は期限切れでも max_stale 以内の値を即座に返し、裏で再取得する。
+        """
         # キャッシュキーを作成
         cache_key = f"{endpoint}:{str(params) if params else ''}"
-        current_time = time.time()
+        
+        def fetch():
+            # 同じリクエストが実行中ならその結果を共有（single-flight）
+            return single_flight.do(f"invidious:{cache_key}", self._fetch, endpoint, params, max_instances, cache_key,
+                                    cache=self._cache, cache_key=cache_key)
+        
+        if stale_ok:
+            return self._cache.get_or_revalidate(cache_key, fetch)
         
         # キャッシュチェック
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            if current_time - timestamp < self._cache_timeout:
-                return cached_data
+        cached_data = self._cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
         
-        # キャッシュがない場合はAPIリクエスト（高速化のため制限）
-        tried_instances = 0
-        for instance in self.instances:
-            if tried_instances >= max_instances:
-                logging.debug(f"最大インスタンス数({max_instances})に達したため停止")
-                break
-            tried_instances += 1
-            # 失敗したインスタンスを一時的に避ける
-            if instance in self._failed_instances:
-                failure_time = self._failed_instances[instance]
-                if current_time - failure_time < self._failure_timeout:
-                    continue
-                else:
-                    # タイムアウト経過後は再試行
-                    del self._failed_instances[instance]
-            
+        return fetch()
+    
+    def _fetch(self, endpoint, params, max_instances, cache_key):
+        """インスタンスへの実際のリクエスト（キャッシュミス時）"""
+        # キャッシュがない場合はAPIリクエスト（健全性スコア順に、高速化のため制限）
+        candidates = self.health.rank(self.instances)[:max_instances]
+        for instance in candidates:
+            started = time.monotonic()
             try:
                 url = f"{instance.rstrip('/')}/api/v1/{endpoint}"
-                response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+                response = http_client.get(url, params=params, timeout=self.timeout)
+                latency = time.monotonic() - started
                 if response.status_code == 200:
                     data = response.json()
                     # データが辞書またはリスト形式であることを確認。検索結果はリスト、動画情報は辞書
                     if isinstance(data, (dict, list)):
-                        # キャッシュに保存
-                        self._cache[cache_key] = (data, current_time)
+                        self.health.record_success(instance, latency)
+                        # アプリが参照する項目だけに絞ってキャッシュに保存
+                        # （ストリームURLを含む場合は expire= から有効期限を決める）
+                        data = project(data, invidious_schema(endpoint))
+                        self._cache.set(cache_key, data, ttl=stream_cache_ttl(data, self._cache.ttl),
+                                        source_bytes=len(response.content))
                         return data
                     else:
                         logging.debug(f"予期しないデータ形式を受信: {instance} - {type(data)}")
-                        self._failed_instances[instance] = current_time
+                        self.health.record_failure(instance, 'invalid_payload', latency)
                         continue
                 else:
                     # HTTPエラーも記録
-                    self._failed_instances[instance] = current_time
+                    self.health.record_failure(instance, f"http_{response.status_code}", latency)
             except Exception as e:
                 logging.warning(f"インスタンス {instance} でエラー: {e}")
-                self._failed_instances[instance] = current_time
+                self.health.record_failure(instance, classify_error(e), time.monotonic() - started)
                 continue
         
-        logging.warning(f"試行した{tried_instances}個のInvidiousインスタンスで失敗しました")
+        logging.warning(f"試行した{len(candidates)}個のInvidiousインスタンスで失敗しました")
         return None
     
+    def invalidate_stream_cache(self, video_id):
+        """動画のストリームURLキャッシュを破棄（プレーヤーで403等が発生した場合）"""
+        self._cache.delete(f"videos/{video_id}:")
+    
+    def get_endpoint_status(self):
+        """各インスタンスの健全性スコアを取得"""
+        return self.health.get_status(self.instances)
+    
     def search_videos(self, query, page=1, sort_by='relevance'):
         """動画検索（高速化版）"""
         params = {
@@ -78,7 +99,7 @@ class InvidiousService:
         
         try:
             # 高速化のため最大3インスタンスのみ試行
-            results = self._make_request('search', params, max_instances=3)
+            results = self._make_request('search', params, max_instances=3, stale_ok=True)
             return results if results else []
         except Exception as e:
             logging.debug(f"検索エラー: {e}")
@@ -95,7 +116,7 @@ class InvidiousService:
         
         try:
             # 高速化のため最大3インスタンスのみ試行
-            results = self._make_request('search', params, max_instances=3)
+            results = self._make_request('search', params, max_instances=3, stale_ok=True)
             if results:
                 # 結果をタイプ別に分離
                 videos = [item for item in results if item.get('type') == 'video']
@@ -130,8 +151,14 @@ class InvidiousService:
     
     def get_stream_urls(self, video_id):
         """Invidiousから直接ストリームURLを取得"""
+        video_info = self.get_video_info(video_id)
+        if not video_info:
+            return None
+        return self.extract_stream_urls(video_info)
+    
+    def extract_stream_urls(self, video_info):
+        """取得済みの動画情報（/api/v1/videos のJSON）からストリームURLを抽出（通信なし）"""
         try:
-            video_info = self.get_video_info(video_id)
             if not video_info:
                 return None
             
@@ -240,27 +267,20 @@ class InvidiousService:
             endpoint = f"api/v1/channels/{channel_id}"
             
             # 各インスタンスで試行
-            for instance in self.instances:
+            for instance in self.health.rank(self.instances):
+                started = time.monotonic()
                 try:
                     url = f"{instance}{endpoint}"
-                    response = requests.get(url, timeout=10)
+                    response = http_client.get(url, timeout=10)
                     
                     if response.status_code == 200:
                         data = response.json()
-                        return {
-                            'author': data.get('author', ''),
-                            'authorId': data.get('authorId', channel_id),
-                            'description': data.get('description', ''),
-                            'subCount': data.get('subCount', 0),
-                            'totalViews': data.get('totalViews', 0),
-                            'videoCount': data.get('videoCount', 0),
-                            'joined': data.get('joined', 0),
-                            'authorThumbnails': data.get('authorThumbnails', []),
-                            'authorBanners': data.get('authorBanners', []),
-                            'autoGenerated': data.get('autoGenerated', False)
-                        }
+                        self.health.record_success(instance, time.monotonic() - started)
+                        return Channel.from_invidious(data, channel_id)
+                    self.health.record_failure(instance, f"http_{response.status_code}", time.monotonic() - started)
                 except requests.RequestException as e:
                     logging.warning(f"チャンネル情報取得失敗 {instance}: {e}")
+                    self.health.record_failure(instance, classify_error(e), time.monotonic() - started)
                     continue
                     
             logging.error(f"全てのインスタンスでチャンネル情報取得に失敗: {channel_id}")
@@ -273,76 +293,38 @@ class InvidiousService:
     def get_channel_videos(self, channel_id, page=1, sort='newest'):
         """チャンネルの動画一覧を取得"""
         try:
-            endpoint = f"/api/v1/channels/{channel_id}/videos"
+            endpoint = f"channels/{channel_id}/videos"
             params = {
                 'page': page,
                 'sort_by': sort
             }
             data = self._make_request(endpoint, params)
             
-            if data:
-                videos = []
-                for video in data:
-                    videos.append({
-                        'videoId': video.get('videoId', ''),
-                        'title': video.get('title', ''),
-                        'description': video.get('description', ''),
-                        'videoThumbnails': video.get('videoThumbnails', []),
-                        'lengthSeconds': video.get('lengthSeconds', 0),
-                        'viewCount': video.get('viewCount', 0),
-                        'author': video.get('author', ''),
-                        'authorId': video.get('authorId', ''),
-                        'publishedText': video.get('publishedText', ''),
-                        'published': video.get('published', 0)
-                    })
-                return videos
+            if isinstance(data, dict):
+                data = data.get('videos', [])  # 新しいインスタンスは {'videos': [...], 'continuation': ...} を返す
+            return [video for video in map(Video.from_invidious, data or []) if video is not None]
         except Exception as e:
             logging.error(f"チャンネル動画取得エラー: {str(e)}")
             return []
 
-    def get_trending_videos(self, region='JP'):
-        """トレンド動画を取得（件数を増加）"""
+    def get_trending_videos(self, region='JP', category=None):
+        """トレンド動画を Video レコードで取得（category 指定時はそのカテゴリのみ、未指定時は Music / Gaming も追加）"""
         try:
-            # 通常のトレンド動画を取得
             endpoint = "trending"
-            params = {'region': region}
-            data = self._make_request(endpoint, params)
+            if category:
+                data = self._make_request(endpoint, {'region': region, 'type': category}, stale_ok=True)
+                return [video for video in map(Video.from_invidious, (data or [])[:30]) if video is not None]
             
-            all_videos = []
-            if data:
-                for video in data[:30]:  # 30件に増加
-                    all_videos.append({
-                        'videoId': video.get('videoId', ''),
-                        'title': video.get('title', ''),
-                        'description': video.get('description', ''),
-                        'videoThumbnails': video.get('videoThumbnails', []),
-                        'lengthSeconds': video.get('lengthSeconds', 0),
-                        'viewCount': video.get('viewCount', 0),
-                        'author': video.get('author', ''),
-                        'authorId': video.get('authorId', ''),
-                        'publishedText': video.get('publishedText', ''),
-                        'published': video.get('published', 0)
-                    })
+            # 通常のトレンド動画を取得
+            data = self._make_request(endpoint, {'region': region}, stale_ok=True)
+            all_videos = [video for video in map(Video.from_invidious, (data or [])[:30]) if video is not None]
             
             # 追加のカテゴリからも取得
             try:
-                for category in ['Music', 'Gaming']:
-                    cat_params = {'region': region, 'type': category}
-                    cat_data = self._make_request(endpoint, cat_params)
+                for extra_category in ['Music', 'Gaming']:
+                    cat_data = self._make_request(endpoint, {'region': region, 'type': extra_category}, stale_ok=True)
                     if cat_data:
-                        for video in cat_data[:10]:
-                            all_videos.append({
-                                'videoId': video.get('videoId', ''),
-                                'title': video.get('title', ''),
-                                'description': video.get('description', ''),
-                                'videoThumbnails': video.get('videoThumbnails', []),
-                                'lengthSeconds': video.get('lengthSeconds', 0),
-                                'viewCount': video.get('viewCount', 0),
-                                'author': video.get('author', ''),
-                                'authorId': video.get('authorId', ''),
-                                'publishedText': video.get('publishedText', ''),
-                                'published': video.get('published', 0)
-                            })
+                        all_videos.extend(video for video in map(Video.from_invidious, cat_data[:10]) if video is not None)
             except:
                 pass
                 
@@ -410,6 +392,7 @@ class InvidiousService:
                         authorThumbnail = 'https://yt3.ggpht.com/ytc/AOPolaDefault=s88-c-k-c0x00ffffff-no-rj'
                     
                     comments.append({
+                        'commentId': comment.get('commentId'),
                         'author': author_name,
                         'authorId': author_id,
                         'authorThumbnails': author_thumbnails,
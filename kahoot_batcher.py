@@ -0,0 +1,200 @@
+"""
+Kahoot 動画詳細APIのマイクロバッチ集約
+
+KahootVideoBatcher は
+  - 動画IDごとにキャッシュ（どのバッチで取得したかに関係なくIDごとにヒット）
+  - キャッシュにないIDを数ミリ秒の間すべての呼び出し元から集め、APIの1回あたりの上限件数ずつ1回で取得
+  - 取得中のIDを要求した呼び出し元は、そのバッチの結果を待つ（同じIDを2回取得しない）
+を行う。MultiStreamService のインスタンスが複数あってもバッチを共有できるよう、モジュールで1つだけ持つ。
+"""
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from config import (KAHOOT_BATCH_WINDOW, KAHOOT_BATCH_MAX, KAHOOT_BATCH_TIMEOUT, KAHOOT_VIDEO_CACHE_TTL,
+                    KAHOOT_VIDEO_MISSING_TTL)
+from cache_store import get_cache
+from upstream_executor import upstream_executor
+from http_client import http_client
+
+KAHOOT_VIDEOS_API_URL = "https://apis.kahoot.it/media-api/youtube/videos"
+
+# 全呼び出し元で同じ part を使う（IDごとのキャッシュをどの用途からも使えるように）
+KAHOOT_VIDEO_PARTS = 'snippet,contentDetails,statistics'
+
+
+def fetch_kahoot_videos(video_ids: List[str]) -> Optional[Dict]:
+    """Kahoot videos API を1回呼ぶ（失敗時None）"""
+    logging.info(f"Kahoot APIから動画情報を取得中: {len(video_ids)} 件")
+    params = {'id': ','.join(video_ids), 'part': KAHOOT_VIDEO_PARTS}
+    response = http_client.get(KAHOOT_VIDEOS_API_URL, params=params, service='kahoot')
+    if response.status_code != 200:
+        logging.warning(f"Kahoot API エラー: {response.status_code}")
+        return None
+    data = response.json()
+    logging.info(f"✅ Kahoot API成功: {len(data.get('items', []))} 件の動画情報を取得")
+    return data
+
+
+class KahootVideoBatcher:
+    """Kahoot 動画詳細の取得を短い時間窓でまとめる（スレッドセーフ）"""
+
+    def __init__(self, fetch: Callable[[List[str]], Optional[Dict]] = fetch_kahoot_videos,
+                 executor=upstream_executor, window: float = KAHOOT_BATCH_WINDOW, max_batch: int = KAHOOT_BATCH_MAX,
+                 timeout: float = KAHOOT_BATCH_TIMEOUT, cache_ttl: float = KAHOOT_VIDEO_CACHE_TTL,
+                 missing_ttl: float = KAHOOT_VIDEO_MISSING_TTL):
+        self.fetch = fetch
+        self.executor = executor
+        self.window = window  # 最初のIDが来てからバッチを送るまでの待ち時間（秒）
+        self.max_batch = max_batch  # 1回のAPI呼び出しで送るIDの上限（達したら待たずに送る）
+        self.timeout = timeout  # 呼び出し元がバッチの結果を待つ上限（秒）
+        self.missing_ttl = missing_ttl  # APIが返さなかったID（削除・非公開など）を覚えておく秒数
+        self._cache = get_cache('kahoot_video_items', ttl=cache_ttl, max_entries=10000,
+                                max_bytes=32 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._batch = []  # 送信待ちのID
+        self._batch_future = None  # 送信待ちのバッチの結果 {ID: item}
+        self._timer = None
+        self._inflight = {}  # ID -> そのIDを含むバッチの Future（送信待ち・取得中）
+        self.requests = 0
+        self.requested_ids = 0
+        self.cache_hits = 0
+        self.joined = 0
+        self.batches = 0
+        self.batched_ids = 0
+        self.failed_batches = 0
+        self.timeouts = 0
+
+    def get_items(self, video_ids: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """動画IDごとの Kahoot の item を取得（要求順の {ID: item}、取得できなかったIDは含まない）"""
+        order = [video_id for video_id in dict.fromkeys(video_ids) if video_id]
+        if not order:
+            return {}
+        self.requests += 1
+        self.requested_ids += len(order)
+        items = {}
+        missing = []
+        for video_id in order:
+            cached = self._cache.get(video_id)
+            if cached is None:
+                missing.append(video_id)
+            else:
+                self.cache_hits += 1
+                if cached:
+                    items[video_id] = cached
+        if missing:
+            deadline = time.time() + (self.timeout if timeout is None else timeout)
+            for video_id, future in self._enqueue(missing).items():
+                try:
+                    result = future.result(timeout=max(0.0, deadline - time.time()))
+                except concurrent.futures.TimeoutError:
+                    self.timeouts += 1
+                    continue
+                if result.get(video_id):
+                    items[video_id] = result[video_id]
+        return {video_id: items[video_id] for video_id in order if video_id in items}
+
+    def cached_items(self, video_ids: Iterable[str]) -> Dict[str, Dict]:
+        """キャッシュ済みの item だけを返す（取得はしない）"""
+        items = {}
+        for video_id in dict.fromkeys(video_ids):
+            cached = self._cache.get(video_id) if video_id else None
+            if cached:
+                items[video_id] = cached
+        return items
+
+    def prefetch(self, video_ids: Iterable[str]) -> int:
+        """キャッシュにないIDをバッチに追加し、結果を待たずに戻る（追加したID数を返す）"""
+        missing = [video_id for video_id in dict.fromkeys(video_ids)
+                   if video_id and self._cache.get(video_id) is None]
+        if missing:
+            self._enqueue(missing)
+        return len(missing)
+
+    def _enqueue(self, video_ids: List[str]) -> Dict[str, concurrent.futures.Future]:
+        # 取得中のIDは既存のバッチに合流し、それ以外は送信待ちのバッチに追加する
+        waits = {}
+        ready = []
+        with self._lock:
+            for video_id in video_ids:
+                future = self._inflight.get(video_id)
+                if future is not None:
+                    self.joined += 1
+                else:
+                    if self._batch_future is None:
+                        self._batch_future = concurrent.futures.Future()
+                    future = self._batch_future
+                    self._batch.append(video_id)
+                    self._inflight[video_id] = future
+                    if len(self._batch) >= self.max_batch:
+                        ready.append(self._take_batch())
+                waits[video_id] = future
+            if self._batch and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        for batch, future in ready:
+            # 上限に達したバッチは時間窓を待たずに送る（プールが飽和していれば呼び出し元のスレッドで実行）
+            if self.executor.submit(self._run_batch, batch, future) is None:
+                self._run_batch(batch, future)
+        return waits
+
+    def _take_batch(self):
+        batch, future = self._batch, self._batch_future
+        self._batch, self._batch_future = [], None
+        return batch, future
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._batch:
+                return
+            batch, future = self._take_batch()
+        self._run_batch(batch, future)
+
+    def _run_batch(self, video_ids: List[str], future: concurrent.futures.Future):
+        self.batches += 1
+        self.batched_ids += len(video_ids)
+        items = {}
+        try:
+            data = self.fetch(video_ids)
+            if data is None:
+                self.failed_batches += 1  # 失敗はキャッシュしない
+            else:
+                items = {item.get('id'): item for item in data.get('items', []) if isinstance(item, dict)}
+                for video_id in video_ids:
+                    if video_id in items:
+                        self._cache.set(video_id, items[video_id])
+                    else:
+                        self._cache.set(video_id, {}, ttl=self.missing_ttl)
+        except Exception as e:
+            self.failed_batches += 1
+            logging.error(f"Kahoot動画情報取得エラー: {e}")
+        finally:
+            with self._lock:
+                for video_id in video_ids:
+                    if self._inflight.get(video_id) is future:
+                        del self._inflight[video_id]
+            future.set_result(items)
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "window": self.window,
+            "max_batch": self.max_batch,
+            "requests": self.requests,
+            "requested_ids": self.requested_ids,
+            "cache_hits": self.cache_hits,
+            "joined": self.joined,
+            "batches": self.batches,
+            "batched_ids": self.batched_ids,
+            "avg_batch_size": round(self.batched_ids / self.batches, 1) if self.batches else 0,
+            "failed_batches": self.failed_batches,
+            "timeouts": self.timeouts,
+            "cache": self._cache.stats()
+        }
+
+
+# グローバルインスタンス（MultiStreamService の全インスタンスで共有）
+kahoot_video_batcher = KahootVideoBatcher()
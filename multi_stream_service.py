@@ -5,13 +5,26 @@ import json
 import urllib.parse
 import base64
 import urllib3
-import subprocess
+import threading
+import concurrent.futures
 from typing import Dict, List, Optional, Union
 from urllib.parse import quote
+from config import HEDGE_DELAY, HEDGE_FANOUT, REQUEST_BUDGET, HEDGE_EXECUTOR_WORKERS
+from endpoint_health import endpoint_health, classify_error
+from http_client import http_client
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+from node_worker_pool import node_worker_pool, NodeWorkerError, NodeWorkerTimeout
+from video_records import Video, parse_duration, parse_count
+from kahoot_batcher import kahoot_video_batcher
 
 # SSL警告を無効化（証明書の問題があるエンドポイント用）
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# ヘッジリクエスト用の共有スレッドプール（リクエストごとに生成しない）
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_EXECUTOR_WORKERS, thread_name_prefix='hedge')
+
 class MultiStreamService:
     """複数のAPIエンドポイントを使用してビデオストリーム取得の高速化と冗長性を提供"""
     
@@ -42,17 +55,19 @@ class MultiStreamService:
             "https://api.ytsr.org"
         ]
         
-        self.timeout = 4  # 🚀 高速化: 6秒→4秒に短縮
+        self.timeout = http_client.timeout_for('multi_stream')  # config.SERVICE_TIMEOUTS で設定
         self.max_retries = 1  # 高速化のためリトライ回数削減
-        self._cache = {}
-        self._cache_timeout = 600  # 🚀 高速化: キャッシュ時間を10分に延長
-        self._failed_endpoints = {}  # 失敗したエンドポイントの記録
-        self._failure_timeout = 120  # 2分間は失敗したエンドポイントを避ける
+        self.hedge_delay = HEDGE_DELAY  # 先行リクエストの応答待ち時間（超過で次のエンドポイントを追加発射）
+        self.hedge_fanout = HEDGE_FANOUT  # 同時に追加発射するエンドポイント数の上限
+        self.request_budget = REQUEST_BUDGET  # _make_request 1回あたりのレイテンシ予算（秒）
+        self._cache = get_cache('multi_stream', ttl=600, max_entries=1000, max_bytes=64 * 1024 * 1024,
+                                max_stale=3600, coherent=True)  # 10分キャッシュ（上限付きLRU、SWR対象は1時間まで古い値を返す）
+        self._trending_records = None  # (トレンドAPIの取得結果, カテゴリごとの Video レコード)
+        self.health = endpoint_health  # エンドポイント健全性スコア（Invidious系サービスと共有）
         
         # フォールバック機能設定
         self.enable_fallback = True
-        self.fallback_cache = {}  # フォールバック結果のキャッシュ
-        self.fallback_cache_timeout = 600  # 10分間キャッシュ
+        self.fallback_cache = get_cache('stream_fallback', ttl=600, max_entries=300, coherent=True)  # フォールバック結果のキャッシュ（10分）
         
         # 処理優先順位設定（True=直接生成優先、False=外部API優先）
         self.direct_generation_first = False  # デフォルトを外部API優先に変更
@@ -76,132 +91,159 @@ class MultiStreamService:
         self.kahoot_key_cache_timeout = 1800  # 30分キャッシュ
         self.kahoot_key_api_url = "https://apis.kahoot.it/media-api/youtube/key"
         
-        # Kahoot動画情報取得用設定
-        self.kahoot_videos_api_url = "https://apis.kahoot.it/media-api/youtube/videos"
-        self.kahoot_video_cache = {}
-        self.kahoot_video_cache_timeout = 600  # 10分キャッシュ
+        # Kahoot動画情報取得用設定（IDごとのキャッシュ・全インスタンス共有のマイクロバッチ）
+        self.kahoot_video_batcher = kahoot_video_batcher
         
         # Kahoot検索API設定
         self.kahoot_search_api_url = "https://apis.kahoot.it/media-api/youtube/search"
-        self.kahoot_search_cache = {}
-        self.kahoot_search_cache_timeout = 300  # 5分キャッシュ
-        
-        # リクエスト内でのチャンネルキャッシュ（リクエストごとにリセット）
-        self._request_channel_cache = {}
-    
-    def clear_request_cache(self):
-        """リクエスト開始時にリクエストレベルキャッシュをクリア"""
-        self._request_channel_cache = {}
-        logging.debug("リクエストレベルキャッシュをクリアしました")
+        self.kahoot_search_cache = get_cache('kahoot_search', ttl=300, max_entries=500, max_bytes=32 * 1024 * 1024,
+                                             max_stale=1800)  # 5分キャッシュ（30分までは古い値を返しつつ再取得）
     
     def get_cached_channel_info(self, channel_id):
-        """キャッシュされたチャンネル情報を取得、なければInvidiousから取得"""
+        """チャンネルのアイコン（authorThumbnails）をチャンネルヘッダーのキャッシュから取得、なければ取得してキャッシュ"""
         if not channel_id:
             return None
-            
-        # リクエスト内キャッシュをチェック
-        if channel_id in self._request_channel_cache:
-            logging.debug(f"リクエストキャッシュからチャンネル情報を取得: {channel_id}")
-            return self._request_channel_cache[channel_id]
-        
-        # Invidiousから取得（タイムアウトを短く設定）
         try:
-            from invidious_service import InvidiousService
-            invidious = InvidiousService()
-            
-            # タイムアウトを短く設定してブロッキングを防ぐ
-            channel_info = invidious.get_channel_info(channel_id)
-            
-            if channel_info and channel_info.get('authorThumbnails'):
-                # キャッシュに保存
-                self._request_channel_cache[channel_id] = channel_info['authorThumbnails']
-                logging.debug(f"チャンネル情報を取得してキャッシュに保存: {channel_id}")
-                return channel_info['authorThumbnails']
-            else:
-                # 失敗した場合も空の配列をキャッシュして再リクエストを防ぐ
-                self._request_channel_cache[channel_id] = []
+            from channel_service import channel_service  # channel_service がこのモジュールを読み込むため遅延インポート
+            channel_info = channel_service.header(channel_id)
+            if channel_info is None:
                 logging.warning(f"チャンネル情報が取得できませんでした: {channel_id}")
                 return []
+            return channel_info.authorThumbnails
         except Exception as e:
-            # エラーの場合も空の配列をキャッシュ
-            self._request_channel_cache[channel_id] = []
             logging.warning(f"チャンネル情報取得エラー ({channel_id}): {e}")
             return []
+    
+    def _make_request(self, endpoint_path: str, params: Optional[Dict] = None, stale_ok: bool = False) -> Optional[Dict]:
+        """複数のエンドポイントへリクエスト（キャッシュ・single-flight付き）
+
+        stale_ok=True の場合は stale-while-revalidate：期限切れでも max_stale 以内の値を
+        即座に返し、裏で再取得する（トレンド・検索・チャンネルなど多少古くてよいデータ用）。
+        """
+        cache_key = f"{endpoint_path}:{str(params) if params else ''}"
         
-        # Kahoot動画情報取得用設定
-        self.kahoot_videos_api_url = "https://apis.kahoot.it/media-api/youtube/videos"
-        self.kahoot_video_cache = {}
-        self.kahoot_video_cache_timeout = 600  # 10分キャッシュ
+        def fetch():
+            # 同じリクエストが実行中ならその結果を共有（single-flight）
+            return single_flight.do(f"multi_stream:{cache_key}", self._fetch_hedged, endpoint_path, params, cache_key,
+                                    cache=self._cache, cache_key=cache_key)
+        
+        if stale_ok:
+            return self._cache.get_or_revalidate(cache_key, fetch)
         
-        # Kahoot検索用設定
-        self.kahoot_search_api_url = "https://apis.kahoot.it/media-api/youtube/search"
-        self.kahoot_search_cache = {}
-        self.kahoot_search_cache_timeout = 300  # 5分キャッシュ
-    
-    def _make_request(self, endpoint_path: str, params: Optional[Dict] = None) -> Optional[Dict]:
-        """複数のエンドポイントで順番にリクエストを試行"""
         # キャッシュチェック
-        cache_key = f"{endpoint_path}:{str(params) if params else ''}"
-        current_time = time.time()
+        cached_data = self._cache.get(cache_key)
+        if cached_data is not None:
+            logging.info(f"キャッシュからデータ取得: {endpoint_path}")
+            return cached_data
         
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            if current_time - timestamp < self._cache_timeout:
-                logging.info(f"キャッシュからデータ取得: {endpoint_path}")
-                return cached_data
+        return fetch()
+    
+    def _fetch_hedged(self, endpoint_path: str, params: Optional[Dict], cache_key: str) -> Optional[Dict]:
+        """複数のエンドポイントへヘッジ付きでリクエスト（最初の有効な応答を採用）
+
+        最上位のエンドポイントへ先に発射し、hedge_delay秒以内に応答がなければ
+        次のエンドポイントを最大hedge_fanout本まで追加で発射する。
+        失敗した場合は待たずに次の候補へ進み、全体はrequest_budget秒で打ち切る。
+        """
+        # 健全性スコア順（速くて安定したエンドポイントが先頭、除外中のものは含まれない）
+        candidates = self.health.rank(self.api_endpoints)
         
-        # エンドポイントを順番に試行
-        for endpoint in self.api_endpoints:
-            # 失敗したエンドポイントを一時的に避ける
-            if endpoint in self._failed_endpoints:
-                failure_time = self._failed_endpoints[endpoint]
-                if current_time - failure_time < self._failure_timeout:
-                    logging.debug(f"エンドポイントをスキップ（失敗履歴）: {endpoint}")
-                    continue
-                else:
-                    # タイムアウト経過後は再試行
-                    del self._failed_endpoints[endpoint]
-            
-            try:
-                url = f"{endpoint.rstrip('/')}/{endpoint_path}"
-                logging.info(f"APIリクエスト試行: {url}")
+        deadline = time.monotonic() + self.request_budget
+        cancel_event = threading.Event()
+        in_flight = {}
+        next_index = 0
+        
+        def launch_next() -> bool:
+            nonlocal next_index
+            remaining = deadline - time.monotonic()
+            if next_index >= len(candidates) or remaining <= 0:
+                return False
+            endpoint = candidates[next_index]
+            next_index += 1
+            timeout = min(self.timeout, remaining)
+            future = _hedge_executor.submit(self._fetch_from_endpoint, endpoint, endpoint_path,
+                                            params, timeout, cancel_event)
+            in_flight[future] = endpoint
+            return True
+        
+        try:
+            launch_next()
+            while in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning(f"レイテンシ予算({self.request_budget}秒)超過: {endpoint_path}")
+                    break
                 
-                # SSL証明書の問題があるエンドポイントは検証をスキップ
-                verify_ssl = not any(problematic in endpoint for problematic in ['3.net219117116.t-com.ne.jp', '219.117.116.3'])
-                response = requests.get(url, params=params, timeout=self.timeout, verify=verify_ssl)
+                done, _ = concurrent.futures.wait(
+                    in_flight, timeout=min(self.hedge_delay, remaining),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    # データが辞書形式であることを確認
-                    if isinstance(data, dict):
-                        # キャッシュに保存
-                        self._cache[cache_key] = (data, current_time)
+                if not done:
+                    # 先行リクエストが遅い場合は次のエンドポイントをヘッジ発射
+                    if len(in_flight) <= self.hedge_fanout:
+                        launch_next()
+                    continue
+                
+                for future in done:
+                    endpoint = in_flight.pop(future)
+                    data, error = future.result()
+                    if data is not None:
+                        # キャッシュに保存（ストリームURLを含む場合は expire= から有効期限を決める）
+                        self._cache.set(cache_key, data, ttl=stream_cache_ttl(data, self._cache.ttl))
                         logging.info(f"✅ 成功: {endpoint} - {endpoint_path}")
                         return data
-                    else:
-                        logging.warning(f"予期しないデータ形式（文字列）を受信: {endpoint} - {type(data)}")
-                        self._failed_endpoints[endpoint] = current_time
-                        continue
-                else:
-                    logging.warning(f"HTTPエラー {response.status_code}: {endpoint}")
-                    self._failed_endpoints[endpoint] = current_time
-                    
-            except requests.exceptions.Timeout:
-                logging.warning(f"タイムアウト: {endpoint}")
-                self._failed_endpoints[endpoint] = current_time
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"リクエストエラー {endpoint}: {e}")
-                self._failed_endpoints[endpoint] = current_time
-            except json.JSONDecodeError as e:
-                logging.warning(f"JSONパースエラー {endpoint}: {e}")
-                self._failed_endpoints[endpoint] = current_time
-            except Exception as e:
-                logging.error(f"予期しないエラー {endpoint}: {e}")
-                self._failed_endpoints[endpoint] = current_time
+                    logging.warning(f"{error}: {endpoint}")
+                    # 失敗した分は待たずに次の候補へ
+                    launch_next()
+        finally:
+            # 残りのリクエストはキャンセル（実行中のものは結果を破棄）
+            cancel_event.set()
+            for future in in_flight:
+                future.cancel()
         
         logging.error(f"すべてのエンドポイントで失敗: {endpoint_path}")
         return None
     
+    def _fetch_from_endpoint(self, endpoint: str, endpoint_path: str, params: Optional[Dict],
+                             timeout: float, cancel_event: threading.Event):
+        """単一エンドポイントへのリクエスト（ヘッジ用ワーカー）。(data, error)を返す
+
+        結果はキャンセル後に返ってきたものも含めて健全性スコアに記録する。
+        """
+        if cancel_event.is_set():
+            return None, "キャンセル済み"
+        started = time.monotonic()
+        try:
+            url = f"{endpoint.rstrip('/')}/{endpoint_path}"
+            logging.info(f"APIリクエスト試行: {url}")
+            
+            # SSL証明書の問題があるエンドポイントは検証をスキップ
+            verify_ssl = not any(problematic in endpoint for problematic in ['3.net219117116.t-com.ne.jp', '219.117.116.3'])
+            response = http_client.get(url, params=params, timeout=timeout, verify=verify_ssl)
+            latency = time.monotonic() - started
+            
+            if response.status_code == 200:
+                data = response.json()
+                # データが辞書形式であることを確認
+                if isinstance(data, dict):
+                    self.health.record_success(endpoint, latency)
+                    return data, None
+                self.health.record_failure(endpoint, 'invalid_payload', latency)
+                return None, f"予期しないデータ形式（文字列）を受信 {type(data)}"
+            self.health.record_failure(endpoint, f"http_{response.status_code}", latency)
+            return None, f"HTTPエラー {response.status_code}"
+                
+        except Exception as e:
+            self.health.record_failure(endpoint, classify_error(e), time.monotonic() - started)
+            if isinstance(e, requests.exceptions.Timeout):
+                return None, "タイムアウト"
+            if isinstance(e, requests.exceptions.RequestException):
+                return None, f"リクエストエラー {e}"
+            if isinstance(e, json.JSONDecodeError):
+                return None, f"JSONパースエラー {e}"
+            return None, f"予期しないエラー {e}"
+    
     def get_video_stream_info(self, video_id: str) -> Optional[Dict]:
         """ビデオストリーム情報を取得（type2エンドポイント + 高速直接生成優先）"""
         try:
@@ -291,17 +333,44 @@ class MultiStreamService:
         """トレンド動画を取得"""
         try:
             endpoint_path = "api/trend"
-            return self._make_request(endpoint_path)
+            return self._make_request(endpoint_path, stale_ok=True)
         except Exception as e:
             logging.error(f"トレンド動画取得エラー: {e}")
             return None
-    
+
+    def get_trending_records(self) -> Dict[str, List[Video]]:
+        """トレンド動画をカテゴリ（trending / music / gaming など）ごとの Video レコードで取得
+
+        キャッシュから同じ取得結果が返る間は、正規化済みのレコードを再利用する。
+        """
+        trend_data = self.get_trending_videos()
+        if not trend_data:
+            return {}
+        cached = self._trending_records
+        if cached is not None and cached[0] is trend_data:
+            return cached[1]
+
+        categories = trend_data if isinstance(trend_data, dict) else {'trending': trend_data}
+        records = {}
+        for category, videos in categories.items():
+            if not isinstance(videos, list):
+                continue
+            seen_ids = set()
+            records[category] = []
+            for video_data in videos:
+                video = Video.from_siawaseok(video_data) if isinstance(video_data, dict) else None
+                if video is not None and video.videoId not in seen_ids:
+                    seen_ids.add(video.videoId)
+                    records[category].append(video)
+        self._trending_records = (trend_data, records)
+        return records
+
     def search_videos(self, query: str, page: int = 1) -> Optional[Dict]:
         """動画検索"""
         try:
             endpoint_path = "api/search"
             params = {"q": query, "page": page}
-            return self._make_request(endpoint_path, params)
+            return self._make_request(endpoint_path, params, stale_ok=True)
         except Exception as e:
             logging.error(f"動画検索エラー ({query}): {e}")
             return None
@@ -310,7 +379,7 @@ class MultiStreamService:
         """チャンネル情報を取得"""
         try:
             endpoint_path = f"api/channel/{channel_id}"
-            return self._make_request(endpoint_path)
+            return self._make_request(endpoint_path, stale_ok=True)
         except Exception as e:
             logging.error(f"チャンネル情報取得エラー ({channel_id}): {e}")
             return None
@@ -329,6 +398,20 @@ class MultiStreamService:
             logging.error(f"埋め込みURL生成エラー ({video_id}): {e}")
             return self.youtube_embed_templates[1].format(video_id=video_id)  # フォールバック
     
+    def get_local_youtube_education_url(self, video_id: str) -> str:
+        """YouTube Education埋め込みURLをネットワークアクセスなしで生成（段階的表示の初期HTML用）
+
+        Kahootキーがキャッシュ済みならKahoot方式、なければキャッシュ済み（または既定）の
+        ベースURLと固定のembed_configで生成する。
+        """
+        current_time = time.time()
+        cached_key = self.kahoot_key_cache.get("kahoot_key")
+        if cached_key and current_time - cached_key[1] < self.kahoot_key_cache_timeout:
+            return self._generate_youtube_education_url_with_kahoot(video_id)
+        cached_base = self.edu_base_url_cache.get("edu_base_url")
+        base_url = cached_base[0] if cached_base else self.default_edu_base_url
+        return self._generate_youtube_education_url(video_id, dynamic_base_url=base_url)
+    
     def get_youtube_thumbnail_url(self, video_id: str, quality: str = "maxresdefault") -> str:
         """YouTube サムネイル画像の直接URLを生成（API不要）"""
         try:
@@ -350,35 +433,26 @@ class MultiStreamService:
         try:
             # 軽量なHEADリクエストでYouTubeサムネイルの存在確認
             thumbnail_url = self.get_youtube_thumbnail_url(video_id, "default")
-            response = requests.head(thumbnail_url, timeout=3)
+            response = http_client.head(thumbnail_url, timeout=3)
             return response.status_code == 200
         except Exception as e:
             logging.debug(f"直接利用可能性チェックエラー ({video_id}): {e}")
             return True  # エラー時はtrueとして扱う（フォールバック）
     
     def get_endpoint_status(self) -> Dict[str, Dict]:
-        """各エンドポイントの状態を取得"""
-        status = {}
-        current_time = time.time()
-        
-        for endpoint in self.api_endpoints:
-            if endpoint in self._failed_endpoints:
-                failure_time = self._failed_endpoints[endpoint]
-                time_since_failure = current_time - failure_time
-                status[endpoint] = {
-                    "status": "failed" if time_since_failure < self._failure_timeout else "recovered",
-                    "last_failure": failure_time,
-                    "time_since_failure": time_since_failure
-                }
-            else:
-                status[endpoint] = {
-                    "status": "active",
-                    "last_failure": None,
-                    "time_since_failure": 0
-                }
-        
+        """各エンドポイントの状態を取得（健全性スコア・EWMAレイテンシ・成功率・直近エラー・現在の順位）"""
+        status = self.health.get_status(self.api_endpoints)
+        for rank, endpoint in enumerate(self.health.rank(self.api_endpoints, claim_probes=False)):
+            status[endpoint]["rank"] = rank + 1
         return status
     
+    def invalidate_stream_cache(self, video_id: str):
+        """動画のストリームURLキャッシュを破棄（プレーヤーで403等が発生した場合）"""
+        for endpoint_path in (f"api/stream/{video_id}/type2", f"api/stream/{video_id}"):
+            self._cache.delete(f"{endpoint_path}:")
+        for stream_type in ("advanced", "basic"):
+            self.fallback_cache.delete(f"fallback_{video_id}_{stream_type}")
+    
     def clear_cache(self):
         """キャッシュをクリア"""
         self._cache.clear()
@@ -386,7 +460,7 @@ class MultiStreamService:
     
     def reset_failed_endpoints(self):
         """失敗したエンドポイントの記録をリセット"""
-        self._failed_endpoints.clear()
+        self.health.reset(self.api_endpoints)
         logging.info("失敗エンドポイント記録をリセットしました")
     
     def _get_dynamic_edu_base_url(self) -> str:
@@ -497,7 +571,7 @@ class MultiStreamService:
         
         try:
             logging.info("Kahoot APIからYouTube Educationキーを取得中...")
-            response = requests.get(self.kahoot_key_api_url, timeout=10)
+            response = http_client.get(self.kahoot_key_api_url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -548,11 +622,12 @@ class MultiStreamService:
             # フォールバック: 従来の方式を使用
             return self._generate_youtube_education_url(video_id)
 
-    def _generate_youtube_education_url(self, video_id: str) -> str:
+    def _generate_youtube_education_url(self, video_id: str, dynamic_base_url: Optional[str] = None) -> str:
         """完全なYouTube Education埋め込みURL生成（動的ベースURL使用）"""
         try:
-            # 動的にベースURLを取得
-            dynamic_base_url = self._get_dynamic_edu_base_url()
+            # 動的にベースURLを取得（指定された場合はそれを使用）
+            if not dynamic_base_url:
+                dynamic_base_url = self._get_dynamic_edu_base_url()
             base_url = f"{dynamic_base_url}/{video_id}"
             
             # 固定のembed_config（提供されたものと同じ）
@@ -635,14 +710,23 @@ class MultiStreamService:
         try:
             # キャッシュチェック
             cache_key = f"fallback_{video_id}_{stream_type}"
-            current_time = time.time()
             
-            if cache_key in self.fallback_cache:
-                cached_data, timestamp = self.fallback_cache[cache_key]
-                if current_time - timestamp < self.fallback_cache_timeout:
-                    logging.info(f"フォールバックキャッシュから取得: {video_id}")
-                    return cached_data
+            cached_data = self.fallback_cache.get(cache_key)
+            if cached_data is not None:
+                logging.info(f"フォールバックキャッシュから取得: {video_id}")
+                return cached_data
+            
+            # 同じ動画のフォールバック処理が実行中ならその結果を共有（single-flight）
+            return single_flight.do(f"stream_fallback:{cache_key}", self._run_stream_fallback, video_id, stream_type,
+                                    cache_key, cache=self.fallback_cache, cache_key=cache_key)
             
+        except Exception as e:
+            logging.error(f"フォールバックエラー ({video_id}): {e}")
+            return None
+    
+    def _run_stream_fallback(self, video_id: str, stream_type: str, cache_key: str) -> Optional[Dict]:
+        """フォールバック処理の本体（キャッシュミス時）"""
+        try:
             logging.info(f"フォールバック処理開始: {video_id} - {stream_type}")
             
             # 1. ytdl-core (Node.js)で試行
@@ -650,7 +734,7 @@ class MultiStreamService:
             if ytdl_result:
                 logging.info(f"フォールバック ytdl-core 成功: {video_id}")
                 # キャッシュに保存
-                self.fallback_cache[cache_key] = (ytdl_result, current_time)
+                self.fallback_cache.set(cache_key, ytdl_result, ttl=stream_cache_ttl(ytdl_result, self.fallback_cache.ttl))
                 return ytdl_result
             
             # 2. yt-dlp (Python)で試行
@@ -658,7 +742,7 @@ class MultiStreamService:
             if ytdlp_result:
                 logging.info(f"フォールバック yt-dlp 成功: {video_id}")
                 # キャッシュに保存
-                self.fallback_cache[cache_key] = (ytdlp_result, current_time)
+                self.fallback_cache.set(cache_key, ytdlp_result, ttl=stream_cache_ttl(ytdlp_result, self.fallback_cache.ttl))
                 return ytdlp_result
             
             logging.error(f"フォールバック完全失敗: {video_id}")
@@ -671,21 +755,16 @@ class MultiStreamService:
     def _try_ytdl_core_fallback(self, video_id: str) -> Optional[Dict]:
         """フォールバック: ytdl-core (Node.js)でストリームURL生成"""
         try:
-            # Node.jsサービスを呼び出し
-            result = subprocess.run([
-                'node', 'turbo_video_service.js', 'stream', video_id, '720p'
-            ], capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                if data.get('success'):
-                    # siawaseok APIのフォーマットに合わせて変換
-                    return self._convert_ytdl_to_siawaseok_format(data, video_id)
-            else:
-                logging.warning(f"ytdl-coreフォールバックエラー: {result.stderr}")
+            # 常駐Node.jsワーカーを呼び出し
+            data = node_worker_pool.call('stream', [video_id, '720p'], timeout=15)
+            if data and data.get('success'):
+                # siawaseok APIのフォーマットに合わせて変換
+                return self._convert_ytdl_to_siawaseok_format(data, video_id)
                 
-        except subprocess.TimeoutExpired:
+        except NodeWorkerTimeout:
             logging.warning(f"ytdl-coreフォールバックタイムアウト: {video_id}")
+        except NodeWorkerError as e:
+            logging.warning(f"ytdl-coreフォールバックエラー: {e}")
         except Exception as e:
             logging.warning(f"ytdl-coreフォールバック例外: {e}")
             
@@ -849,53 +928,23 @@ class MultiStreamService:
         logging.info("フォールバックキャッシュをクリアしました")
     
     def get_kahoot_video_info(self, video_ids: Union[str, List[str]]) -> Optional[Dict]:
-        """Kahoot APIから動画情報を取得"""
+        """Kahoot APIから動画情報を取得（IDごとのキャッシュ、同時に要求されたIDは1回の呼び出しにまとめる）"""
         try:
             # 文字列の場合はリストに変換
             if isinstance(video_ids, str):
                 video_ids = [video_ids]
             
-            # カンマ区切りの文字列を作成
-            video_ids_str = ','.join(video_ids)
-            
-            # キャッシュチェック
-            cache_key = f"kahoot_videos_{video_ids_str}"
-            current_time = time.time()
-            
-            if cache_key in self.kahoot_video_cache:
-                cached_data, timestamp = self.kahoot_video_cache[cache_key]
-                if current_time - timestamp < self.kahoot_video_cache_timeout:
-                    logging.info(f"Kahoot動画情報キャッシュから取得: {len(video_ids)} 件")
-                    return cached_data
-            
-            # Kahoot APIにリクエスト
-            logging.info(f"Kahoot APIから動画情報を取得中: {len(video_ids)} 件")
-            
-            params = {
-                'id': video_ids_str,
-                'part': 'snippet,contentDetails'
-            }
-            
-            response = requests.get(self.kahoot_videos_api_url, params=params, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # キャッシュに保存
-                self.kahoot_video_cache[cache_key] = (data, current_time)
-                
-                logging.info(f"✅ Kahoot API成功: {len(data.get('items', []))} 件の動画情報を取得")
-                return data
-            else:
-                logging.warning(f"Kahoot API エラー: {response.status_code}")
+            items = self.kahoot_video_batcher.get_items(video_ids)
+            if not items:
                 return None
+            return {'items': list(items.values())}
                 
         except Exception as e:
             logging.error(f"Kahoot動画情報取得エラー: {e}")
             return None
     
-    def get_video_info_from_kahoot(self, video_id: str) -> Optional[Dict]:
-        """単一の動画情報をKahoot APIから取得し、既存フォーマットに変換"""
+    def get_video_info_from_kahoot(self, video_id: str) -> Optional[Video]:
+        """単一の動画情報をKahoot APIから取得し、Video レコードに変換"""
         try:
             kahoot_data = self.get_kahoot_video_info(video_id)
             if not kahoot_data or 'items' not in kahoot_data:
@@ -905,72 +954,10 @@ class MultiStreamService:
             if not items:
                 return None
             
-            video_data = items[0]  # 最初の動画を取得
-            snippet = video_data.get('snippet', {})
-            content_details = video_data.get('contentDetails', {})
-            
-            # ISO 8601 duration (PT4M13S) を秒数に変換
-            duration_str = content_details.get('duration', 'PT0S')
-            duration_seconds = self._parse_iso_duration(duration_str)
-            
-            # チャンネルのサムネイル（投稿者アイコン）を取得
-            channel_thumbnails = []
-            channel_id = snippet.get('channelId', '')
-            
-            # 一時的にチャンネル情報取得を無効化（パフォーマンス向上）
-            # if channel_id:
-            #     # キャッシュされたチャンネル情報を取得
-            #     channel_thumbnails = self.get_cached_channel_info(channel_id)
-            #     if channel_thumbnails:
-            #         logging.debug(f"✅ チャンネルアイコンを取得: {channel_id}")
-            
-            # フォールバック用のデフォルトアイコン（安全な静的画像）
-            if not channel_thumbnails:
-                channel_thumbnails = [
-                    {
-                        'url': '/static/logo.avif',  # 既存のローカル画像を使用
-                        'width': 88,
-                        'height': 88
-                    },
-                    {
-                        'url': '/static/logo.avif',
-                        'width': 176,
-                        'height': 176
-                    }
-                ]
-
-            # 既存のフォーマットに変換
-            formatted_data = {
-                'videoId': video_id,
-                'title': snippet.get('title', ''),
-                'description': snippet.get('description', ''),
-                'author': snippet.get('channelTitle', ''),
-                'authorId': snippet.get('channelId', ''),
-                'lengthSeconds': duration_seconds,
-                'publishedText': snippet.get('publishedAt', ''),
-                'published': snippet.get('publishedAt', ''),
-                'viewCount': 0,  # Kahoot APIからは取得できない
-                'videoThumbnails': [
-                    {
-                        'url': snippet.get('thumbnails', {}).get('maxresdefault', {}).get('url') or
-                               snippet.get('thumbnails', {}).get('high', {}).get('url') or
-                               snippet.get('thumbnails', {}).get('medium', {}).get('url') or
-                               snippet.get('thumbnails', {}).get('default', {}).get('url', ''),
-                        'quality': 'maxresdefault'
-                    }
-                ],
-                # 投稿者アイコン（チャンネルサムネイル）を追加
-                'authorThumbnails': channel_thumbnails,
-                'authorThumbnail': channel_thumbnails[0]['url'] if channel_thumbnails else '',
-                # Kahoot API特有の詳細情報も追加
-                'categoryId': snippet.get('categoryId', ''),
-                'defaultLanguage': snippet.get('defaultLanguage', ''),
-                'tags': snippet.get('tags', []),
-                'liveBroadcastContent': snippet.get('liveBroadcastContent', 'none'),
-                'dimension': content_details.get('dimension', ''),
-                'definition': content_details.get('definition', ''),
-                'caption': content_details.get('caption', 'false')
-            }
+            # 最初の動画を共通レコードに変換（投稿者アイコンは既定画像、チャンネル情報の取得は行わない）
+            formatted_data = Video.from_kahoot(items[0])
+            if formatted_data is None:
+                return None
             
             logging.info(f"✅ Kahoot動画情報変換完了: {video_id}")
             return formatted_data
@@ -979,7 +966,7 @@ class MultiStreamService:
             logging.error(f"Kahoot動画情報変換エラー ({video_id}): {e}")
             return None
     
-    def get_related_videos_from_kahoot(self, base_video_id: str, related_video_ids: List[str]) -> List[Dict]:
+    def get_related_videos_from_kahoot(self, base_video_id: str, related_video_ids: List[str]) -> List[Video]:
         """関連動画をKahoot APIから取得"""
         try:
             if not related_video_ids:
@@ -995,66 +982,7 @@ class MultiStreamService:
             if not kahoot_data or 'items' not in kahoot_data:
                 return []
             
-            related_videos = []
-            for video_data in kahoot_data['items']:
-                snippet = video_data.get('snippet', {})
-                content_details = video_data.get('contentDetails', {})
-                video_id = video_data.get('id', '')
-                
-                # ISO 8601 duration を秒数に変換
-                duration_str = content_details.get('duration', 'PT0S')
-                duration_seconds = self._parse_iso_duration(duration_str)
-                
-                # チャンネルのサムネイル（投稿者アイコン）を取得
-                channel_thumbnails = []
-                channel_id = snippet.get('channelId', '')
-                
-                # 一時的にチャンネル情報取得を無効化（パフォーマンス向上）
-                # if channel_id:
-                #     # キャッシュされたチャンネル情報を取得
-                #     channel_thumbnails = self.get_cached_channel_info(channel_id)
-                #     if channel_thumbnails:
-                #         logging.debug(f"✅ 関連動画でチャンネルアイコンを取得: {channel_id}")
-                
-                # フォールバック用のデフォルトアイコン（安全な静的画像）
-                if not channel_thumbnails:
-                    channel_thumbnails = [
-                        {
-                            'url': '/static/logo.avif',
-                            'width': 88,
-                            'height': 88
-                        },
-                        {
-                            'url': '/static/logo.avif',
-                            'width': 176,
-                            'height': 176
-                        }
-                    ]
-
-                related_video = {
-                    'videoId': video_id,
-                    'title': snippet.get('title', ''),
-                    'description': snippet.get('description', ''),
-                    'author': snippet.get('channelTitle', ''),
-                    'authorId': snippet.get('channelId', ''),
-                    'lengthSeconds': duration_seconds,
-                    'publishedText': snippet.get('publishedAt', ''),
-                    'published': snippet.get('publishedAt', ''),
-                    'viewCount': 0,  # Kahoot APIからは取得できない
-                    'videoThumbnails': [
-                        {
-                            'url': snippet.get('thumbnails', {}).get('maxresdefault', {}).get('url') or
-                                   snippet.get('thumbnails', {}).get('high', {}).get('url') or
-                                   snippet.get('thumbnails', {}).get('medium', {}).get('url') or
-                                   snippet.get('thumbnails', {}).get('default', {}).get('url', ''),
-                            'quality': 'maxresdefault'
-                        }
-                    ],
-                    # 投稿者アイコン（チャンネルサムネイル）を追加
-                    'authorThumbnails': channel_thumbnails,
-                    'authorThumbnail': channel_thumbnails[0]['url'] if channel_thumbnails else ''
-                }
-                related_videos.append(related_video)
+            related_videos = [video for video in map(Video.from_kahoot, kahoot_data['items']) if video is not None]
             
             logging.info(f"✅ Kahoot関連動画取得完了: {len(related_videos)} 件")
             return related_videos
@@ -1063,19 +991,25 @@ class MultiStreamService:
             logging.error(f"Kahoot関連動画取得エラー: {e}")
             return []
     
-    def search_videos_with_kahoot(self, query: str, max_results: int = 50, page: int = 1) -> Optional[List[Dict]]:
-        """Kahoot APIで動画検索"""
+    def search_videos_with_kahoot(self, query: str, max_results: int = 50, page: int = 1) -> Optional[List[Video]]:
+        """Kahoot APIで動画検索（stale-while-revalidate：期限切れ後も一定時間は古い結果を即座に返す）"""
         try:
-            # キャッシュチェック
             cache_key = f"search_{query}_{max_results}_{page}"
-            current_time = time.time()
             
-            if cache_key in self.kahoot_search_cache:
-                cached_data, timestamp = self.kahoot_search_cache[cache_key]
-                if current_time - timestamp < self.kahoot_search_cache_timeout:
-                    logging.info(f"Kahoot検索キャッシュから取得: '{query}' - {len(cached_data)} 件")
-                    return cached_data
+            def fetch():
+                # 同じ検索が実行中ならその結果を共有（single-flight）
+                return single_flight.do(f"kahoot_search:{cache_key}", self._fetch_kahoot_search, query, max_results,
+                                        page, cache_key, cache=self.kahoot_search_cache, cache_key=cache_key)
             
+            return self.kahoot_search_cache.get_or_revalidate(cache_key, fetch)
+            
+        except Exception as e:
+            logging.error(f"Kahoot動画検索エラー: {e}")
+            return None
+    
+    def _fetch_kahoot_search(self, query: str, max_results: int, page: int, cache_key: str) -> Optional[List[Video]]:
+        """Kahoot検索APIへの実際のリクエスト（キャッシュミス・再検証時）"""
+        try:
             # Kahoot APIで検索（ページネーション対応）
             start_index = (page - 1) * max_results + 1 if page > 1 else 1
             logging.info(f"Kahoot APIで動画検索: '{query}' - 最大{max_results}件 (ページ{page}: {start_index}から)")
@@ -1091,97 +1025,28 @@ class MultiStreamService:
                 'videoEmbeddable': 'true'
             }
             
-            response = requests.get(self.kahoot_search_api_url, params=params, timeout=20)
+            response = http_client.get(self.kahoot_search_api_url, params=params, timeout=20)
             
             if response.status_code == 200:
                 data = response.json()
                 
                 if 'items' in data:
-                    search_results = []
-                    video_ids = []
-                    
-                    # 初期データ収集
-                    for item in data['items']:
-                        snippet = item.get('snippet', {})
-                        video_id = item.get('id', {}).get('videoId', '') if isinstance(item.get('id'), dict) else item.get('id', '')
-                        
-                        if video_id:
-                            video_ids.append(video_id)
-                            video_result = {
-                                'videoId': video_id,
-                                'title': snippet.get('title', ''),
-                                'description': snippet.get('description', ''),
-                                'author': snippet.get('channelTitle', ''),
-                                'authorId': snippet.get('channelId', ''),
-                                'lengthSeconds': 0,  # 後で詳細APIから取得
-                                'viewCount': 0,  # 後で詳細APIから取得
-                                'publishedText': snippet.get('publishedAt', ''),
-                                'published': snippet.get('publishedAt', ''),
-                                'videoThumbnails': [
-                                    {
-                                        'url': snippet.get('thumbnails', {}).get('maxresdefault', {}).get('url') or
-                                               snippet.get('thumbnails', {}).get('high', {}).get('url') or
-                                               snippet.get('thumbnails', {}).get('medium', {}).get('url') or
-                                               snippet.get('thumbnails', {}).get('default', {}).get('url', ''),
-                                        'quality': 'maxresdefault'
-                                    }
-                                ],
-                                # Kahoot API特有の情報
-                                'categoryId': snippet.get('categoryId', ''),
-                                'liveBroadcastContent': snippet.get('liveBroadcastContent', 'none'),
-                                'tags': snippet.get('tags', [])
-                            }
-                            search_results.append(video_result)
+                    # 検索結果を共通レコードに変換（再生時間・視聴回数は後で詳細APIから補完）
+                    search_results = [video for video in map(Video.from_kahoot, data['items']) if video is not None]
+                    videos_by_id = {video.videoId: video for video in search_results}
                     
-                    # Kahoot APIから詳細情報を取得して視聴回数と時間長を補完
-                    if video_ids and len(video_ids) <= 50:  # API制限を考慮
-                        try:
-                            # 複数の動画IDを一括でKahoot APIから取得
-                            video_ids_str = ','.join(video_ids)
-                            params_detail = {
-                                'id': video_ids_str,
-                                'part': 'snippet,contentDetails,statistics'
-                            }
-                            
-                            response_detail = requests.get(self.kahoot_videos_api_url, params=params_detail, timeout=15)
-                            
-                            if response_detail.status_code == 200:
-                                detail_data = response_detail.json()
-                                
-                                if 'items' in detail_data:
-                                    # 詳細情報でsearch_resultsを更新
-                                    for item in detail_data['items']:
-                                        video_id = item.get('id', '')
-                                        statistics = item.get('statistics', {})
-                                        content_details = item.get('contentDetails', {})
-                                        
-                                        # 該当する検索結果を更新
-                                        for i, video in enumerate(search_results):
-                                            if video['videoId'] == video_id:
-                                                # 視聴回数を取得
-                                                view_count = statistics.get('viewCount', 0)
-                                                try:
-                                                    view_count = int(view_count) if view_count else 0
-                                                except (ValueError, TypeError):
-                                                    view_count = 0
-                                                
-                                                # 動画時間を取得・変換
-                                                duration = content_details.get('duration', '')
-                                                length_seconds = self._parse_iso_duration(duration)
-                                                
-                                                search_results[i].update({
-                                                    'lengthSeconds': length_seconds,
-                                                    'viewCount': view_count
-                                                })
-                                                break
-                                    
-                                    logging.info(f"✅ {len(detail_data['items'])} 件の動画詳細情報を補完")
-                                
-                        except Exception as e:
-                            logging.warning(f"Kahoot詳細情報取得エラー: {e}")
+                    # Kahoot APIから詳細情報を取得して視聴回数と時間長を補完（IDごとにキャッシュされ /watch とも共有）
+                    if videos_by_id:
+                        details = self.kahoot_video_batcher.get_items(videos_by_id)
+                        for video_id, item in details.items():
+                            video = videos_by_id[video_id]
+                            video.lengthSeconds = parse_duration((item.get('contentDetails') or {}).get('duration'))
+                            video.viewCount = parse_count((item.get('statistics') or {}).get('viewCount'))
+                        if details:
+                            logging.info(f"✅ {len(details)} 件の動画詳細情報を補完")
                     
                     # キャッシュに保存
-                    self.kahoot_search_cache[cache_key] = (search_results, current_time)
+                    self.kahoot_search_cache.set(cache_key, search_results)
                     
                     logging.info(f"✅ Kahoot検索成功: '{query}' - {len(search_results)} 件の動画を取得")
                     return search_results
@@ -1196,28 +1061,6 @@ class MultiStreamService:
             logging.error(f"Kahoot動画検索エラー: {e}")
             return None
     
-    def _parse_iso_duration(self, duration_str: str) -> int:
-        """ISO 8601 duration (PT4M13S) を秒数に変換"""
-        try:
-            if not duration_str or duration_str == 'PT0S':
-                return 0
-            
-            import re
-            # PT4M13S のような形式をパース
-            pattern = r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?'
-            match = re.match(pattern, duration_str)
-            
-            if match:
-                hours = int(match.group(1) or 0)
-                minutes = int(match.group(2) or 0)
-                seconds = int(match.group(3) or 0)
-                return hours * 3600 + minutes * 60 + seconds
-            
-            return 0
-        except Exception as e:
-            logging.warning(f"Duration解析エラー: {duration_str}, エラー: {e}")
-            return 0
-    
     def get_fallback_status(self) -> Dict:
         """フォールバック機能の状態を取得"""
         return {
@@ -1225,7 +1068,7 @@ class MultiStreamService:
             'direct_generation_first': self.direct_generation_first,
             'processing_mode': 'direct_first' if self.direct_generation_first else 'api_first',
             'cache_size': len(self.fallback_cache),
-            'cache_timeout': self.fallback_cache_timeout,
+            'cache_timeout': self.fallback_cache.ttl,
             'available_methods': ['ytdl-core', 'yt-dlp']
         }
     
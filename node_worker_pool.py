@@ -0,0 +1,354 @@
+"""
+Node.js常駐ワーカープール
+
+NodeWorkerPool は turbo_video_service.js を worker モードで常駐させ、標準入出力上の
+1行1件のJSON RPCでリクエストを送る。
+
+  - 1プロセスで複数リクエストを同時に処理（idで応答を対応付け）
+  - 同時処理数が最も少ないワーカーへ振り分け、上限に達したら即座にエラー
+  - プロセス終了・連続タイムアウト・ping失敗時は自動で再起動（起動失敗・起動直後の終了が続く場合は指数バックオフ）
+  - gunicornのfork後は子プロセス側で新しくワーカーを起動
+"""
+import atexit
+import concurrent.futures
+import itertools
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+from config import (NODE_WORKER_SCRIPT, NODE_WORKER_POOL_SIZE, NODE_WORKER_MAX_INFLIGHT, NODE_WORKER_HEALTH_INTERVAL,
+                    NODE_WORKER_RESTART_BACKOFF, NODE_WORKER_RESTART_BACKOFF_MAX)
+
+
+class NodeWorkerError(Exception):
+    """Nodeワーカーでの処理失敗（ワーカー側のエラー応答・プロセス異常終了など）"""
+
+
+class NodeWorkerTimeout(NodeWorkerError):
+    """Nodeワーカーの応答待ちタイムアウト"""
+
+
+class _NodeWorker:
+    """1つの常駐Nodeプロセスと、その応答待ちリクエストを管理"""
+
+    def __init__(self, index: int, script: str):
+        self.index = index
+        self.script = script
+        self.pending = {}  # request id -> Future
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.alive = True
+        self.started_at = time.time()
+        self.requests = 0
+        self.consecutive_timeouts = 0
+        try:
+            self.proc = subprocess.Popen(
+                ['node', script, 'worker'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                bufsize=1
+            )
+        except OSError as e:
+            # node が見つからない・起動できない場合も呼び出し側では NodeWorkerError として扱う
+            raise NodeWorkerError(f"Nodeワーカー #{index} を起動できません: {e}") from e
+        threading.Thread(target=self._read_stdout, name=f'node-worker-{index}-out', daemon=True).start()
+        threading.Thread(target=self._read_stderr, name=f'node-worker-{index}-err', daemon=True).start()
+        logging.info(f"🟢 Nodeワーカー起動: #{index} (pid={self.proc.pid})")
+
+    @property
+    def inflight(self) -> int:
+        return len(self.pending)
+
+    def is_running(self) -> bool:
+        return self.alive and self.proc.poll() is None
+
+    def send(self, request_id: int, method: str, params: List) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        line = json.dumps({'id': request_id, 'method': method, 'params': params}, ensure_ascii=False) + '\n'
+        with self.lock:
+            if not self.alive:
+                raise NodeWorkerError(f"Nodeワーカー #{self.index} は停止しています")
+            self.pending[request_id] = future
+            self.requests += 1
+        try:
+            with self.write_lock:
+                self.proc.stdin.write(line)
+                self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.discard(request_id)
+            self._fail_all(f"Nodeワーカー #{self.index} への書き込みに失敗: {e}")
+            raise NodeWorkerError(str(e))
+        return future
+
+    def discard(self, request_id: int):
+        with self.lock:
+            self.pending.pop(request_id, None)
+
+    def _read_stdout(self):
+        for line in self.proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logging.debug(f"Nodeワーカー #{self.index} の不正な応答行: {line[:200]}")
+                continue
+            with self.lock:
+                future = self.pending.pop(message.get('id'), None)
+            if future is None or future.done():
+                continue
+            if 'error' in message:
+                future.set_exception(NodeWorkerError(message['error']))
+            else:
+                future.set_result(message.get('result'))
+        try:
+            code = self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            code = None
+        self._fail_all(f"Nodeワーカー #{self.index} が終了しました (code={code})")
+
+    def _read_stderr(self):
+        # Node側のログ（console.log / console.error）はデバッグログへ転送
+        for line in self.proc.stderr:
+            line = line.rstrip()
+            if line:
+                logging.debug(f"[node#{self.index}] {line[:500]}")
+
+    def _fail_all(self, reason: str, log: bool = True):
+        with self.lock:
+            was_alive = self.alive
+            self.alive = False
+            pending = list(self.pending.values())
+            self.pending.clear()
+        if was_alive and log:
+            logging.warning(f"⚠️ {reason}")
+        for future in pending:
+            if not future.done():
+                future.set_exception(NodeWorkerError(reason))
+
+    def stop(self):
+        self._fail_all(f"Nodeワーカー #{self.index} を停止", log=False)
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class NodeWorkerPool:
+    """常駐Nodeワーカーへリクエストを振り分けるプール（スレッドセーフ）"""
+
+    def __init__(self, script: str = NODE_WORKER_SCRIPT, size: int = NODE_WORKER_POOL_SIZE,
+                 max_inflight: int = NODE_WORKER_MAX_INFLIGHT, health_interval: float = NODE_WORKER_HEALTH_INTERVAL,
+                 max_consecutive_timeouts: int = 3, restart_backoff: float = NODE_WORKER_RESTART_BACKOFF,
+                 restart_backoff_max: float = NODE_WORKER_RESTART_BACKOFF_MAX):
+        self.script = script
+        self.size = max(1, size)
+        self.max_inflight = max_inflight  # 1ワーカーあたりの同時処理数上限
+        self.health_interval = health_interval  # ping間隔（秒、0以下で無効）
+        self.max_consecutive_timeouts = max_consecutive_timeouts  # この回数連続でタイムアウトしたら再起動
+        self.restart_backoff = restart_backoff  # 再起動待ちの初期秒数（失敗が続くごとに倍）
+        self.restart_backoff_max = restart_backoff_max  # 再起動待ちの上限（秒）
+        self._workers: List[Optional[_NodeWorker]] = [None] * self.size
+        self._starting = [False] * self.size  # 起動処理中のスロット（同じスロットを同時に起動しない）
+        self._failures = [0] * self.size  # スロットごとの連続した起動失敗・起動直後の終了の回数
+        self._next_restart_at = [0.0] * self.size  # スロットを次に起動してよい時刻（time.monotonic）
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pid = None
+        self._monitor = None
+        self._closed = False
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.spawn_errors = 0
+
+    def _ensure_process(self):
+        # fork後の子プロセスでは親のワーカー（パイプ）を使えないため作り直す（ロック取得済みで呼ぶこと）
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._workers = [None] * self.size
+            self._starting = [False] * self.size
+            self._failures = [0] * self.size
+            self._next_restart_at = [0.0] * self.size
+            self._monitor = None
+
+    def _backoff_delay(self, index: int) -> float:
+        # 連続した失敗回数に応じた再起動待ち（ロック取得済みで呼ぶこと）
+        failures = self._failures[index]
+        return min(self.restart_backoff * 2 ** (failures - 1), self.restart_backoff_max) if failures else 0.0
+
+    def _start_worker(self, index: int, previous: Optional[_NodeWorker]) -> Optional[_NodeWorker]:
+        """スロットのワーカーを previous から置き換える（起動済み・起動中・再起動待ちの場合は何もしない）
+
+        プロセスの起動はロックの外で行い、他のリクエストを待たせない。
+        """
+        with self._lock:
+            if (self._closed or self._pid != os.getpid() or self._starting[index]
+                    or self._workers[index] is not previous or time.monotonic() < self._next_restart_at[index]):
+                return None
+            self._starting[index] = True
+            if previous is not None:
+                self.restarts += 1
+                # 起動直後に終了・停止したワーカーは失敗として数え、次の再起動を遅らせる
+                if time.time() - previous.started_at < self.restart_backoff_max:
+                    self._failures[index] += 1
+                else:
+                    self._failures[index] = 0
+        if previous is not None:
+            threading.Thread(target=previous.stop, daemon=True).start()
+
+        worker = None
+        try:
+            worker = _NodeWorker(index, self.script)
+        except NodeWorkerError as e:
+            logging.warning(f"⚠️ {e}")
+
+        with self._lock:
+            self._starting[index] = False
+            if worker is None:
+                self.spawn_errors += 1
+                self._failures[index] += 1
+            elif self._closed or self._workers[index] is not previous:
+                # 起動中にプールが停止された
+                threading.Thread(target=worker.stop, daemon=True).start()
+                return None
+            else:
+                self._workers[index] = worker
+                if self._monitor is None and self.health_interval > 0:
+                    self._monitor = threading.Thread(target=self._monitor_loop, name='node-worker-health', daemon=True)
+                    self._monitor.start()
+            failures = self._failures[index]
+            delay = self._backoff_delay(index)
+            self._next_restart_at[index] = time.monotonic() + delay
+        if delay:
+            logging.warning(f"Nodeワーカー #{index} の起動が{failures}回続けて失敗、次の再起動まで{delay:.1f}秒待ちます")
+        return worker
+
+    def _acquire_worker(self) -> _NodeWorker:
+        with self._lock:
+            if self._closed:
+                raise NodeWorkerError("Nodeワーカープールは停止済みです")
+            self._ensure_process()
+            stopped = [(index, worker) for index, worker in enumerate(self._workers)
+                       if worker is None or not worker.is_running()]
+        for index, previous in stopped:
+            self._start_worker(index, previous)
+        with self._lock:
+            running = [worker for worker in self._workers if worker is not None and worker.is_running()]
+            if not running:
+                self.rejected += 1
+                raise NodeWorkerError("起動しているNodeワーカーがありません（再起動待ち）")
+            worker = min(running, key=lambda w: w.inflight)
+            if worker.inflight >= self.max_inflight:
+                self.rejected += 1
+                raise NodeWorkerError("Nodeワーカーが混雑しています")
+            return worker
+
+    def call(self, method: str, params: Optional[List] = None, timeout: float = 30.0):
+        """Nodeワーカーで method を実行して結果を返す
+
+        ワーカー側のエラーは NodeWorkerError、応答待ちの超過は NodeWorkerTimeout を送出する。
+        """
+        params = [str(p) for p in (params or [])]
+        worker = self._acquire_worker()
+        request_id = next(self._ids)
+        self.calls += 1
+        start_time = time.time()
+        try:
+            result = worker.send(request_id, method, params).result(timeout=timeout)
+            worker.consecutive_timeouts = 0
+            logging.debug(f"Nodeワーカー #{worker.index} {method}: {time.time() - start_time:.2f}秒")
+            return result
+        except concurrent.futures.TimeoutError:
+            worker.discard(request_id)
+            self.timeouts += 1
+            worker.consecutive_timeouts += 1
+            if worker.consecutive_timeouts >= self.max_consecutive_timeouts:
+                logging.warning(f"Nodeワーカー #{worker.index} が{worker.consecutive_timeouts}回連続でタイムアウト、再起動します")
+                self._restart(worker)
+            raise NodeWorkerTimeout(f"{method} timeout ({timeout}s)")
+        except NodeWorkerError:
+            self.errors += 1
+            raise
+
+    def _restart(self, worker: _NodeWorker):
+        self._start_worker(worker.index, worker)
+
+    def health_check(self, timeout: float = 5.0) -> Dict:
+        """全ワーカーへpingを送り、応答しないワーカーを再起動"""
+        with self._lock:
+            self._ensure_process()
+            workers = [w for w in self._workers if w is not None]
+        results = {}
+        for worker in workers:
+            start_time = time.time()
+            try:
+                worker.send(next(self._ids), 'ping', []).result(timeout=timeout)
+                results[worker.index] = {'healthy': True, 'latency': round(time.time() - start_time, 3)}
+            except Exception as e:
+                results[worker.index] = {'healthy': False, 'error': str(e) or type(e).__name__}
+                logging.warning(f"Nodeワーカー #{worker.index} のヘルスチェック失敗、再起動します: {e}")
+                self._restart(worker)
+        return results
+
+    def _monitor_loop(self):
+        pid = os.getpid()
+        while not self._closed and self._pid == pid:
+            time.sleep(self.health_interval)
+            if self._closed or self._pid != pid:
+                break
+            try:
+                self.health_check()
+            except Exception as e:
+                logging.debug(f"Nodeワーカーのヘルスチェックエラー: {e}")
+
+    def stats(self) -> Dict:
+        """プールの統計を取得"""
+        with self._lock:
+            workers = [w for w in self._workers if w is not None] if self._pid == os.getpid() else []
+            return {
+                "size": self.size,
+                "max_inflight": self.max_inflight,
+                "calls": self.calls,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "spawn_errors": self.spawn_errors,
+                "restart_wait": [round(max(at - time.monotonic(), 0.0), 1) for at in self._next_restart_at],
+                "workers": [{
+                    "index": w.index,
+                    "pid": w.proc.pid,
+                    "alive": w.is_running(),
+                    "inflight": w.inflight,
+                    "requests": w.requests,
+                    "uptime": round(time.time() - w.started_at, 1)
+                } for w in workers]
+            }
+
+    def shutdown(self):
+        """全ワーカーを停止"""
+        with self._lock:
+            self._closed = True
+            workers = [w for w in self._workers if w is not None] if self._pid == os.getpid() else []
+            self._workers = [None] * self.size
+        for worker in workers:
+            worker.stop()
+
+
+# グローバルインスタンス（TurboVideoService / MultiStreamService で共有）
+node_worker_pool = NodeWorkerPool()
+atexit.register(node_worker_pool.shutdown)
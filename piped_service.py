@@ -1,5 +1,6 @@
 import requests
 import logging
+from http_client import http_client
 
 class PipedService:
     def __init__(self):
@@ -28,14 +29,14 @@ class PipedService:
             "https://piped-api.hostux.net",
             "https://pipedapi.syncpundit.io"
         ]
-        self.timeout = 3  # 高速化のためタイムアウト短縮
+        self.timeout = http_client.timeout_for('piped')  # config.SERVICE_TIMEOUTS で設定
         
     def _make_request(self, endpoint, params=None):
         """複数のPipedインスタンスでリクエストを試行"""
         for instance in self.instances:
             try:
                 url = f"{instance}/{endpoint}"
-                response = requests.get(url, params=params, timeout=self.timeout)
+                response = http_client.get(url, params=params, timeout=self.timeout)
                 if response.status_code == 200:
                     data = response.json()
                     # データが辞書形式またはリストであることを確認
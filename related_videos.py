@@ -0,0 +1,198 @@
+"""
+関連動画エンジン
+
+RelatedVideosEngine は
+  - 候補の生成元（キーワード検索・タイトル検索・トレンド）を共有スレッドプールで同時に実行し、1つの締め切りの中で待つ
+  - 生成元ごとの重みと順位からスコアを付け、動画IDから決まる小さな揺らぎを加えて並べる
+    （同じ動画では同じ並び、動画ごとに異なる並び）
+  - Kahoot の詳細はIDごとのキャッシュにあるものだけで空の項目を補完し、ないものは裏で取得しておく
+    （関連動画から開いた /watch でそのまま使われる）
+  - 並べた結果を動画IDごとにキャッシュ
+する。siawaseok のトレンドはトップページと共有の正規化済みスナップショットを使う。
+"""
+import hashlib
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+from config import RELATED_DEADLINE, RELATED_LIMIT, RELATED_CACHE_TTL, RELATED_PARTIAL_TTL
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from kahoot_batcher import kahoot_video_batcher
+from multi_stream_service import MultiStreamService
+from invidious_service import InvidiousService
+from video_records import Video
+
+# 順位によるスコアの減衰（重み / (RANK_OFFSET + 順位)）
+RANK_OFFSET = 10
+
+# 生成元ごとの重み（タスク名の ":" より前で引く）
+GENERATOR_WEIGHTS = {'keyword': 1.0, 'title': 0.9, 'trending': 0.4, 'siawaseok': 0.4}
+
+# 動画ごとの並びの揺らぎの大きさ（1位のスコア 1/RANK_OFFSET に対する割合で小さく）
+_JITTER = 0.03
+
+# Kahoot の詳細で空の場合に補完する項目
+_FILL_FIELDS = ('lengthSeconds', 'viewCount', 'publishedText', 'published', 'description', 'thumbnail')
+
+_JAPANESE_WORDS = re.compile(r'[\u3040-\u30ff\u3400-\u9fff]+')  # ひらがな・カタカナ・漢字
+_ENGLISH_WORDS = re.compile(r'[a-zA-Z]+')
+
+
+def _stable_hash(text: str) -> int:
+    """プロセスをまたいで同じ値になるハッシュ（hash() は起動ごとに変わる）"""
+    return int(hashlib.md5(text.encode()).hexdigest(), 16)
+
+
+def priority_keywords(query: str) -> List[str]:
+    """タイトルから検索に使うキーワード（日本語2語 + 英語2語、なければ空白区切りの先頭3語）"""
+    keywords = _JAPANESE_WORDS.findall(query)[:2] + _ENGLISH_WORDS.findall(query)[:2]
+    return keywords or query.split()[:3]
+
+
+class RelatedVideosEngine:
+    """関連動画の候補を同時に集めて並べ、動画IDごとにキャッシュする（スレッドセーフ）"""
+
+    def __init__(self, invidious: InvidiousService, multi_stream_service: MultiStreamService,
+                 executor=upstream_executor, batcher=kahoot_video_batcher, deadline: float = RELATED_DEADLINE,
+                 limit: int = RELATED_LIMIT, cache_ttl: float = RELATED_CACHE_TTL,
+                 partial_ttl: float = RELATED_PARTIAL_TTL):
+        self.invidious = invidious
+        self.multi_stream_service = multi_stream_service
+        self.executor = executor
+        self.batcher = batcher
+        self.deadline = deadline  # 生成元を待つ上限（秒）
+        self.limit = limit  # 返す関連動画の数
+        self.cache_ttl = cache_ttl  # 全生成元の結果から並べた場合のTTL
+        self.partial_ttl = partial_ttl  # 締め切りで一部の生成元を待たなかった場合のTTL
+        self._cache = get_cache('related_videos', ttl=cache_ttl, max_entries=2000, max_bytes=16 * 1024 * 1024)
+        self.builds = 0
+        self.kahoot_filled = 0
+        self.kahoot_prefetched = 0
+
+    # --- 候補の生成 ---
+
+    def candidate_tasks(self, video_id: str, query: str) -> Dict[str, Callable[[], List[Video]]]:
+        """生成元ごとのタスク {タスク名: 引数なし関数} を作成"""
+        seed = sum(ord(c) for c in video_id)
+        tasks = {}
+        if query:
+            # 各キーワードで個別に検索（ページを変えて異なる結果を取得）
+            for i, keyword in enumerate(priority_keywords(query)):
+                tasks[f'keyword:{keyword}'] = (lambda keyword=keyword, page=(i % 3) + 1:
+                                               self._search(keyword, page, 30))
+            # タイトル全体での検索（動画IDから決まるページ）
+            tasks['title'] = lambda: self._search(query[:25], _stable_hash(video_id) % 5 + 1, 40)
+        tasks['trending'] = lambda: self._invidious_trending(seed)
+        tasks['siawaseok'] = lambda: self._siawaseok_trending(seed)
+        return tasks
+
+    def _search(self, keyword: str, page: int, limit: int) -> List[Video]:
+        results = self.invidious.search_videos(keyword, page=page) or []
+        return [video for video in map(Video.from_invidious, results) if video is not None][:limit]
+
+    def _invidious_trending(self, seed: int) -> List[Video]:
+        # 動画IDに基づいてカテゴリと開始位置を選択
+        category = ['', 'Music', 'Gaming'][seed % 3]
+        trending_videos = self.invidious.get_trending_videos(region='JP', category=category or None) or []
+        start_index = seed % 20
+        return trending_videos[start_index:start_index + 30]
+
+    def _siawaseok_trending(self, seed: int) -> List[Video]:
+        # トップページと共有の正規化済みトレンド（キャッシュ済みのスナップショットを再利用）
+        trend_records = self.multi_stream_service.get_trending_records()
+        category_videos = trend_records.get(['trending', 'music', 'gaming'][seed % 3]) or []
+        start_pos = seed % max(1, len(category_videos) - 10)
+        return category_videos[start_pos:start_pos + 20]
+
+    # --- 並べ替え ---
+
+    def rank(self, video_id: str, tasks: Dict[str, Any], results: Dict[str, List[Video]]) -> List[Video]:
+        """生成元の結果を動画IDで統合し、スコア順に limit 件並べる（通信なし）"""
+        scores = {}
+        records = {}
+        for name in tasks:
+            weight = GENERATOR_WEIGHTS.get(name.split(':')[0], 0.5)
+            rank = 0
+            for video in results.get(name) or []:
+                candidate_id = video.get('videoId') if video is not None else None
+                if not candidate_id or candidate_id == video_id:
+                    continue
+                scores[candidate_id] = scores.get(candidate_id, 0.0) + weight / (RANK_OFFSET + rank)
+                records.setdefault(candidate_id, video)
+                rank += 1
+
+        def score(candidate_id):
+            jitter = (_stable_hash(video_id + candidate_id) % 1000) / 1000 * _JITTER / RANK_OFFSET
+            return scores[candidate_id] + jitter
+
+        ranked = sorted(scores, key=score, reverse=True)[:self.limit]
+        return [records[candidate_id] for candidate_id in ranked]
+
+    def _fill_from_kahoot(self, videos: List[Video]) -> List[Video]:
+        # キャッシュ済みの Kahoot 詳細で空の項目だけ補完し、未取得のIDは裏で取得しておく
+        video_ids = [video.videoId for video in videos]
+        items = self.batcher.cached_items(video_ids)
+        self.kahoot_prefetched += self.batcher.prefetch(video_id for video_id in video_ids if video_id not in items)
+        filled = []
+        for video in videos:
+            item = items.get(video.videoId)
+            kahoot_video = Video.from_kahoot(item) if item else None
+            if kahoot_video is not None:
+                missing = {field: kahoot_video[field] for field in _FILL_FIELDS
+                           if not video.get(field) and kahoot_video.get(field)}
+                if missing:
+                    video = video.copy()  # キャッシュ上のレコードは書き換えない
+                    video.update(missing)
+                    self.kahoot_filled += 1
+            filled.append(video)
+        return filled
+
+    # --- 取得 ---
+
+    def related(self, video_id: str, query: str = '') -> List[Video]:
+        """動画の関連動画（キャッシュ・同時リクエストの合流あり）"""
+        cached = self._cache.get(video_id)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"related_videos:{video_id}", self._build, video_id, query,
+                                cache=self._cache, cache_key=video_id)
+
+    def _build(self, video_id: str, query: str) -> List[Video]:
+        start_time = time.time()
+        self.builds += 1
+        tasks = self.candidate_tasks(video_id, query)
+        results = {}
+        for name, videos in self.executor.iter_completed(tasks, timeout=self.deadline,
+                                                         label=f"related[{video_id}]"):
+            results[name] = videos
+        videos = self._fill_from_kahoot(self.rank(video_id, tasks, results))
+        # タイトルなしで呼ばれた場合はトレンドだけの候補なので、短いTTLにして次のタイトル付きの要求で作り直す
+        complete = bool(query) and all(name in results for name in tasks)
+        if videos:
+            self._cache.set(video_id, videos, ttl=self.cache_ttl if complete else self.partial_ttl)
+        logging.info(f"🎞️ 関連動画 {video_id}: {len(videos)} 件 {time.time() - start_time:.2f}秒 "
+                     f"(生成元 {sorted(name for name in results if results[name])}, "
+                     f"{'完全' if complete else '締め切りで打ち切り'})")
+        return videos
+
+    def get_cached(self, video_id: str) -> Optional[List[Video]]:
+        """キャッシュ済みの関連動画（取得はしない）"""
+        return self._cache.get(video_id)
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "weights": GENERATOR_WEIGHTS,
+            "deadline": self.deadline,
+            "limit": self.limit,
+            "builds": self.builds,
+            "kahoot_filled": self.kahoot_filled,
+            "kahoot_prefetched": self.kahoot_prefetched,
+            "cache": self._cache.stats()
+        }
+
+
+# グローバルインスタンス（/api/related-videos で使用）
+related_videos_engine = RelatedVideosEngine(InvidiousService(), MultiStreamService())
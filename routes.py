@@ -1,19 +1,34 @@
-from flask import render_template, request, jsonify, redirect, url_for
+from flask import render_template, request, jsonify, redirect, url_for, Response, stream_with_context
 from app import app
 from invidious_service import InvidiousService
 import datetime
 from piped_service import PipedService
 from ytdl_service import YtdlService
-from additional_services import AdditionalStreamServices
 from turbo_video_service import TurboVideoService
 from multi_stream_service import MultiStreamService
 from custom_api_service import CustomApiService
 from vkr_downloader_service import OmadaVideoService
 from user_preferences import user_prefs
-import requests
+from http_client import http_client
+from cache_store import get_cache_stats
+from single_flight import single_flight
+from node_worker_pool import node_worker_pool
+from ytdl_pool import ytdl_pool
+from upstream_executor import upstream_executor
+from video_metadata import video_metadata_resolver
+from federated_search import federated_search
+from suggestion_service import suggestion_engine
+from kahoot_batcher import kahoot_video_batcher
+from related_videos import related_videos_engine
+from shorts_feed import shorts_feed_service
+from channel_service import channel_service, DEFAULT_CHANNEL_AVATAR
+from author_avatars import author_avatars
+from comment_service import comment_service
+from video_records import Video, Channel, StreamFormat, json_default
+from config import WATCH_FANOUT_DEADLINE, WATCH_PROGRESSIVE, WATCH_STREAM_DEADLINE
 import logging
 import json
-import urllib.parse
+import time
 
 @app.template_filter('format_view_count')
 def format_view_count(count):
@@ -117,30 +132,11 @@ def format_published_japanese(published_text):
 invidious = InvidiousService()
 piped = PipedService()
 ytdl = YtdlService()
-additional_services = AdditionalStreamServices()
 turbo_service = TurboVideoService()
 multi_stream_service = MultiStreamService()
 custom_api_service = CustomApiService()
 video_service = OmadaVideoService()
 
-def suggest(keyword: str):
-    """Google/YouTube検索予測変換API"""
-    try:
-        url = f"http://www.google.com/complete/search?client=youtube&hl=ja&ds=yt&q={urllib.parse.quote(keyword)}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            # JSONPの形式から実際のJSONデータを抽出
-            json_text = response.text[19:-1]  # 前後の不要な部分を削除
-            data = json.loads(json_text)
-            suggestions = [item[0] for item in data[1]]
-            return suggestions
-        else:
-            return []
-    except Exception as e:
-        logging.error(f"検索予測変換エラー: {e}")
-        return []
-
 @app.route('/test')
 def test():
     """テスト用診断ページ"""
@@ -207,71 +203,16 @@ def test():
 def get_fallback_trending_videos():
     """フォールバック用のサンプルトレンド動画"""
     return [
-        {
-            'videoId': 'dQw4w9WgXcQ',
-            'title': 'Rick Astley - Never Gonna Give You Up (Official Video)',
-            'author': 'Rick Astley',
-            'authorId': 'UCuAXFkgsw1L7xaCfnd5JJOw',
-            'lengthSeconds': 212,
-            'viewCount': 1400000000,
-            'publishedText': '1 year ago',
-            'videoThumbnails': [
-                {'url': 'https://img.youtube.com/vi/dQw4w9WgXcQ/maxresdefault.jpg'},
-                {'url': 'https://img.youtube.com/vi/dQw4w9WgXcQ/hqdefault.jpg'}
-            ]
-        },
-        {
-            'videoId': 'L_jWHffIx5E',
-            'title': 'Smash Mouth - All Star (Official Music Video)',
-            'author': 'SmashMouthVEVO',
-            'authorId': 'UCN1hnUccO4FD5WfM7ithXaw',
-            'lengthSeconds': 201,
-            'viewCount': 800000000,
-            'publishedText': '2 years ago',
-            'videoThumbnails': [
-                {'url': 'https://img.youtube.com/vi/L_jWHffIx5E/maxresdefault.jpg'},
-                {'url': 'https://img.youtube.com/vi/L_jWHffIx5E/hqdefault.jpg'}
-            ]
-        },
-        {
-            'videoId': 'kJQP7kiw5Fk',
-            'title': 'Despacito ft. Daddy Yankee',
-            'author': 'Luis Fonsi',
-            'authorId': 'UCmBA_wu8xGg1OfOkfW13Q0Q',
-            'lengthSeconds': 281,
-            'viewCount': 8000000000,
-            'publishedText': '6 years ago',
-            'videoThumbnails': [
-                {'url': 'https://img.youtube.com/vi/kJQP7kiw5Fk/maxresdefault.jpg'},
-                {'url': 'https://img.youtube.com/vi/kJQP7kiw5Fk/hqdefault.jpg'}
-            ]
-        },
-        {
-            'videoId': 'ZEHk7UXxhIs',
-            'title': '【実況】最恐の脱出ゲーム「POPPY PLAYTIME」をやる！ Part1',
-            'author': 'HikakinGames',
-            'authorId': 'UCsFn6flPnvnGLY1JbSnAFIg',
-            'lengthSeconds': 1456,
-            'viewCount': 5200000,
-            'publishedText': '2 months ago',
-            'videoThumbnails': [
-                {'url': 'https://img.youtube.com/vi/ZEHk7UXxhIs/maxresdefault.jpg'},
-                {'url': 'https://img.youtube.com/vi/ZEHk7UXxhIs/hqdefault.jpg'}
-            ]
-        },
-        {
-            'videoId': 'WPvGqX-TXP0',
-            'title': '【ドッキリ】もしもヒカキンの家の床が全部バナナの皮だったら',
-            'author': 'HikakinTV',
-            'authorId': 'UCZf__ehlCEBPop-_sldpBUQ',
-            'lengthSeconds': 932,
-            'viewCount': 3800000,
-            'publishedText': '1 month ago',
-            'videoThumbnails': [
-                {'url': 'https://img.youtube.com/vi/WPvGqX-TXP0/maxresdefault.jpg'},
-                {'url': 'https://img.youtube.com/vi/WPvGqX-TXP0/hqdefault.jpg'}
-            ]
-        }
+        Video('dQw4w9WgXcQ', 'Rick Astley - Never Gonna Give You Up (Official Video)', 'Rick Astley',
+              'UCuAXFkgsw1L7xaCfnd5JJOw', 212, 1400000000, '1 year ago'),
+        Video('L_jWHffIx5E', 'Smash Mouth - All Star (Official Music Video)', 'SmashMouthVEVO',
+              'UCN1hnUccO4FD5WfM7ithXaw', 201, 800000000, '2 years ago'),
+        Video('kJQP7kiw5Fk', 'Despacito ft. Daddy Yankee', 'Luis Fonsi',
+              'UCmBA_wu8xGg1OfOkfW13Q0Q', 281, 8000000000, '6 years ago'),
+        Video('ZEHk7UXxhIs', '【実況】最恐の脱出ゲーム「POPPY PLAYTIME」をやる！ Part1', 'HikakinGames',
+              'UCsFn6flPnvnGLY1JbSnAFIg', 1456, 5200000, '2 months ago'),
+        Video('WPvGqX-TXP0', '【ドッキリ】もしもヒカキンの家の床が全部バナナの皮だったら', 'HikakinTV',
+              'UCZf__ehlCEBPop-_sldpBUQ', 932, 3800000, '1 month ago')
     ]
 
 @app.route('/')
@@ -280,129 +221,17 @@ def index():
     trending_videos = []
     
     try:
-        # マルチエンドポイントでトレンドを高速取得
+        # マルチエンドポイントでトレンドを高速取得（カテゴリごとに正規化済みの Video レコード）
         logging.info("高速マルチエンドポイントでトレンド動画を取得中...")
-        trend_data = multi_stream_service.get_trending_videos()
-        
-        if trend_data:
-            logging.info(f"siawaseok trend API data type: {type(trend_data)}")
-            logging.info(f"siawaseok trend API keys: {list(trend_data.keys()) if isinstance(trend_data, dict) else 'not dict'}")
-            
-            videos_list = []
-            
-            # APIレスポンスの構造を確認して適切に処理
-            if isinstance(trend_data, dict):
-                # siawaseok trend APIの構造: trending, music, gaming, updated
-                if 'trending' in trend_data:
-                    videos_list = trend_data['trending']
-                    logging.info(f"Using 'trending' key with {len(videos_list) if isinstance(videos_list, list) else 'not list'} items")
-                elif 'music' in trend_data:
-                    videos_list = trend_data['music']
-                    logging.info(f"Using 'music' key with {len(videos_list) if isinstance(videos_list, list) else 'not list'} items")
-                elif 'gaming' in trend_data:
-                    videos_list = trend_data['gaming']
-                    logging.info(f"Using 'gaming' key with {len(videos_list) if isinstance(videos_list, list) else 'not list'} items")
-                else:
-                    # 他のキーを確認
-                    for key, value in trend_data.items():
-                        if isinstance(value, list) and len(value) > 0:
-                            videos_list = value
-                            logging.info(f"Using key '{key}' as videos list with {len(value)} items")
-                            break
-            elif isinstance(trend_data, list):
-                videos_list = trend_data
-            
-            if videos_list:
-                seen_ids = set()
-                
-                for video_data in videos_list[:100]:  # 最大100件に増加
-                    if isinstance(video_data, dict):
-                        video_id = video_data.get('videoId') or video_data.get('id')
-                        
-                        if video_id and video_id not in seen_ids:
-                            seen_ids.add(video_id)
-                            
-                            # duration値を安全に変換
-                            duration_raw = video_data.get('lengthSeconds') or video_data.get('duration', 0)
-                            try:
-                                if isinstance(duration_raw, str):
-                                    # 時間文字列（例: "3:45"）を秒に変換
-                                    if ':' in duration_raw:
-                                        parts = duration_raw.split(':')
-                                        if len(parts) == 2:  # mm:ss
-                                            duration_seconds = int(parts[0]) * 60 + int(parts[1])
-                                        elif len(parts) == 3:  # hh:mm:ss
-                                            duration_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                                        else:
-                                            duration_seconds = 0
-                                    else:
-                                        duration_seconds = int(duration_raw)
-                                else:
-                                    duration_seconds = int(duration_raw) if duration_raw else 0
-                            except (ValueError, TypeError):
-                                duration_seconds = 0
-
-                            # viewCount値を安全に変換
-                            view_count_raw = video_data.get('viewCount') or video_data.get('view_count', 0)
-                            try:
-                                view_count = int(view_count_raw) if view_count_raw else 0
-                            except (ValueError, TypeError):
-                                view_count = 0
-
-                            # チャンネル名とIDを適切に取得（siawaseok APIの実際の構造に合わせて）
-                            author_name = None
-                            author_id = None
-                            
-                            # siawaseok APIの構造に基づいた取得
-                            if video_data.get('author'):
-                                author_name = video_data['author']
-                            elif video_data.get('uploader'):
-                                author_name = video_data['uploader']
-                            elif video_data.get('uploaderName'):  # siawaseok APIで使われる可能性
-                                author_name = video_data['uploaderName']
-                            elif video_data.get('channel'):
-                                if isinstance(video_data['channel'], dict):
-                                    author_name = video_data['channel'].get('name') or video_data['channel'].get('title')
-                                elif isinstance(video_data['channel'], str):
-                                    author_name = video_data['channel']
-                            elif video_data.get('channelName'):  # siawaseok APIで使われる可能性
-                                author_name = video_data['channelName']
-                            
-                            # チャンネルIDを取得
-                            if video_data.get('authorId'):
-                                author_id = video_data['authorId']
-                            elif video_data.get('uploader_id'):
-                                author_id = video_data['uploader_id']
-                            elif video_data.get('uploaderId'):  # siawaseok APIで使われる可能性
-                                author_id = video_data['uploaderId']
-                            elif video_data.get('channelId'):  # siawaseok APIで使われる可能性
-                                author_id = video_data['channelId']
-                            elif video_data.get('channel') and isinstance(video_data['channel'], dict):
-                                author_id = video_data['channel'].get('id') or video_data['channel'].get('channelId')
-                            
-                            # デフォルト値設定
-                            if not author_name:
-                                author_name = 'チャンネル名不明'
-                            if not author_id:
-                                author_id = ''
-
-                            # 統一された動画形式に変換
-                            video = {
-                                'videoId': video_id,
-                                'title': video_data.get('title', f'Video {video_id}'),
-                                'author': author_name,
-                                'authorId': author_id,
-                                'lengthSeconds': duration_seconds,
-                                'viewCount': view_count,
-                                'publishedText': video_data.get('publishedText') or video_data.get('upload_date', ''),
-                                'videoThumbnails': [
-                                    {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
-                                    {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
-                                ]
-                            }
-                            trending_videos.append(video)
-            
-                logging.info(f"Processed {len(trending_videos)} trending videos from siawaseok API")
+        trend_records = multi_stream_service.get_trending_records()
+        
+        if trend_records:
+            # siawaseok trend APIの構造: trending, music, gaming, updated
+            for key in ('trending', 'music', 'gaming', *trend_records):
+                if trend_records.get(key):
+                    trending_videos = trend_records[key][:100]  # 最大100件
+                    logging.info(f"Using '{key}' key with {len(trending_videos)} items")
+                    break
             else:
                 logging.warning("No videos found in siawaseok trend data")
                 
@@ -426,9 +255,6 @@ def index():
 
 @app.route('/search')
 def search():
-    # リクエスト開始時にキャッシュをクリア（パフォーマンス向上）
-    multi_stream_service.clear_request_cache()
-    
     query = request.args.get('q', '')
     page = int(request.args.get('page', 1))
     
@@ -436,111 +262,11 @@ def search():
         return redirect(url_for('index'))
     
     try:
-        # 🆕 カスタムAPIサービス（siawaseok.duckdns.org）から検索結果を最優先取得
-        logging.info(f"検索クエリ: '{query}' - CustomApiService (siawaseok.duckdns.org) を使用（最優先）")
-        
-        search_videos = []
-        channels = []
-        
-        # 1. 高速化: まずKahoot APIで検索（最も安定）
-        try:
-            max_results = 50 if page == 1 else 30  # 1ページ目は多め
-            kahoot_results = multi_stream_service.search_videos_with_kahoot(query, max_results=max_results, page=page)
-            
-            if kahoot_results:
-                search_videos = kahoot_results
-                logging.info(f"✅ 高速化: Kahoot APIから {len(search_videos)} 件の検索結果を取得")
-            
-        except Exception as e:
-            logging.warning(f"Kahoot API検索エラー: {e}")
-        
-        # 2. フォールバック: CustomApiService（Kahoot APIが失敗した場合のみ）
-        if not search_videos:
-            try:
-                custom_search_data = custom_api_service.search_videos(query)
-                
-                if custom_search_data:
-                    custom_videos = custom_api_service.format_search_results(custom_search_data)
-                    if custom_videos:
-                        search_videos = custom_videos
-                        logging.info(f"✅ フォールバック: CustomApiService (siawaseok.duckdns.org) から {len(search_videos)} 件の検索結果を取得")
-                
-            except Exception as e:
-                logging.warning(f"CustomApiService検索エラー: {e}")
-        
-        # 3. 🚀 高速化: Invidiousは検索結果が少ない場合のみ補完で使用
-        if len(search_videos) < 10:  # 十分な結果がある場合はInvidiousをスキップ
-            try:
-                logging.info(f"Invidiousからチャンネル情報と補完動画を取得: '{query}'")
-                search_results = invidious.search_all(query, page=page)
-                
-                if isinstance(search_results, dict):
-                    invidious_videos = search_results.get('videos', [])
-                    channels = search_results.get('channels', [])  # チャンネル情報は常に取得
-                    
-                    # Kahoot APIの結果と重複しないものを追加
-                    kahoot_video_ids = set(v.get('videoId') for v in search_videos)
-                    for video in invidious_videos:
-                        if video.get('videoId') not in kahoot_video_ids:
-                            search_videos.append(video)
-                    
-                    logging.info(f"Invidiousから追加動画 {len(invidious_videos)} 件、チャンネル {len(channels)} 件を取得")
-                    
-                elif search_results:  # 動画のみのリスト
-                    invidious_videos = search_results
-                    # 重複回避
-                    kahoot_video_ids = set(v.get('videoId') for v in search_videos)
-                    for video in invidious_videos:
-                        if video.get('videoId') not in kahoot_video_ids:
-                            search_videos.append(video)
-                    logging.info(f"Invidiousから追加動画 {len(invidious_videos)} 件を取得")
-                
-            except Exception as e:
-                logging.debug(f"Invidious API検索エラー: {e}")
-                # 高速化のため、チャンネル情報の追加取得はスキップ
-        else:
-            logging.info(f"十分な検索結果({len(search_videos)}件)があるため、Invidiousをスキップ")
-        
-        # 4. 最終フォールバック: 検索結果が極端に少ない場合のみsiawaseok APIを試す
-        if not search_videos or len(search_videos) < 3:
-            try:
-                logging.info(f"最終フォールバック: マルチエンドポイント検索使用 - {query}")
-                
-                search_data = multi_stream_service.search_videos(query, 1)
-                
-                if search_data:
-                    videos_list = []
-                    if isinstance(search_data, dict) and 'results' in search_data:
-                        videos_list = search_data['results']
-                    elif isinstance(search_data, list):
-                        videos_list = search_data
-                    
-                    if videos_list:
-                        # 重複回避
-                        existing_video_ids = set(v.get('videoId') for v in search_videos)
-                        added_count = 0
-                        
-                        for video_data in videos_list[:20]:
-                            if isinstance(video_data, dict):
-                                video_id = video_data.get('videoId') or video_data.get('id')
-                                if video_id and video_id not in existing_video_ids:
-                                    existing_video_ids.add(video_id)
-                                    search_videos.append({
-                                        'videoId': video_id,
-                                        'title': video_data.get('title', f'Video {video_id}'),
-                                        'author': video_data.get('author', 'Unknown'),
-                                        'authorId': video_data.get('authorId', ''),
-                                        'lengthSeconds': video_data.get('lengthSeconds', 0),
-                                        'viewCount': video_data.get('viewCount', 0),
-                                        'publishedText': video_data.get('publishedText', ''),
-                                        'videoThumbnails': [
-                                            {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'}
-                                        ]
-                                    })
-                                    added_count += 1
-                        logging.info(f"siawaseok APIから追加で {added_count} 件を取得")
-            except Exception as e2:
-                logging.error(f"siawaseok フォールバックエラー: {e2}")
+        # Kahoot / CustomApi / Invidious / siawaseok に同時に問い合わせ、1つの締め切りの中で統合
+        results = federated_search.search(query, page)
+        search_videos = author_avatars.apply(results['videos'])  # 投稿者アイコンはインデックスから（通信なし）
+        channels = results['channels']
+        logging.info(f"検索クエリ: '{query}' - 統合検索 {len(search_videos)} 件 (取得元 {results['sources']})")
         
         # タイトルと投稿時間の改善処理
         improved_videos = []
@@ -574,16 +300,20 @@ def search():
                     except:
                         published_text = "投稿日時不明"
             
-            improved_video = video.copy()
-            improved_video['title'] = title
-            improved_video['publishedText'] = published_text
-            improved_videos.append(improved_video)
+            # 変更がある場合だけコピー（キャッシュ上のレコードは書き換えない）
+            if title != video.get('title') or published_text != video.get('publishedText'):
+                video = video.copy()
+                video['title'] = title
+                video['publishedText'] = published_text
+            improved_videos.append(video)
         
         # Invidiousの場合、1ページあたり20件が標準なので、最大20ページまで表示
         results_per_page = 20
         total_pages = 20  # 最大20ページ
         has_next = len(improved_videos) >= results_per_page and page < total_pages
         has_prev = page > 1
+        if has_next:
+            federated_search.prefetch(query, page + 1)  # 次のページを裏で取得してキャッシュ
         
         return render_template('search.html', 
                              results=improved_videos,
@@ -613,37 +343,22 @@ def api_search():
     
     try:
         logging.info(f"Ajax検索: '{query}' - ページ {page}")
-        multi_stream_service.clear_request_cache()
-        
-        search_videos = []
-        channels = []
         
-        # 1. 高速検索: Kahoot API優先
-        try:
-            max_results = 30
-            kahoot_results = multi_stream_service.search_videos_with_kahoot(query, max_results=max_results, page=page)
-            
-            if kahoot_results:
-                search_videos = kahoot_results
-                logging.info(f"✅ Ajax検索: Kahoot APIから {len(search_videos)} 件を高速取得")
-        except Exception as e:
-            logging.warning(f"Ajax Kahoot検索エラー: {e}")
+        # /search と同じ統合検索（キャッシュも共有）
+        results = federated_search.search(query, page)
+        search_videos = author_avatars.apply(results['videos'])  # 投稿者アイコンはインデックスから（通信なし）
+        channels = results['channels'][:5]  # 最大5チャンネル
         
-        # 2. チャンネル情報を補完
-        if len(search_videos) >= 10:  # 十分な結果がある場合
-            try:
-                search_results = invidious.search_all(query, page=page)
-                if isinstance(search_results, dict) and 'channels' in search_results:
-                    channels = search_results['channels'][:5]  # 最大5チャンネル
-                    logging.info(f"✅ Ajax検索: チャンネル {len(channels)} 件を追加")
-            except Exception as e:
-                logging.debug(f"Ajax Invidiousチャンネル取得エラー: {e}")
+        if len(search_videos) >= 20 and page < 20:
+            federated_search.prefetch(query, page + 1)  # 次のページを裏で取得してキャッシュ
         
         return jsonify({
             'videos': search_videos,
             'channels': channels,
             'query': query,
-            'page': page
+            'page': page,
+            'sources': results['sources'],
+            'complete': results['complete']
         })
     
     except Exception as e:
@@ -651,44 +366,38 @@ def api_search():
         return jsonify({'error': '検索中にエラーが発生しました'}), 500
 
 @app.route('/api/comments/<video_id>')
-def get_comments(video_id):
-    """コメント取得API - siawaseok APIからコメントを取得"""
+def api_comments(video_id):
+    """コメントAPI - omada.cafe と Invidious を同時に問い合わせ、ローカルのコメントと統合（cursor でページ送り）"""
     try:
-        # siawaseok APIからコメントを取得
-        api_url = f"https://siawaseok.duckdns.org/api/comments/{video_id}"
-        response = requests.get(api_url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            logging.info(f"✅ siawaseok APIからコメント取得成功: {video_id}")
-            return jsonify({
-                'success': True,
-                'comments': data,
-                'source': 'siawaseok'
-            })
-        else:
-            logging.warning(f"siawaseok APIコメント取得失敗: {response.status_code}")
+        result = comment_service.page(video_id, request.args.get('cursor'))
+        return jsonify({
+            'success': True,
+            'comments': result['comments'],
+            'commentCount': result['commentCount'],
+            'continuation': result['continuation'],  # 次のページの cursor（最後のページではNone）
+            'source': result['source']
+        })
     except Exception as e:
-        logging.error(f"siawaseok APIコメント取得エラー: {e}")
-    
-    # フォールバック: 空のコメントリストを返す
-    return jsonify({
-        'success': False,
-        'comments': [],
-        'source': 'fallback'
-    })
+        logging.error(f"コメント取得エラー: {e}")
+        return jsonify({
+            'success': False,
+            'comments': [],
+            'commentCount': 0,
+            'error': str(e)
+        }), 500
 
 @app.route('/api/invidious-comments/<video_id>')
 def get_invidious_comments(video_id):
-    """Invidiousからコメント取得"""
+    """Invidiousからコメント取得（ページごとにキャッシュ）"""
     try:
-        invidious_comments = invidious.get_comments(video_id)
+        page = comment_service.source_page('invidious', video_id, request.args.get('continuation'))
         
-        if invidious_comments:
-            logging.info(f"✅ Invidiousからコメント取得成功: {len(invidious_comments)} 件")
+        if page and page['comments']:
+            logging.info(f"✅ Invidiousからコメント取得成功: {len(page['comments'])} 件")
             return jsonify({
                 'success': True,
-                'comments': invidious_comments,
+                'comments': page['comments'],
+                'continuation': page['continuation'],
                 'source': 'invidious'
             })
     except Exception as e:
@@ -719,8 +428,25 @@ def like_comment(comment_id):
 
 @app.route('/api/video-author/<video_id>')
 def get_video_author_info(video_id):
-    """Invidious APIから動画投稿者の情報とアイコンを取得"""
+    """動画投稿者の情報とアイコンを取得（統合メタデータと投稿者アイコンのインデックスにあれば通信なし）"""
     try:
+        # /watch で統合済みのメタデータがあれば、投稿者アイコンはインデックスから引く
+        metadata = video_metadata_resolver.get_cached(video_id)
+        if metadata and metadata.get('authorId'):
+            avatar_url = author_avatars.lookup([metadata['authorId']]).get(metadata['authorId'])
+            if avatar_url:
+                return jsonify({
+                    'success': True,
+                    'author_info': {
+                        'author': metadata.get('author', 'Unknown Author'),
+                        'authorId': metadata['authorId'],
+                        'authorUrl': f"/channel/{metadata['authorId']}",
+                        'authorThumbnails': [{'url': avatar_url, 'width': 176, 'height': 176}],
+                        'avatar_url': avatar_url
+                    },
+                    'source': 'avatar_index'
+                })
+        
         # Invidiousから動画詳細を取得
         video_info = invidious.get_video_info(video_id)
         
@@ -743,6 +469,7 @@ def get_video_author_info(video_id):
                     avatar_url = thumbnails[0].get('url', '')
             
             author_info['avatar_url'] = avatar_url
+            author_avatars.record(author_info['authorId'], avatar_url)
             
             logging.info(f"✅ 動画投稿者情報取得成功: {video_id} - {author_info['author']}")
             return jsonify({
@@ -761,51 +488,20 @@ def get_video_author_info(video_id):
         'source': 'invidious'
     })
 
-@app.route('/api/siawaseok-comments/<video_id>')
-def get_siawaseok_comments(video_id):
-    """siawaseok APIからコメント取得"""
-    try:
-        api_url = f"https://siawaseok.duckdns.org/api/comments/{video_id}"
-        response = requests.get(api_url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            logging.info(f"✅ siawaseok APIからコメント取得成功: {video_id} - {len(data)} 件")
-            return jsonify({
-                'success': True,
-                'comments': data,
-                'source': 'siawaseok'
-            })
-        else:
-            logging.warning(f"siawaseok APIコメント取得失敗: {response.status_code}")
-    except Exception as e:
-        logging.error(f"siawaseok APIコメント取得エラー: {e}")
-    
-    return jsonify({
-        'success': False,
-        'comments': [],
-        'source': 'siawaseok'
-    })
-
 @app.route('/api/omada-comments/<video_id>')
 def get_omada_comments(video_id):
-    """yt.omada.cafe APIからコメント取得"""
+    """yt.omada.cafe APIからコメント取得（ページごとにキャッシュ）"""
     try:
-        api_url = f"https://yt.omada.cafe/api/v1/comments/{video_id}"
-        response = requests.get(api_url, timeout=10)
+        page = comment_service.source_page('omada', video_id, request.args.get('continuation'))
         
-        if response.status_code == 200:
-            data = response.json()
-            # omada APIのコメント構造に対応
-            comments = data.get('comments', [])
-            logging.info(f"✅ omada APIからコメント取得成功: {video_id} - {len(comments)} 件")
+        if page is not None:
+            logging.info(f"✅ omada APIからコメント取得成功: {video_id} - {len(page['comments'])} 件")
             return jsonify({
                 'success': True,
-                'comments': comments,
+                'comments': page['comments'],
+                'continuation': page['continuation'],
                 'source': 'omada'
             })
-        else:
-            logging.warning(f"omada APIコメント取得失敗: {response.status_code}")
     except Exception as e:
         logging.error(f"omada APIコメント取得エラー: {e}")
     
@@ -815,6 +511,340 @@ def get_omada_comments(video_id):
         'source': 'omada'
     })
 
+# type2 APIレスポンスの分離ストリーム（品質, 解像度, ラベル, itag, 音声付きがない場合に最適URLとするか）
+_STREAM_API_SPLIT_QUALITIES = [
+    ('720p', '1280x720', '720p (高画質)', 136, True),
+    ('1080p', '1920x1080', '1080p (最高画質)', 137, True),
+    ('480p', '854x480', '480p (標準)', 135, False),
+    ('240p', '426x240', '240p (低画質)', 133, False),
+]
+
+
+def _formats_from_stream_api(api_data):
+    """siawaseok API（type2）のレスポンスから画質一覧を作成し (formats, best_url, has_audio) を返す"""
+    formats = []
+    best_url = None
+    has_audio = False
+    
+    # muxed360p（音声付き360p）- 最高の互換性
+    if 'muxed360p' in api_data and api_data['muxed360p']:
+        if isinstance(api_data['muxed360p'], dict) and 'url' in api_data['muxed360p']:
+            muxed_url = api_data['muxed360p']['url']
+            muxed_container = api_data['muxed360p'].get('container', 'mp4')
+            muxed_mime = api_data['muxed360p'].get('mimeType', 'video/mp4')
+        else:
+            muxed_url = api_data['muxed360p']
+            muxed_container = 'mp4'
+            muxed_mime = 'video/mp4'
+        
+        formats.append(StreamFormat(muxed_url, '360p', muxed_container, muxed_mime, has_audio=True,
+                                    resolution='640x360', fps='30', label='360p (音声付き)', itag=18))
+        best_url = muxed_url
+        has_audio = True
+        logging.info(f"✓ muxed360p取得: {len(muxed_url)} 文字のURL")
+    
+    # 720p / 1080p / 480p / 240p（分離音声）
+    for quality, resolution, label, itag, preferred in _STREAM_API_SPLIT_QUALITIES:
+        entry = api_data.get(quality)
+        if not entry or not isinstance(entry, dict):
+            continue
+        video = entry.get('video') if isinstance(entry.get('video'), dict) else {}
+        audio = entry.get('audio') if isinstance(entry.get('audio'), dict) else {}
+        video_url = video.get('url')
+        audio_url = audio.get('url')
+        
+        if video_url and audio_url:
+            formats.append(StreamFormat(video_url, quality, video.get('container', 'mp4'),
+                                        video.get('mimeType', 'video/mp4'), has_audio=False, audio_url=audio_url,
+                                        resolution=resolution, fps='30', label=label, itag=itag))
+            # 音声付き360pがない場合は高画質を優先
+            if preferred and not has_audio:
+                best_url = video_url
+            logging.info(f"✓ {quality}取得: 動画={len(video_url)} 文字, 音声={len(audio_url)} 文字")
+    
+    return formats, best_url, has_audio
+
+
+# 段階的表示でストリーム情報をどの取得元の値で表示するか（前にあるほど優先）
+_WATCH_STREAM_PRIORITY = ['omada_api', 'custom_api', 'stream']
+
+
+def _simple_formats(streams):
+    """formatStreams 形式のリストを画質選択用の形式に変換"""
+    return [fmt for fmt in (stream if isinstance(stream, StreamFormat) else StreamFormat.from_stream(stream)
+                            for stream in streams or []) if fmt is not None]
+
+
+def _omada_best_url(quality_streams):
+    """Omada多品質ストリームから最適なURLを選択（360p結合ストリームを優先）→ (best_url, has_audio)"""
+    # 360pがあれば結合ストリームとして優先
+    if quality_streams.get('360p', {}).get('combined_url'):
+        return quality_streams['360p']['combined_url'], True
+    # 他の品質で動画URLがあるものを選択（分離音声）
+    for quality in ['1080p', '720p', '480p']:
+        if quality_streams.get(quality, {}).get('video_url'):
+            return quality_streams[quality]['video_url'], False
+    return '', True
+
+
+def _watch_stream_patch(name, data):
+    """取得元の結果から段階的表示用のストリーム情報を抽出（ない場合はNone）"""
+    if not data or not isinstance(data, dict):
+        return None
+    
+    if name == 'omada_api':
+        if data.get('success') and data.get('multi_quality') and data.get('quality_streams'):
+            best_url, has_audio = _omada_best_url(data['quality_streams'])
+            return {'multi_quality': True, 'quality_streams': data['quality_streams'],
+                    'best_url': best_url, 'has_audio': has_audio}
+        formats = _simple_formats(data.get('formatStreams'))
+        if formats:
+            return {'formats': formats, 'best_url': formats[0]['url'], 'has_audio': True}
+    
+    elif name == 'custom_api':
+        formats = _simple_formats(data.get('formatStreams'))
+        if data.get('streamUrl') or formats:
+            return {'formats': formats, 'best_url': data.get('streamUrl') or formats[0]['url'], 'has_audio': True}
+    
+    elif name == 'stream':
+        formats, best_url, has_audio = _formats_from_stream_api(data)
+        if formats:
+            quality_priority = {'1080p': 5, '720p': 4, '480p': 3, '360p': 2, '240p': 1}
+            formats.sort(key=lambda x: quality_priority.get(x['quality'], 0), reverse=True)
+            return {'formats': formats, 'best_url': best_url or formats[0]['url'], 'has_audio': has_audio}
+    
+    return None
+
+
+def _build_watch_stream_data(video_id, results, video_info):
+    """並列フェーズの結果から動画ページの stream_data を作成"""
+    omada_api_data = results.get('omada_api')
+    custom_api_video_info = results.get('custom_api')
+    api_data = results.get('stream')
+    invidious_video_info = results.get('invidious')
+    metadata = {key: video_info.get(key) for key in ('title', 'author', 'authorId', 'description', 'viewCount',
+                                                     'lengthSeconds', 'publishedText')}
+    
+    # 🚀 yt.omada.cafe API結果を最優先で使用 - マルチ品質対応
+    if omada_api_data and omada_api_data.get('success') and omada_api_data.get('multi_quality'):
+        logging.info(f"✅ yt.omada.cafe API から多品質ストリームを最優先使用: {video_id}")
+        quality_streams = omada_api_data.get('quality_streams', {})
+        best_url, has_audio = _omada_best_url(quality_streams)
+        
+        # YouTube Education URLを/api/<video_id>エンドポイントと同じ方法で生成（直接呼び出し）
+        try:
+            youtube_education_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
+        except Exception as e:
+            youtube_education_url = f'https://www.youtubeeducation.com/embed/{video_id}?autoplay=1&controls=1&rel=0'
+            logging.warning(f"⚠️ YouTube Education URL生成エラー、フォールバック使用: {e}")
+        
+        logging.info(f"yt.omada.cafe多品質結果: 利用可能品質={list(quality_streams.keys())}")
+        return dict(metadata, **{
+            'multi_quality': True,
+            'quality_streams': quality_streams,
+            'best_audio': omada_api_data.get('best_audio'),
+            'best_url': best_url,
+            'has_audio': has_audio,
+            'can_access_video_page': True,
+            'success': True,
+            'type': 'omada_api_multi_quality',
+            'youtube_education_url': youtube_education_url
+        })
+    
+    # 🚀 フォールバック: Omada APIから旧形式データが返された場合
+    if omada_api_data and omada_api_data.get('formatStreams'):
+        logging.info(f"✅ yt.omada.cafe API から従来形式ストリームを使用: {video_id}")
+        # 最高品質のストリームを選択
+        best_stream = max(omada_api_data['formatStreams'], key=lambda x: x.get('qualityLabel', '720p'))
+        return dict(metadata, **{
+            'formatStreams': omada_api_data.get('formatStreams', []),
+            'adaptiveFormats': omada_api_data.get('adaptiveFormats', []),
+            'hlsUrl': omada_api_data.get('hlsUrl', ''),
+            'dashUrl': omada_api_data.get('dashUrl', ''),
+            'best_url': best_stream.get('url', ''),
+            'can_access_video_page': True,
+            'success': True,
+            'type': 'omada_api'
+        })
+    
+    # 🚀 CustomApiService結果を2番目優先で使用
+    if custom_api_video_info and custom_api_service.can_access_video_page(custom_api_video_info):
+        logging.info(f"✅ CustomApiService (siawaseok.duckdns.org) からストリームを使用: {video_id}")
+        return dict(metadata, **{
+            'streamUrl': custom_api_video_info.get('streamUrl', ''),
+            'best_url': custom_api_video_info.get('streamUrl', ''),  # ストリームURLがあれば使用
+            'youtube_education_url': custom_api_video_info.get('youtubeeducation', ''),  # テンプレート用のフィールド名に統一
+            'formats': custom_api_video_info.get('formatStreams', []),
+            'can_access_video_page': True,  # CustomApiServiceが成功した場合は動画ページアクセス可能
+            'success': True,
+            'type': 'custom_api'
+        })
+    
+    if api_data:
+        # 新しいtype2 APIレスポンス構造に対応したストリーム情報設定
+        formats, best_url, has_audio = _formats_from_stream_api(api_data)
+        
+        if formats:
+            # 直接YouTube Education埋め込みURLを生成（API不要）
+            youtube_education_embed_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
+            
+            # 画質オプションを優先順位でソート
+            quality_priority = {'1080p': 5, '720p': 4, '480p': 3, '360p': 2, '240p': 1}
+            formats.sort(key=lambda x: quality_priority.get(x['quality'], 0), reverse=True)
+            
+            # 最適なURLを決定（音声付きフォーマットを優先）
+            if not best_url:
+                audio_formats = [f for f in formats if f.get('has_audio', False)]
+                best_url = audio_formats[0]['url'] if audio_formats else formats[0]['url']
+            
+            logging.info(f"✅ 全画質取得完了: {[f['quality'] for f in formats]} (計{len(formats)}種類)")
+            return {
+                'success': True,
+                'best_url': best_url,
+                'formats': formats,
+                'has_audio': has_audio,
+                'quality': formats[0]['quality'] if formats else '360p',
+                'type': 'direct',
+                'youtube_education_url': youtube_education_embed_url,
+                'total_formats': len(formats)
+            }
+    
+    # 🆕 Invidious: 並列フェーズで取得済みの動画情報からストリームURLを抽出（通信なし）
+    invidious_stream_data = invidious.extract_stream_urls(invidious_video_info) if invidious_video_info else None
+    if invidious_stream_data:
+        logging.info(f"✅ InvidiousからStreamURL取得成功: {len(invidious_stream_data['formats'])} 種類")
+        return dict(metadata, **{
+            'best_url': invidious_stream_data['best_url'],
+            'formats': invidious_stream_data['formats'],
+            'has_audio': invidious_stream_data['has_audio'],
+            'quality': invidious_stream_data['formats'][0]['quality'],
+            'youtube_education_url': multi_stream_service.get_direct_youtube_embed_url(video_id, "education"),
+            'can_access_video_page': True,
+            'success': True,
+            'type': 'invidious'
+        })
+    
+    if api_data:
+        # フォールバック：YouTube Education埋め込み
+        youtube_education_embed_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
+        return {
+            'success': True,
+            'embed_url': f'https://www.youtube-nocookie.com/embed/{video_id}',
+            'youtube_education_url': youtube_education_embed_url,
+            'quality': 'embed',
+            'type': 'embed',
+            'formats': []
+        }
+    
+    logging.warning(f"マルチAPIからストリームを取得できませんでした")
+    return {
+        'success': False,
+        'embed_url': f'https://www.youtube-nocookie.com/embed/{video_id}',
+        'quality': 'embed',
+        'type': 'fallback',
+        'formats': [],
+        'error': 'データを取得できませんでした'
+    }
+
+
+def _watch_shell_data(video_id):
+    """段階的表示の初期HTML用の video_info / stream_data（上流APIを待たずに生成）"""
+    # 統合済みの動画情報がキャッシュにあれば初期HTMLに含める（タイトル・OGPが最初から正しくなる）
+    cached = video_metadata_resolver.get_cached(video_id)
+    video_info = dict(cached) if cached else {
+        'videoId': video_id,
+        'title': '読み込み中...',
+        'author': '',
+        'authorId': '',
+        'lengthSeconds': 0,
+        'viewCount': 0,
+        'publishedText': '',
+        'description': '',
+        'videoThumbnails': [
+            {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
+            {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
+        ]
+    }
+    stream_data = {
+        'success': True,
+        'youtube_education_url': multi_stream_service.get_local_youtube_education_url(video_id),
+        'formats': [],
+        'quality': 'embed',
+        'type': 'progressive'
+    }
+    return video_info, stream_data
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=json_default)}\n\n"
+
+
+@app.route('/watch/events/<video_id>')
+def watch_events(video_id):
+    """段階的表示用のServer-Sent Events: 取得元ごとにメタデータ・ストリーム情報を送信"""
+    view_count_filter = app.jinja_env.filters.get('format_view_count_with_suffix')
+    published_filter = app.jinja_env.filters.get('format_published_japanese')
+
+    def generate():
+        start_time = time.time()
+        payloads = {}
+        metadata_owner = {}
+        stream_owner = None
+        first_stream_sent = None
+        
+        for name, data in upstream_executor.iter_completed(video_metadata_resolver.source_tasks(video_id),
+                                                           timeout=WATCH_STREAM_DEADLINE,
+                                                           label=f"watch-events[{video_id}]"):
+            payloads[name] = data
+            metadata = video_metadata_resolver.normalize(name, data, video_id)
+            streams = _watch_stream_patch(name, data)
+            
+            # 優先度の高い取得元の値を上書きしないよう項目ごとに採用元を記録
+            changed = {}
+            for key, value in metadata.items():
+                priority = video_metadata_resolver.priority(key)
+                owner = metadata_owner.get(key)
+                if name in priority and (owner is None or priority.index(name) < priority.index(owner)):
+                    metadata_owner[key] = name
+                    changed[key] = value
+            if changed:
+                if 'viewCount' in changed and view_count_filter:
+                    changed['viewCountText'] = view_count_filter(changed['viewCount'])
+                if 'publishedText' in changed and published_filter:
+                    changed['publishedTextFormatted'] = published_filter(changed['publishedText'])
+                yield _sse_event('metadata', {'source': name, 'elapsed': round(time.time() - start_time, 3),
+                                              'fields': changed})
+            
+            if streams and (stream_owner is None or
+                            _WATCH_STREAM_PRIORITY.index(name) < _WATCH_STREAM_PRIORITY.index(stream_owner)):
+                stream_owner = name
+                if first_stream_sent is None:
+                    first_stream_sent = time.time() - start_time
+                streams['source'] = name
+                streams['elapsed'] = round(time.time() - start_time, 3)
+                yield _sse_event('streams', streams)
+        
+        # 統合結果をキャッシュし、どの取得元からも埋まらずフォールバックで補完した項目も送る
+        if metadata_owner:
+            record = video_metadata_resolver.resolve_payloads(video_id, payloads)
+            fallback_fields = {key: record[key] for key, source in record['metadata_sources'].items()
+                               if source.startswith('fallback:')}
+            if fallback_fields:
+                yield _sse_event('metadata', {'source': 'fallback', 'elapsed': round(time.time() - start_time, 3),
+                                              'fields': fallback_fields})
+            # 視聴履歴を記録
+            user_prefs.record_watch(record)
+        
+        elapsed = time.time() - start_time
+        logging.info(f"🚀 段階的表示完了 {video_id}: {elapsed:.2f}秒 (初回ストリーム: "
+                     f"{f'{first_stream_sent:.2f}秒' if first_stream_sent is not None else 'なし'}, "
+                     f"採用元: {sorted(set(metadata_owner.values()))})")
+        yield _sse_event('done', {'elapsed': round(elapsed, 3), 'has_streams': stream_owner is not None})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/watch')
 def watch():
     """動画視聴ページ - siawaseok API専用版"""
@@ -822,799 +852,49 @@ def watch():
     if not video_id:
         return redirect(url_for('index'))
     
+    # 段階的表示: 上流APIを待たずにプレーヤー（YouTube Education埋め込み）を含む初期HTMLを返し、
+    # 動画情報・ストリームは /watch/events/<video_id> から取得元ごとに反映する
+    if request.args.get('progressive', '1' if WATCH_PROGRESSIVE else '0') != '0':
+        video_info, stream_data = _watch_shell_data(video_id)
+        return render_template('watch.html',
+                             video_info=video_info,
+                             stream_data=stream_data,
+                             comments_data={'comments': [], 'continuation': None},
+                             progressive_events_url=url_for('watch_events', video_id=video_id))
+    
     try:
-        # 🚀 超高速並列処理: 全てのAPIリクエストを同時に開始
-        import concurrent.futures
-        import threading
-        
+        # 🚀 超高速並列処理: 全てのAPIリクエストを共有スレッドプールで同時に開始
         logging.info(f"🚀 超高速並列処理開始: {video_id}")
         
-        # 並列処理用の結果保存
-        results = {}
-        
-        def get_omada_api_info():
-            """🚀 yt.omada.cafe API - 最優先（多品質対応）"""
-            try:
-                if video_id:  # video_idの存在を確認
-                    # 🚀 多品質ストリーム取得 (360p, 480p, 720p, 1080p)
-                    target_qualities = ['360p', '480p', '720p', '1080p']
-                    omada_data = video_service.get_stream_urls(video_id, target_qualities)
-                    if omada_data:
-                        results['omada_api'] = omada_data
-                        logging.info(f"✅ Omada API (yt.omada.cafe) 多品質取得完了 - 最優先")
-                    else:
-                        results['omada_api'] = None
-                else:
-                    results['omada_api'] = None
-            except Exception as e:
-                logging.warning(f"Omada API (yt.omada.cafe) 失敗: {e}")
-                results['omada_api'] = None
-
-        def get_custom_api_info():
-            try:
-                if video_id:  # video_idの存在を確認
-                    custom_data = custom_api_service.get_video_info(video_id)
-                    if custom_data:
-                        results['custom_api'] = custom_api_service.format_video_info(custom_data)
-                        logging.info(f"✅ CustomApiService (siawaseok.duckdns.org) API完了")
-                    else:
-                        results['custom_api'] = None
-                else:
-                    results['custom_api'] = None
-            except Exception as e:
-                logging.warning(f"CustomApiService API失敗: {e}")
-                results['custom_api'] = None
-
-        def get_kahoot_video_info():
-            try:
-                if video_id:  # video_idの存在を確認
-                    results['kahoot'] = multi_stream_service.get_video_info_from_kahoot(video_id)
-                    logging.info(f"✅ Kahoot API完了")
-                else:
-                    results['kahoot'] = None
-            except Exception as e:
-                logging.warning(f"Kahoot API失敗: {e}")
-                results['kahoot'] = None
-        
-        def get_stream_info():
-            try:
-                if video_id:  # video_idの存在を確認
-                    results['stream'] = multi_stream_service.get_video_stream_info(video_id)
-                    logging.info(f"✅ Stream API完了")
-                else:
-                    results['stream'] = None
-            except Exception as e:
-                logging.warning(f"Stream API失敗: {e}")
-                results['stream'] = None
-        
-        def get_invidious_info():
-            try:
-                if video_id:  # video_idの存在を確認
-                    results['invidious'] = invidious.get_video_info(video_id)
-                    logging.info(f"✅ Invidious API完了")
-                else:
-                    results['invidious'] = None
-            except Exception as e:
-                logging.warning(f"Invidious API失敗: {e}")
-                results['invidious'] = None
-        
-        def get_additional_streams():
-            """🚀 追加の高速APIサービス群を並列実行（簡素化）"""
-            try:
-                from additional_services import AdditionalStreamServices
-                additional_services = AdditionalStreamServices()
-                
-                # 順次実行でスレッドプール問題を回避
-                try:
-                    result = additional_services.get_noembed_stream(video_id)
-                    if result:
-                        results['additional_noembed'] = result
-                        logging.info(f"✅ Noembed API成功")
-                except:
-                    pass
-                
-                try:
-                    result = additional_services.get_lemnoslife_stream(video_id)
-                    if result:
-                        results['additional_lemnoslife'] = result
-                        logging.info(f"✅ LemnosLife API成功")
-                except:
-                    pass
-                
-                logging.info(f"✅ 追加API群処理完了")
-            except Exception as e:
-                logging.warning(f"追加API群失敗: {e}")
-        
-        # 🚀 メインAPI + 追加API群を安全な並列で実行
+        # 🚀 メタデータ・ストリームの取得元を共有スレッドプールで同時に開始（締め切りを過ぎた取得元は待たない）
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [
-                    executor.submit(get_omada_api_info),     # 🚀 最優先: yt.omada.cafe
-                    executor.submit(get_custom_api_info),    # 2番目: CustomApiService
-                    executor.submit(get_kahoot_video_info),  # 3番目: Kahoot
-                    executor.submit(get_stream_info),        # 4番目: Stream
-                    executor.submit(get_invidious_info)      # 5番目: Invidious
-                ]
-                
-                # 🚀 最大3秒で全API処理完了（超高速化重視）
-                done, not_done = concurrent.futures.wait(futures, timeout=3.0)
-                
-                # 完了していないフューチャーをキャンセル
-                for future in not_done:
-                    future.cancel()
-            
-            # 追加APIを別途実行
-            get_additional_streams()
+            results = video_metadata_resolver.fetch(video_id, timeout=WATCH_FANOUT_DEADLINE, label=f"watch[{video_id}]")
         except Exception as e:
             logging.error(f"並列処理エラー: {e}")
             # フォールバック: 順次実行
-            get_omada_api_info()      # 🚀 最優先
-            get_custom_api_info()
-            get_kahoot_video_info()
-            get_stream_info() 
-            get_invidious_info()
-            get_additional_streams()
+            results = {}
+            for name, task in video_metadata_resolver.source_tasks(video_id).items():
+                try:
+                    results[name] = task()
+                except Exception as task_error:
+                    logging.warning(f"{name} 失敗: {task_error}")
+                    results[name] = None
         
         # 成功したAPI数を計算
-        successful_apis = len([k for k, v in results.items() if v is not None and not k.startswith('additional_')])
-        total_apis = 5  # OmadaAPI, CustomApiService, Kahoot, Stream, Invidious
-        additional_apis = len([k for k in results.keys() if k.startswith('additional_')])
+        successful_apis = len([v for v in results.values() if v is not None])
+        total_apis = len(video_metadata_resolver.source_names)  # OmadaAPI, CustomApiService, Kahoot, Invidious, Stream
         
-        logging.info(f"🚀 超高速並列処理完了: メインAPI {successful_apis}/{total_apis}, 追加API {additional_apis}個成功")
+        logging.info(f"🚀 超高速並列処理完了: API {successful_apis}/{total_apis} 成功")
         
-        # 結果を取得（🚀 yt.omada.cafe を最優先）
-        omada_api_data = results.get('omada_api')
-        custom_api_video_info = results.get('custom_api')
-        kahoot_video_info = results.get('kahoot')
-        api_data = results.get('stream')
-        invidious_video_info = results.get('invidious')
+        # 🧩 動画情報は項目ごとの優先順で1回だけ統合（欠けた項目だけフォールバックで補完）
+        video_info = dict(video_metadata_resolver.resolve_payloads(video_id, results))
+        logging.info(f"🧩 動画情報の採用元: {video_info.get('metadata_sources')}")
         
-        # 🆕 InvidiousからもStreamURLを取得
-        invidious_stream_data = None
-        try:
-            if invidious_video_info:
-                logging.info(f"🚀 InvidiousからStreamURL取得開始: {video_id}")
-                invidious_stream_data = invidious.get_stream_urls(video_id)
-                if invidious_stream_data:
-                    logging.info(f"✅ InvidiousからStreamURL取得成功: {len(invidious_stream_data.get('formats', []))} 種類")
-                else:
-                    logging.warning(f"⚠️ InvidiousStreamURL取得失敗: {video_id}")
-        except Exception as e:
-            logging.warning(f"InvidiousStreamURL取得エラー: {e}")
+        # ストリーム情報は Omada(多品質) > Omada(従来形式) > CustomApiService > Stream API > Invidious の順で採用
+        stream_data = _build_watch_stream_data(video_id, results, video_info)
         
-        video_info = None
-        stream_data = None
-        
-        # 🚀 yt.omada.cafe API結果を最優先で使用 - マルチ品質対応
-        if omada_api_data and omada_api_data.get('success') and omada_api_data.get('multi_quality'):
-            logging.info(f"✅ yt.omada.cafe API から多品質動画情報を最優先使用: {video_id}")
-            
-            # 新しいマルチ品質形式から最適なURLを選択（360pを優先）
-            quality_streams = omada_api_data.get('quality_streams', {})
-            best_url = ''
-            has_audio = True
-            
-            # 360pがあれば結合ストリームとして優先
-            if '360p' in quality_streams and quality_streams['360p'].get('combined_url'):
-                best_url = quality_streams['360p']['combined_url']
-                has_audio = True
-                logging.info("360p結合ストリームを最適URLとして選択")
-            # 他の品質で動画URLがあるものを選択
-            elif quality_streams:
-                for quality in ['1080p', '720p', '480p']:
-                    if quality in quality_streams and quality_streams[quality].get('video_url'):
-                        best_url = quality_streams[quality]['video_url']
-                        has_audio = False  # 分離音声
-                        logging.info(f"{quality}分離ストリームを最適URLとして選択")
-                        break
-            
-            # YouTube Education URLを/api/<video_id>エンドポイントと同じ方法で生成（直接呼び出し）
-            try:
-                # 内部API呼び出しの代わりに直接multi_stream_serviceを使用（より高速）
-                youtube_education_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
-                logging.info(f"✅ multi_stream_serviceから直接YouTube Education URL取得成功")
-            except Exception as e:
-                youtube_education_url = f'https://www.youtubeeducation.com/embed/{video_id}?autoplay=1&controls=1&rel=0'
-                logging.warning(f"⚠️ YouTube Education URL生成エラー、フォールバック使用: {e}")
-
-            # Omada APIからのマルチ品質情報を設定
-            stream_data = {
-                'title': omada_api_data.get('title', f'Video {video_id}'),
-                'author': omada_api_data.get('author', 'Unknown'),
-                'authorId': omada_api_data.get('authorId', ''),
-                'description': omada_api_data.get('description', ''),
-                'viewCount': omada_api_data.get('viewCount', 0),
-                'lengthSeconds': omada_api_data.get('lengthSeconds', 0),
-                'publishedText': omada_api_data.get('publishedText', ''),
-                'multi_quality': True,
-                'quality_streams': quality_streams,
-                'best_audio': omada_api_data.get('best_audio'),
-                'best_url': best_url,
-                'has_audio': has_audio,
-                'can_access_video_page': True,
-                'success': True,
-                'type': 'omada_api_multi_quality',
-                'youtube_education_url': youtube_education_url
-            }
-            
-            # video_infoも設定
-            video_info = {
-                'videoId': video_id,
-                'title': omada_api_data.get('title', f'Video {video_id}'),
-                'author': omada_api_data.get('author', 'Unknown'),
-                'authorId': omada_api_data.get('authorId', ''),
-                'lengthSeconds': omada_api_data.get('lengthSeconds', 0),
-                'viewCount': omada_api_data.get('viewCount', 0),
-                'publishedText': omada_api_data.get('publishedText', ''),
-                'description': omada_api_data.get('description', ''),
-                'videoThumbnails': [
-                    {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
-                    {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
-                ]
-            }
-                
-            logging.info(f"yt.omada.cafe多品質結果: タイトル={stream_data['title']}, 利用可能品質={list(quality_streams.keys())}")
-            
-        # 🚀 フォールバック: Omada APIから旧形式データが返された場合
-        elif omada_api_data and omada_api_data.get('formatStreams'):
-            logging.info(f"✅ yt.omada.cafe API から従来形式動画情報を使用: {video_id}")
-            
-            # Omada APIからの基本情報を設定（従来形式）
-            stream_data = {
-                'title': omada_api_data.get('title', f'Video {video_id}'),
-                'author': omada_api_data.get('author', 'Unknown'),
-                'authorId': omada_api_data.get('authorId', ''),
-                'description': omada_api_data.get('description', ''),
-                'viewCount': omada_api_data.get('viewCount', 0),
-                'lengthSeconds': omada_api_data.get('lengthSeconds', 0),
-                'publishedText': omada_api_data.get('publishedText', ''),
-                'formatStreams': omada_api_data.get('formatStreams', []),
-                'adaptiveFormats': omada_api_data.get('adaptiveFormats', []),
-                'hlsUrl': omada_api_data.get('hlsUrl', ''),
-                'dashUrl': omada_api_data.get('dashUrl', ''),
-                'best_url': '',  # formatStreamsから最適なURLを選択
-                'can_access_video_page': True,
-                'success': True,
-                'type': 'omada_api'
-            }
-            
-            # formatStreamsから最適なストリームURLを選択
-            if omada_api_data.get('formatStreams'):
-                # 最高品質のストリームを選択
-                best_stream = max(omada_api_data['formatStreams'], 
-                                key=lambda x: x.get('qualityLabel', '720p'))
-                stream_data['best_url'] = best_stream.get('url', '')
-                
-            # video_infoも設定（従来形式）
-            video_info = {
-                'videoId': video_id,
-                'title': omada_api_data.get('title', f'Video {video_id}'),
-                'author': omada_api_data.get('author', 'Unknown'),
-                'authorId': omada_api_data.get('authorId', ''),
-                'lengthSeconds': omada_api_data.get('lengthSeconds', 0),
-                'viewCount': omada_api_data.get('viewCount', 0),
-                'publishedText': omada_api_data.get('publishedText', ''),
-                'description': omada_api_data.get('description', ''),
-                'videoThumbnails': [
-                    {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
-                    {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
-                ]
-            }
-            
-            logging.info(f"yt.omada.cafe従来形式結果: タイトル={stream_data['title']}, フォーマット数={len(stream_data['formatStreams'])}")
-            
-        # 🚀 CustomApiService結果を2番目優先で使用
-        elif custom_api_video_info and custom_api_service.can_access_video_page(custom_api_video_info):
-            logging.info(f"✅ CustomApiService (siawaseok.duckdns.org) から動画情報を最優先使用: {video_id}")
-            video_info = custom_api_video_info
-            
-            # CustomApiServiceから基本的なstream情報を生成
-            stream_data = {
-                'title': video_info.get('title', f'Video {video_id}'),
-                'author': video_info.get('author', 'Unknown'),
-                'authorId': video_info.get('authorId', ''),
-                'description': video_info.get('description', ''),
-                'viewCount': video_info.get('viewCount', 0),
-                'lengthSeconds': video_info.get('lengthSeconds', 0),
-                'publishedText': video_info.get('publishedText', ''),
-                'streamUrl': video_info.get('streamUrl', ''),
-                'best_url': video_info.get('streamUrl', ''),  # ストリームURLがあれば使用
-                'youtube_education_url': video_info.get('youtubeeducation', ''),  # テンプレート用のフィールド名に統一
-                'formats': video_info.get('formatStreams', []),
-                'can_access_video_page': True,  # CustomApiServiceが成功した場合は動画ページアクセス可能
-                'success': True,
-                'type': 'custom_api'
-            }
-            
-            logging.info(f"CustomApiService結果: タイトル={stream_data['title']}, YouTubeEducation={bool(stream_data['youtube_education_url'])}")
-            
-        elif api_data:
-            logging.info(f"マルチAPIデータ受信成功")
-            
-            # duration値を安全に変換
-            duration_raw = api_data.get('duration', 0)
-            try:
-                if isinstance(duration_raw, str):
-                    if ':' in duration_raw:
-                        parts = duration_raw.split(':')
-                        if len(parts) == 2:
-                            duration_seconds = int(parts[0]) * 60 + int(parts[1])
-                        elif len(parts) == 3:
-                            duration_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                        else:
-                            duration_seconds = 0
-                    else:
-                        duration_seconds = int(duration_raw)
-                else:
-                    duration_seconds = int(duration_raw) if duration_raw else 0
-            except (ValueError, TypeError):
-                duration_seconds = 0
-
-            # viewCount値を安全に変換（複数のフィールドをチェック）
-            view_count_raw = (api_data.get('view_count') or 
-                            api_data.get('viewCount') or 
-                            api_data.get('views') or 
-                            api_data.get('view_count_text', '').replace(',', '').replace('回視聴', '').replace('回再生', '').strip() or
-                            0)
-            try:
-                # 文字列の場合、数字以外を削除してから変換
-                if isinstance(view_count_raw, str):
-                    # 日本語の数字記号を除去して数字のみ抽出
-                    import re
-                    view_count_clean = re.sub(r'[^\d]', '', view_count_raw)
-                    view_count = int(view_count_clean) if view_count_clean else 0
-                else:
-                    view_count = int(view_count_raw) if view_count_raw else 0
-            except (ValueError, TypeError):
-                view_count = 0
-
-            # チャンネル名とIDを適切に取得
-            author_name = (api_data.get('uploader') or 
-                         api_data.get('author') or
-                         api_data.get('channel', {}).get('name') if isinstance(api_data.get('channel'), dict) else None or
-                         api_data.get('channel_name') or
-                         'Unknown')
-            
-            author_id = (api_data.get('uploader_id') or 
-                       api_data.get('authorId') or
-                       api_data.get('channel', {}).get('id') if isinstance(api_data.get('channel'), dict) else None or
-                       api_data.get('channel_id') or
-                       '')
-            
-            # siawaseok APIから動画の説明欄を取得
-            video_description = api_data.get('description', '')
-            
-            # 🚀 並列処理で取得済みのInvidious情報を活用
-            if invidious_video_info:
-                # Invidiousから取得した情報で補完
-                if author_name == 'Unknown' and invidious_video_info.get('author'):
-                    author_name = invidious_video_info['author']
-                if not author_id and invidious_video_info.get('authorId'):
-                    author_id = invidious_video_info['authorId']
-                # より詳細な説明文があれば使用
-                if not video_description and invidious_video_info.get('description'):
-                    video_description = invidious_video_info['description']
-                
-                # より信頼性の高い視聴回数があれば更新
-                invidious_view_count = invidious_video_info.get('viewCount', 0)
-                try:
-                    invidious_view_count = int(invidious_view_count) if invidious_view_count else 0
-                    # Invidiousの方が大きい値か、siawaseokが0の場合はInvidiousの値を使用
-                    if invidious_view_count > view_count or view_count == 0:
-                        view_count = invidious_view_count
-                        logging.info(f"Invidiousから視聴回数を更新: {invidious_view_count:,}回")
-                except (ValueError, TypeError):
-                    pass
-                
-                logging.info(f"🚀 並列処理完了Invidiousデータ活用: 投稿者={author_name}, ID={author_id}")
-            
-            logging.info(f"動画説明文の長さ: {len(video_description)} 文字")
-            logging.info(f"チャンネル情報: 名前={author_name}, ID={author_id}")
-            
-            # 🚀 チャンネル情報も必要時のみ高速取得（Unknownの場合のみ）
-            channel_info = None  # 変数を初期化
-            if author_id and author_name == 'Unknown':
-                try:
-                    channel_api_url = f"https://siawaseok.duckdns.org/api/channel/{author_id}"
-                    logging.info(f"🚀 高速チャンネル情報取得: {channel_api_url}")
-                    channel_response = requests.get(channel_api_url, timeout=3)  # タイムアウト短縮
-                    if channel_response.status_code == 200:
-                        channel_info = channel_response.json()
-                        if channel_info and 'name' in channel_info:
-                            author_name = channel_info.get('name', author_name)
-                            logging.info(f"✅ チャンネル情報取得成功: {author_name}")
-                except Exception as e:
-                    logging.warning(f"チャンネル情報取得スキップ: {e}")
-
-            # 動画タイトルを複数のソースから優先的に取得
-            title = api_data.get('title')
-            
-            # まずInvidiousから取得を試みる（より信頼性が高い）
-            if not title or title == f'Video {video_id}' or title == f'動画 {video_id}':
-                if invidious_video_info and invidious_video_info.get('title'):
-                    title = invidious_video_info['title']
-                    logging.info(f"優先: Invidiousからタイトル取得: {title}")
-            
-            # それでも取得できない場合、代替APIを試す
-            if not title or title == f'Video {video_id}' or title == f'動画 {video_id}':
-                try:
-                    detail_url = f"https://siawaseok.duckdns.org/api/stream/{video_id}"
-                    detail_response = requests.get(detail_url, timeout=10)
-                    if detail_response.status_code == 200:
-                        detail_data = detail_response.json()
-                        if detail_data.get('title'):
-                            title = detail_data['title']
-                            logging.info(f"代替APIからタイトル取得: {title}")
-                except Exception as e:
-                    logging.warning(f"代替API失敗: {e}")
-            
-            # 🆕 動画情報を優先順位で統合（Kahoot API > Invidious > siawaseok）
-            final_title = title
-            final_author = author_name
-            final_author_id = author_id
-            final_description = video_description
-            final_published_text = ''
-            final_thumbnails = []
-            final_length_seconds = duration_seconds
-            
-            # 1. Kahoot APIからの情報を最優先
-            if kahoot_video_info:
-                if kahoot_video_info.get('title'):
-                    final_title = kahoot_video_info['title']
-                    logging.info(f"✅ Kahoot APIからタイトル取得: {final_title}")
-                if kahoot_video_info.get('author'):
-                    final_author = kahoot_video_info['author']
-                    logging.info(f"✅ Kahoot APIから投稿者取得: {final_author}")
-                if kahoot_video_info.get('authorId'):
-                    final_author_id = kahoot_video_info['authorId']
-                if kahoot_video_info.get('description'):
-                    final_description = kahoot_video_info['description']
-                    logging.info(f"✅ Kahoot APIから説明文取得: {len(final_description)} 文字")
-                if kahoot_video_info.get('publishedText'):
-                    final_published_text = kahoot_video_info['publishedText']
-                if kahoot_video_info.get('videoThumbnails'):
-                    final_thumbnails = kahoot_video_info['videoThumbnails']
-                if kahoot_video_info.get('lengthSeconds'):
-                    final_length_seconds = kahoot_video_info['lengthSeconds']
-            
-            # 2. Invidiousで補完
-            if not final_title or final_title == f'動画 {video_id}':
-                if invidious_video_info and invidious_video_info.get('title'):
-                    final_title = invidious_video_info['title']
-                    logging.info(f"Invidiousからタイトル補完: {final_title}")
-            
-            if final_author == 'Unknown' or not final_author:
-                if invidious_video_info and invidious_video_info.get('author'):
-                    final_author = invidious_video_info['author']
-                    logging.info(f"Invidiousから投稿者補完: {final_author}")
-            
-            if not final_description:
-                if invidious_video_info and invidious_video_info.get('description'):
-                    final_description = invidious_video_info['description']
-            
-            if not final_published_text:
-                if invidious_video_info and invidious_video_info.get('publishedText'):
-                    final_published_text = invidious_video_info['publishedText']
-                elif api_data.get('upload_date'):
-                    upload_date = api_data.get('upload_date')
-                    if upload_date and upload_date != 'N/A':
-                        final_published_text = upload_date
-            
-            if not final_thumbnails:
-                if invidious_video_info and invidious_video_info.get('videoThumbnails'):
-                    final_thumbnails = invidious_video_info['videoThumbnails']
-                else:
-                    final_thumbnails = [
-                        {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
-                        {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
-                    ]
-            
-            # 3. 最終的なフォールバック処理
-            if not final_title or final_title == f'動画 {video_id}':
-                try:
-                    fallback_response = requests.get(f"https://siawaseok.duckdns.org/api/stream/{video_id}", timeout=10)
-                    if fallback_response.status_code == 200:
-                        fallback_data = fallback_response.json()
-                        if fallback_data.get('title'):
-                            final_title = fallback_data['title']
-                            logging.info(f"フォールバックからタイトル取得: {final_title}")
-                except Exception as e:
-                    logging.warning(f"フォールバックタイトル取得失敗: {e}")
-            
-            if not final_title or final_title == f'動画 {video_id}':
-                final_title = "タイトル未取得"
-                logging.warning(f"動画 {video_id} のタイトルを取得できませんでした")
-            
-            # 🆕 複数のAPIソースからチャンネルアイコン（authorThumbnails）を取得
-            final_author_thumbnails = []
-            
-            # 1. Kahoot APIから取得（小さいサイズから大きいサイズの順序でテンプレートの期待に合わせる）
-            if kahoot_video_info and kahoot_video_info.get('snippet', {}).get('thumbnails'):
-                thumbnail_sizes = ['default', 'medium', 'high']  # 最小→最大の順序に修正
-                for size in thumbnail_sizes:
-                    if kahoot_video_info['snippet']['thumbnails'].get(size, {}).get('url'):
-                        final_author_thumbnails.append({
-                            'url': kahoot_video_info['snippet']['thumbnails'][size]['url'],
-                            'width': kahoot_video_info['snippet']['thumbnails'][size].get('width', 88),
-                            'height': kahoot_video_info['snippet']['thumbnails'][size].get('height', 88)
-                        })
-            
-            # 2. Invidious APIから取得（フォールバック）
-            if not final_author_thumbnails and invidious_video_info and invidious_video_info.get('authorThumbnails'):
-                final_author_thumbnails = invidious_video_info['authorThumbnails']
-            
-            # 3. siawaseok APIのチャンネル情報から取得（フォールバック）
-            if not final_author_thumbnails and channel_info and channel_info.get('avatarUrl'):
-                final_author_thumbnails.append({
-                    'url': channel_info['avatarUrl'],
-                    'width': 176,
-                    'height': 176
-                })
-            
-            # 4. 最終フォールバック：YouTubeの標準チャンネルアイコンURL生成
-            if not final_author_thumbnails and final_author_id:
-                final_author_thumbnails.append({
-                    'url': f'https://yt3.ggpht.com/ytc/default_user=s176-c-k-c0x00ffffff-no-rj',
-                    'width': 176,
-                    'height': 176
-                })
-            
-            # 5. 完全なフォールバック：デフォルトアバター
-            if not final_author_thumbnails:
-                final_author_thumbnails.append({
-                    'url': 'https://via.placeholder.com/176x176/cccccc/ffffff?text=USER',
-                    'width': 176,
-                    'height': 176
-                })
-
-            video_info = {
-                'videoId': video_id,
-                'title': final_title,
-                'author': final_author,
-                'authorId': final_author_id,
-                'lengthSeconds': final_length_seconds,
-                'viewCount': view_count,
-                'publishedText': final_published_text,
-                'description': final_description,
-                'videoThumbnails': final_thumbnails,
-                'authorThumbnails': final_author_thumbnails,
-                'subCountText': invidious_video_info.get('subCountText', '') if invidious_video_info else '',
-                'channel_info': channel_info,  # siawaseok APIから取得
-                # 🆕 Kahoot API特有の情報も追加
-                'kahoot_data': kahoot_video_info if kahoot_video_info else None
-            }
-            
-            # 新しいtype2 APIレスポンス構造に対応したストリーム情報設定
-            formats = []
-            best_url = None
-            has_audio = False
-            
-            # muxed360p（音声付き360p）- 最高の互換性
-            if 'muxed360p' in api_data and api_data['muxed360p']:
-                if isinstance(api_data['muxed360p'], dict) and 'url' in api_data['muxed360p']:
-                    muxed_url = api_data['muxed360p']['url']
-                    muxed_container = api_data['muxed360p'].get('container', 'mp4')
-                    muxed_mime = api_data['muxed360p'].get('mimeType', 'video/mp4')
-                else:
-                    muxed_url = api_data['muxed360p']
-                    muxed_container = 'mp4'
-                    muxed_mime = 'video/mp4'
-                
-                formats.append({
-                    'url': muxed_url,
-                    'quality': '360p',
-                    'resolution': '640x360',
-                    'container': muxed_container,
-                    'has_audio': True,
-                    'audio_url': '',
-                    'fps': '30',
-                    'mimeType': muxed_mime,
-                    'label': '360p (音声付き)',
-                    'itag': 18
-                })
-                best_url = muxed_url
-                has_audio = True
-                logging.info(f"✓ muxed360p取得: {len(muxed_url)} 文字のURL")
-            
-            # 720p（高画質、分離音声）
-            if '720p' in api_data and api_data['720p']:
-                video_url = None
-                audio_url = None
-                video_container = 'mp4'
-                video_mime = 'video/mp4'
-                
-                if isinstance(api_data['720p'], dict):
-                    if 'video' in api_data['720p'] and isinstance(api_data['720p']['video'], dict):
-                        video_info_720p = api_data['720p']['video']
-                        video_url = video_info_720p.get('url')
-                        video_container = video_info_720p.get('container', 'mp4')
-                        video_mime = video_info_720p.get('mimeType', 'video/mp4')
-                    if 'audio' in api_data['720p'] and isinstance(api_data['720p']['audio'], dict):
-                        audio_url = api_data['720p']['audio'].get('url')
-                
-                if video_url and audio_url:
-                    formats.append({
-                        'url': video_url,
-                        'quality': '720p',
-                        'resolution': '1280x720',
-                        'container': video_container,
-                        'has_audio': False,
-                        'audio_url': audio_url,
-                        'fps': '30',
-                        'mimeType': video_mime,
-                        'label': '720p (高画質)',
-                        'itag': 136
-                    })
-                    if not has_audio:  # 720pを優先として設定（360pがない場合）
-                        best_url = video_url
-                    logging.info(f"✓ 720p取得: 動画={len(video_url)} 文字, 音声={len(audio_url)} 文字")
-            
-            # 1080p（最高画質、分離音声）
-            if '1080p' in api_data and api_data['1080p']:
-                video_url = None
-                audio_url = None
-                video_container = 'mp4'
-                video_mime = 'video/mp4'
-                
-                if isinstance(api_data['1080p'], dict):
-                    if 'video' in api_data['1080p'] and isinstance(api_data['1080p']['video'], dict):
-                        video_info_1080p = api_data['1080p']['video']
-                        video_url = video_info_1080p.get('url')
-                        video_container = video_info_1080p.get('container', 'mp4')
-                        video_mime = video_info_1080p.get('mimeType', 'video/mp4')
-                    if 'audio' in api_data['1080p'] and isinstance(api_data['1080p']['audio'], dict):
-                        audio_url = api_data['1080p']['audio'].get('url')
-                
-                if video_url and audio_url:
-                    formats.append({
-                        'url': video_url,
-                        'quality': '1080p',
-                        'resolution': '1920x1080',
-                        'container': video_container,
-                        'has_audio': False,
-                        'audio_url': audio_url,
-                        'fps': '30',
-                        'mimeType': video_mime,
-                        'label': '1080p (最高画質)',
-                        'itag': 137
-                    })
-                    # 1080pが利用可能で360pがない場合は1080pを優先
-                    if not has_audio:
-                        best_url = video_url
-                    logging.info(f"✓ 1080p取得: 動画={len(video_url)} 文字, 音声={len(audio_url)} 文字")
-            
-            # 480p（中画質、分離音声）
-            if '480p' in api_data and api_data['480p']:
-                video_url = None
-                audio_url = None
-                video_container = 'mp4'
-                video_mime = 'video/mp4'
-                
-                if isinstance(api_data['480p'], dict):
-                    if 'video' in api_data['480p'] and isinstance(api_data['480p']['video'], dict):
-                        video_info_480p = api_data['480p']['video']
-                        video_url = video_info_480p.get('url')
-                        video_container = video_info_480p.get('container', 'mp4')
-                        video_mime = video_info_480p.get('mimeType', 'video/mp4')
-                    if 'audio' in api_data['480p'] and isinstance(api_data['480p']['audio'], dict):
-                        audio_url = api_data['480p']['audio'].get('url')
-                
-                if video_url and audio_url:
-                    formats.append({
-                        'url': video_url,
-                        'quality': '480p',
-                        'resolution': '854x480',
-                        'container': video_container,
-                        'has_audio': False,
-                        'audio_url': audio_url,
-                        'fps': '30',
-                        'mimeType': video_mime,
-                        'label': '480p (標準)',
-                        'itag': 135
-                    })
-                    logging.info(f"✓ 480p取得: 動画={len(video_url)} 文字, 音声={len(audio_url)} 文字")
-            
-            # 240p（低画質、分離音声）
-            if '240p' in api_data and api_data['240p']:
-                video_url = None
-                audio_url = None
-                video_container = 'mp4'
-                video_mime = 'video/mp4'
-                
-                if isinstance(api_data['240p'], dict):
-                    if 'video' in api_data['240p'] and isinstance(api_data['240p']['video'], dict):
-                        video_info_240p = api_data['240p']['video']
-                        video_url = video_info_240p.get('url')
-                        video_container = video_info_240p.get('container', 'mp4')
-                        video_mime = video_info_240p.get('mimeType', 'video/mp4')
-                    if 'audio' in api_data['240p'] and isinstance(api_data['240p']['audio'], dict):
-                        audio_url = api_data['240p']['audio'].get('url')
-                
-                if video_url and audio_url:
-                    formats.append({
-                        'url': video_url,
-                        'quality': '240p',
-                        'resolution': '426x240',
-                        'container': video_container,
-                        'has_audio': False,
-                        'audio_url': audio_url,
-                        'fps': '30',
-                        'mimeType': video_mime,
-                        'label': '240p (低画質)',
-                        'itag': 133
-                    })
-                    logging.info(f"✓ 240p取得: 動画={len(video_url)} 文字, 音声={len(audio_url)} 文字")
-            
-            # 直接YouTube Education埋め込みURLを生成（API不要）
-            youtube_education_embed_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
-            logging.info(f"YouTube Education URL直接生成成功: {youtube_education_embed_url[:100]}...")
-
-            if formats:
-                # 画質オプションを優先順位でソート
-                quality_priority = {'1080p': 5, '720p': 4, '480p': 3, '360p': 2, '240p': 1}
-                formats.sort(key=lambda x: quality_priority.get(x['quality'], 0), reverse=True)
-                
-                # 最適なURLを決定
-                if not best_url and formats:
-                    # 音声付きフォーマットを優先
-                    audio_formats = [f for f in formats if f.get('has_audio', False)]
-                    if audio_formats:
-                        best_url = audio_formats[0]['url']
-                        logging.info(f"音声付きを優先: {audio_formats[0]['quality']}")
-                    else:
-                        best_url = formats[0]['url']
-                        logging.info(f"最高画質を選択: {formats[0]['quality']}")
-                
-                stream_data = {
-                    'success': True,
-                    'best_url': best_url,
-                    'formats': formats,
-                    'has_audio': has_audio,
-                    'quality': formats[0]['quality'] if formats else '360p',
-                    'type': 'direct',
-                    'youtube_education_url': youtube_education_embed_url,
-                    'total_formats': len(formats)
-                }
-                
-                logging.info(f"✅ 全画質取得完了: {[f['quality'] for f in formats]} (計{len(formats)}種類)")
-            else:
-                # フォールバック：YouTube Education埋め込み
-                stream_data = {
-                    'success': True,
-                    'embed_url': f'https://www.youtube-nocookie.com/embed/{video_id}',
-                    'youtube_education_url': youtube_education_embed_url,
-                    'quality': 'embed',
-                    'type': 'embed',
-                    'formats': []
-                }
-        else:
-            logging.warning(f"マルチAPIからデータを取得できませんでした")
-            # 最小限の動画情報を作成
-            video_info = {
-                'videoId': video_id,
-                'title': f'Video {video_id}',
-                'author': 'Unknown',
-                'authorId': '',
-                'lengthSeconds': 0,
-                'viewCount': 0,
-                'publishedText': '',
-                'description': '',
-                'videoThumbnails': [
-                    {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'}
-                ]
-            }
-            # 最小限のstream_dataも作成
-            stream_data = {
-                'success': False,
-                'embed_url': f'https://www.youtube-nocookie.com/embed/{video_id}',
-                'quality': 'embed',
-                'type': 'fallback',
-                'formats': [],
-                'error': 'データを取得できませんでした'
-            }
-        
-        # コメントは遅延読み込みのため、初期表示では空にする
-        comments_data = {'comments': [], 'continuation': None}
+        # コメントは遅延読み込みのため、初期表示では空にする
+        comments_data = {'comments': [], 'continuation': None}
         
         # 視聴履歴を記録
         if video_info:
@@ -1658,140 +938,17 @@ def watch_video_id(video_id):
 
 @app.route('/api/related-videos/<video_id>')
 def api_related_videos(video_id):
-    """関連動画API - 各動画ごとに異なる関連動画を提供"""
+    """関連動画API - 各動画ごとに異なる関連動画を提供（候補を同時に集めて動画IDごとにキャッシュ）"""
     try:
-        # リクエスト開始時にキャッシュをクリア（パフォーマンス向上）
-        multi_stream_service.clear_request_cache()
-        
         query = request.args.get('q', '')
-        all_related_videos = []
-        
-        # 1. 動画タイトルに基づいて関連動画を検索（最優先）
-        if query:
-            # 日本語文字を含むキーワードを抽出（より関連性の高い検索のため）
-            import re
-            japanese_words = re.findall(r'[ひらがなカタカナ漢字]+', query)
-            english_words = re.findall(r'[a-zA-Z]+', query)
-            
-            # 最も関連性の高いキーワードを選択
-            priority_keywords = japanese_words[:2] + english_words[:2]
-            if not priority_keywords:
-                priority_keywords = query.split()[:3]
-            
-            # 各キーワードで個別に検索
-            for i, keyword in enumerate(priority_keywords):
-                try:
-                    # ページを変えて異なる結果を取得
-                    page = (i % 3) + 1
-                    search_results = invidious.search_videos(keyword, page=page)
-                    if search_results:
-                        filtered_videos = [v for v in search_results if v.get('videoId') != video_id]
-                        all_related_videos.extend(filtered_videos[:30])
-                        logging.info(f"キーワード '{keyword}' で {len(filtered_videos[:30])} 件取得 (ページ{page})")
-                except Exception as e:
-                    logging.warning(f"関連動画検索失敗（キーワード: {keyword}）: {e}")
-            
-            # 2. タイトル全体での検索（異なるページから取得）
-            try:
-                # 動画IDをハッシュ化してページ番号を決定（動画ごとに異なるページ）
-                import hashlib
-                hash_obj = hashlib.md5(video_id.encode())
-                page_num = (int(hash_obj.hexdigest(), 16) % 5) + 1  # 1-5ページ
-                
-                broad_search = invidious.search_videos(query[:25], page=page_num)
-                if broad_search:
-                    filtered_videos = [v for v in broad_search if v.get('videoId') != video_id]
-                    all_related_videos.extend(filtered_videos[:40])
-                    logging.info(f"タイトル全体検索で {len(filtered_videos[:40])} 件取得 (ページ{page_num})")
-            except Exception as e:
-                logging.warning(f"広域検索失敗: {e}")
-        
-        # 3. 動画IDに基づいてトレンドの異なる部分を取得
-        try:
-            # 動画IDに基づいてカテゴリを選択
-            categories = ['', 'Music', 'Gaming']
-            category_index = sum(ord(c) for c in video_id) % len(categories)
-            category = categories[category_index]
-            
-            trending_videos = invidious.get_trending_videos(region='JP', category=category if category else None)
-            if trending_videos:
-                # 動画IDに基づいて開始位置を決定
-                start_index = (sum(ord(c) for c in video_id) % 20)
-                filtered_trending = [v for v in trending_videos[start_index:start_index+30] if v.get('videoId') != video_id]
-                all_related_videos.extend(filtered_trending)
-                logging.info(f"トレンド動画({category or 'general'})から {len(filtered_trending)} 件取得")
-        except Exception as e:
-            logging.warning(f"Invidiousトレンド取得失敗: {e}")
-        
-        # 4. siawaseok APIから異なるカテゴリを取得
-        try:
-            response = requests.get("https://siawaseok.duckdns.org/api/trend", timeout=10)
-            if response.status_code == 200:
-                trend_data = response.json()
-                if isinstance(trend_data, dict):
-                    # 動画IDに基づいてカテゴリを選択
-                    available_categories = ['trending', 'music', 'gaming']
-                    selected_category = available_categories[(sum(ord(c) for c in video_id) % len(available_categories))]
-                    
-                    if selected_category in trend_data:
-                        category_videos = trend_data[selected_category]
-                        # 動画IDに基づいて開始位置を決定
-                        start_pos = (sum(ord(c) for c in video_id) % max(1, len(category_videos) - 10))
-                        selected_videos = category_videos[start_pos:start_pos+20]
-                        filtered_category = [v for v in selected_videos if v.get('videoId') != video_id]
-                        all_related_videos.extend(filtered_category)
-                        logging.info(f"siawaseok {selected_category}から {len(filtered_category)} 件取得")
-        except Exception as e:
-            logging.warning(f"siawaseokトレンド取得失敗: {e}")
-        
-        # 5. 🆕 Kahoot APIで関連動画の詳細情報を取得・補完
-        enhanced_videos = []
-        seen_ids = set()
-        
-        # 動画IDに基づいて結果をシャッフル（同じ動画では同じ順序）
-        import random
-        random.seed(hash(video_id))  # 動画IDに基づいた固定シード
-        shuffled_videos = all_related_videos.copy()
-        random.shuffle(shuffled_videos)
-        
-        # 重複を除去して候補動画IDを収集
-        candidate_video_ids = []
-        for video in shuffled_videos:
-            video_id_check = video.get('videoId')
-            if video_id_check and video_id_check not in seen_ids and video_id_check != video_id:
-                seen_ids.add(video_id_check)
-                candidate_video_ids.append(video_id_check)
-                if len(candidate_video_ids) >= 25:  # 最大25本の候補（パフォーマンス向上）
-                    break
-        
-        # Kahoot APIで関連動画の詳細情報を一括取得
-        if candidate_video_ids:
-            logging.info(f"Kahoot APIで関連動画の詳細情報を取得中: {len(candidate_video_ids)} 件")
-            kahoot_related_videos = multi_stream_service.get_related_videos_from_kahoot(video_id, candidate_video_ids)
-            
-            if kahoot_related_videos:
-                # Kahoot APIから取得した高品質な情報を優先
-                enhanced_videos = kahoot_related_videos[:20]  # 最大20本（パフォーマンス向上）
-                logging.info(f"✅ Kahoot APIから関連動画詳細情報取得: {len(enhanced_videos)} 件")
-            else:
-                # Kahoot API失敗時のフォールバック: 既存の動画情報を使用
-                for video in shuffled_videos:
-                    video_id_check = video.get('videoId')
-                    if video_id_check and video_id_check not in seen_ids and video_id_check != video_id:
-                        seen_ids.add(video_id_check)
-                        enhanced_videos.append(video)
-                        if len(enhanced_videos) >= 20:
-                            break
-                logging.info(f"🔄 フォールバック: 既存の関連動画情報を使用: {len(enhanced_videos)} 件")
-        else:
-            logging.warning("関連動画の候補が見つかりませんでした")
+        related_videos = author_avatars.apply(related_videos_engine.related(video_id, query))
         
-        logging.info(f"動画 {video_id} の関連動画を {len(enhanced_videos)} 本取得")
+        logging.info(f"動画 {video_id} の関連動画を {len(related_videos)} 本取得")
         
         return jsonify({
             'success': True,
-            'videos': enhanced_videos,
-            'total': len(enhanced_videos),
+            'videos': related_videos,
+            'total': len(related_videos),
             'video_id': video_id  # デバッグ用
         })
         
@@ -1803,58 +960,6 @@ def api_related_videos(video_id):
             'videos': []
         })
 
-@app.route('/api/comments/<video_id>')
-def api_comments(video_id):
-    """コメントAPI - CustomApiServiceを最優先使用"""
-    try:
-        # 1. CustomApiService（siawaseok.duckdns.org）を最優先で使用
-        try:
-            logging.info(f"CustomApiService (siawaseok.duckdns.org) でコメント取得開始: {video_id}")
-            custom_comments_data = custom_api_service.get_video_comments(video_id)
-            
-            if custom_comments_data:
-                custom_comments = custom_api_service.format_comments(custom_comments_data)
-                if custom_comments:
-                    logging.info(f"✅ CustomApiService から {len(custom_comments)} 件のコメントを取得")
-                    return jsonify({
-                        'success': True,
-                        'comments': custom_comments,
-                        'commentCount': len(custom_comments),
-                        'source': 'CustomApiService',
-                        'continuation': custom_comments_data.get('continuation')
-                    })
-        except Exception as e:
-            logging.warning(f"CustomApiService コメント取得エラー: {e}")
-        
-        # 2. フォールバック: Invidiousを使用
-        logging.info(f"フォールバック: Invidiousでコメント取得: {video_id}")
-        comments_data = invidious.get_video_comments(video_id)
-        
-        if comments_data and comments_data.get('comments'):
-            return jsonify({
-                'success': True,
-                'comments': comments_data['comments'],
-                'commentCount': comments_data.get('commentCount', len(comments_data['comments'])),
-                'source': 'Invidious',
-                'continuation': comments_data.get('continuation')
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'comments': [],
-                'commentCount': 0,
-                'error': 'コメントが見つかりません'
-            })
-            
-    except Exception as e:
-        logging.error(f"コメント取得エラー: {e}")
-        return jsonify({
-            'success': False,
-            'comments': [],
-            'commentCount': 0,
-            'error': str(e)
-        })
-
 @app.route('/api/omada-audio/<video_id>')
 def get_omada_audio(video_id):
     """omada APIから音声のみを取得"""
@@ -1943,195 +1048,27 @@ def channel(channel_id):
         channel_name = request.args.get('name', '')
         sort = request.args.get('sort', 'newest')
         
-        # siawaseok APIからチャンネル情報を取得
-        channel_info = None
-        api_data = None
-        if channel_id:
-            try:
-                logging.info(f"マルチエンドポイントでチャンネル情報を取得中: {channel_id}")
-                api_data = multi_stream_service.get_channel_info(channel_id)
-                
-                if api_data:
-                    logging.info(f"マルチAPIチャンネルデータ受信成功")
-                    
-                    # siawaseok APIの実際の構造に合わせて調整
-                    # チャンネル登録者数の正しい取得
-                    sub_count = 0
-                    total_views = 0
-                    video_count = 0
-                    
-                    # siawaseok APIの実際の構造に合わせて調整
-                    if 'subCount' in api_data:
-                        try:
-                            sub_count = int(api_data['subCount']) if api_data['subCount'] else 0
-                        except (ValueError, TypeError):
-                            sub_count = 0
-                    
-                    # 総視聴回数を正しく取得
-                    if 'totalViews' in api_data:
-                        try:
-                            total_views = int(api_data['totalViews']) if api_data['totalViews'] else 0
-                        except (ValueError, TypeError):
-                            total_views = 0
-                    
-                    # 動画数を正しく計算
-                    if 'playlists' in api_data:
-                        for playlist in api_data['playlists']:
-                            if isinstance(playlist, dict) and 'items' in playlist:
-                                video_count += len(playlist['items'])
-                    
-                    # チャンネル画像の取得
-                    avatar_url = api_data.get('avatar', f'https://yt3.ggpht.com/a/default-user=s176-c-k-c0x00ffffff-no-rj')
-                    banner_url = api_data.get('banner', '')
-                    
-                    channel_info = {
-                        'author': api_data.get('title', channel_name or f'チャンネル ({channel_id})'),
-                        'authorId': channel_id,
-                        'description': api_data.get('description', ''),
-                        'subCount': sub_count,
-                        'totalViews': total_views,
-                        'videoCount': video_count,
-                        'joined': api_data.get('joined', 0),
-                        'authorThumbnails': [
-                            {'url': avatar_url}
-                        ],
-                        'authorBanners': [
-                            {'url': banner_url}
-                        ] if banner_url else [],
-                        'autoGenerated': False
-                    }
-                else:
-                    logging.warning(f"マルチAPIチャンネル情報取得失敗")
-            except Exception as e:
-                logging.error(f"siawaseok channel API error: {e}")
+        # ヘッダー（長いTTLでキャッシュ）と動画一覧のページ（並び順・ページごとにキャッシュ）を同時に取得し、次のページは裏で先読み
+        result = channel_service.channel_page(channel_id, sort=sort, page=page, channel_name=channel_name)
+        channel_info = result['channel_info']
+        videos = result['videos']
+        playlists = result['playlists']
         
         # フォールバック: チャンネル名で基本情報作成
         if not channel_info and channel_name:
-            channel_info = {
-                'author': channel_name,
-                'authorId': channel_id,
-                'description': f'{channel_name}のチャンネル',
-                'subCount': 0,
-                'totalViews': 0,
-                'videoCount': 0,
-                'joined': 0,
-                'authorThumbnails': [
-                    {'url': f'https://yt3.ggpht.com/a/default-user=s176-c-k-c0x00ffffff-no-rj'}
-                ],
-                'authorBanners': [],
-                'autoGenerated': False
-            }
-        
-        # siawaseok APIからチャンネル動画を取得（プレイリスト分け対応）
-        videos = []
-        playlists = []
-        if channel_info and api_data and 'playlists' in api_data:
-            # siawaseok APIの構造に基づいてプレイリストごとに整理
-            all_videos = []
-            
-            # 各プレイリストを名前分けして処理
-            for playlist in api_data.get('playlists', []):
-                if isinstance(playlist, dict) and 'items' in playlist:
-                    # プレイリスト情報を取得
-                    playlist_name = playlist.get('name', playlist.get('title', 'その他の動画'))
-                    playlist_videos = []
-                    
-                    # プレイリスト内の動画を処理
-                    seen_ids_in_playlist = set()
-                    for video_data in playlist.get('items', []):
-                        if isinstance(video_data, dict) and video_data.get('videoId'):
-                            video_id = video_data.get('videoId')
-                            if video_id and video_id not in seen_ids_in_playlist:
-                                seen_ids_in_playlist.add(video_id)
-                                
-                                # duration値を安全に変換
-                                duration_raw = video_data.get('duration', '0:00')
-                                try:
-                                    if isinstance(duration_raw, str) and ':' in duration_raw:
-                                        parts = duration_raw.split(':')
-                                        if len(parts) == 2:
-                                            duration_seconds = int(parts[0]) * 60 + int(parts[1])
-                                        elif len(parts) == 3:
-                                            duration_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                                        else:
-                                            duration_seconds = 0
-                                    else:
-                                        duration_seconds = int(duration_raw) if duration_raw else 0
-                                except (ValueError, TypeError):
-                                    duration_seconds = 0
-                                
-                                # viewCount値を安全に変換
-                                view_count_raw = video_data.get('viewCount', '0')
-                                try:
-                                    # "1,234 回視聴" のような文字列から数値を抽出
-                                    if isinstance(view_count_raw, str):
-                                        import re
-                                        view_count_str = re.sub(r'[^\d]', '', view_count_raw)
-                                        view_count = int(view_count_str) if view_count_str else 0
-                                    else:
-                                        view_count = int(view_count_raw) if view_count_raw else 0
-                                except (ValueError, TypeError):
-                                    view_count = 0
-                                
-                                video = {
-                                    'videoId': video_id,
-                                    'title': video_data.get('title', f'Video {video_id}'),
-                                    'author': api_data.get('title', channel_name) if api_data else channel_name,
-                                    'authorId': channel_id,
-                                    'lengthSeconds': duration_seconds,
-                                    'viewCount': view_count,
-                                    'publishedText': video_data.get('published', ''),
-                                    'videoThumbnails': [
-                                        {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
-                                        {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
-                                    ]
-                                }
-                                playlist_videos.append(video)
-                                all_videos.append(video)  # 全体リスト用
-                    
-                    # プレイリスト情報を保存（動画がある場合のみ）
-                    if playlist_videos:
-                        playlists.append({
-                            'name': playlist_name,
-                            'videos': playlist_videos,
-                            'video_count': len(playlist_videos)
-                        })
-            
-            # 従来の全体動画リスト用（後方互換性のため）
-            seen_ids = set()
-            for video_data in all_videos:
-                if isinstance(video_data, dict) and video_data.get('videoId'):
-                    video_id = video_data.get('videoId')
-                    if video_id and video_id not in seen_ids:
-                        seen_ids.add(video_id)
-                        videos.append(video_data)  # 既に処理済みの動画データを使用
-            
-            # ソート処理
-            if sort == 'oldest':
-                videos.reverse()
-            elif sort == 'popular':
-                videos.sort(key=lambda x: x.get('viewCount', 0), reverse=True)
+            channel_info = Channel(channel_id, channel_name, f'{channel_name}のチャンネル', avatar=DEFAULT_CHANNEL_AVATAR)
         
-        # ページネーション設定（簡易版）
-        videos = videos or []
-        total_pages = max(1, page + (1 if len(videos) >= 20 else 0))
+        total_pages = page + 1 if result['has_next'] else page
         
         # チャンネル情報が無い場合の最終フォールバック
         if not channel_info:
-            channel_info = {
-                'author': videos[0].get('author', channel_name) if videos else (channel_name or f'チャンネル ({channel_id})'),
-                'authorId': channel_id,
-                'description': 'チャンネル動画一覧',
-                'subCount': 0,
-                'totalViews': 0,
-                'videoCount': len(videos) if videos else 0,
-                'joined': 0,
-                'authorThumbnails': videos[0].get('authorThumbnails', []) if videos else [
-                    {'url': f'https://yt3.ggpht.com/a/default-user=s176-c-k-c0x00ffffff-no-rj'}
-                ],
-                'authorBanners': [],
-                'autoGenerated': False
-            }
+            channel_info = Channel(
+                authorId=channel_id,
+                author=videos[0].author if videos else (channel_name or f'チャンネル ({channel_id})'),
+                description='チャンネル動画一覧',
+                videoCount=len(videos),
+                avatar=DEFAULT_CHANNEL_AVATAR
+            )
         
         return render_template('channel.html',
                              channel_info=channel_info,
@@ -2146,18 +1083,8 @@ def channel(channel_id):
         channel_name = request.args.get('name', '')
         
         # エラー時も基本的なページを表示
-        channel_info = {
-            'author': channel_name if channel_name else f'チャンネル ({channel_id})',
-            'authorId': channel_id,
-            'description': 'チャンネル情報の読み込み中にエラーが発生しました。',
-            'subCount': 0,
-            'totalViews': 0,
-            'videoCount': 0,
-            'joined': 0,
-            'authorThumbnails': [],
-            'authorBanners': [],
-            'autoGenerated': False
-        }
+        channel_info = Channel(channel_id, channel_name if channel_name else f'チャンネル ({channel_id})',
+                               'チャンネル情報の読み込み中にエラーが発生しました。')
         
         return render_template('channel.html',
                              channel_info=channel_info,
@@ -2172,16 +1099,10 @@ def channel(channel_id):
 def shorts():
     """ショート動画メインページ（最初の動画にリダイレクト）"""
     try:
-        # 最初のショート動画を取得
-        response = api_shorts_list()
-        if hasattr(response, 'get_json'):
-            response_data = response.get_json()
-        else:
-            response_data = response
-            
-        if response_data.get('success') and response_data.get('videos'):
-            first_video_id = response_data['videos'][0]['videoId']
-            return redirect(url_for('shorts_video', video_id=first_video_id))
+        # 現在の嗜好のフィードの先頭
+        videos = shorts_feed_service.page('', 1)['videos']
+        if videos:
+            return redirect(url_for('shorts_video', video_id=videos[0].videoId))
         else:
             return render_template('shorts.html', error="ショート動画が見つかりません")
     except Exception as e:
@@ -2192,9 +1113,9 @@ def shorts():
 def shorts_video(video_id):
     """個別ショート動画ページ"""
     try:
-        # 動画情報を取得
-        video_info = invidious.get_video_info(video_id)
-        if not video_info:
+        # 動画情報を取得（統合リゾルバー: 必須項目が確定した時点で返る）
+        video_info = video_metadata_resolver.resolve(video_id)
+        if not video_info.get('metadata_sources'):
             return redirect(url_for('shorts'))
         
         # 視聴履歴を記録
@@ -2215,107 +1136,41 @@ def shorts_video(video_id):
         logging.error(f"ショート動画取得エラー: {e}")
         return redirect(url_for('shorts'))
 
+@app.route('/api/shorts-feed')
+def api_shorts_feed():
+    """ショート動画フィードAPI - カーソルでページを返す（?cursor=&limit=、続きは next_cursor）"""
+    try:
+        cursor = request.args.get('cursor', '')
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        result = shorts_feed_service.page(cursor, limit)
+        
+        return jsonify({
+            'success': True,
+            'videos': result['videos'],
+            'next_cursor': result['next_cursor'],
+            'has_more': True  # 末尾に近づくと裏で補充される
+        })
+    except Exception as e:
+        logging.error(f"ショート動画フィード取得エラー: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'videos': []
+        })
+
 @app.route('/api/shorts-list')
 def api_shorts_list():
-    """個人化された日本のショート動画リストAPI - 大幅改善版"""
+    """個人化された日本のショート動画リストAPI（フィードの先頭80件、続きは /api/shorts-feed）"""
     try:
-        shorts_videos = []
-        
-        # ユーザーの好みに基づいた推奨キーワードを取得
-        recommended_keywords = user_prefs.get_recommendation_keywords()
-        logging.info(f"推奨キーワード: {recommended_keywords[:5]}")
-        
-        # より多くのソースから動画を収集
-        search_queries = []
-        
-        # 好みのチャンネルからの動画を優先検索
-        preferred_channels = user_prefs.get_preferred_channels()
-        for channel_name, count in preferred_channels[:5]:  # 上位5チャンネル
-            search_queries.append(f"channel:{channel_name}")
-        
-        # 推奨キーワード追加
-        search_queries.extend(recommended_keywords[:15])
-        
-        # 日本の人気ジャンル追加
-        popular_genres = [
-            "面白い", "おもしろ", "爆笑", "ネタ", "コメディ",
-            "料理", "レシピ", "簡単", "DIY", "手作り",
-            "ダンス", "踊り", "TikTok", "バズった",
-            "猫", "犬", "ペット", "動物", "可愛い",
-            "ゲーム", "実況", "攻略", "プレイ",
-            "メイク", "ファッション", "コーデ", "美容",
-            "スポーツ", "サッカー", "野球", "バスケ",
-            "歌ってみた", "弾いてみた", "演奏", "カバー",
-            "vlog", "日常", "ルーティン", "モーニング"
-        ]
-        search_queries.extend(popular_genres)
-        
-        # 検索実行
-        for query in search_queries[:25]:  # 最大25クエリ
-            try:
-                search_results = invidious.search_videos(query, page=1)
-                if search_results and isinstance(search_results, list):
-                    videos_list = search_results[:6]  # 各クエリから6件
-                elif search_results and hasattr(search_results, 'get') and search_results.get('success'):
-                    videos_list = search_results.get('videos', [])[:6]
-                else:
-                    videos_list = []
-                
-                for video in videos_list:
-                        duration = video.get('lengthSeconds', 0)
-                        if 10 <= duration <= 300:  # 10秒～5分に拡大
-                            video_id = video.get('videoId')
-                            if video_id not in [v.get('videoId') for v in shorts_videos]:
-                                if user_prefs.should_recommend_video(video):
-                                    shorts_videos.append(video)
-                                    if len(shorts_videos) >= 80:  # 80件まで収集
-                                        break
-                
-                if len(shorts_videos) >= 80:
-                    break
-                    
-            except Exception as e:
-                logging.warning(f"検索エラー ({query}): {e}")
-                continue
-        
-        # トレンド動画からも大量追加
-        trending_types = ['', 'Music', 'Gaming']
-        for trend_type in trending_types:
-            if len(shorts_videos) >= 80:
-                break
-                
-            try:
-                if trend_type:
-                    trending_videos = invidious.get_trending_videos(region='JP')
-                else:
-                    trending_videos = invidious.get_trending_videos(region='JP')
-                
-                if trending_videos:
-                    videos_list = trending_videos if isinstance(trending_videos, list) else trending_videos.get('videos', [])
-                    for video in videos_list[:15]:  # トレンドから15件
-                        duration = video.get('lengthSeconds', 0)
-                        if 10 <= duration <= 300:  # 範囲拡大
-                            video_id = video.get('videoId')
-                            if video_id not in [v.get('videoId') for v in shorts_videos]:
-                                if user_prefs.should_recommend_video(video):
-                                    shorts_videos.append(video)
-                                    if len(shorts_videos) >= 80:
-                                        break
-            except Exception as e:
-                logging.warning(f"トレンド動画取得エラー: {e}")
-        
-        # 多様性を保つため、ランダムに並び替え
-        import random
-        random.shuffle(shorts_videos)
-        
-        # 短い動画を優先しつつ、多様性も保つ
-        shorts_videos.sort(key=lambda x: (x.get('lengthSeconds', 0), random.random()))
+        result = shorts_feed_service.page('', 80)
+        shorts_videos = result['videos']
         
         logging.info(f"ショート動画 {len(shorts_videos)} 件を取得")
         
         return jsonify({
             'success': True,
-            'videos': shorts_videos,  # 全件返す
+            'videos': shorts_videos,
+            'next_cursor': result['next_cursor'],
             'has_more': True,  # 常に追加読み込み可能
             'total': len(shorts_videos)
         })
@@ -2329,55 +1184,17 @@ def api_shorts_list():
 
 @app.route('/api/shorts-next/<current_video_id>')
 def api_shorts_next(current_video_id):
-    """次のショート動画を取得"""
+    """次のショート動画を取得（フィード上の位置から引く）"""
     try:
-        # 現在の動画リストを取得
-        response = api_shorts_list()
-        if hasattr(response, 'get_json'):
-            response_data = response.get_json()
-        else:
-            response_data = response
-            
-        if not response_data or not response_data.get('success'):
-            return jsonify({'success': False, 'error': 'No videos available'})
-        
-        videos = response_data.get('videos', [])
-        current_index = -1
-        
-        # 現在の動画のインデックスを探す
-        for i, video in enumerate(videos):
-            if video.get('videoId') == current_video_id:
-                current_index = i
-                break
-        
-        # 次の動画を取得
-        next_index = current_index + 1
-        if next_index < len(videos):
-            return jsonify({
-                'success': True,
-                'video': videos[next_index],
-                'has_next': next_index + 1 < len(videos)
-            })
-        else:
-            # 新しい動画を生成して追加
-            import random
-            additional_keywords = ["エンタメ", "動物", "グルメ", "スポーツ", "技術"]
-            for keyword in additional_keywords:
-                try:
-                    search_results = invidious.search_videos(keyword, page=random.randint(1, 3))
-                    for video in search_results[:2]:
-                        duration = video.get('lengthSeconds', 0)
-                        if 15 <= duration <= 180:
-                            if user_prefs.should_recommend_video(video):
-                                return jsonify({
-                                    'success': True,
-                                    'video': video,
-                                    'has_next': True
-                                })
-                except:
-                    continue
-            
+        video, has_next = shorts_feed_service.neighbour(current_video_id, 1)
+        if video is None:
             return jsonify({'success': False, 'error': 'No more videos'})
+        
+        return jsonify({
+            'success': True,
+            'video': video,
+            'has_next': has_next
+        })
             
     except Exception as e:
         logging.error(f"次の動画取得エラー: {e}")
@@ -2385,34 +1202,17 @@ def api_shorts_next(current_video_id):
 
 @app.route('/api/shorts-prev/<current_video_id>')
 def api_shorts_prev(current_video_id):
-    """前のショート動画を取得"""
+    """前のショート動画を取得（フィード上の位置から引く）"""
     try:
-        response = api_shorts_list()
-        if hasattr(response, 'get_json'):
-            response_data = response.get_json()
-        else:
-            response_data = response
-            
-        if not response_data or not response_data.get('success'):
-            return jsonify({'success': False, 'error': 'No videos available'})
-        
-        videos = response_data.get('videos', [])
-        current_index = -1
-        
-        for i, video in enumerate(videos):
-            if video.get('videoId') == current_video_id:
-                current_index = i
-                break
-        
-        prev_index = current_index - 1
-        if prev_index >= 0:
-            return jsonify({
-                'success': True,
-                'video': videos[prev_index],
-                'has_prev': prev_index > 0
-            })
-        else:
+        video, has_prev = shorts_feed_service.neighbour(current_video_id, -1)
+        if video is None:
             return jsonify({'success': False, 'error': 'No previous videos'})
+        
+        return jsonify({
+            'success': True,
+            'video': video,
+            'has_prev': has_prev
+        })
             
     except Exception as e:
         logging.error(f"前の動画取得エラー: {e}")
@@ -2427,7 +1227,7 @@ def api_stream(video_id):
         external_url = f"https://siawaseok.duckdns.org/api/stream/{video_id}/"
         logging.info(f"Requesting siawaseok API: {external_url}")
         
-        response = requests.get(external_url, timeout=15)
+        response = http_client.get(external_url, timeout=15)
         logging.info(f"siawaseok API response status: {response.status_code}")
         
         if response.status_code == 200:
@@ -2481,7 +1281,7 @@ def api_stream_type2(video_id):
         external_url = f"https://siawaseok.duckdns.org/api/stream/{video_id}/type2"
         logging.info(f"Type2 API request: {external_url}")
         
-        response = requests.get(external_url, timeout=15)
+        response = http_client.get(external_url, timeout=15)
         logging.info(f"Type2 API response status: {response.status_code}")
         
         if response.status_code == 200:
@@ -2536,7 +1336,7 @@ def suggest_api():
     if not keyword:
         return jsonify([])
     
-    suggestions = suggest(keyword)
+    suggestions = suggestion_engine.suggest(keyword)
     return jsonify(suggestions)
 
 # プレイリスト・高度動画機能 (@distube/ytpl, @distube/ytdl-core)
@@ -2586,138 +1386,364 @@ def api_advanced_video_info(video_id):
     except Exception as e:
         logging.error(f"高度な動画情報API例外: {e}")
         return jsonify({
-            'success': False,
-            'error': str(e)
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/batch-playlists', methods=['POST'])
+def api_batch_playlists():
+    """複数プレイリスト一括取得API"""
+    try:
+        data = request.get_json()
+        if not data or 'playlist_urls' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'playlist_urls配列を指定してください'
+            }), 400
+        
+        playlist_urls = data['playlist_urls']
+        if not isinstance(playlist_urls, list) or len(playlist_urls) == 0:
+            return jsonify({
+                'success': False,
+                'error': '有効なプレイリストURL配列を指定してください'
+            }), 400
+        
+        if len(playlist_urls) > 50:  # 上限設定
+            return jsonify({
+                'success': False,
+                'error': 'プレイリストは最大50件まで指定可能です'
+            }), 400
+        
+        logging.info(f"プレイリスト一括取得リクエスト: {len(playlist_urls)}件")
+        result = turbo_service.batch_get_playlists(playlist_urls)
+        
+        logging.info(f"プレイリスト一括取得結果: {result.get('successful', 0)}/{result.get('totalRequested', 0)}")
+        return jsonify(result)
+        
+    except Exception as e:
+        logging.error(f"プレイリスト一括取得API例外: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/channel-playlists')
+def api_channel_playlists():
+    """チャンネルプレイリスト取得API"""
+    channel_url = request.args.get('url', '').strip()
+    
+    if not channel_url:
+        return jsonify({
+            'success': False,
+            'error': 'チャンネルURLを指定してください'
+        }), 400
+    
+    try:
+        logging.info(f"チャンネルプレイリスト取得リクエスト: {channel_url}")
+        result = turbo_service.get_channel_playlists(channel_url)
+        
+        if result.get('success'):
+            logging.info(f"チャンネルプレイリスト取得成功: {result.get('channelName', 'Unknown')} ({len(result.get('playlists', []))}件)")
+            return jsonify(result)
+        else:
+            logging.error(f"チャンネルプレイリスト取得失敗: {result.get('error', 'Unknown error')}")
+            return jsonify(result), 500
+            
+    except Exception as e:
+        logging.error(f"チャンネルプレイリストAPI例外: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stream-invalidate/<video_id>', methods=['POST'])
+def api_stream_invalidate(video_id):
+    """ストリームURLキャッシュの破棄API（プレーヤーで403・失効を検知した場合に呼ばれる）"""
+    try:
+        for service in (multi_stream_service, video_service, invidious, custom_api_service, ytdl):
+            service.invalidate_stream_cache(video_id)
+        video_metadata_resolver.invalidate(video_id)  # /watch の統合レコードも取り直させる
+        
+        logging.info(f"🗑️ ストリームURLキャッシュを破棄: {video_id}")
+        return jsonify({
+            "success": True,
+            "video_id": video_id
+        })
+        
+    except Exception as e:
+        logging.error(f"ストリームキャッシュ破棄API例外 ({video_id}): {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/stream-fallback/<video_id>')
+def api_stream_fallback(video_id):
+    """フォールバック機能付きストリーム取得API"""
+    try:
+        # マルチストリームサービスを使用（フォールバック機能付き）
+        result = multi_stream_service.get_video_stream_info(video_id)
+        
+        if result:
+            # siawaseok互換フォーマットに変換
+            response_data = {
+                "success": True,
+                "video_id": video_id,
+                "title": result.get('title', ''),
+                "duration": result.get('duration', 0),
+                "author": result.get('author', ''),
+                "thumbnail": result.get('thumbnail', ''),
+                "view_count": result.get('view_count', 0),
+                "description": result.get('description', ''),
+                "1080p": result.get('1080p', ''),
+                "720p": result.get('720p', ''),
+                "360p": result.get('360p', ''),
+                "muxed360p": result.get('muxed360p', ''),
+                "audio": result.get('audio', ''),
+                "source": result.get('source', 'fallback')
+            }
+            
+            logging.info(f"フォールバックストリーム取得成功: {video_id} - ソース: {result.get('source', 'unknown')}")
+            return jsonify(response_data)
+        else:
+            logging.error(f"フォールバックストリーム取得失敗: {video_id}")
+            return jsonify({
+                "success": False,
+                "error": "すべてのストリーム取得方法が失敗しました"
+            }), 404
+            
+    except Exception as e:
+        logging.error(f"フォールバックストリームAPI例外 ({video_id}): {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/fallback-status')
+def api_fallback_status():
+    """フォールバック機能の状態確認API"""
+    try:
+        status = multi_stream_service.get_fallback_status()
+        endpoint_status = multi_stream_service.get_endpoint_status()
+        
+        return jsonify({
+            "success": True,
+            "fallback": status,
+            "endpoints": endpoint_status,
+            "features": {
+                "external_api_endpoints": len(multi_stream_service.api_endpoints),
+                "fallback_methods": status['available_methods'],
+                "cache_enabled": True
+            }
+        })
+        
+    except Exception as e:
+        logging.error(f"フォールバック状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    """キャッシュの名前空間ごとの統計API（ヒット・ミス・削除・バイト数、射影による削減バイト数、single-flight合流数）"""
+    try:
+        return jsonify({
+            "success": True,
+            "caches": get_cache_stats(),
+            "single_flight": single_flight.stats()
+        })
+        
+    except Exception as e:
+        logging.error(f"キャッシュ統計API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/node-workers')
+def api_node_workers():
+    """常駐Node.jsワーカープールの状態API（?check=1 でpingによるヘルスチェックも実行）"""
+    try:
+        health = node_worker_pool.health_check() if request.args.get('check') else None
+        return jsonify({
+            "success": True,
+            "pool": node_worker_pool.stats(),
+            "health": health
+        })
+        
+    except Exception as e:
+        logging.error(f"Nodeワーカー状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/ytdl-pool')
+def api_ytdl_pool():
+    """yt-dlp抽出プロセスプールの状態API（待ち行列の長さ・抽出時間・キャッシュ）"""
+    try:
+        return jsonify({
+            "success": True,
+            "pool": ytdl_pool.stats()
+        })
+        
+    except Exception as e:
+        logging.error(f"yt-dlpプール状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/upstream-executor')
+def api_upstream_executor():
+    """上流API共有スレッドプールの状態API（実行中・待機中・拒否・締め切り超過の件数）"""
+    try:
+        return jsonify({
+            "success": True,
+            "executor": upstream_executor.stats()
+        })
+        
+    except Exception as e:
+        logging.error(f"上流スレッドプール状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/related-videos/stats')
+def api_related_videos_stats():
+    """関連動画エンジンの状態API（生成元の重み・作成回数・Kahoot補完・キャッシュ）"""
+    try:
+        return jsonify({
+            "success": True,
+            "related": related_videos_engine.stats()
+        })
+    except Exception as e:
+        logging.error(f"関連動画エンジン状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/shorts-feed/stats')
+def api_shorts_feed_stats():
+    """ショート動画フィードの状態API（プロファイルごとの件数・補充回数）"""
+    try:
+        return jsonify({
+            "success": True,
+            "shorts": shorts_feed_service.stats()
+        })
+    except Exception as e:
+        logging.error(f"ショート動画フィード状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/channel/stats')
+def api_channel_stats():
+    """チャンネルページの状態API（ヘッダー・ページのキャッシュ、先読み回数）"""
+    try:
+        return jsonify({
+            "success": True,
+            "channel": channel_service.stats()
+        })
+    except Exception as e:
+        logging.error(f"チャンネル状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/author-avatars/stats')
+def api_author_avatars_stats():
+    """投稿者アイコンのインデックスの状態API（記録数・ヒット率・まとめ取得）"""
+    try:
+        return jsonify({
+            "success": True,
+            "author_avatars": author_avatars.stats()
+        })
+    except Exception as e:
+        logging.error(f"投稿者アイコン状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
         }), 500
 
-@app.route('/api/batch-playlists', methods=['POST'])
-def api_batch_playlists():
-    """複数プレイリスト一括取得API"""
+@app.route('/api/comment-service/stats')
+def api_comment_service_stats():
+    """コメント集約の状態API（取得元ごとの勝ち数・先読み・ページのキャッシュ）"""
     try:
-        data = request.get_json()
-        if not data or 'playlist_urls' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'playlist_urls配列を指定してください'
-            }), 400
-        
-        playlist_urls = data['playlist_urls']
-        if not isinstance(playlist_urls, list) or len(playlist_urls) == 0:
-            return jsonify({
-                'success': False,
-                'error': '有効なプレイリストURL配列を指定してください'
-            }), 400
-        
-        if len(playlist_urls) > 50:  # 上限設定
-            return jsonify({
-                'success': False,
-                'error': 'プレイリストは最大50件まで指定可能です'
-            }), 400
-        
-        logging.info(f"プレイリスト一括取得リクエスト: {len(playlist_urls)}件")
-        result = turbo_service.batch_get_playlists(playlist_urls)
-        
-        logging.info(f"プレイリスト一括取得結果: {result.get('successful', 0)}/{result.get('totalRequested', 0)}")
-        return jsonify(result)
-        
+        return jsonify({
+            "success": True,
+            "comments": comment_service.stats()
+        })
     except Exception as e:
-        logging.error(f"プレイリスト一括取得API例外: {e}")
+        logging.error(f"コメント集約状態API例外: {e}")
         return jsonify({
-            'success': False,
-            'error': str(e)
+            "success": False,
+            "error": str(e)
         }), 500
 
-@app.route('/api/channel-playlists')
-def api_channel_playlists():
-    """チャンネルプレイリスト取得API"""
-    channel_url = request.args.get('url', '').strip()
-    
-    if not channel_url:
+@app.route('/api/kahoot-batcher')
+def api_kahoot_batcher():
+    """Kahoot動画詳細のマイクロバッチの状態API（バッチ数・平均件数・合流・IDごとのキャッシュ）"""
+    try:
         return jsonify({
-            'success': False,
-            'error': 'チャンネルURLを指定してください'
-        }), 400
-    
+            "success": True,
+            "batcher": kahoot_video_batcher.stats()
+        })
+    except Exception as e:
+        logging.error(f"Kahootバッチ状態API例外: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/video-metadata/stats')
+def api_video_metadata_stats():
+    """動画メタデータ統合リゾルバーの状態API（取得元・早期終了・フォールバック・キャッシュ）"""
     try:
-        logging.info(f"チャンネルプレイリスト取得リクエスト: {channel_url}")
-        result = turbo_service.get_channel_playlists(channel_url)
-        
-        if result.get('success'):
-            logging.info(f"チャンネルプレイリスト取得成功: {result.get('channelName', 'Unknown')} ({len(result.get('playlists', []))}件)")
-            return jsonify(result)
-        else:
-            logging.error(f"チャンネルプレイリスト取得失敗: {result.get('error', 'Unknown error')}")
-            return jsonify(result), 500
-            
+        return jsonify({
+            "success": True,
+            "resolver": video_metadata_resolver.stats()
+        })
     except Exception as e:
-        logging.error(f"チャンネルプレイリストAPI例外: {e}")
+        logging.error(f"動画メタデータリゾルバー状態API例外: {e}")
         return jsonify({
-            'success': False,
-            'error': str(e)
+            "success": False,
+            "error": str(e)
         }), 500
 
-@app.route('/api/stream-fallback/<video_id>')
-def api_stream_fallback(video_id):
-    """フォールバック機能付きストリーム取得API"""
+@app.route('/api/suggest/stats')
+def api_suggest_stats():
+    """検索予測変換エンジンの状態API（ローカルインデックス・上流呼び出し・絞り込み・キャッシュ）"""
     try:
-        # マルチストリームサービスを使用（フォールバック機能付き）
-        result = multi_stream_service.get_video_stream_info(video_id)
-        
-        if result:
-            # siawaseok互換フォーマットに変換
-            response_data = {
-                "success": True,
-                "video_id": video_id,
-                "title": result.get('title', ''),
-                "duration": result.get('duration', 0),
-                "author": result.get('author', ''),
-                "thumbnail": result.get('thumbnail', ''),
-                "view_count": result.get('view_count', 0),
-                "description": result.get('description', ''),
-                "1080p": result.get('1080p', ''),
-                "720p": result.get('720p', ''),
-                "360p": result.get('360p', ''),
-                "muxed360p": result.get('muxed360p', ''),
-                "audio": result.get('audio', ''),
-                "source": result.get('source', 'fallback')
-            }
-            
-            logging.info(f"フォールバックストリーム取得成功: {video_id} - ソース: {result.get('source', 'unknown')}")
-            return jsonify(response_data)
-        else:
-            logging.error(f"フォールバックストリーム取得失敗: {video_id}")
-            return jsonify({
-                "success": False,
-                "error": "すべてのストリーム取得方法が失敗しました"
-            }), 404
-            
+        return jsonify({
+            "success": True,
+            "suggest": suggestion_engine.stats()
+        })
     except Exception as e:
-        logging.error(f"フォールバックストリームAPI例外 ({video_id}): {e}")
+        logging.error(f"検索予測変換状態API例外: {e}")
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
-@app.route('/api/fallback-status')
-def api_fallback_status():
-    """フォールバック機能の状態確認API"""
+@app.route('/api/search/stats')
+def api_search_stats():
+    """統合検索エンジンの状態API（取得元と重み・早期終了・次ページの先読み・キャッシュ）"""
     try:
-        status = multi_stream_service.get_fallback_status()
-        endpoint_status = multi_stream_service.get_endpoint_status()
-        
         return jsonify({
             "success": True,
-            "fallback": status,
-            "endpoints": endpoint_status,
-            "features": {
-                "external_api_endpoints": len(multi_stream_service.api_endpoints),
-                "fallback_methods": status['available_methods'],
-                "cache_enabled": True
-            }
+            "search": federated_search.stats()
         })
-        
     except Exception as e:
-        logging.error(f"フォールバック状態API例外: {e}")
+        logging.error(f"統合検索状態API例外: {e}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -2846,66 +1872,18 @@ def music():
     trending_music = []
     
     try:
-        # siawaseok APIからトレンド動画を取得
+        # siawaseok APIからトレンド動画を取得（トップページと共有の Video レコードをそのまま表示）
         logging.info("siawaseok APIから音楽トレンドデータを取得中...")
-        trend_data = multi_stream_service.get_trending_videos()
-        
-        if trend_data and isinstance(trend_data, dict):
-            # 'music'キーを優先的に使用
-            music_videos = []
-            if 'music' in trend_data and isinstance(trend_data['music'], list):
-                music_videos = trend_data['music']
-                logging.info(f"siawaseok music APIから {len(music_videos)} 件の音楽を取得")
-            elif 'trending' in trend_data and isinstance(trend_data['trending'], list):
-                # フォールバック: トレンドから音楽をフィルタリング
-                all_videos = trend_data['trending']
-                music_videos = [v for v in all_videos if is_music_content(v)]
-                logging.info(f"トレンドから {len(music_videos)} 件の音楽をフィルタリング")
-            
-            # 音楽データを統一形式に変換
-            seen_ids = set()
-            for video_data in music_videos[:50]:  # 最大50件
-                if isinstance(video_data, dict):
-                    video_id = video_data.get('videoId') or video_data.get('id')
-                    
-                    if video_id and video_id not in seen_ids:
-                        seen_ids.add(video_id)
-                        
-                        # duration値を安全に変換
-                        duration_raw = video_data.get('lengthSeconds') or video_data.get('duration', 0)
-                        try:
-                            duration_seconds = int(duration_raw) if duration_raw else 0
-                        except (ValueError, TypeError):
-                            duration_seconds = 0
-                        
-                        # viewCount値を安全に変換
-                        view_count_raw = video_data.get('viewCount') or video_data.get('view_count', 0)
-                        try:
-                            view_count = int(view_count_raw) if view_count_raw else 0
-                        except (ValueError, TypeError):
-                            view_count = 0
-                        
-                        # アーティスト名を取得
-                        artist_name = (video_data.get('author') or 
-                                     video_data.get('uploader') or 
-                                     video_data.get('uploaderName') or
-                                     video_data.get('channelName') or 
-                                     'Unknown Artist')
-                        
-                        # 音楽トラック形式に変換
-                        music_track = {
-                            'id': video_id,
-                            'videoId': video_id,
-                            'title': video_data.get('title', f'Track {video_id}'),
-                            'artist': artist_name,
-                            'duration': duration_seconds,
-                            'thumbnail': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg',
-                            'artwork_url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg',
-                            'playback_count': view_count,
-                            'genre': 'Music',
-                            'permalink_url': f'https://youtube.com/watch?v={video_id}'
-                        }
-                        trending_music.append(music_track)
+        trend_records = multi_stream_service.get_trending_records()
+        
+        # 'music'キーを優先的に使用
+        if trend_records.get('music'):
+            trending_music = trend_records['music'][:50]  # 最大50件
+            logging.info(f"siawaseok music APIから {len(trending_music)} 件の音楽を取得")
+        elif trend_records.get('trending'):
+            # フォールバック: トレンドから音楽をフィルタリング
+            trending_music = [v for v in trend_records['trending'] if is_music_content(v)][:50]
+            logging.info(f"トレンドから {len(trending_music)} 件の音楽をフィルタリング")
         
         logging.info(f"音楽ページ用に {len(trending_music)} 件の音楽トラックを準備")
         
@@ -2914,21 +1892,7 @@ def music():
         # フォールバック: Invidiousから音楽を取得
         try:
             trending_videos = invidious.get_trending_videos()
-            if trending_videos:
-                for video in trending_videos[:30]:
-                    if is_music_content(video):
-                        music_track = {
-                            'id': video.get('videoId'),
-                            'videoId': video.get('videoId'),
-                            'title': video.get('title', ''),
-                            'artist': video.get('author', 'Unknown Artist'),
-                            'duration': video.get('lengthSeconds', 0),
-                            'thumbnail': f"https://img.youtube.com/vi/{video.get('videoId')}/hqdefault.jpg",
-                            'artwork_url': f"https://img.youtube.com/vi/{video.get('videoId')}/hqdefault.jpg",
-                            'playback_count': video.get('viewCount', 0),
-                            'genre': 'Music'
-                        }
-                        trending_music.append(music_track)
+            trending_music = [video for video in trending_videos[:30] if is_music_content(video)]
             logging.info(f"フォールバックで {len(trending_music)} 件の音楽を取得")
         except Exception as e2:
             logging.error(f"音楽フォールバックも失敗: {e2}")
@@ -3124,26 +2088,15 @@ def music_education_stream_proxy(video_id):
         
         # Education URLから音声ストリーム情報を抽出
         try:
-            # ytdl-coreを使ってEducation URLから音声情報を抽出
-            import yt_dlp
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'format': 'bestaudio[ext=m4a]/bestaudio',
-                'noplaylist': True,
-                'extract_flat': False
-            }
+            # yt-dlpプロセスプールで、生成されたYouTube Education URLから音声を抽出
+            info = ytdl_pool.extract(education_url, 'audio')
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # 生成されたYouTube Education URLから音声を抽出
-                info = ydl.extract_info(education_url, download=False)
-                
-                if info and 'url' in info:
-                    # 直接音声URLをリダイレクト
-                    logging.info(f"✅ YouTube Education音声ストリーム抽出成功")
-                    return redirect(info['url'])
-                else:
-                    logging.error(f"YouTube Education音声URL抽出失敗: {video_id}")
+            if info and info.get('url'):
+                # 直接音声URLをリダイレクト
+                logging.info(f"✅ YouTube Education音声ストリーム抽出成功")
+                return redirect(info['url'])
+            else:
+                logging.error(f"YouTube Education音声URL抽出失敗: {video_id}")
                     
         except Exception as extract_error:
             logging.error(f"YouTube Education音声抽出エラー: {extract_error}")
@@ -3160,212 +2113,17 @@ def music_education_stream_proxy(video_id):
             "error": str(e)
         }), 500
 
-@app.route('/api/siawaseok-comments/<video_id>')
-def siawaseok_comments_proxy(video_id):
-    """siawaseok.duckdns.org/api/comments/ プロキシエンドポイント"""
-    try:
-        if not video_id:
-            return jsonify({
-                'success': False,
-                'error': '動画IDが必要です'
-            }), 400
-        
-        # siawaseok APIからコメントを取得
-        siawaseok_url = f"https://siawaseok.duckdns.org/api/comments/{video_id}"
-        logging.info(f"siawaseokコメント取得: {siawaseok_url}")
-        
-        response = requests.get(siawaseok_url, timeout=10)
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                logging.info(f"siawaseokコメント取得成功: {video_id}")
-                
-                # データ形式を統一
-                formatted_comments = []
-                comments_data = data.get('comments', []) if isinstance(data, dict) else data
-                
-                if isinstance(comments_data, list):
-                    for comment in comments_data:
-                        formatted_comment = {
-                            'id': comment.get('id', f"siawaseok_{hash(str(comment))}"),
-                            'author': comment.get('author', comment.get('user', {}).get('name', 'Unknown User')),
-                            'authorThumbnails': comment.get('authorThumbnails', []),
-                            'content': comment.get('content', comment.get('text', '')),
-                            'publishedText': comment.get('publishedText', comment.get('created_at', '')),
-                            'likeCount': comment.get('likeCount', comment.get('likes', 0)),
-                            'replies': comment.get('replies', 0),
-                            'source': 'siawaseok'
-                        }
-                        formatted_comments.append(formatted_comment)
-                
-                return jsonify({
-                    'success': True,
-                    'comments': formatted_comments,
-                    'total': len(formatted_comments),
-                    'source': 'siawaseok'
-                })
-                
-            except json.JSONDecodeError as e:
-                logging.warning(f"siawaseokコメントJSON解析エラー: {e}")
-                return jsonify({
-                    'success': False,
-                    'error': 'コメントデータの解析に失敗しました'
-                }), 500
-        else:
-            logging.warning(f"siawaseokコメント取得失敗: {response.status_code}")
-            return jsonify({
-                'success': False,
-                'error': f'コメント取得失敗: {response.status_code}'
-            }), response.status_code
-            
-    except requests.exceptions.Timeout:
-        logging.warning(f"siawaseokコメント取得タイムアウト: {video_id}")
-        return jsonify({
-            'success': False,
-            'error': 'コメント取得がタイムアウトしました'
-        }), 504
-        
-    except requests.exceptions.RequestException as e:
-        logging.error(f"siawaseokコメント取得リクエストエラー: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'コメント取得でネットワークエラーが発生しました'
-        }), 503
-        
-    except Exception as e:
-        logging.error(f"siawaseokコメント取得例外: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
-
-@app.route('/api/omada-comments/<video_id>')
-def omada_comments_proxy(video_id):
-    """yt.omada.cafe/api/v1/comments/ プロキシエンドポイント"""
-    try:
-        if not video_id:
-            return jsonify({
-                'success': False,
-                'error': '動画IDが必要です'
-            }), 400
-        
-        # yt.omada.cafe APIからコメントを取得
-        omada_url = f"https://yt.omada.cafe/api/v1/comments/{video_id}"
-        logging.info(f"yt.omada.cafeコメント取得: {omada_url}")
-        
-        response = requests.get(omada_url, timeout=10)
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                logging.info(f"yt.omada.cafeコメント取得成功: {video_id}")
-                
-                # データ形式を統一
-                formatted_comments = []
-                comments_data = data.get('comments', []) if isinstance(data, dict) else data
-                
-                if isinstance(comments_data, list):
-                    for comment in comments_data:
-                        formatted_comment = {
-                            'id': comment.get('commentId', f"omada_{hash(str(comment))}"),
-                            'author': comment.get('author', comment.get('authorText', 'Unknown User')),
-                            'authorThumbnails': comment.get('authorThumbnails', []),
-                            'content': comment.get('content', comment.get('contentHtml', '')),
-                            'publishedText': comment.get('publishedText', comment.get('published', '')),
-                            'likeCount': comment.get('likeCount', 0),
-                            'replies': comment.get('replies', 0),
-                            'source': 'omada'
-                        }
-                        formatted_comments.append(formatted_comment)
-                
-                return jsonify({
-                    'success': True,
-                    'comments': formatted_comments,
-                    'total': len(formatted_comments),
-                    'source': 'omada'
-                })
-                
-            except json.JSONDecodeError as e:
-                logging.warning(f"yt.omada.cafeコメントJSON解析エラー: {e}")
-                return jsonify({
-                    'success': False,
-                    'error': 'コメントデータの解析に失敗しました'
-                }), 500
-        else:
-            logging.warning(f"yt.omada.cafeコメント取得失敗: {response.status_code}")
-            return jsonify({
-                'success': False,
-                'error': f'コメント取得失敗: {response.status_code}'
-            }), response.status_code
-            
-    except requests.exceptions.Timeout:
-        logging.warning(f"yt.omada.cafeコメント取得タイムアウト: {video_id}")
-        return jsonify({
-            'success': False,
-            'error': 'コメント取得がタイムアウトしました'
-        }), 504
-        
-    except requests.exceptions.RequestException as e:
-        logging.error(f"yt.omada.cafeコメント取得リクエストエラー: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'コメント取得でネットワークエラーが発生しました'
-        }), 503
-        
-    except Exception as e:
-        logging.error(f"yt.omada.cafeコメント取得例外: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
-
 @app.route('/api/priority-comments/<video_id>')
 def get_priority_comments(video_id):
-    """🎯 最優先でomada.cafeからコメント取得、フォールバック付き統合エンドポイント"""
+    """🎯 omada.cafe と Invidious から先に返った方のコメント（/api/comments の1ページ目と同じ）"""
     try:
-        logging.info(f"🎯 最優先コメント取得開始: {video_id}")
-        
-        # CustomApiServiceの優先度付きコメント取得を使用
-        comments_data = custom_api_service.get_video_comments_with_priority(video_id)
-        
-        if comments_data:
-            # コメントをフォーマット
-            formatted_comments = custom_api_service.format_comments(comments_data)
-            if formatted_comments:
-                logging.info(f"✅ 優先度付きコメント取得成功: {len(formatted_comments)} 件")
-                return jsonify({
-                    'success': True,
-                    'comments': formatted_comments,
-                    'commentCount': len(formatted_comments),
-                    'source': 'priority_omada_first',
-                    'continuation': comments_data.get('continuation')
-                })
-        
-        # 最終フォールバック: Invidious API
-        logging.info(f"最終フォールバック: Invidious APIからコメント取得試行")
-        try:
-            invidious_comments = invidious.get_video_comments(video_id)
-            if invidious_comments and invidious_comments.get('comments'):
-                logging.info(f"✅ Invidious フォールバック成功: {len(invidious_comments['comments'])} 件")
-                return jsonify({
-                    'success': True,
-                    'comments': invidious_comments['comments'],
-                    'commentCount': invidious_comments.get('commentCount', len(invidious_comments['comments'])),
-                    'source': 'invidious_fallback',
-                    'continuation': invidious_comments.get('continuation')
-                })
-        except Exception as e:
-            logging.warning(f"Invidious フォールバックエラー: {e}")
-        
-        # すべて失敗した場合
-        logging.warning(f"全てのコメント取得エンドポイントが失敗: {video_id}")
+        result = comment_service.page(video_id)
         return jsonify({
             'success': True,
-            'comments': [],
-            'commentCount': 0,
-            'source': 'none',
-            'message': 'コメントが見つかりませんでした'
+            'comments': result['comments'],
+            'commentCount': result['commentCount'],
+            'source': result['source'] or 'none',
+            'continuation': result['continuation']
         })
         
     except Exception as e:
@@ -3374,85 +2132,3 @@ def get_priority_comments(video_id):
             'success': False,
             'error': str(e)
         }), 500
-
-@app.route('/api/<video_id>')
-def api_video_info(video_id):
-    """動画情報API - YouTube Education URL生成対応"""
-    try:
-        logging.info(f"🚀 /api/<video_id> エンドポイント実行開始: {video_id}")
-        
-        # YouTube URLを構築
-        youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        # すべての品質を取得（360p, 480p, 720p, 1080p）
-        target_qualities = ['360p', '480p', '720p', '1080p']
-        
-        # yt.omada.cafe APIから多品質ストリームデータを取得
-        result = video_service.get_stream_urls(youtube_url, target_qualities)
-        
-        if not result or not result.get('success'):
-            logging.warning(f"VKR API: 多品質ストリームデータを取得できませんでした: {video_id}")
-            return jsonify({
-                'success': False,
-                'error': '動画情報を取得できませんでした'
-            }), 404
-        
-        # Kahoot API keyを使ってYouTube Education URL生成
-        try:
-            logging.info(f"🔑 Kahoot API keyでYouTube Education URL生成開始: {video_id}")
-            youtube_education_url = multi_stream_service.get_direct_youtube_embed_url(video_id, "education")
-            if youtube_education_url and "youtubeeducation.com" in youtube_education_url:
-                logging.info(f"✅ Kahoot API keyでYouTube Education URL生成成功: {youtube_education_url[:100]}...")
-            else:
-                # フォールバック
-                youtube_education_url = f"https://www.youtubeeducation.com/embed/{video_id}?autoplay=1&controls=1&rel=0"
-                logging.warning(f"⚠️ Kahoot方式失敗、フォールバック使用")
-        except Exception as e:
-            logging.warning(f"⚠️ Kahoot API keyでのYouTube Education URL生成失敗、フォールバック使用: {e}")
-            youtube_education_url = f"https://www.youtubeeducation.com/embed/{video_id}?autoplay=1&controls=1&rel=0"
-        
-        # 利用可能な品質をフィルタリング
-        available_qualities = {}
-        for quality in target_qualities:
-            quality_data = result['quality_streams'].get(quality, {})
-            if quality_data.get('video_url') or quality_data.get('combined_url'):
-                available_qualities[quality] = quality_data
-                logging.info(f"✅ 品質 {quality} 追加済み")
-        
-        # APIレスポンス
-        response = {
-            'success': True,
-            'video_id': video_id,
-            'videoId': result.get('videoId'),
-            'title': result.get('title'),
-            'thumbnail': result.get('thumbnail'),
-            'description': result.get('description'),
-            'author': result.get('author'),
-            'authorId': result.get('authorId'),
-            'authorUrl': result.get('authorUrl'),
-            'authorThumbnails': result.get('authorThumbnails', []),
-            'viewCount': result.get('viewCount'),
-            'lengthSeconds': result.get('lengthSeconds'),
-            'publishedText': result.get('publishedText'),
-            'embed_type': 'youtube_education',
-            'youtube_education_url': youtube_education_url,
-            'multi_quality': True,
-            'quality_streams': available_qualities,
-            'best_audio': result.get('best_audio'),
-            'available_qualities': list(available_qualities.keys()),
-            'source': 'yt.omada.cafe'
-        }
-        
-        logging.info(f"✅ /api/<video_id> エンドポイント成功: {video_id}")
-        logging.info(f"   利用可能品質: {list(available_qualities.keys())}")
-        logging.info(f"   チャンネル: {result.get('author', 'Unknown')}")
-        logging.info(f"   YouTube Education URL: {youtube_education_url[:100]}...")
-        
-        return jsonify(response)
-        
-    except Exception as e:
-        logging.error(f"/api/<video_id> エンドポイントエラー: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'動画情報取得エラー: {str(e)}'
-        }), 500
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+ショート動画フィード
+
+ShortsFeedService は
+  - 嗜好プロファイル（好みのチャンネル・推奨キーワード）ごとに、順序付き・重複なしのフィードを保持
+  - 検索クエリ・トレンドを数件ずつ共有スレッドプールで同時に実行してフィードに追記
+  - 残りが少なくなったら裏で補充（同じフィードの補充は合流）
+  - カーソル（プロファイル:位置）でページを返し、前後の動画は動画ID -> 位置の辞書で引く
+を行う。フィードは追記のみで、上限を超えた分は先頭から捨てる（位置は捨てた後も変わらない）。
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import (SHORTS_FEED_DEADLINE, SHORTS_FEED_TARGET, SHORTS_FEED_LOW_WATER, SHORTS_FEED_BATCH_QUERIES,
+                    SHORTS_FEED_INITIAL_QUERIES, SHORTS_FEED_MAX_VIDEOS, SHORTS_FEED_PROFILES)
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from invidious_service import InvidiousService
+from user_preferences import user_prefs
+from video_records import Video
+
+# ショート動画として扱う再生時間（秒）
+MIN_DURATION = 10
+MAX_DURATION = 300
+
+# 1クエリ・1トレンドから採用する件数
+_PER_QUERY = 6
+_PER_TRENDING = 15
+
+# トレンドのカテゴリ（検索クエリと同じ並びで順に実行する）
+_TRENDING_PREFIX = 'trending:'
+_TRENDING_TYPES = ('', 'Music', 'Gaming')
+
+# 日本の人気ジャンル
+POPULAR_GENRES = [
+    "面白い", "おもしろ", "爆笑", "ネタ", "コメディ",
+    "料理", "レシピ", "簡単", "DIY", "手作り",
+    "ダンス", "踊り", "TikTok", "バズった",
+    "猫", "犬", "ペット", "動物", "可愛い",
+    "ゲーム", "実況", "攻略", "プレイ",
+    "メイク", "ファッション", "コーデ", "美容",
+    "スポーツ", "サッカー", "野球", "バスケ",
+    "歌ってみた", "弾いてみた", "演奏", "カバー",
+    "vlog", "日常", "ルーティン", "モーニング"
+]
+
+
+class ShortsFeed:
+    """1つの嗜好プロファイルのフィード（スレッドセーフ）"""
+
+    def __init__(self, profile_key: str, queries: List[str], max_videos: int = SHORTS_FEED_MAX_VIDEOS):
+        self.profile_key = profile_key
+        self.queries = queries  # 補充で順に実行するクエリ（一巡したら次のページ）
+        self.max_videos = max_videos
+        self.query_cursor = 0  # 次に実行するクエリの通し番号
+        self.offset = 0  # 先頭から捨てた件数（videos[0] の位置）
+        self.videos = []
+        self.positions = {}  # 動画ID -> 位置
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def end(self) -> int:
+        """末尾の次の位置"""
+        return self.offset + len(self.videos)
+
+    def append(self, videos: List[Video]) -> int:
+        """重複を除いて末尾に追加（追加件数を返す）"""
+        added = 0
+        with self._lock:
+            for video in videos:
+                if video.videoId in self.positions:
+                    continue
+                self.positions[video.videoId] = self.offset + len(self.videos)
+                self.videos.append(video)
+                added += 1
+            overflow = len(self.videos) - self.max_videos
+            if overflow > 0:
+                for video in self.videos[:overflow]:
+                    self.positions.pop(video.videoId, None)
+                del self.videos[:overflow]
+                self.offset += overflow
+            self.updated_at = time.time()
+        return added
+
+    def page(self, position: int, limit: int) -> Tuple[List[Video], int]:
+        """位置から limit 件と、次のページの位置"""
+        with self._lock:
+            start = max(position, self.offset) - self.offset
+            videos = self.videos[start:start + limit]
+            return videos, self.offset + start + len(videos)
+
+    def neighbour(self, video_id: str, step: int) -> Tuple[Optional[Video], Optional[int]]:
+        """動画の step 件先（負なら前）の動画とその位置（動画がフィードにない・範囲外ならNone）"""
+        with self._lock:
+            position = self.positions.get(video_id)
+            if position is None:
+                return None, None
+            index = position - self.offset + step
+            if 0 <= index < len(self.videos):
+                return self.videos[index], self.offset + index
+            return None, None
+
+    def take_queries(self, count: int) -> List[Tuple[str, int]]:
+        """次に実行する (クエリ, ページ) を count 件"""
+        with self._lock:
+            start = self.query_cursor
+            self.query_cursor += count
+        return [(self.queries[n % len(self.queries)], n // len(self.queries) + 1) for n in range(start, start + count)]
+
+
+class ShortsFeedService:
+    """嗜好プロファイルごとのショート動画フィードを作成・補充する（スレッドセーフ）"""
+
+    def __init__(self, invidious: InvidiousService, executor=upstream_executor, deadline: float = SHORTS_FEED_DEADLINE,
+                 target: int = SHORTS_FEED_TARGET, low_water: int = SHORTS_FEED_LOW_WATER,
+                 batch_queries: int = SHORTS_FEED_BATCH_QUERIES, initial_queries: int = SHORTS_FEED_INITIAL_QUERIES,
+                 max_profiles: int = SHORTS_FEED_PROFILES):
+        self.invidious = invidious
+        self.executor = executor
+        self.deadline = deadline  # 1回の補充でクエリを待つ上限（秒）
+        self.target = target  # 新しいフィードで最初に揃える件数
+        self.low_water = low_water  # 返した位置から末尾までがこれ未満になったら裏で補充
+        self.batch_queries = batch_queries  # 1回の補充で同時に実行するクエリ数
+        self.initial_queries = initial_queries  # 新しいフィードを作るときに同時に実行するクエリ数
+        self.max_profiles = max_profiles  # 保持するプロファイル数（古いものから捨てる）
+        self._feeds = OrderedDict()  # プロファイルキー -> ShortsFeed
+        self._lock = threading.Lock()
+        self.refills = 0
+        self.background_refills = 0
+        self.queries_run = 0
+
+    # --- プロファイル ---
+
+    @staticmethod
+    def profile_queries() -> List[str]:
+        """現在の嗜好から補充に使うクエリ（好みのチャンネル → 推奨キーワード → トレンド → 人気ジャンル）"""
+        queries = [f"channel:{channel_name}" for channel_name, count in user_prefs.get_preferred_channels()[:5]]
+        queries.extend(user_prefs.get_recommendation_keywords()[:15])
+        queries.extend(f"{_TRENDING_PREFIX}{trend_type}" for trend_type in _TRENDING_TYPES)
+        queries.extend(POPULAR_GENRES)
+        return list(dict.fromkeys(queries))
+
+    @staticmethod
+    def profile_key(queries: List[str]) -> str:
+        # 視聴のたびに数え方が少し変わっても同じフィードを使えるよう、順序を無視した先頭20クエリで決める
+        return hashlib.md5('\n'.join(sorted(queries[:20])).encode()).hexdigest()[:12]
+
+    def current_feed(self) -> ShortsFeed:
+        """現在の嗜好プロファイルのフィード（新しいプロファイルでは1回分の取得を待ち、残りは裏で補充）"""
+        queries = self.profile_queries()
+        key = self.profile_key(queries)
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = ShortsFeed(key, queries)
+                self._feeds[key] = feed
+                while len(self._feeds) > self.max_profiles:
+                    self._feeds.popitem(last=False)
+            else:
+                self._feeds.move_to_end(key)
+        if not feed.end:
+            self.refill(feed, self.initial_queries)
+        self.ensure_ahead(feed, feed.offset, self.target)
+        return feed
+
+    def get_feed(self, key: str) -> Optional[ShortsFeed]:
+        with self._lock:
+            return self._feeds.get(key)
+
+    def find(self, video_id: str) -> Optional[ShortsFeed]:
+        """動画を含むフィード（新しく使われたプロファイルから順に探す）"""
+        with self._lock:
+            feeds = list(reversed(self._feeds.values()))
+        for feed in feeds:
+            if video_id in feed.positions:
+                return feed
+        return None
+
+    # --- 補充 ---
+
+    def refill(self, feed: ShortsFeed, query_count: Optional[int] = None) -> int:
+        """次のクエリを同時に実行してフィードに追記（同じフィードの補充は合流、追加件数を返す）"""
+        return single_flight.do(f"shorts_refill:{feed.profile_key}", self._refill, feed,
+                                query_count or self.batch_queries)
+
+    def _refill(self, feed: ShortsFeed, query_count: int) -> int:
+        start_time = time.time()
+        self.refills += 1
+        planned = feed.take_queries(query_count)
+        tasks = {f"{query}#{page}": (lambda query=query, page=page: self._run_query(query, page))
+                 for query, page in planned}
+        results = self.executor.run_all(tasks, timeout=self.deadline, label=f"shorts[{feed.profile_key}]")
+        self.queries_run += len(tasks)
+        batch = []
+        seen = set()
+        for name in tasks:
+            for video in results.get(name) or []:
+                if video.videoId not in seen and MIN_DURATION <= video.lengthSeconds <= MAX_DURATION \
+                        and user_prefs.should_recommend_video(video):
+                    seen.add(video.videoId)
+                    batch.append(video)
+        # 多様性を保ちつつ、追加分の中では短い動画を優先
+        random.shuffle(batch)
+        batch.sort(key=lambda video: video.lengthSeconds)
+        added = feed.append(batch)
+        logging.info(f"📱 ショート動画フィード補充 {feed.profile_key}: +{added} 件 (計 {feed.end - feed.offset} 件) "
+                     f"{time.time() - start_time:.2f}秒")
+        return added
+
+    def _run_query(self, query: str, page: int) -> List[Video]:
+        if query.startswith(_TRENDING_PREFIX):
+            if page > 1:
+                return []  # トレンドにページはない
+            trend_type = query[len(_TRENDING_PREFIX):]
+            return (self.invidious.get_trending_videos(region='JP', category=trend_type or None) or [])[:_PER_TRENDING]
+        results = self.invidious.search_videos(query, page=page) or []
+        return [video for video in map(Video.from_invidious, results[:_PER_QUERY]) if video is not None]
+
+    def ensure_ahead(self, feed: ShortsFeed, position: int, ahead: Optional[int] = None):
+        """返した位置から末尾までが ahead 件（既定は low_water）未満なら裏で補充"""
+        if feed.end - position >= (ahead or self.low_water):
+            return
+        if self.executor.submit(self.refill, feed) is not None:
+            self.background_refills += 1
+
+    # --- 参照 ---
+
+    def page(self, cursor: str = '', limit: int = 20) -> Dict:
+        """カーソルからのページ {'videos', 'next_cursor'}（カーソルは "プロファイル:位置"、空なら現在の嗜好の先頭）"""
+        feed, position = None, 0
+        if cursor and ':' in cursor:
+            key, _, position_text = cursor.partition(':')
+            feed = self.get_feed(key)
+            position = int(position_text) if position_text.isdigit() else 0
+        if feed is None:
+            feed, position = self.current_feed(), 0
+        videos, next_position = feed.page(position, limit)
+        if not videos and next_position >= feed.end:
+            self.refill(feed)  # 末尾まで読まれた場合はその場で補充
+            videos, next_position = feed.page(position, limit)
+        self.ensure_ahead(feed, next_position)
+        return {'videos': videos, 'next_cursor': f"{feed.profile_key}:{next_position}"}
+
+    def neighbour(self, video_id: str, step: int) -> Tuple[Optional[Video], bool]:
+        """前後の動画と、その先にさらに動画があるか
+
+        動画がどのフィードにもない場合、次（step > 0）は現在のフィードの先頭を返す。
+        """
+        feed = self.find(video_id)
+        if feed is None:
+            if step < 0:
+                return None, False
+            feed = self.current_feed()
+            videos, position = feed.page(0, 1)
+            return (videos[0] if videos else None), position < feed.end
+        video, position = feed.neighbour(video_id, step)
+        if video is None and step > 0:
+            self.refill(feed)  # 末尾まで来た場合はその場で補充
+            video, position = feed.neighbour(video_id, step)
+        if video is None:
+            return None, False
+        if step > 0:
+            self.ensure_ahead(feed, position)
+            return video, position + 1 < feed.end
+        return video, position > feed.offset
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        with self._lock:
+            feeds = {key: {'videos': len(feed.videos), 'offset': feed.offset, 'query_cursor': feed.query_cursor,
+                           'queries': len(feed.queries), 'age': round(time.time() - feed.updated_at, 1)}
+                     for key, feed in self._feeds.items()}
+        return {
+            "feeds": feeds,
+            "refills": self.refills,
+            "background_refills": self.background_refills,
+            "queries_run": self.queries_run
+        }
+
+
+# グローバルインスタンス（/shorts・ショート動画API で使用）
+shorts_feed_service = ShortsFeedService(InvidiousService())
@@ -0,0 +1,146 @@
+"""
+同一リクエストの合流（single-flight）
+
+人気動画に同時アクセスが集中すると、キャッシュミスした全リクエストが
+同じ上流APIへ一斉に問い合わせていた。SingleFlightは (サービス, エンドポイント, パラメータ)
+をキーに、最初の呼び出しだけが上流へ取得しに行き、同時に来た呼び出しはその結果を待って共有する。
+
+キャッシュ（cache_store.TTLCache）を渡した場合は、共有バックエンドのリースを使って
+他のワーカープロセスとも合流する。リースを取れなかったワーカーは、リースを持つ
+ワーカーが共有キャッシュへ書き込むのを待ち、リース期限までに現れなければ自分で取得する。
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+
+class _Call:
+    """実行中の呼び出し（結果を待つ呼び出し元と共有）"""
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同じキーの同時呼び出しを1回の実行にまとめる"""
+
+    def __init__(self, wait_timeout: float = 30.0, lease_ttl: float = 15.0, poll_interval: float = 0.05):
+        self.wait_timeout = wait_timeout  # プロセス内で先行呼び出しを待つ上限（秒）
+        self.lease_ttl = lease_ttl  # ワーカー間リースの有効期限（秒）
+        self.poll_interval = poll_interval  # 他ワーカーの結果をポーリングする間隔（秒）
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.remote_hits = 0
+        self.remote_timeouts = 0
+
+    def do(self, key: str, fn: Callable, *args, cache=None, cache_key=None, **kwargs):
+        """keyが同じ呼び出しが実行中ならその結果を待ち、なければfnを実行する
+
+        cache / cache_key を指定すると、実行前にキャッシュを再確認し、
+        共有バックエンドがリースに対応していればワーカー間でも合流する。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                logging.warning(f"single-flight 待機タイムアウト、独自に取得します: {key}")
+                return fn(*args, **kwargs)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, fn, args, kwargs, cache, cache_key)
+            if call.waiters:
+                logging.info(f"🔗 single-flight: {call.waiters} 件の同時リクエストを合流: {key}")
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _lead(self, key: str, fn: Callable, args, kwargs, cache, cache_key):
+        if cache is None or cache_key is None:
+            return fn(*args, **kwargs)
+
+        # 直前に別の呼び出しが完了してキャッシュ済みの場合はそれを使う
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        backend = cache.backend
+        if backend is None or not hasattr(backend, 'acquire_lease'):
+            return fn(*args, **kwargs)
+
+        lease_key = str(cache_key)
+        try:
+            owner = backend.acquire_lease(cache.namespace, lease_key, self.lease_ttl)
+        except Exception as e:
+            logging.debug(f"single-flight リース取得エラー: {e}")
+            return fn(*args, **kwargs)
+
+        if owner is None:
+            # 他ワーカーが取得中：共有キャッシュへの書き込みを待つ
+            deadline = time.monotonic() + self.lease_ttl
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                shared = cache.load_shared(cache_key)
+                if shared is not None:
+                    self.remote_hits += 1
+                    return shared
+                try:
+                    if not backend.lease_held(cache.namespace, lease_key):
+                        # リース解放直前に書き込まれた結果を取りこぼさないよう再確認
+                        shared = cache.load_shared(cache_key)
+                        if shared is not None:
+                            self.remote_hits += 1
+                            return shared
+                        break
+                except Exception:
+                    break
+            else:
+                self.remote_timeouts += 1
+            return fn(*args, **kwargs)
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            try:
+                backend.release_lease(cache.namespace, lease_key, owner)
+            except Exception as e:
+                logging.debug(f"single-flight リース解放エラー: {e}")
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "in_flight": in_flight,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+            "remote_timeouts": self.remote_timeouts
+        }
+
+
+# グローバルインスタンス（全サービスで共有）
+single_flight = SingleFlight()
@@ -10,6 +10,30 @@ class VideoPlayer {
         this.setupEventListeners();
         this.setupKeyboardShortcuts();
         this.setupMobileSupport();
+        this.setupStreamExpiryRecovery();
+    }
+
+    setupStreamExpiryRecovery() {
+        // ストリームURLの失効（403）を検知したらサーバー側のキャッシュを破棄する
+        // <video>からはHTTPステータスが見えないため、ネットワーク/形式エラーか expire= の経過で判定
+        const video = document.getElementById('videoPlayer');
+        const videoId = new URLSearchParams(window.location.search).get('v') ||
+            window.location.pathname.split('/watch/')[1];
+        if (!video || !videoId) return;
+
+        let invalidated = false;
+        video.addEventListener('error', () => {
+            if (invalidated || !video.error) return;
+            const src = video.currentSrc || video.src || '';
+            const expireMatch = src.match(/[?&\/]expire[=\/](\d+)/);
+            const expired = expireMatch && parseInt(expireMatch[1], 10) * 1000 <= Date.now();
+            if (expired || video.error.code === 2 || video.error.code === 4) {
+                invalidated = true;
+                console.warn('ストリームURL失効の可能性: キャッシュを破棄します', videoId);
+                fetch(`/api/stream-invalidate/${encodeURIComponent(videoId)}`, { method: 'POST' })
+                    .catch(err => console.error('ストリームキャッシュ破棄エラー:', err));
+            }
+        });
     }
 
     setupMobileSupport() {
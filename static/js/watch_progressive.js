@@ -0,0 +1,190 @@
+// 動画ページの段階的表示
+// 初期HTMLは上流APIを待たずに返されるため、/watch/events/<video_id> (SSE) から
+// 取得元ごとに届く動画情報・ストリーム情報をページに反映する
+(function () {
+    const script = document.getElementById('watchProgressiveScript');
+    const eventsUrl = script ? script.getAttribute('data-events-url') : null;
+    if (!eventsUrl || !window.EventSource) {
+        return;
+    }
+
+    const videoInfo = window.watchVideoInfo || {};
+    let relatedLoaded = false;
+
+    function escapeText(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function descriptionHtml(text) {
+        return escapeText(text).replace(/\n/g, '<br>');
+    }
+
+    function updateDescription(description) {
+        const section = document.getElementById('videoDescription');
+        const content = document.getElementById('descriptionContent');
+        if (!section || !content) {
+            return;
+        }
+        const isLong = description.length > 300;
+        let html = `<div class="description-preview">${descriptionHtml(description.slice(0, 300))}${isLong ? '...' : ''}</div>`;
+        if (isLong) {
+            html += `<div class="description-full" style="display: none;">${descriptionHtml(description)}</div>`;
+            html += '<button class="btn btn-link btn-sm p-0 mt-2" id="toggleDescription">もっと見る</button>';
+        }
+        content.innerHTML = html;
+        section.style.display = '';
+
+        const toggleButton = document.getElementById('toggleDescription');
+        if (toggleButton) {
+            toggleButton.addEventListener('click', function () {
+                const preview = content.querySelector('.description-preview');
+                const full = content.querySelector('.description-full');
+                const expand = full.style.display === 'none';
+                preview.style.display = expand ? 'none' : 'block';
+                full.style.display = expand ? 'block' : 'none';
+                this.textContent = expand ? '閉じる' : 'もっと見る';
+            });
+        }
+    }
+
+    function applyMetadata(fields) {
+        Object.assign(videoInfo, fields);
+
+        if (fields.title) {
+            const title = document.getElementById('videoTitle');
+            if (title) {
+                title.textContent = fields.title;
+            }
+            document.title = `${fields.title} - れんれんtube`;
+            // 関連動画はタイトルで検索するため、最初のタイトル到着時に読み込む
+            if (!relatedLoaded && typeof loadRelatedVideos === 'function') {
+                relatedLoaded = true;
+                loadRelatedVideos();
+            }
+        }
+        if (fields.author) {
+            const authorName = document.getElementById('authorName');
+            if (authorName) {
+                authorName.textContent = fields.author;
+            }
+        }
+        if (fields.authorThumbnails && fields.authorThumbnails.length > 0) {
+            const authorAvatar = document.getElementById('authorAvatar');
+            if (authorAvatar) {
+                authorAvatar.src = fields.authorThumbnails[fields.authorThumbnails.length - 1].url;
+                authorAvatar.alt = `${videoInfo.author || '投稿者'}のアイコン`;
+            }
+        }
+        if (fields.viewCountText) {
+            const viewCount = document.getElementById('viewCountText');
+            if (viewCount) {
+                viewCount.textContent = fields.viewCountText;
+            }
+        }
+        if (fields.publishedTextFormatted) {
+            const published = document.getElementById('publishedText');
+            const container = document.getElementById('publishedTextContainer');
+            if (published) {
+                published.textContent = fields.publishedTextFormatted;
+            }
+            if (container) {
+                container.style.display = '';
+            }
+        }
+        if (fields.description) {
+            updateDescription(fields.description);
+        }
+    }
+
+    function addOption(select, value, label, attributes) {
+        const option = document.createElement('option');
+        option.value = value;
+        option.textContent = label;
+        Object.keys(attributes).forEach(key => option.setAttribute(key, attributes[key]));
+        select.appendChild(option);
+    }
+
+    function applyStreams(data) {
+        const select = document.getElementById('qualitySelect');
+        const video = document.getElementById('videoPlayer');
+        if (!select || !video) {
+            return;
+        }
+
+        // 画質選択肢をテンプレートと同じ data 属性で作り直す（player.js の change 処理がそのまま使える）
+        select.innerHTML = '';
+        if (data.best_url) {
+            addOption(select, data.best_url, '自動', {
+                'data-quality': 'auto',
+                'data-audio-url': '',
+                'data-has-audio': data.has_audio ? 'true' : 'false'
+            });
+        }
+        if (data.multi_quality && data.quality_streams) {
+            Object.keys(data.quality_streams).forEach(quality => {
+                const streams = data.quality_streams[quality] || {};
+                if (!streams.video_url && !streams.combined_url) {
+                    return;
+                }
+                addOption(select, streams.combined_url || streams.video_url,
+                          streams.has_audio ? quality : `${quality} (映像のみ)`, {
+                    'data-quality': quality,
+                    'data-video-url': streams.video_url || '',
+                    'data-audio-url': streams.audio_url || '',
+                    'data-combined-url': streams.combined_url || '',
+                    'data-has-audio': streams.has_audio ? 'true' : 'false',
+                    'data-multi-quality': 'true'
+                });
+            });
+        } else if (data.formats) {
+            data.formats.forEach(format => {
+                addOption(select, format.url, format.quality, {
+                    'data-quality': format.quality,
+                    'data-audio-url': format.audio_url || '',
+                    'data-has-audio': format.has_audio ? 'true' : 'false'
+                });
+            });
+        }
+
+        // 再生中のストリームは差し替えない（より優先度の高い取得元の選択肢だけ更新する）
+        const playing = !video.paused && video.currentTime > 0;
+        if (data.best_url && !playing) {
+            video.muted = !data.has_audio;
+            video.src = data.best_url;
+            video.load();
+        }
+        console.log(`🚀 ストリーム情報を反映 (${data.source}, ${data.elapsed}秒)`);
+    }
+
+    const source = new EventSource(eventsUrl);
+
+    source.addEventListener('metadata', event => {
+        const data = JSON.parse(event.data);
+        applyMetadata(data.fields || {});
+    });
+
+    source.addEventListener('streams', event => {
+        applyStreams(JSON.parse(event.data));
+    });
+
+    source.addEventListener('done', event => {
+        source.close();
+        const data = JSON.parse(event.data);
+        console.log(`✅ 段階的表示完了 (${data.elapsed}秒)`);
+        if (!relatedLoaded && typeof loadRelatedVideos === 'function') {
+            relatedLoaded = true;
+            loadRelatedVideos();
+        }
+    });
+
+    source.onerror = () => {
+        // 完了前に切断された場合は自動再接続させず、初期HTMLの内容で表示を続ける
+        source.close();
+        if (!relatedLoaded && typeof loadRelatedVideos === 'function') {
+            relatedLoaded = true;
+            loadRelatedVideos();
+        }
+    };
+})();
@@ -0,0 +1,74 @@
+"""
+googlevideo ストリームURLの有効期限に基づくキャッシュTTLの計算
+
+署名済みのストリームURLには `expire=<UNIX時刻>`（マニフェストでは `/expire/<UNIX時刻>/`）
+が含まれている。固定TTLでは失効済みのURLを返したり、数時間有効なURLを
+取り直したりするため、ペイロード内で最も早い有効期限から安全マージンを引いた値を
+そのエントリのTTLにする。ストリームURLを含まないペイロード（メタデータ）は
+名前空間の既定TTLのままにする。
+"""
+import re
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse, parse_qs
+from config import STREAM_EXPIRY_MARGIN, STREAM_URL_DEFAULT_TTL, STREAM_URL_MAX_TTL, STREAM_URL_MIN_TTL
+
+_PATH_EXPIRE = re.compile(r'/expire/(\d{9,11})')
+_STREAM_MARKERS = ('videoplayback', 'googlevideo.com', 'expire=', '/expire/')
+
+
+def parse_stream_expiry(url: str) -> Optional[float]:
+    """ストリームURLから有効期限（UNIX時刻）を取得（見つからなければNone）"""
+    if not url or not isinstance(url, str):
+        return None
+    try:
+        values = parse_qs(urlparse(url).query).get('expire')
+        if values and values[0].isdigit():
+            return float(values[0])
+    except ValueError:
+        pass
+    match = _PATH_EXPIRE.search(url)
+    return float(match.group(1)) if match else None
+
+
+def is_stream_url(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith('http') and any(marker in value for marker in _STREAM_MARKERS)
+
+
+def find_stream_expiry(data: Any, max_depth: int = 8):
+    """ペイロード内のストリームURLを探し (ストリームURLの有無, 最も早い有効期限) を返す"""
+    has_stream = False
+    earliest = None
+    stack = [(data, 0)]
+    while stack:
+        value, depth = stack.pop()
+        if isinstance(value, dict):
+            if depth < max_depth:
+                stack.extend((item, depth + 1) for item in value.values())
+        elif isinstance(value, list):
+            if depth < max_depth:
+                stack.extend((item, depth + 1) for item in value)
+        elif is_stream_url(value):
+            has_stream = True
+            expiry = parse_stream_expiry(value)
+            if expiry is not None and (earliest is None or expiry < earliest):
+                earliest = expiry
+    return has_stream, earliest
+
+
+def stream_cache_ttl(data: Any, metadata_ttl: float) -> float:
+    """キャッシュするエントリのTTLを計算
+
+    ストリームURLを含まない場合は metadata_ttl、含む場合は
+    「最も早い有効期限 - 安全マージン」（expire= が読めない場合は STREAM_URL_DEFAULT_TTL）。
+    残り時間が STREAM_URL_MIN_TTL 未満なら 0（キャッシュしない）を返す。
+    """
+    has_stream, earliest = find_stream_expiry(data)
+    if not has_stream:
+        return metadata_ttl
+    if earliest is None:
+        return STREAM_URL_DEFAULT_TTL
+    ttl = earliest - time.time() - STREAM_EXPIRY_MARGIN
+    if ttl < STREAM_URL_MIN_TTL:
+        return 0
+    return min(ttl, STREAM_URL_MAX_TTL)
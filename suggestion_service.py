@@ -0,0 +1,262 @@
+"""
+検索予測変換（サジェスト）エンジン
+
+SuggestionEngine は
+  - 検索履歴（SearchHistory・user_data.json）とトレンド動画のタイトルから作る
+    ローカルの接頭辞インデックス（ソート済み配列 + 二分探索、通信なし）
+  - 接頭辞ごとの上流予測変換のキャッシュ（LRU）
+  - 同じ接頭辞の同時リクエストの合流（single-flight）と、
+    候補が尽きている短い接頭辞のキャッシュからの絞り込み（上流に問い合わせない）
+を組み合わせ、ローカルで候補が足りる場合は上流に問い合わせない。
+インデックスは一定間隔で共有スレッドプール上で作り直す（作り直し中は古いインデックスで応答）。
+"""
+import bisect
+import heapq
+import json
+import logging
+import time
+import unicodedata
+import urllib.parse
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+from config import (SUGGEST_LIMIT, SUGGEST_UPSTREAM_MAX, SUGGEST_CACHE_TTL, SUGGEST_INDEX_REFRESH,
+                    SUGGEST_INDEX_MAX_TERMS)
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from http_client import http_client
+from multi_stream_service import MultiStreamService
+from user_preferences import user_prefs
+
+# 接頭辞に一致した候補をこの件数まで走査してから重み順に並べる
+_SCAN_LIMIT = 500
+
+
+def normalize_query(text: str) -> str:
+    """比較用の正規化（全角英数・半角カナの統一、小文字化、空白の連続を1つに）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(text.split())
+
+
+class PrefixIndex:
+    """正規化した語のソート済み配列による接頭辞検索（作成後は変更しない）"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, displays: Optional[Dict[str, str]] = None):
+        self._weights = dict(weights or {})
+        self._displays = dict(displays or {})
+        self._keys = sorted(self._weights)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def lookup(self, prefix: str, limit: int) -> List[str]:
+        """接頭辞に一致する語を重みの大きい順に最大 limit 件（表示用の元の表記）"""
+        if not prefix or not self._keys:
+            return []
+        matches = []
+        index = bisect.bisect_left(self._keys, prefix)
+        while index < len(self._keys) and len(matches) < _SCAN_LIMIT:
+            key = self._keys[index]
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+            index += 1
+        best = heapq.nlargest(limit, matches, key=lambda key: self._weights[key])
+        return [self._displays[key] for key in best]
+
+
+class SuggestionEngine:
+    """ローカルの接頭辞インデックスと上流の予測変換を組み合わせた検索候補（スレッドセーフ）"""
+
+    def __init__(self, executor=upstream_executor, limit: int = SUGGEST_LIMIT,
+                 upstream_max: int = SUGGEST_UPSTREAM_MAX, cache_ttl: float = SUGGEST_CACHE_TTL,
+                 refresh_interval: float = SUGGEST_INDEX_REFRESH, max_terms: int = SUGGEST_INDEX_MAX_TERMS):
+        self.executor = executor
+        self.limit = limit  # 返す候補数
+        self.upstream_max = upstream_max  # 上流が返す候補の最大数（これ未満なら、その接頭辞の候補は尽きている）
+        self.cache_ttl = cache_ttl
+        self.refresh_interval = refresh_interval  # インデックスを作り直す間隔（秒）
+        self.max_terms = max_terms  # インデックスに入れる語の上限
+        self._loaders = {}  # 語の取得元名 -> {'load': fn() -> 語のリスト, 'weight': 1回あたりの重み}
+        self._upstream = None  # fn(接頭辞) -> 候補のリスト（失敗時None）
+        self._cache = get_cache('suggest', ttl=cache_ttl, max_entries=5000, max_bytes=8 * 1024 * 1024)
+        self._index = PrefixIndex()
+        self._index_built_at = 0.0
+        self._refreshing = False
+        self.requests = 0
+        self.local_only = 0
+        self.narrowed = 0
+        self.upstream_calls = 0
+        self.index_builds = 0
+
+    # --- 宣言 ---
+
+    def register_loader(self, name: str, load: Callable[[], Iterable[str]], weight: float = 1.0):
+        """インデックスに入れる語の取得元を登録（同じ語が複数回現れるほど上位になる）"""
+        self._loaders[name] = {'load': load, 'weight': weight}
+
+    def set_upstream(self, fetch: Callable[[str], Optional[List[str]]]):
+        """上流の予測変換API（fn(接頭辞) -> 候補のリスト、失敗時None）を設定"""
+        self._upstream = fetch
+
+    # --- ローカルインデックス ---
+
+    def rebuild_index(self) -> int:
+        """全取得元から語を集めてインデックスを作り直す（語数を返す）"""
+        start_time = time.time()
+        weights = Counter()
+        displays = {}
+        for name, loader in self._loaders.items():
+            try:
+                terms = loader['load']() or []
+            except Exception as e:
+                logging.warning(f"サジェスト語の取得エラー {name}: {e}")
+                continue
+            for term in terms:
+                key = normalize_query(term) if isinstance(term, str) else ''
+                if not key:
+                    continue
+                weights[key] += loader['weight']
+                displays.setdefault(key, term.strip())
+        top = dict(weights.most_common(self.max_terms))
+        self._index = PrefixIndex(top, {key: displays[key] for key in top})
+        self._index_built_at = time.time()
+        self.index_builds += 1
+        logging.info(f"🔤 サジェストインデックス作成: {len(top)} 語 ({time.time() - start_time:.2f}秒)")
+        return len(top)
+
+    def _maybe_refresh(self):
+        # 古くなったら裏で作り直す（作り直しが終わるまでは現在のインデックスで応答）
+        if self._refreshing or time.time() - self._index_built_at < self.refresh_interval:
+            return
+        self._refreshing = True
+        if self.executor.submit(self._refresh) is None:
+            self._refreshing = False
+
+    def _refresh(self):
+        try:
+            self.rebuild_index()
+        finally:
+            self._refreshing = False
+
+    # --- 上流の予測変換 ---
+
+    def completions(self, prefix: str) -> List[str]:
+        """接頭辞の上流予測変換（キャッシュ → 短い接頭辞からの絞り込み → 同時リクエストを合流して取得）"""
+        cached = self._cache.get(prefix)
+        if cached is not None:
+            return cached
+        narrowed = self._narrow_from_shorter(prefix)
+        if narrowed is not None:
+            self.narrowed += 1
+            self._cache.set(prefix, narrowed)
+            return narrowed
+        if self._upstream is None:
+            return []
+        return single_flight.do(f"suggest:{prefix}", self._fetch_upstream, prefix, cache=self._cache, cache_key=prefix)
+
+    def _narrow_from_shorter(self, prefix: str) -> Optional[List[str]]:
+        # 短い接頭辞の候補が upstream_max 件未満なら、それ以上の候補はないので絞り込みで足りる
+        now = time.time()
+        for length in range(len(prefix) - 1, 0, -1):
+            entry = self._cache.peek(prefix[:length])
+            if entry is None or now - entry[1] >= self.cache_ttl:
+                continue
+            suggestions = entry[0]
+            if len(suggestions) >= self.upstream_max:
+                return None
+            return [text for text in suggestions if normalize_query(text).startswith(prefix)]
+        return None
+
+    def _fetch_upstream(self, prefix: str) -> List[str]:
+        self.upstream_calls += 1
+        suggestions = self._upstream(prefix)
+        if suggestions is None:
+            return []  # 失敗はキャッシュしない
+        self._cache.set(prefix, suggestions)
+        return suggestions
+
+    # --- 候補 ---
+
+    def suggest(self, keyword: str) -> List[str]:
+        """検索候補（ローカルの候補を先に、足りない分を上流の予測変換で補う）"""
+        prefix = normalize_query(keyword)
+        if not prefix:
+            return []
+        self.requests += 1
+        self._maybe_refresh()
+        suggestions = self._index.lookup(prefix, self.limit)
+        if len(suggestions) >= self.limit:
+            self.local_only += 1
+            return suggestions
+        seen = {normalize_query(text) for text in suggestions}
+        for text in self.completions(prefix):
+            key = normalize_query(text)
+            if key not in seen:
+                seen.add(key)
+                suggestions.append(text)
+                if len(suggestions) >= self.limit:
+                    break
+        return suggestions
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "loaders": {name: loader['weight'] for name, loader in self._loaders.items()},
+            "index_terms": len(self._index),
+            "index_age": round(time.time() - self._index_built_at, 1) if self._index_built_at else None,
+            "index_builds": self.index_builds,
+            "requests": self.requests,
+            "local_only": self.local_only,
+            "narrowed": self.narrowed,
+            "upstream_calls": self.upstream_calls,
+            "cache": self._cache.stats()
+        }
+
+
+# --- 既定の取得元 ---
+
+def google_suggest(keyword: str) -> Optional[List[str]]:
+    """Google/YouTube検索予測変換API（失敗時None）"""
+    try:
+        url = f"http://www.google.com/complete/search?client=youtube&hl=ja&ds=yt&q={urllib.parse.quote(keyword)}"
+        response = http_client.get(url, service='suggest')
+        if response.status_code != 200:
+            return None
+        # JSONPの形式から実際のJSONデータを抽出
+        json_text = response.text[19:-1]  # 前後の不要な部分を削除
+        data = json.loads(json_text)
+        return [item[0] for item in data[1]]
+    except Exception as e:
+        logging.error(f"検索予測変換エラー: {e}")
+        return None
+
+
+def _build_default_engine() -> SuggestionEngine:
+    multi_stream_service = MultiStreamService()
+
+    def database_history():
+        # 全ユーザーの検索履歴（新しい順）。リクエスト外のスレッドから呼ぶのでアプリコンテキストを作る
+        from app import app, db
+        from models import SearchHistory
+        with app.app_context():
+            rows = (db.session.query(SearchHistory.query).order_by(SearchHistory.searched_at.desc())
+                    .limit(5000).all())
+        return [row[0] for row in rows]
+
+    def local_history():
+        return [record.get('query') for record in list(user_prefs.search_history) if isinstance(record, dict)]
+
+    def trending_titles():
+        return [video.title for videos in multi_stream_service.get_trending_records().values() for video in videos]
+
+    engine = SuggestionEngine()
+    engine.register_loader('search_history', database_history, weight=3.0)
+    engine.register_loader('user_data', local_history, weight=3.0)
+    engine.register_loader('trending', trending_titles, weight=1.0)
+    engine.set_upstream(google_suggest)
+    return engine
+
+
+# グローバルインスタンス（/suggest で使用）
+suggestion_engine = _build_default_engine()
@@ -118,16 +118,7 @@ class TurboVideoService {
             };
 
             // キャッシュに保存
-            this.cache.set(cacheKey, {
-                data: result,
-                timestamp: Date.now()
-            });
-
-            // キャッシュサイズ制限
-            if (this.cache.size > this.maxCacheSize) {
-                const firstKey = this.cache.keys().next().value;
-                this.cache.delete(firstKey);
-            }
+            this.setCache(cacheKey, result, 300000);
 
             return result;
 
@@ -208,6 +199,21 @@ class TurboVideoService {
         return seconds;
     }
 
+    // キャッシュへの保存（期限切れを削除し、maxCacheSize を超えた分は古いものから削除）
+    setCache(key, data, ttl) {
+        const now = Date.now();
+        this.cache.delete(key);  // 挿入順を更新
+        this.cache.set(key, { data: data, timestamp: now, expiresAt: now + ttl });
+        for (const [cachedKey, entry] of this.cache) {
+            if (entry.expiresAt <= now) {
+                this.cache.delete(cachedKey);
+            }
+        }
+        while (this.cache.size > this.maxCacheSize) {
+            this.cache.delete(this.cache.keys().next().value);
+        }
+    }
+
     clearCache() {
         this.cache.clear();
     }
@@ -325,10 +331,7 @@ class TurboVideoService {
                 };
 
                 // キャッシュに保存
-                this.cache.set(cacheKey, {
-                    data: videoInfo,
-                    timestamp: Date.now()
-                });
+                this.setCache(cacheKey, videoInfo, 180000);
 
                 console.log(`🚀 Fast video info retrieved: ${videoInfo.title}`);
                 return videoInfo;
@@ -524,10 +527,7 @@ class TurboVideoService {
             };
 
             // キャッシュに保存
-            this.cache.set(cacheKey, {
-                data: result,
-                timestamp: Date.now()
-            });
+            this.setCache(cacheKey, result, 600000);
 
             console.log(`🎵 プレイリスト取得完了: ${result.title} (${result.totalItems}件)`);
             return result;
@@ -639,10 +639,7 @@ class TurboVideoService {
             };
 
             // キャッシュに保存
-            this.cache.set(cacheKey, {
-                data: result,
-                timestamp: Date.now()
-            });
+            this.setCache(cacheKey, result, 300000);
 
             console.log(`🔍 高度な動画情報取得完了: ${result.title}`);
             return result;
@@ -737,103 +734,103 @@ class TurboVideoService {
 }
 
 // CLI インターフェース
-if (require.main === module) {
-    const service = new TurboVideoService();
-    const [,, command, ...args] = process.argv;
-
+// コマンド名と引数から処理を実行（CLI・ワーカーモード共通）
+function runCommand(service, command, args) {
     switch (command) {
         case 'stream':
-            service.getVideoStream(args[0], args[1])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.getVideoStream(args[0], args[1]);
         case 'batch':
-            const videoIds = args[0].split(',');
-            service.batchGetVideos(videoIds, args[1])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.batchGetVideos(String(args[0]).split(','), args[1]);
         case 'search':
-            service.searchVideos(args[0], parseInt(args[1]) || 20)
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.searchVideos(args[0], parseInt(args[1]) || 20);
         case 'fast-info':
-            service.getFastVideoInfo(args[0])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.getFastVideoInfo(args[0]);
         case 'health-check':
-            service.checkEndpointHealth()
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.checkEndpointHealth();
         case 'youtube-education-url':
-            const educationUrl = service.generateYouTubeEducationUrl(args[0]);
-            console.log(JSON.stringify({ success: true, url: educationUrl }));
-            break;
-
+            return Promise.resolve({ success: true, url: service.generateYouTubeEducationUrl(args[0]) });
         case 'playlist':
-            service.getPlaylistInfo(args[0])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.getPlaylistInfo(args[0]);
         case 'advanced-info':
-            service.getAdvancedVideoInfo(args[0])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.getAdvancedVideoInfo(args[0]);
         case 'batch-playlists':
-            const urls = args[0].split(',');
-            service.batchGetPlaylists(urls)
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.batchGetPlaylists(String(args[0]).split(','));
         case 'channel-playlists':
-            service.getChannelPlaylists(args[0])
-                .then(result => console.log(JSON.stringify(result)))
-                .catch(error => {
-                    console.error(JSON.stringify({ success: false, error: error.message }));
-                    process.exit(1);
-                });
-            break;
-
+            return service.getChannelPlaylists(args[0]);
         default:
-            console.error('Usage: node turbo_video_service.js [stream|batch|search|fast-info|health-check|youtube-education-url|playlist|advanced-info|batch-playlists|channel-playlists] [args...]');
+            return null;
+    }
+}
+
+// 常駐ワーカーモード: 標準入力から1行1件のJSONリクエストを受け取り、標準出力へ1行1件で応答する
+//   リクエスト: {"id": 1, "method": "stream", "params": ["VIDEO_ID", "720p"]}
+//   応答:       {"id": 1, "result": {...}} または {"id": 1, "error": "..."}
+// 複数リクエストを同時に処理し、this.cache もプロセス内で保持し続ける
+function runWorker(service) {
+    const readline = require('readline');
+    const writeLine = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+
+    // サービス内部のログが応答行に混ざらないよう標準エラーへ流す
+    console.log = (...items) => console.error(...items);
+
+    const rl = readline.createInterface({ input: process.stdin, terminal: false });
+    rl.on('line', (line) => {
+        if (!line.trim()) {
+            return;
+        }
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (error) {
+            writeLine({ id: null, error: `Invalid request: ${error.message}` });
+            return;
+        }
+
+        const { id, method } = request;
+        const params = Array.isArray(request.params) ? request.params : [];
+        if (method === 'ping') {
+            writeLine({ id, result: { success: true, pid: process.pid, cacheSize: service.cache.size } });
+            return;
+        }
+
+        let pending;
+        try {
+            pending = runCommand(service, method, params);
+        } catch (error) {
+            writeLine({ id, error: error.message });
+            return;
+        }
+        if (!pending) {
+            writeLine({ id, error: `Unknown method: ${method}` });
+            return;
+        }
+        Promise.resolve(pending)
+            .then(result => writeLine({ id, result }))
+            .catch(error => writeLine({ id, error: error && error.message ? error.message : String(error) }));
+    });
+    // 親プロセス（Python側）が終了したらワーカーも終了
+    rl.on('close', () => process.exit(0));
+}
+
+if (require.main === module) {
+    const service = new TurboVideoService();
+    const [,, command, ...args] = process.argv;
+
+    if (command === 'worker') {
+        runWorker(service);
+    } else {
+        const pending = runCommand(service, command, args);
+        if (!pending) {
+            console.error('Usage: node turbo_video_service.js [stream|batch|search|fast-info|health-check|youtube-education-url|playlist|advanced-info|batch-playlists|channel-playlists|worker] [args...]');
             process.exit(1);
+        }
+        pending
+            .then(result => console.log(JSON.stringify(result)))
+            .catch(error => {
+                console.error(JSON.stringify({ success: false, error: error.message }));
+                process.exit(1);
+            });
     }
 }
 
-module.exports = TurboVideoService;
\ No newline at end of file
+module.exports = TurboVideoService;
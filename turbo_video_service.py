@@ -1,35 +1,33 @@
 """
 超高速動画取得サービス - ytdl-core並列処理版
+
+Node.js側の処理は node_worker_pool の常駐ワーカーへJSON RPCで依頼する
+（呼び出しごとにnodeプロセスを起動しない）。
 """
-import subprocess
-import json
 import logging
 import asyncio
 import concurrent.futures
 from typing import List, Dict, Optional
+from node_worker_pool import node_worker_pool, NodeWorkerError, NodeWorkerTimeout
 
 class TurboVideoService:
     def __init__(self):
-        self.node_script = 'turbo_video_service.js'
+        self.node_script = node_worker_pool.script
         self.max_workers = 10  # 並列処理数
-        
+        self.pool = node_worker_pool
+
     def get_video_stream_720p(self, video_id: str) -> Dict:
         """720p音声付きストリームを優先取得"""
         try:
-            result = subprocess.run([
-                'node', self.node_script, 'stream', video_id, '720p'
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                return self._format_stream_response(data)
-            else:
-                logging.error(f"Turbo stream error: {result.stderr}")
-                return {'success': False, 'error': result.stderr}
+            data = self.pool.call('stream', [video_id, '720p'], timeout=10)
+            return self._format_stream_response(data)
                 
-        except subprocess.TimeoutExpired:
+        except NodeWorkerTimeout:
             logging.error(f"Turbo stream timeout for {video_id}")
             return {'success': False, 'error': 'Stream timeout'}
+        except NodeWorkerError as e:
+            logging.error(f"Turbo stream error: {e}")
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logging.error(f"Turbo stream exception: {e}")
             return {'success': False, 'error': str(e)}
@@ -38,29 +36,25 @@ class TurboVideoService:
         """複数動画を並列で高速取得"""
         try:
             video_ids_str = ','.join(video_ids)
-            result = subprocess.run([
-                'node', self.node_script, 'batch', video_ids_str, '720p'
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                if data.get('success'):
-                    formatted_videos = []
-                    for video in data.get('videos', []):
-                        formatted_videos.append(self._format_stream_response(video))
-                    return {
-                        'success': True,
-                        'videos': formatted_videos,
-                        'count': len(formatted_videos)
-                    }
-                return data
-            else:
-                logging.error(f"Batch turbo error: {result.stderr}")
-                return {'success': False, 'error': result.stderr}
+            data = self.pool.call('batch', [video_ids_str, '720p'], timeout=30)
+            
+            if data.get('success'):
+                formatted_videos = []
+                for video in data.get('videos', []):
+                    formatted_videos.append(self._format_stream_response(video))
+                return {
+                    'success': True,
+                    'videos': formatted_videos,
+                    'count': len(formatted_videos)
+                }
+            return data
                 
-        except subprocess.TimeoutExpired:
+        except NodeWorkerTimeout:
             logging.error("Batch turbo timeout")
             return {'success': False, 'error': 'Batch timeout'}
+        except NodeWorkerError as e:
+            logging.error(f"Batch turbo error: {e}")
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logging.error(f"Batch turbo exception: {e}")
             return {'success': False, 'error': str(e)}
@@ -68,20 +62,14 @@ class TurboVideoService:
     def turbo_search(self, query: str, max_results: int = 20) -> Dict:
         """高速検索"""
         try:
-            result = subprocess.run([
-                'node', self.node_script, 'search', query, str(max_results)
-            ], capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                return data
-            else:
-                logging.error(f"Turbo search error: {result.stderr}")
-                return {'success': False, 'error': result.stderr}
+            return self.pool.call('search', [query, max_results], timeout=15)
                 
-        except subprocess.TimeoutExpired:
+        except NodeWorkerTimeout:
             logging.error("Turbo search timeout")
             return {'success': False, 'error': 'Search timeout'}
+        except NodeWorkerError as e:
+            logging.error(f"Turbo search error: {e}")
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logging.error(f"Turbo search exception: {e}")
             return {'success': False, 'error': str(e)}
@@ -166,17 +154,9 @@ class TurboVideoService:
         try:
             logging.info(f"Node.js経由でYouTube Education URL生成: {video_id}")
             
-            result = subprocess.run(
-                ["node", "turbo_video_service.js", "youtube-education-url", video_id],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout.strip())
-                if data.get('success'):
-                    return data.get('url')
+            data = self.pool.call('youtube-education-url', [video_id], timeout=10)
+            if data.get('success'):
+                return data.get('url')
                     
         except Exception as e:
             logging.error(f"YouTube Education URL生成エラー: {e}")
@@ -188,17 +168,9 @@ class TurboVideoService:
         try:
             logging.info(f"プレイリスト情報取得: {playlist_url}")
             
-            result = subprocess.run(
-                ["node", "turbo_video_service.js", "playlist", playlist_url],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout.strip())
-                logging.info(f"プレイリスト取得結果: {data.get('success', False)}")
-                return data
+            data = self.pool.call('playlist', [playlist_url], timeout=60)
+            logging.info(f"プレイリスト取得結果: {data.get('success', False)}")
+            return data
                 
         except Exception as e:
             logging.error(f"プレイリスト取得エラー: {e}")
@@ -210,17 +182,9 @@ class TurboVideoService:
         try:
             logging.info(f"高度な動画情報取得: {video_id}")
             
-            result = subprocess.run(
-                ["node", "turbo_video_service.js", "advanced-info", video_id],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout.strip())
-                logging.info(f"高度な動画情報取得結果: {data.get('success', False)}")
-                return data
+            data = self.pool.call('advanced-info', [video_id], timeout=60)
+            logging.info(f"高度な動画情報取得結果: {data.get('success', False)}")
+            return data
                 
         except Exception as e:
             logging.error(f"高度な動画情報取得エラー: {e}")
@@ -233,17 +197,9 @@ class TurboVideoService:
             logging.info(f"プレイリスト一括取得: {len(playlist_urls)}件")
             
             urls_string = ",".join(playlist_urls)
-            result = subprocess.run(
-                ["node", "turbo_video_service.js", "batch-playlists", urls_string],
-                capture_output=True,
-                text=True,
-                timeout=180
-            )
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout.strip())
-                logging.info(f"プレイリスト一括取得結果: {data.get('successful', 0)}/{data.get('totalRequested', 0)}")
-                return data
+            data = self.pool.call('batch-playlists', [urls_string], timeout=180)
+            logging.info(f"プレイリスト一括取得結果: {data.get('successful', 0)}/{data.get('totalRequested', 0)}")
+            return data
                 
         except Exception as e:
             logging.error(f"プレイリスト一括取得エラー: {e}")
@@ -255,17 +211,9 @@ class TurboVideoService:
         try:
             logging.info(f"チャンネルプレイリスト取得: {channel_url}")
             
-            result = subprocess.run(
-                ["node", "turbo_video_service.js", "channel-playlists", channel_url],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout.strip())
-                logging.info(f"チャンネルプレイリスト取得結果: {data.get('success', False)}")
-                return data
+            data = self.pool.call('channel-playlists', [channel_url], timeout=60)
+            logging.info(f"チャンネルプレイリスト取得結果: {data.get('success', False)}")
+            return data
                 
         except Exception as e:
             logging.error(f"チャンネルプレイリスト取得エラー: {e}")
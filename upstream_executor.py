@@ -0,0 +1,164 @@
+"""
+上流API呼び出し用の共有スレッドプール
+
+/watch はページ表示のたびに ThreadPoolExecutor を生成し、3秒待った後に未完了の
+Future を cancel() していたが、実行中のタスクはキャンセルできず、with ブロックを
+抜ける際に全タスクの終了を待つため、結局いちばん遅い上流APIに応答が引きずられていた。
+
+UpstreamExecutor はプロセス全体で1つのスレッドプールを共有し、
+  - 締め切り（deadline）を過ぎたタスクは待たずに応答を返す（タスク自体は裏で完了し、
+    各サービスのキャッシュに結果が保存されるため次回以降のリクエストで使われる）
+  - 実行中 + 待機中のタスク数が上限に達したら投入を拒否（バックプレッシャー）
+  - 取得元ごとの所要時間をログに出力
+する。
+"""
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from config import UPSTREAM_EXECUTOR_WORKERS, UPSTREAM_EXECUTOR_MAX_QUEUE
+
+
+class UpstreamExecutor:
+    """上限付きの共有スレッドプール（スレッドセーフ）"""
+
+    def __init__(self, max_workers: int = UPSTREAM_EXECUTOR_WORKERS, max_queue: int = UPSTREAM_EXECUTOR_MAX_QUEUE,
+                 name: str = 'upstream'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue  # 全スレッドが使用中のときに待たせてよいタスク数
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.abandoned = 0
+        self.late_completed = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Optional[concurrent.futures.Future]:
+        """タスクを投入（プールが飽和している場合はNone）"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self._pending += 1
+            self.submitted += 1
+        try:
+            return self._executor.submit(self._run, fn, args, kwargs)
+        except RuntimeError:
+            self._release()
+            raise
+
+    def _run(self, fn: Callable, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            result = fn(*args, **kwargs)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run_all(self, tasks: Dict[str, Callable[[], Any]], timeout: float, label: str = '') -> Dict[str, Any]:
+        """複数のタスクを並列実行し、timeout秒以内に完了したものの結果を返す
+
+        tasks は {取得元名: 引数なし関数} を優先順に渡す。例外・締め切り超過・飽和による
+        スキップの場合、その取得元の結果はNone。
+        """
+        results = {name: None for name in tasks}
+        for name, result in self.iter_completed(tasks, timeout, label):
+            results[name] = result
+        return results
+
+    def iter_completed(self, tasks: Dict[str, Callable[[], Any]], timeout: float,
+                       label: str = '') -> Iterator[Tuple[str, Any]]:
+        """複数のタスクを並列実行し、完了した順に (取得元名, 結果) を返す
+
+        締め切りを過ぎたタスクは待たずに放置し、完了時に所要時間だけをログに残す。
+        全タスクが飽和で投入できなかった場合は、最優先の1件だけを呼び出し元のスレッドで実行する。
+        """
+        start_time = time.time()
+        futures = {}
+        skipped = []
+        for name, fn in tasks.items():
+            future = self.submit(self._timed, name, fn, label, start_time)
+            if future is None:
+                skipped.append(name)
+            else:
+                futures[future] = name
+
+        if skipped:
+            logging.warning(f"🚦 上流スレッドプール飽和のためスキップ {label}: {', '.join(skipped)}")
+            if not futures:
+                name = next(iter(tasks))
+                yield name, self._timed(name, tasks[name], label, start_time)
+                return
+
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                yield futures[future], future.result()
+        except concurrent.futures.TimeoutError:
+            not_done = [future for future in futures if not future.done()]
+            with self._lock:
+                self.abandoned += len(not_done)
+            names = [futures[future] for future in not_done]
+            logging.warning(f"⌛ 締め切り {timeout}秒 超過、待たずに応答 {label}: {', '.join(names)}")
+            for future in not_done:
+                future.add_done_callback(self._late_callback(futures[future], label, start_time))
+
+    def _timed(self, name: str, fn: Callable[[], Any], label: str, start_time: float):
+        task_start = time.time()
+        try:
+            result = fn()
+            status = 'ok' if result is not None else 'empty'
+        except Exception as e:
+            logging.warning(f"{name} 失敗 {label}: {e}")
+            result = None
+            status = 'error'
+        logging.info(f"⏱️ {label} {name}: {time.time() - task_start:.2f}秒 "
+                     f"(待機 {task_start - start_time:.2f}秒, {status})")
+        return result
+
+    def _late_callback(self, name: str, label: str, start_time: float):
+        def callback(future):
+            with self._lock:
+                self.late_completed += 1
+            logging.info(f"⌛ {label} {name}: 締め切り後に完了 {time.time() - start_time:.2f}秒（結果は各サービスのキャッシュに保存）")
+        return callback
+
+    def stats(self) -> Dict:
+        """プールの統計を取得"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": max(self._pending - self._running, 0),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "abandoned": self.abandoned,
+                "late_completed": self.late_completed
+            }
+
+
+# グローバルインスタンス（ページ表示時の上流API並列呼び出しで共有）
+upstream_executor = UpstreamExecutor()
@@ -0,0 +1,390 @@
+"""
+動画メタデータの統合リゾルバー
+
+/watch では Omada / CustomApi / Kahoot / siawaseok(stream) / Invidious の結果を
+数百行の手書きの if 文で統合しており、タイトルが取れなければ siawaseok に再度問い合わせ、
+投稿者が Unknown ならチャンネル情報を取りに行く、といった直列の取得が混在していた。
+エンドポイントごとに統合の仕方も異なっていた。
+
+VideoMetadataResolver は
+  - 取得元（取得関数 + 正規化関数）を宣言的に登録
+  - 項目ごとの取得元の優先順位に従い、1回の統合処理で各項目を決定
+  - どの取得元からも埋まらなかった項目だけ、項目ごとのフォールバックを実行
+  - 取得元を共有スレッドプールで同時に実行し、必須項目が確定した時点で返す
+  - 統合結果を動画IDごとにキャッシュ
+する。
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import VIDEO_METADATA_TIMEOUT, VIDEO_METADATA_CACHE_TTL, VIDEO_METADATA_PARTIAL_TTL
+from cache_store import get_cache
+from single_flight import single_flight
+from upstream_executor import upstream_executor
+from http_client import http_client
+from vkr_downloader_service import OmadaVideoService
+from custom_api_service import CustomApiService
+from multi_stream_service import MultiStreamService
+from invidious_service import InvidiousService
+from video_records import parse_count, parse_duration
+from author_avatars import author_avatars
+
+
+# 統合する項目
+METADATA_FIELDS = ('title', 'author', 'authorId', 'description', 'viewCount', 'lengthSeconds', 'publishedText',
+                   'videoThumbnails', 'authorThumbnails', 'subCountText', 'keywords', 'genre')
+
+# これらが確定したら、残りの取得元を待たずに返す
+REQUIRED_FIELDS = ('title', 'author', 'authorId')
+
+# 取得元が返す「値なし」を表す仮の値
+_PLACEHOLDER_VALUES = ('Unknown', 'N/A', 'タイトル未取得')
+
+
+# --- 取得元ごとの正規化（通信なし） ---
+
+def _pick(data: Dict, keys: Iterable[str]) -> Dict:
+    return {key: data.get(key) for key in keys}
+
+
+def normalize_omada(data: Dict) -> Dict:
+    """yt.omada.cafe (OmadaVideoService.get_stream_urls) の結果"""
+    fields = _pick(data, ('title', 'author', 'authorId', 'description', 'publishedText', 'authorThumbnails'))
+    fields['viewCount'] = parse_count(data.get('viewCount'))
+    fields['lengthSeconds'] = parse_duration(data.get('lengthSeconds'))
+    if data.get('thumbnail'):
+        fields['videoThumbnails'] = [{'url': data['thumbnail']}]
+    return fields
+
+
+def normalize_custom_api(data: Dict) -> Dict:
+    """siawaseok (CustomApiService.format_video_info) の結果"""
+    fields = _pick(data, ('title', 'author', 'authorId', 'description', 'publishedText', 'videoThumbnails'))
+    fields['viewCount'] = parse_count(data.get('viewCount'))
+    fields['lengthSeconds'] = parse_duration(data.get('lengthSeconds'))
+    return fields
+
+
+def normalize_kahoot(data: Dict) -> Dict:
+    """Kahoot (MultiStreamService.get_video_info_from_kahoot) の結果"""
+    fields = _pick(data, ('title', 'author', 'authorId', 'description', 'publishedText', 'videoThumbnails'))
+    fields['lengthSeconds'] = parse_duration(data.get('lengthSeconds'))
+    # チャンネルアイコンは小さいサイズから大きいサイズの順（テンプレートの期待に合わせる）
+    thumbnails = data.get('snippet', {}).get('thumbnails', {})
+    fields['authorThumbnails'] = [{'url': thumbnails[size]['url'], 'width': thumbnails[size].get('width', 88),
+                                   'height': thumbnails[size].get('height', 88)}
+                                  for size in ('default', 'medium', 'high') if thumbnails.get(size, {}).get('url')]
+    return fields
+
+
+def normalize_invidious(data: Dict) -> Dict:
+    """Invidious /api/v1/videos の結果"""
+    fields = _pick(data, ('title', 'author', 'authorId', 'description', 'publishedText', 'videoThumbnails',
+                          'authorThumbnails', 'subCountText', 'keywords', 'genre'))
+    fields['viewCount'] = parse_count(data.get('viewCount'))
+    fields['lengthSeconds'] = parse_duration(data.get('lengthSeconds'))
+    return fields
+
+
+def normalize_stream(data: Dict) -> Dict:
+    """siawaseok type2 (MultiStreamService.get_video_stream_info) の結果"""
+    channel = data.get('channel') if isinstance(data.get('channel'), dict) else {}
+    upload_date = data.get('upload_date')
+    return {
+        'title': data.get('title'),
+        'author': data.get('uploader') or data.get('author') or channel.get('name') or data.get('channel_name'),
+        'authorId': data.get('uploader_id') or data.get('authorId') or channel.get('id') or data.get('channel_id'),
+        'description': data.get('description'),
+        'viewCount': parse_count(data.get('view_count') or data.get('viewCount') or data.get('views')
+                             or data.get('view_count_text')),
+        'lengthSeconds': parse_duration(data.get('duration')),
+        'publishedText': upload_date if upload_date != 'N/A' else None
+    }
+
+
+class VideoMetadataResolver:
+    """複数の取得元から動画メタデータを取得・統合する（スレッドセーフ）"""
+
+    def __init__(self, executor=upstream_executor, required_fields: Iterable[str] = REQUIRED_FIELDS,
+                 timeout: float = VIDEO_METADATA_TIMEOUT, cache_ttl: float = VIDEO_METADATA_CACHE_TTL,
+                 partial_ttl: float = VIDEO_METADATA_PARTIAL_TTL):
+        self.executor = executor
+        self.required_fields = tuple(required_fields)
+        self.timeout = timeout  # 取得元を待つ上限（秒）
+        self.cache_ttl = cache_ttl  # 全取得元の結果から統合した場合のTTL
+        self.partial_ttl = partial_ttl  # 必須項目の確定で打ち切った場合のTTL（残りは各サービスのキャッシュに入る）
+        self._sources = {}  # 取得元名 -> {'fetch': fn(video_id), 'normalize': fn(data)}（登録順が既定の優先順）
+        self._priority = {}  # 項目 -> 取得元名のリスト（既定の優先順を上書き）
+        self._fallbacks = {}  # 項目 -> fn(video_id, record) -> {項目: 値}
+        self._cache = get_cache('video_metadata', ttl=cache_ttl, max_entries=2000, max_bytes=32 * 1024 * 1024,
+                                coherent=True)
+        self.resolves = 0
+        self.early_returns = 0
+        self.fallback_calls = 0
+
+    # --- 宣言 ---
+
+    def register_source(self, name: str, fetch: Callable[[str], Any], normalize: Callable[[Dict], Dict]):
+        """取得元を登録（先に登録した取得元ほど優先）"""
+        self._sources[name] = {'fetch': fetch, 'normalize': normalize}
+
+    def set_priority(self, field: str, sources: List[str]):
+        """項目ごとの取得元の優先順を指定（指定のない取得元はその項目に使わない）"""
+        self._priority[field] = list(sources)
+
+    def register_fallback(self, field: str, fallback: Callable[[str, Dict], Optional[Dict]]):
+        """どの取得元からも埋まらなかった場合にだけ呼ぶ、項目ごとのフォールバックを登録"""
+        self._fallbacks[field] = fallback
+
+    @property
+    def source_names(self) -> List[str]:
+        return list(self._sources)
+
+    def priority(self, field: str) -> List[str]:
+        """項目の取得元の優先順"""
+        return self._priority.get(field, self.source_names)
+
+    # --- 取得 ---
+
+    def source_tasks(self, video_id: str, exclude: Iterable[str] = ()) -> Dict[str, Callable[[], Any]]:
+        """取得元ごとのタスク {取得元名: 引数なし関数} を優先順に作成"""
+        return {name: (lambda fetch=source['fetch']: fetch(video_id))
+                for name, source in self._sources.items() if name not in exclude}
+
+    def normalize(self, name: str, data: Any, video_id: str = '') -> Dict:
+        """取得元の結果を項目の辞書に変換（空の値・仮の値は含めない）"""
+        source = self._sources.get(name)
+        if source is None or not data or not isinstance(data, dict):
+            return {}
+        try:
+            fields = source['normalize'](data)
+        except Exception as e:
+            logging.warning(f"メタデータ正規化エラー {name}: {e}")
+            return {}
+        placeholders = _PLACEHOLDER_VALUES + (f'Video {video_id}', f'動画 {video_id}')
+        return {key: value for key, value in fields.items()
+                if key in METADATA_FIELDS and value and not (isinstance(value, str) and value in placeholders)}
+
+    def is_settled(self, video_id: str, payloads: Dict[str, Any], fields: Iterable[str]) -> bool:
+        """指定した項目が全て確定したか（値を持つ取得元より優先度の高い取得元が全て完了している）"""
+        normalized = {}
+        for field in fields:
+            for name in self.priority(field):
+                if name not in payloads:
+                    return False  # より優先する取得元が未完了
+                if name not in normalized:
+                    normalized[name] = self.normalize(name, payloads[name], video_id)
+                if normalized[name].get(field):
+                    break
+            else:
+                return False  # 完了した取得元のどれにも値がない（フォールバック待ち）
+        return True
+
+    def fetch(self, video_id: str, timeout: Optional[float] = None, label: str = '',
+              extra_tasks: Optional[Dict[str, Callable[[], Any]]] = None,
+              prefetched: Optional[Dict[str, Any]] = None, stop_when_settled: bool = False) -> Dict[str, Any]:
+        """全取得元を同時に実行し、完了した取得元の結果 {取得元名: 結果} を返す
+
+        extra_tasks は同じ並列フェーズで実行する追加のタスク、prefetched は呼び出し元で取得済みの結果。
+        stop_when_settled=True の場合は必須項目が確定した時点で残りを待たずに返す
+        （残りのタスクは裏で完了し、各サービスのキャッシュに保存される）。
+        """
+        payloads = dict(prefetched or {})
+        if stop_when_settled and self.is_settled(video_id, payloads, self.required_fields):
+            return payloads
+        tasks = self.source_tasks(video_id, exclude=payloads)
+        tasks.update(extra_tasks or {})
+        if not tasks:
+            return payloads
+        label = label or f"metadata[{video_id}]"
+        for name, result in self.executor.iter_completed(tasks, timeout=self.timeout if timeout is None else timeout,
+                                                         label=label):
+            payloads[name] = result
+            if stop_when_settled and self.is_settled(video_id, payloads, self.required_fields):
+                pending = [name for name in tasks if name not in payloads]
+                if pending:
+                    self.early_returns += 1
+                    logging.info(f"⚡ {label} 必須項目が確定、残りを待たずに返します: {', '.join(pending)}")
+                break
+        return payloads
+
+    # --- 統合 ---
+
+    def merge(self, video_id: str, payloads: Dict[str, Any]) -> Dict:
+        """取得元の結果を項目ごとの優先順で1回だけ統合（通信なし、フォールバック・既定値は適用しない）"""
+        normalized = {name: self.normalize(name, payloads.get(name), video_id) for name in self._sources}
+        record = {'videoId': video_id}
+        sources = {}
+        for field in METADATA_FIELDS:
+            for name in self.priority(field):
+                value = normalized.get(name, {}).get(field)
+                if value:
+                    record[field] = value
+                    sources[field] = name
+                    break
+        record['metadata_sources'] = sources
+        return record
+
+    def _apply_fallbacks(self, video_id: str, record: Dict) -> Dict:
+        # 欠けている項目のフォールバックだけを同時に実行し、欠けている項目にだけ反映する
+        tasks = {field: (lambda fallback=fallback: fallback(video_id, dict(record)))
+                 for field, fallback in self._fallbacks.items() if not record.get(field)}
+        if not tasks:
+            return record
+        self.fallback_calls += len(tasks)
+        results = self.executor.run_all(tasks, timeout=self.timeout, label=f"metadata-fallback[{video_id}]")
+        for field, values in results.items():
+            for key, value in (values or {}).items():
+                if value and not record.get(key):
+                    record[key] = value
+                    record['metadata_sources'][key] = f'fallback:{field}'
+        return record
+
+    def _apply_author_avatar(self, record: Dict) -> Dict:
+        # 取得元が返した投稿者アイコンはインデックスに記録し、返さなかった場合はインデックスから補完する
+        author_id = record.get('authorId')
+        if not author_id:
+            return record
+        if record.get('authorThumbnails'):
+            author_avatars.observe([record])
+        else:
+            url = author_avatars.lookup([author_id]).get(author_id)
+            if url:
+                record['authorThumbnails'] = [{'url': url, 'width': 176, 'height': 176}]
+                record['metadata_sources']['authorThumbnails'] = 'avatar_index'
+        return record
+
+    def _apply_defaults(self, video_id: str, record: Dict) -> Dict:
+        record.setdefault('title', 'タイトル未取得')
+        record.setdefault('author', 'Unknown')
+        record.setdefault('authorId', '')
+        record.setdefault('description', '')
+        record.setdefault('viewCount', 0)
+        record.setdefault('lengthSeconds', 0)
+        record.setdefault('publishedText', '')
+        record.setdefault('subCountText', '')
+        record.setdefault('videoThumbnails', [
+            {'url': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg'},
+            {'url': f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'}
+        ])
+        if not record.get('authorThumbnails'):
+            # YouTubeの標準チャンネルアイコン → デフォルトアバター
+            default_avatar = ('https://yt3.ggpht.com/ytc/default_user=s176-c-k-c0x00ffffff-no-rj' if record['authorId']
+                              else 'https://via.placeholder.com/176x176/cccccc/ffffff?text=USER')
+            record['authorThumbnails'] = [{'url': default_avatar, 'width': 176, 'height': 176}]
+        return record
+
+    def resolve_payloads(self, video_id: str, payloads: Dict[str, Any], complete: Optional[bool] = None) -> Dict:
+        """取得済みの結果から統合レコードを作成してキャッシュ（/watch のように取得元の結果を他にも使う場合）"""
+        record = self.merge(video_id, payloads)
+        record = self._apply_author_avatar(record)
+        record = self._apply_fallbacks(video_id, record)
+        record = self._apply_defaults(video_id, record)
+        if complete is None:
+            complete = all(name in payloads for name in self._sources)
+        record['metadata_complete'] = complete
+        if record['metadata_sources']:
+            self._cache.set(video_id, record, ttl=self.cache_ttl if complete else self.partial_ttl)
+        return record
+
+    def resolve(self, video_id: str, prefetched: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None) -> Dict:
+        """動画IDの統合メタデータを取得（キャッシュ・同時リクエストの合流・必須項目確定での早期終了あり）
+
+        metadata_sources が空の場合はどの取得元からも情報を得られなかったことを表す。
+        """
+        cached = self._cache.get(video_id)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"video_metadata:{video_id}", self._resolve, video_id, prefetched, timeout,
+                                cache=self._cache, cache_key=video_id)
+
+    def _resolve(self, video_id: str, prefetched: Optional[Dict[str, Any]], timeout: Optional[float]) -> Dict:
+        start_time = time.time()
+        self.resolves += 1
+        payloads = self.fetch(video_id, timeout=timeout, prefetched=prefetched, stop_when_settled=True)
+        record = self.resolve_payloads(video_id, payloads)
+        logging.info(f"🧩 動画メタデータ統合 {video_id}: {time.time() - start_time:.2f}秒 "
+                     f"(取得元 {sorted(name for name in payloads if payloads[name])}, "
+                     f"{'完全' if record['metadata_complete'] else '必須項目のみ確定'})")
+        return record
+
+    def get_cached(self, video_id: str) -> Optional[Dict]:
+        """キャッシュ済みの統合レコード（取得はしない）"""
+        return self._cache.get(video_id)
+
+    def invalidate(self, video_id: str):
+        """キャッシュした統合レコードを破棄"""
+        self._cache.delete(video_id)
+
+    def stats(self) -> Dict:
+        """統計を取得"""
+        return {
+            "sources": self.source_names,
+            "required_fields": list(self.required_fields),
+            "resolves": self.resolves,
+            "early_returns": self.early_returns,
+            "fallback_calls": self.fallback_calls,
+            "cache": self._cache.stats()
+        }
+
+
+# --- 既定の取得元 ---
+
+_OMADA_QUALITIES = ['360p', '480p', '720p', '1080p']
+_SIAWASEOK_BASE_URL = 'https://siawaseok.duckdns.org'
+
+
+def _build_default_resolver() -> VideoMetadataResolver:
+    video_service = OmadaVideoService()
+    custom_api_service = CustomApiService()
+    multi_stream_service = MultiStreamService()
+    invidious = InvidiousService()
+
+    def title_fallback(video_id, record):
+        # siawaseok の非type2ストリームAPIのタイトル
+        response = http_client.get(f"{_SIAWASEOK_BASE_URL}/api/stream/{video_id}", service='custom_api')
+        if response.status_code == 200:
+            data = response.json()
+            if isinstance(data, dict) and data.get('title'):
+                logging.info(f"フォールバックからタイトル取得: {data['title']}")
+                return {'title': data['title']}
+        return None
+
+    def author_fallback(video_id, record):
+        # チャンネルIDだけ分かっている場合はチャンネル情報から投稿者名・アイコンを補完
+        author_id = record.get('authorId')
+        if not author_id:
+            return None
+        response = http_client.get(f"{_SIAWASEOK_BASE_URL}/api/channel/{author_id}", service='custom_api')
+        if response.status_code != 200:
+            return None
+        channel_info = response.json()
+        if not isinstance(channel_info, dict):
+            return None
+        values = {'author': channel_info.get('name')}
+        if channel_info.get('avatarUrl'):
+            values['authorThumbnails'] = [{'url': channel_info['avatarUrl'], 'width': 176, 'height': 176}]
+        logging.info(f"✅ チャンネル情報から投稿者補完: {values['author']}")
+        return values
+
+    resolver = VideoMetadataResolver()
+    # 登録順が既定の優先順（🚀 yt.omada.cafe を最優先）
+    resolver.register_source('omada_api', lambda video_id: video_service.get_stream_urls(video_id, _OMADA_QUALITIES),
+                             normalize_omada)
+    resolver.register_source('custom_api', custom_api_service.get_video_info, normalize_custom_api)
+    resolver.register_source('kahoot', multi_stream_service.get_video_info_from_kahoot, normalize_kahoot)
+    resolver.register_source('invidious', invidious.get_video_info, normalize_invidious)
+    resolver.register_source('stream', multi_stream_service.get_video_stream_info, normalize_stream)
+    # 取得元の既定順と異なる項目
+    resolver.set_priority('authorThumbnails', ['omada_api', 'kahoot', 'invidious'])
+    resolver.set_priority('subCountText', ['invidious'])
+    resolver.set_priority('keywords', ['invidious'])
+    resolver.set_priority('genre', ['invidious'])
+    resolver.register_fallback('title', title_fallback)
+    resolver.register_fallback('author', author_fallback)
+    return resolver
+
+
+# グローバルインスタンス（/watch・動画情報API・ショート動画で共有）
+video_metadata_resolver = _build_default_resolver()
@@ -0,0 +1,380 @@
+"""
+動画・チャンネル・ストリーム形式の共通レコード
+
+index() / music() / search() / 関連動画API / Kahoot / CustomApi / Invidious のトレンドは
+それぞれ動画ごとに新しい辞書を組み立て、再生時間の文字列解析・視聴回数の変換・
+サムネイルURL 2件の生成を個別に（少しずつ異なる方法で）行っていた。
+
+このモジュールは
+  - __slots__ 付きの Video / Channel / StreamFormat（辞書よりも小さく、属性アクセスが速い）
+  - 再生時間・視聴回数の共通パーサー
+  - 上流APIのスキーマごとに1つの正規化関数（from_siawaseok / from_invidious / from_kahoot など）
+  - テンプレート・既存コード向けの辞書互換アクセス（video.title / video['title'] / video.get('title')）
+  - APIレスポンス用の to_dict() と、キャッシュ保存用のコンパクトなJSON表現
+を提供する。サムネイルURLなど動画IDから導出できる値は保持せず、参照時に生成する。
+"""
+import dataclasses
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# 動画IDから生成するサムネイル（テンプレートは末尾の要素を表示に使う）
+_THUMBNAIL_URL = 'https://img.youtube.com/vi/{video_id}/{name}.jpg'
+_THUMBNAIL_NAMES = ('maxresdefault', 'hqdefault')
+
+# 投稿者アイコンが取得できない場合の既定画像
+DEFAULT_AUTHOR_THUMBNAIL = '/static/logo.avif'
+
+_ISO_DURATION = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
+_NON_DIGITS = re.compile(r'[^\d]')
+
+
+def parse_duration(value) -> int:
+    """再生時間を秒数に変換（数値・"3:45"・"1:02:03"・ISO 8601 "PT4M13S" に対応、変換できない場合は0）"""
+    if not value:
+        return 0
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return 0
+    value = value.strip()
+    if value.startswith('PT'):
+        match = _ISO_DURATION.fullmatch(value)
+        if not match:
+            return 0
+        hours, minutes, seconds = (int(group or 0) for group in match.groups())
+        return hours * 3600 + minutes * 60 + seconds
+    if ':' in value:
+        seconds = 0
+        for part in value.split(':'):
+            if not part.strip().isdigit():
+                return 0
+            seconds = seconds * 60 + int(part)
+        return seconds
+    try:
+        return int(float(value))
+    except ValueError:
+        return 0
+
+
+def parse_count(value) -> int:
+    """視聴回数・登録者数などを整数に変換（"1,234 回視聴" のような文字列は数字だけを使う、変換できない場合は0）"""
+    if not value:
+        return 0
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return 0
+    digits = _NON_DIGITS.sub('', value)
+    return int(digits) if digits else 0
+
+
+def _absolute_url(url: str) -> str:
+    """Invidious が返すプロトコル省略URL（//yt3.ggpht.com/...）を補完"""
+    return f'https:{url}' if url and url.startswith('//') else (url or '')
+
+
+def _kahoot_thumbnail(snippet: Dict) -> str:
+    thumbnails = snippet.get('thumbnails') or {}
+    for size in ('maxresdefault', 'maxres', 'high', 'medium', 'default'):
+        url = (thumbnails.get(size) or {}).get('url')
+        if url:
+            return url
+    return ''
+
+
+class _Record:
+    """レコード共通の辞書互換アクセス
+
+    _computed: 参照時に生成する項目（例: videoThumbnails）
+    _optional: 値が空の場合は to_dict() に含めない項目
+    """
+    __slots__ = ()
+    _computed = ()
+    _optional = ()
+
+    def __getitem__(self, key):
+        if key != 'extra' and key in self.__slots__:
+            return getattr(self, key)
+        extra = getattr(self, 'extra', None)
+        if extra and key in extra:
+            return extra[key]
+        if key in self._computed:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != 'extra' and key in self.__slots__:
+            setattr(self, key, value)
+        elif 'extra' in self.__slots__:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values: Dict):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def copy(self):
+        clone = dataclasses.replace(self)
+        if getattr(self, 'extra', None):
+            clone.extra = dict(self.extra)
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        """APIレスポンス・テンプレートの tojson 用の辞書（従来の辞書と同じキー）"""
+        data = {}
+        for name in self.__slots__:
+            if name == 'extra' or (name in self._optional and not getattr(self, name)):
+                continue
+            data[name] = getattr(self, name)
+        for name in self._computed:
+            value = getattr(self, name)
+            if value or name not in self._optional:
+                data[name] = value
+        extra = getattr(self, 'extra', None)
+        if extra:
+            for key, value in extra.items():
+                data.setdefault(key, value)
+        return data
+
+
+@dataclass(slots=True)
+class Video(_Record):
+    """一覧表示・関連動画・検索結果の動画1件"""
+    videoId: str
+    title: str = ''
+    author: str = ''
+    authorId: str = ''
+    lengthSeconds: int = 0
+    viewCount: int = 0
+    publishedText: str = ''
+    published: Any = 0
+    description: str = ''
+    thumbnail: str = ''  # 上流APIが返したサムネイル（空なら動画IDから生成）
+    authorThumbnail: str = ''
+    extra: Optional[Dict[str, Any]] = None  # 取得元固有の項目（Kahoot の categoryId / tags など）
+
+    _computed = ('videoThumbnails', 'authorThumbnails')
+    _optional = ('thumbnail', 'authorThumbnail', 'authorThumbnails')
+
+    @property
+    def videoThumbnails(self) -> List[Dict]:
+        if self.thumbnail:
+            return [{'url': self.thumbnail, 'quality': 'maxresdefault'}]
+        return [{'url': _THUMBNAIL_URL.format(video_id=self.videoId, name=name)} for name in _THUMBNAIL_NAMES]
+
+    @property
+    def authorThumbnails(self) -> List[Dict]:
+        if not self.authorThumbnail:
+            return []
+        return [{'url': self.authorThumbnail, 'width': size, 'height': size} for size in (88, 176)]
+
+    @classmethod
+    def from_siawaseok(cls, data: Dict, default_author: str = '') -> Optional['Video']:
+        """siawaseok API（/api/trend・/api/search）の動画"""
+        video_id = data.get('videoId') or data.get('id')
+        if not video_id or not isinstance(video_id, str):
+            return None
+        channel = data.get('channel')
+        author = (data.get('author') or data.get('uploader') or data.get('uploaderName')
+                  or (channel.get('name') or channel.get('title') if isinstance(channel, dict) else channel)
+                  or data.get('channelName'))
+        author_id = (data.get('authorId') or data.get('uploader_id') or data.get('uploaderId')
+                     or data.get('channelId')
+                     or (channel.get('id') or channel.get('channelId') if isinstance(channel, dict) else None))
+        return cls(
+            videoId=video_id,
+            title=data.get('title') or f'Video {video_id}',
+            author=author or default_author,
+            authorId=author_id or '',
+            lengthSeconds=parse_duration(data.get('lengthSeconds') or data.get('duration')),
+            viewCount=parse_count(data.get('viewCount') or data.get('view_count')),
+            publishedText=data.get('publishedText') or data.get('upload_date') or data.get('published') or '',
+            published=data.get('published') or 0,
+            description=data.get('description') or data.get('descriptionSnippet') or '',
+        )
+
+    @classmethod
+    def from_invidious(cls, data: Dict) -> Optional['Video']:
+        """Invidious /api/v1（trending・search・channels/videos）の動画"""
+        video_id = data.get('videoId')
+        if not video_id:
+            return None
+        return cls(
+            videoId=video_id,
+            title=data.get('title') or '',
+            author=data.get('author') or '',
+            authorId=data.get('authorId') or '',
+            lengthSeconds=parse_duration(data.get('lengthSeconds')),
+            viewCount=parse_count(data.get('viewCount')),
+            publishedText=data.get('publishedText') or '',
+            published=data.get('published') or 0,
+            description=data.get('description') or '',
+        )
+
+    @classmethod
+    def from_kahoot(cls, item: Dict) -> Optional['Video']:
+        """Kahoot API（YouTube Data API互換の videos / search の items 要素）"""
+        video_id = item.get('id')
+        if isinstance(video_id, dict):  # search の結果は {'kind': ..., 'videoId': ...}
+            video_id = video_id.get('videoId')
+        if not video_id:
+            return None
+        snippet = item.get('snippet') or {}
+        content_details = item.get('contentDetails') or {}
+        statistics = item.get('statistics') or {}
+        extra = {
+            'categoryId': snippet.get('categoryId', ''),
+            'liveBroadcastContent': snippet.get('liveBroadcastContent', 'none'),
+            'tags': snippet.get('tags', []),
+        }
+        if snippet.get('defaultLanguage'):
+            extra['defaultLanguage'] = snippet['defaultLanguage']
+        if content_details:
+            extra['dimension'] = content_details.get('dimension', '')
+            extra['definition'] = content_details.get('definition', '')
+            extra['caption'] = content_details.get('caption', 'false')
+        return cls(
+            videoId=video_id,
+            title=snippet.get('title', ''),
+            author=snippet.get('channelTitle', ''),
+            authorId=snippet.get('channelId', ''),
+            lengthSeconds=parse_duration(content_details.get('duration')),
+            viewCount=parse_count(statistics.get('viewCount')),
+            publishedText=snippet.get('publishedAt', ''),
+            published=snippet.get('publishedAt', ''),
+            description=snippet.get('description', ''),
+            thumbnail=_kahoot_thumbnail(snippet),
+            authorThumbnail=DEFAULT_AUTHOR_THUMBNAIL,
+            extra=extra,
+        )
+
+
+@dataclass(slots=True)
+class Channel(_Record):
+    """チャンネルのヘッダー情報"""
+    authorId: str
+    author: str = ''
+    description: str = ''
+    subCount: int = 0
+    totalViews: int = 0
+    videoCount: int = 0
+    joined: Any = 0
+    avatar: str = ''
+    banner: str = ''
+    autoGenerated: bool = False
+
+    _computed = ('authorThumbnails', 'authorBanners')
+    _optional = ('avatar', 'banner')
+
+    @property
+    def authorThumbnails(self) -> List[Dict]:
+        return [{'url': self.avatar, 'width': 176, 'height': 176}] if self.avatar else []
+
+    @property
+    def authorBanners(self) -> List[Dict]:
+        return [{'url': self.banner}] if self.banner else []
+
+    @classmethod
+    def from_invidious(cls, data: Dict, channel_id: str = '') -> 'Channel':
+        """Invidious /api/v1/channels/<id> のチャンネル（アイコンは最大サイズ、バナーは先頭を使う）"""
+        thumbnails = data.get('authorThumbnails') or []
+        banners = data.get('authorBanners') or []
+        return cls(
+            authorId=data.get('authorId') or channel_id,
+            author=data.get('author') or '',
+            description=data.get('description') or '',
+            subCount=parse_count(data.get('subCount')),
+            totalViews=parse_count(data.get('totalViews')),
+            videoCount=parse_count(data.get('videoCount')),
+            joined=data.get('joined') or 0,
+            avatar=_absolute_url(thumbnails[-1].get('url')) if thumbnails else '',
+            banner=_absolute_url(banners[0].get('url')) if banners else '',
+            autoGenerated=bool(data.get('autoGenerated')),
+        )
+
+
+@dataclass(slots=True)
+class StreamFormat(_Record):
+    """画質選択に使うストリーム1件"""
+    url: str
+    quality: str = 'auto'
+    container: str = 'mp4'
+    mimeType: str = 'video/mp4'
+    has_audio: bool = True
+    audio_url: str = ''
+    resolution: str = ''
+    fps: str = ''
+    label: str = ''
+    itag: int = 0
+
+    _optional = ('resolution', 'fps', 'label', 'itag')
+
+    @classmethod
+    def from_stream(cls, stream: Dict) -> Optional['StreamFormat']:
+        """formatStreams / videoStreams 形式（Invidious・siawaseok 共通）の要素"""
+        if not isinstance(stream, dict) or not stream.get('url'):
+            return None
+        return cls(
+            url=stream['url'],
+            quality=stream.get('qualityLabel') or stream.get('quality') or stream.get('resolution') or 'auto',
+            container=stream.get('container') or 'mp4',
+            mimeType=stream.get('mimeType') or stream.get('type') or 'video/mp4',
+            has_audio=stream.get('has_audio', True),
+            audio_url=stream.get('audio_url') or '',
+            resolution=stream.get('resolution') or stream.get('size') or '',
+            fps=str(stream.get('fps') or ''),
+            itag=parse_count(stream.get('itag')),
+        )
+
+
+RECORD_TYPES = (Video, Channel, StreamFormat)
+_RECORDS_BY_NAME = {cls.__name__: cls for cls in RECORD_TYPES}
+
+
+def json_default(obj):
+    """json.dumps の default（レコードは従来の辞書形式、それ以外は文字列）"""
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    return str(obj)
+
+
+def cache_encode(obj):
+    """キャッシュ保存用の json.dumps の default（レコードは項目名を省いた値の配列で保存）"""
+    if isinstance(obj, _Record):
+        return {'__record__': type(obj).__name__, 'v': [getattr(obj, name) for name in obj.__slots__]}
+    return str(obj)
+
+
+def cache_decode(data: Dict):
+    """キャッシュ読み込み用の json.loads の object_hook"""
+    name = data.get('__record__')
+    if name is not None and name in _RECORDS_BY_NAME and len(data) == 2:
+        return _RECORDS_BY_NAME[name](*data['v'])
+    return data
@@ -1,36 +1,43 @@
 import requests
 import logging
-import time
 import json
 import urllib.parse
 from typing import Dict, List, Optional, Union
+from http_client import http_client
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+from cache_projection import project, invidious_schema
 
 class OmadaVideoService:
     """Omada APIを使用した動画・音声ストリーム取得サービス"""
     
     def __init__(self):
         self.base_url = "https://yt.omada.cafe"
-        self.timeout = 6  # 🚀 高速化: 15秒→6秒に短縮
-        self._cache = {}
-        self._cache_timeout = 600  # 🚀 高速化: キャッシュ時間を10分に延長
+        self.timeout = http_client.timeout_for('omada')  # config.SERVICE_TIMEOUTS で設定
+        self._cache = get_cache('omada', ttl=600, max_entries=500, max_bytes=64 * 1024 * 1024, coherent=True)  # 10分キャッシュ（上限付きLRU）
         
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """APIリクエストの実行（キャッシュ付き）"""
         cache_key = f"{endpoint}:{str(params) if params else ''}"
-        current_time = time.time()
         
         # キャッシュチェック
-        if cache_key in self._cache:
-            cached_data, timestamp = self._cache[cache_key]
-            if current_time - timestamp < self._cache_timeout:
-                logging.info(f"VKRDownloader: キャッシュからデータ取得: {endpoint}")
-                return cached_data
+        cached_data = self._cache.get(cache_key)
+        if cached_data is not None:
+            logging.info(f"VKRDownloader: キャッシュからデータ取得: {endpoint}")
+            return cached_data
         
+        # 同じリクエストが実行中ならその結果を共有（single-flight）
+        return single_flight.do(f"omada:{cache_key}", self._fetch, endpoint, params, cache_key,
+                                cache=self._cache, cache_key=cache_key)
+    
+    def _fetch(self, endpoint: str, params: Optional[Dict], cache_key: str) -> Optional[Dict]:
+        """Omada APIへの実際のリクエスト（キャッシュミス時）"""
         try:
             url = f"{self.base_url}{endpoint}"
             logging.info(f"VKRDownloader APIリクエスト: {url}")
             
-            response = requests.get(url, params=params, timeout=self.timeout)
+            response = http_client.get(url, params=params, timeout=self.timeout)
             
             if response.status_code == 200:
                 # レスポンステキストをログ出力（デバッグ用）
@@ -42,8 +49,11 @@ class OmadaVideoService:
                     try:
                         data = response.json()
                         if isinstance(data, dict):
-                            # キャッシュに保存
-                            self._cache[cache_key] = (data, current_time)
+                            # アプリが参照する項目だけに絞ってキャッシュに保存
+                            # （ストリームURLを含む場合は expire= から有効期限を決める）
+                            data = project(data, invidious_schema(endpoint))
+                            self._cache.set(cache_key, data, ttl=stream_cache_ttl(data, self._cache.ttl),
+                                            source_bytes=len(response.content))
                             logging.info(f"✅ VKRDownloader API成功: {url}")
                             return data
                         else:
@@ -73,6 +83,10 @@ class OmadaVideoService:
             logging.error(f"VKRDownloader 予期しないエラー: {e}")
             return None
     
+    def invalidate_stream_cache(self, video_id: str):
+        """動画のストリームURLキャッシュを破棄（プレーヤーで403等が発生した場合）"""
+        self._cache.delete(f"/api/v1/videos/{video_id}:")
+    
     def get_stream_urls(self, video_input: str, target_qualities: List[str] = None) -> Optional[Dict]:
         """YouTube URLまたは動画IDから多品質動画・音声ストリームURLを取得
         
@@ -0,0 +1,271 @@
+"""
+yt-dlp抽出プロセスプール
+
+YtdlExtractionPool は専用のワーカープロセスで抽出を行う（プレーヤーJSの解析でWebワーカーのGILを占有しない）。
+  - 各プロセスはプロファイル（video / audio）ごとに YoutubeDL インスタンスを保持し続ける
+  - 待ち行列は上限付き（超えた場合は即座に YtdlPoolBusy）
+  - ジョブごとのタイムアウト（応答しないプロセスが溜まったらプールを作り直す）
+  - 抽出結果は URL の expire= に合わせてキャッシュし、同時の同一抽出は single-flight で合流
+  - 待ち行列の長さ・抽出時間などの統計
+"""
+import atexit
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from config import YTDL_POOL_WORKERS, YTDL_POOL_MAX_QUEUE, YTDL_POOL_JOB_TIMEOUT, STREAM_URL_DEFAULT_TTL
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+
+
+# プロファイルごとのyt-dlp設定
+YTDL_PROFILES = {
+    'video': {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        'format': 'best[height<=1080]/best',
+        'noplaylist': True,
+        'socket_timeout': 30,
+        'retries': 3,
+        'fragment_retries': 3,
+        'extractor_retries': 3,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    },
+    'audio': {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        'format': 'bestaudio[ext=m4a]/bestaudio',
+        'noplaylist': True
+    }
+}
+
+# プロセス間で受け渡すフォーマットの項目（info全体はプレーヤー情報等を含み大きいため）
+_FORMAT_FIELDS = ('format_id', 'url', 'height', 'width', 'acodec', 'vcodec', 'tbr', 'fps', 'ext')
+
+
+class YtdlExtractionError(Exception):
+    """yt-dlp抽出プールでの失敗"""
+
+
+class YtdlPoolBusy(YtdlExtractionError):
+    """待ち行列が上限に達している"""
+
+
+class YtdlPoolTimeout(YtdlExtractionError):
+    """抽出がタイムアウトした"""
+
+
+# --- ワーカープロセス側 ---
+
+_worker_instances = {}
+
+
+def _init_worker():
+    # ワーカープロセスの起動時にyt-dlpを読み込んでおく（初回リクエストでの読み込み待ちを避ける）
+    import yt_dlp  # noqa: F401
+
+
+def _extract_in_worker(profile: str, url: str) -> Optional[Dict]:
+    """ワーカープロセス内で抽出し、必要な項目だけを返す"""
+    import yt_dlp
+    ydl = _worker_instances.get(profile)
+    if ydl is None:
+        # プレーヤーJS・署名の解析結果はインスタンスに保持されるため使い回す
+        ydl = yt_dlp.YoutubeDL(YTDL_PROFILES[profile])
+        _worker_instances[profile] = ydl
+    try:
+        info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        # yt-dlpの例外はトレースバック等を保持しておりプロセス間で受け渡せないため文字列化する
+        raise YtdlExtractionError(f"{type(e).__name__}: {e}") from None
+    if not info:
+        return None
+    return {
+        'id': info.get('id'),
+        'title': info.get('title', ''),
+        'duration': info.get('duration', 0),
+        'thumbnail': info.get('thumbnail', ''),
+        'uploader': info.get('uploader', ''),
+        'url': info.get('url'),
+        'formats': [{field: fmt[field] for field in _FORMAT_FIELDS if field in fmt} for fmt in info.get('formats') or []]
+    }
+
+
+# --- 呼び出し側 ---
+
+class YtdlExtractionPool:
+    """yt-dlp抽出をワーカープロセスで実行するプール（スレッドセーフ）"""
+
+    def __init__(self, workers: int = YTDL_POOL_WORKERS, max_queue: int = YTDL_POOL_MAX_QUEUE,
+                 job_timeout: float = YTDL_POOL_JOB_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue  # 実行中 + 待機中のジョブ数の上限
+        self.job_timeout = job_timeout  # ジョブごとのタイムアウト（秒）
+        self._executor = None
+        self._pid = None
+        self._lock = threading.RLock()  # 完了コールバックがロック保持中のスレッドで呼ばれることがあるため再入可能
+        self._pending = 0
+        self._stuck = 0  # タイムアウト後も終わっていないジョブ数（プロセスを占有中）
+        self._cache = get_cache('ytdl_extract', ttl=STREAM_URL_DEFAULT_TTL, max_entries=500, max_bytes=16 * 1024 * 1024,
+                                coherent=True)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.recycles = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.avg_time = None  # 抽出時間のEWMA（秒）
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        # ロック取得済みで呼ぶこと。fork後の子プロセスでは親のプールを使えないため作り直す
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            self._pid = os.getpid()
+            self._pending = 0
+            self._stuck = 0
+            logging.info(f"🧵 yt-dlp抽出プール起動: {self.workers} プロセス")
+        return self._executor
+
+    def _discard_executor(self):
+        # 次回の呼び出しで新しいプールを起動させる（旧プールのジョブは件数に含めない、ロック取得済みで呼ぶこと）
+        self._executor = None
+        self._pending = 0
+        self._stuck = 0
+        self.recycles += 1
+
+    def _recycle(self):
+        # タイムアウトしたジョブがワーカーを占有し続けている場合はプールごと作り直す（ロック取得済みで呼ぶこと）
+        executor = self._executor
+        logging.warning(f"⚠️ yt-dlp抽出プールを再起動します（応答のないジョブ {self._stuck} 件）")
+        self._discard_executor()
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+
+    def extract(self, url: str, profile: str = 'video') -> Optional[Dict]:
+        """URLから動画情報を抽出（キャッシュ・同時リクエストの合流あり）
+
+        待ち行列が一杯なら YtdlPoolBusy、タイムアウトなら YtdlPoolTimeout を送出する。
+        """
+        cache_key = f"{profile}:{url}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return single_flight.do(f"ytdl_extract:{cache_key}", self._extract, url, profile, cache_key,
+                                cache=self._cache, cache_key=cache_key)
+
+    def invalidate(self, url: str, profile: str = 'video'):
+        """キャッシュした抽出結果を破棄（ストリームURLが失効していた場合）"""
+        self._cache.delete(f"{profile}:{url}")
+
+    def _extract(self, url: str, profile: str, cache_key: str) -> Optional[Dict]:
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise YtdlPoolBusy(f"yt-dlp抽出の待ち行列が上限に達しています ({self.max_queue})")
+            future = executor.submit(_extract_in_worker, profile, url)
+            self._pending += 1
+            self.submitted += 1
+
+        start_time = time.time()
+        finished = True
+        try:
+            info = future.result(timeout=self.job_timeout)
+        except concurrent.futures.TimeoutError:
+            finished = False
+            with self._lock:
+                self.timeouts += 1
+                if self._executor is executor:
+                    self._stuck += 1
+                    future.add_done_callback(lambda _: self._job_released(executor))
+                    if self._stuck >= self.workers:
+                        self._recycle()
+            raise YtdlPoolTimeout(f"yt-dlp抽出タイムアウト ({self.job_timeout}s): {url}")
+        except BrokenProcessPool as e:
+            with self._lock:
+                self.failed += 1
+                if self._executor is executor:
+                    self._discard_executor()
+            raise YtdlExtractionError(f"yt-dlpワーカープロセスが異常終了しました: {e}")
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            if finished:
+                with self._lock:
+                    if self._executor is executor:
+                        self._pending -= 1
+
+        elapsed = time.time() - start_time
+        with self._lock:
+            self.completed += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            self.avg_time = elapsed if self.avg_time is None else 0.3 * elapsed + 0.7 * self.avg_time
+        logging.info(f"yt-dlp抽出完了 [{profile}] {elapsed:.2f}秒: {url}")
+
+        if info:
+            self._cache.set(cache_key, info, ttl=stream_cache_ttl(info, STREAM_URL_DEFAULT_TTL))
+        return info
+
+    def _job_released(self, executor):
+        # タイムアウト後に遅れて終わったジョブの枠を戻す（再起動済みのプールのジョブは無視）
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._pending = max(self._pending - 1, 0)
+            self._stuck = max(self._stuck - 1, 0)
+
+    def stats(self) -> Dict:
+        """プールの統計を取得"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._executor is not None and self._pid == os.getpid(),
+                "queue_depth": self._pending,
+                "max_queue": self.max_queue,
+                "stuck": self._stuck,
+                "job_timeout": self.job_timeout,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "recycles": self.recycles,
+                "avg_time": round(self.avg_time, 3) if self.avg_time is not None else None,
+                "mean_time": round(self.total_time / self.completed, 3) if self.completed else None,
+                "max_time": round(self.max_time, 3),
+                "cache": self._cache.stats()
+            }
+
+    def shutdown(self):
+        """ワーカープロセスを停止"""
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# グローバルインスタンス（YtdlService / 音声プロキシで共有）
+ytdl_pool = YtdlExtractionPool()
+atexit.register(ytdl_pool.shutdown)
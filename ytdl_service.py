@@ -1,108 +1,121 @@
 import requests
 import logging
-import yt_dlp
 import subprocess
 import json
-from config import YTDL_OPTIONS
+from config import YTDL_OPTIONS, STREAM_URL_DEFAULT_TTL
+from cache_store import get_cache
+from single_flight import single_flight
+from stream_expiry import stream_cache_ttl
+from ytdl_pool import ytdl_pool
 
 
 class YtdlService:
     def __init__(self):
         self.node_service_url = "http://localhost:3001"
         self.ytdl_opts = YTDL_OPTIONS.copy()
+        # ストリームURLキャッシュ（TTLはURLの expire= から決める）
+        self._stream_cache = get_cache('ytdl_streams', ttl=STREAM_URL_DEFAULT_TTL, max_entries=300, coherent=True)
     
     def get_stream_urls(self, video_id):
-        """シンプルで確実な動画取得"""
+        """シンプルで確実な動画取得（ストリームURLの有効期限までキャッシュ）"""
+        cached_data = self._stream_cache.get(video_id)
+        if cached_data is not None:
+            logging.info(f"yt-dlpストリームキャッシュから取得: {video_id}")
+            return cached_data
+        
+        # 同じ動画の抽出が実行中ならその結果を共有（single-flight）
+        return single_flight.do(f"ytdl_streams:{video_id}", self._extract_stream_urls, video_id,
+                                cache=self._stream_cache, cache_key=video_id)
+    
+    def invalidate_stream_cache(self, video_id):
+        """動画のストリームURLキャッシュを破棄（プレーヤーで403等が発生した場合）"""
+        self._stream_cache.delete(video_id)
+        # 抽出プールのキャッシュも破棄しないと、次の抽出で同じ失効済みURLが返る
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        for profile in ('video', 'audio'):
+            ytdl_pool.invalidate(url, profile)
+    
+    def _extract_stream_urls(self, video_id):
+        """yt-dlpでストリームURLを抽出"""
         try:
             url = f"https://www.youtube.com/watch?v={video_id}"
             logging.info(f"動画URL取得開始: {video_id}")
             
-            # 最適化されたyt-dlp設定
-            opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'format': 'best[height<=1080]/best',
-                'noplaylist': True,
-                'socket_timeout': 30,
-                'retries': 3,
-                'fragment_retries': 3,
-                'extractor_retries': 3,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+            # 抽出はyt-dlpプロセスプールで実行（YoutubeDLインスタンスを使い回す）
+            info = ytdl_pool.extract(url, 'video')
             
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                if not info:
-                    return None
-                
-                formats = []
-                available_qualities = set()
+            if not info:
+                return None
+            
+            formats = []
+            available_qualities = set()
+            
+            # 利用可能なフォーマットを収集
+            for fmt in info.get('formats', []):
+                if not fmt.get('url') or not fmt.get('height'):
+                    continue
                 
-                # 利用可能なフォーマットを収集
-                for fmt in info.get('formats', []):
-                    if not fmt.get('url') or not fmt.get('height'):
-                        continue
-                    
-                    height = fmt.get('height')
-                    if height < 240:  # 240p未満は除外
-                        continue
-                        
-                    quality = f"{height}p"
-                    
-                    # 重複を避ける
-                    if quality in available_qualities:
-                        continue
+                height = fmt.get('height')
+                if height < 240:  # 240p未満は除外
+                    continue
                     
-                    available_qualities.add(quality)
-                    
-                    formats.append({
-                        'url': fmt['url'],
-                        'quality': quality,
-                        'resolution': f"{fmt.get('width', '?')}x{height}",
-                        'has_audio': fmt.get('acodec', 'none') != 'none',
-                        'audio_url': None,
-                        'bitrate': fmt.get('tbr', 0),
-                        'fps': fmt.get('fps', 30),
-                        'ext': fmt.get('ext', 'mp4')
-                    })
-                
-                # 品質でソート（高品質から低品質へ）
-                formats.sort(key=lambda x: int(x['quality'].replace('p', '')), reverse=True)
+                quality = f"{height}p"
                 
-                # 音声のみのフォーマットを取得
-                audio_url = self._get_audio_stream(video_id)
+                # 重複を避ける
+                if quality in available_qualities:
+                    continue
                 
-                # 音声が分離されている場合は音声URLを追加
-                for fmt in formats:
-                    if not fmt['has_audio'] and audio_url:
-                        fmt['audio_url'] = audio_url
-                
-                # フォールバック：基本的な品質オプションを保証
-                if not formats:
-                    basic_url = info.get('url')
-                    if basic_url:
-                        formats = [{
-                            'url': basic_url,
-                            'quality': '720p',
-                            'resolution': '1280x720',
-                            'has_audio': True,
-                            'audio_url': None,
-                            'bitrate': 0,
-                            'fps': 30,
-                            'ext': 'mp4'
-                        }]
-                
-                return {
-                    'title': info.get('title', ''),
-                    'duration': info.get('duration', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'uploader': info.get('uploader', ''),
-                    'best_url': formats[0]['url'] if formats else None,
-                    'formats': formats
-                }
+                available_qualities.add(quality)
                 
+                formats.append({
+                    'url': fmt['url'],
+                    'quality': quality,
+                    'resolution': f"{fmt.get('width', '?')}x{height}",
+                    'has_audio': fmt.get('acodec', 'none') != 'none',
+                    'audio_url': None,
+                    'bitrate': fmt.get('tbr', 0),
+                    'fps': fmt.get('fps', 30),
+                    'ext': fmt.get('ext', 'mp4')
+                })
+            
+            # 品質でソート（高品質から低品質へ）
+            formats.sort(key=lambda x: int(x['quality'].replace('p', '')), reverse=True)
+            
+            # 音声のみのフォーマットを取得
+            audio_url = self._get_audio_stream(video_id)
+            
+            # 音声が分離されている場合は音声URLを追加
+            for fmt in formats:
+                if not fmt['has_audio'] and audio_url:
+                    fmt['audio_url'] = audio_url
+            
+            # フォールバック：基本的な品質オプションを保証
+            if not formats:
+                basic_url = info.get('url')
+                if basic_url:
+                    formats = [{
+                        'url': basic_url,
+                        'quality': '720p',
+                        'resolution': '1280x720',
+                        'has_audio': True,
+                        'audio_url': None,
+                        'bitrate': 0,
+                        'fps': 30,
+                        'ext': 'mp4'
+                    }]
+            
+            result = {
+                'title': info.get('title', ''),
+                'duration': info.get('duration', 0),
+                'thumbnail': info.get('thumbnail', ''),
+                'uploader': info.get('uploader', ''),
+                'best_url': formats[0]['url'] if formats else None,
+                'formats': formats
+            }
+            if formats:
+                self._stream_cache.set(video_id, result, ttl=stream_cache_ttl(result, STREAM_URL_DEFAULT_TTL))
+            return result
+            
         except Exception as e:
             logging.error(f"動画取得エラー: {e}")
             return None
@@ -111,16 +124,8 @@ class YtdlService:
         """音声ストリームを取得"""
         try:
             url = f"https://www.youtube.com/watch?v={video_id}"
-            opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'format': 'bestaudio[ext=m4a]/bestaudio',
-                'noplaylist': True
-            }
-            
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return info.get('url') if info else None
+            info = ytdl_pool.extract(url, 'audio')
+            return info.get('url') if info else None
                 
         except Exception as e:
             logging.error(f"音声取得エラー: {e}")